@@ -13,6 +13,7 @@ from typing import (
     DefaultDict,
     Dict,
     List,
+    Mapping,
     Optional,
     Sequence,
     Set,
@@ -41,12 +42,14 @@ from cmk.utils.type_defs import (
     ServiceState,
     SourceType,
     state_markers,
+    TimeperiodName,
 )
 
 from cmk.core_helpers.protocol import FetcherMessage, FetcherType
 from cmk.core_helpers.type_defs import Mode, NO_SELECTION, SectionNameCollection
 
 import cmk.base.api.agent_based.register as agent_based_register
+import cmk.base.check_plan
 import cmk.base.check_table as check_table
 import cmk.base.sources as sources
 import cmk.base.config as config
@@ -61,7 +64,7 @@ from cmk.base.agent_based.data_provider import ParsedSectionsBroker
 from cmk.base.api.agent_based import checking_classes
 from cmk.base.api.agent_based.register.check_plugins_legacy import wrap_parameters
 from cmk.base.api.agent_based.type_defs import Parameters
-from cmk.base.check_utils import LegacyCheckParameters, Service
+from cmk.base.check_utils import LegacyCheckParameters, Service, ServiceID
 
 from . import _legacy_mode, _submit_to_core
 from .utils import (
@@ -121,34 +124,14 @@ def do_check(
         if ipaddress is None and not host_config.is_cluster:
             ipaddress = config.lookup_ip_address(host_config)
 
-        # When monitoring Checkmk clusters, the cluster nodes are responsible for fetching all
-        # information from the monitored host and cache the result for the cluster checks to be
-        # performed on the cached information.
-        #
-        # This means that in case of SNMP nodes, they need to take the clustered services of the
-        # node into account, fetch the needed sections and cache them for the cluster host.
-        #
-        # But later, when checking the node services, the node has to only deal with the unclustered
-        # services.
-        #
-        # TODO: clean this up. The fetched sections are computed in the checkers
-        #       _make_configured_snmp_sections now.
-        #
-        belongs_to_cluster = len(config_cache.clusters_of(hostname)) > 0
-
-        services_to_fetch = _get_services_to_fetch(
-            host_name=hostname,
-            belongs_to_cluster=belongs_to_cluster,
-            config_cache=config_cache,
-        )
-
-        services_to_check = _filter_clustered_services(
-            config_cache=config_cache,
-            host_name=hostname,
-            belongs_to_cluster=belongs_to_cluster,
-            services=services_to_fetch,
-            run_only_plugin_names=run_only_plugin_names,
-        )
+        check_plan = cmk.base.check_plan.get_check_plan(config_cache, hostname)
+        services_to_check = [
+            service for service in check_plan.services_to_check(run_only_plugin_names)
+            if not _outside_check_period(
+                service.description,
+                check_plan.check_periods[service.description],
+            )
+        ]
 
         nodes = sources.make_nodes(
             config_cache,
@@ -192,6 +175,7 @@ def do_check(
                 ipaddress,
                 parsed_sections_broker=broker,
                 services=services_to_check,
+                static_parameters=check_plan.parameters,
                 dry_run=dry_run,
                 show_perfdata=show_perfdata,
             )
@@ -302,6 +286,7 @@ def _do_all_checks_on_host(
     parsed_sections_broker: ParsedSectionsBroker,
     *,
     services: List[Service],
+    static_parameters: Mapping[ServiceID, Parameters],
     dry_run: bool,
     show_perfdata: bool,
 ) -> Tuple[int, List[CheckPluginName]]:
@@ -315,6 +300,7 @@ def _do_all_checks_on_host(
                 host_config,
                 ipaddress,
                 service,
+                static_parameters=static_parameters.get(service.id()),
                 dry_run=dry_run,
                 show_perfdata=show_perfdata,
             )
@@ -326,68 +312,15 @@ def _do_all_checks_on_host(
     return num_success, sorted(plugins_missing_data)
 
 
-def _get_services_to_fetch(
-    host_name: HostName,
-    belongs_to_cluster: bool,
-    config_cache: config.ConfigCache,
-) -> List[Service]:
-    """Gather list of services to fetch the sections for
-
-    Please note that explicitly includes the services that are assigned to cluster nodes.  In SNMP
-    clusters the nodes have to fetch the information for the checking phase of the clustered
-    services.
-    """
-    host_check_table = check_table.get_check_table(
-        host_name, filter_mode=check_table.FilterMode.INCLUDE_CLUSTERED)
-
-    services = config.resolve_service_dependencies(
-        host_name=host_name,
-        services=sorted(host_check_table.values(), key=lambda s: s.description),
+def service_outside_check_period(config_cache: config.ConfigCache, hostname: HostName,
+                                 description: ServiceName) -> bool:
+    return _outside_check_period(
+        description,
+        config_cache.check_period_of_service(hostname, description),
     )
 
-    return [
-        service for service in services
-        if not service_outside_check_period(config_cache, host_name, service.description)
-    ]
 
-
-def _filter_clustered_services(
-    *,
-    config_cache: config.ConfigCache,
-    host_name: HostName,
-    belongs_to_cluster: bool,
-    services: List[Service],
-    run_only_plugin_names: Optional[Set[CheckPluginName]] = None,
-) -> List[Service]:
-    """If the host belongs to a cluster, exclude the services that are not assigned to this host"""
-    def _is_not_of_host(service):
-        return host_name != config_cache.host_of_clustered_service(host_name, service.description)
-
-    # When check types are specified via command line, enforce them.
-    # Otherwise start with all check plugin names.
-    if run_only_plugin_names is None:
-        used_plugins = {s.check_plugin_name for s in services}
-    else:
-        used_plugins = run_only_plugin_names.intersection(s.check_plugin_name for s in services)
-
-    # Filter out check types which are not used on the node
-    if belongs_to_cluster:
-        removed_plugins = {
-            plugin for plugin in used_plugins if all(
-                _is_not_of_host(service) for service in services
-                if service.check_plugin_name == plugin)
-        }
-        used_plugins -= removed_plugins
-
-    return [
-        service for service in services if (service.check_plugin_name in used_plugins and
-                                            not (belongs_to_cluster and _is_not_of_host(service)))
-    ]
-
-
-def service_outside_check_period(config_cache: config.ConfigCache, hostname: HostName,
-                                 description: ServiceName) -> bool:
-    period = config_cache.check_period_of_service(hostname, description)
+def _outside_check_period(description: ServiceName, period: Optional[TimeperiodName]) -> bool:
     if period is None:
         return False
 
@@ -407,6 +340,7 @@ def execute_check(
     ipaddress: Optional[HostAddress],
     service: Service,
     *,
+    static_parameters: Optional[Parameters] = None,
     dry_run: bool,
     show_perfdata: bool,
 ) -> bool:
@@ -434,7 +368,8 @@ def execute_check(
             ipaddress,
             service,
             plugin,
-            lambda: _final_read_only_check_parameters(service.parameters),
+            lambda: (static_parameters if static_parameters is not None else
+                     _final_read_only_check_parameters(service.parameters)),
         )
 
     if submittable.submit:
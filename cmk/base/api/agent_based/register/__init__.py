@@ -4,7 +4,8 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from typing import List
+import importlib
+from typing import Iterable, List
 
 import cmk.utils.debug
 import cmk.utils.paths
@@ -54,6 +55,19 @@ def load_all_plugins() -> List[str]:
     return errors
 
 
+def load_selected_plugins(modules: Iterable[str]) -> List[str]:
+    """Load the given plugin modules of cmk.base.plugins.agent_based"""
+    errors = []
+    for module in modules:
+        try:
+            importlib.import_module("cmk.base.plugins.agent_based.%s" % module)
+        except Exception as exception:
+            errors.append(f"Error in agent based plugin {module}: {exception}\n")
+            if cmk.utils.debug.enabled():
+                raise
+    return errors
+
+
 __all__ = [
     "add_check_plugin",
     "add_discovery_ruleset",
@@ -191,6 +191,17 @@ def has_autochecks(hostname: HostName) -> bool:
     return _autochecks_path_for(hostname).exists()
 
 
+def autochecks_stamp(hostname: HostName) -> Optional[Tuple[int, int]]:
+    """Identify the current version of the autochecks of the host
+
+    Returns mtime (ns) and size of the autochecks file, or None if there is none."""
+    try:
+        stat = _autochecks_path_for(hostname).stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def _load_raw_autochecks(
     *,
     path: Path,
@@ -248,6 +259,28 @@ def parse_autochecks_file(
     return services
 
 
+def check_plugin_names_of(hostname: HostName) -> Set[CheckPluginName]:
+    """Read the check plugin names of the autochecks without loading any plugin or config"""
+    path = _autochecks_path_for(hostname)
+    try:
+        raw_autochecks = _load_raw_autochecks(path=path, check_variables=None)
+    except SyntaxError as e:
+        raise MKGeneralException("Unable to parse autochecks of host %s (%s): %s" %
+                                 (hostname, path, e))
+
+    check_plugin_names: Set[CheckPluginName] = set()
+    for entry in raw_autochecks:
+        if isinstance(entry, tuple):
+            check_plugin_name = _parse_pre_16_tuple_autocheck_entry(entry)[0]
+        elif isinstance(entry, dict):
+            check_plugin_name = _parse_dict_autocheck_entry(entry)[0]
+        else:
+            continue
+        check_plugin_names.add(CheckPluginName(maincheckify(check_plugin_name)))
+
+    return check_plugin_names
+
+
 def _parse_autocheck_entry(
     hostname: HostName,
     entry: Union[Tuple, Dict],
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Long running helper process executing the automation calls of the GUI
+
+The helper loads the check plugins once and keeps the configuration loaded. Each automation
+call is executed in a process forked from the helper. The worker processes start with
+everything loaded and changes they make to the global state do not affect later calls.
+
+The configuration is reloaded before executing a call in case one of the configuration files
+has changed. Changed local plugins can not be reloaded into the running process. The helper
+declines the call and re-executes itself in this case.
+
+See cmk.utils.automation_helper for the protocol and the client.
+"""
+
+import io
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import traceback
+from contextlib import suppress
+from pathlib import Path
+from types import FrameType
+from typing import IO, Iterable, List, NoReturn, Optional, Set, Tuple
+
+import cmk.utils.daemon as daemon
+import cmk.utils.log as log
+import cmk.utils.paths
+from cmk.utils.automation_helper import (
+    AutomationRequest,
+    AutomationResponse,
+    receive_all,
+    serialize_response,
+    serialize_unavailable,
+)
+from cmk.utils.exceptions import MKTerminate
+
+import cmk.base.automations as automations
+import cmk.base.check_api as check_api
+import cmk.base.config as config
+
+logger = logging.getLogger("cmk.base.automation_helper")
+
+# These commands create the configuration of the core and control the core. They are always
+# executed by a dedicated "cmk --automation" process.
+UNSUPPORTED_COMMANDS = frozenset(["restart", "reload", "start"])
+
+# Same as in mode_automation(): These commands handle their console output on their own
+_COMMANDS_WITH_CONSOLE_LOGGING = frozenset(["create-diagnostics-dump", "try-inventory"])
+
+MAX_WORKERS = 10
+ACCEPT_TIMEOUT = 1.0
+REQUEST_TIMEOUT = 10.0
+
+Fingerprint = Tuple[Tuple[str, int, int], ...]
+
+
+def _fingerprint(paths: Iterable[Path]) -> Fingerprint:
+    entries = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+def config_fingerprint() -> Fingerprint:
+    """Changes whenever a configuration file is created, changed or removed"""
+    return _fingerprint(config._get_config_file_paths(with_conf_d=True))  # pylint: disable=protected-access
+
+
+def plugins_fingerprint() -> Fingerprint:
+    """Changes whenever a local plugin is created, changed or removed"""
+    directories = [
+        cmk.utils.paths.local_checks_dir,
+        cmk.utils.paths.local_inventory_dir,
+        cmk.utils.paths.local_agent_based_plugins_dir,
+    ]
+    return _fingerprint(
+        path for directory in directories for path in sorted(Path(directory).rglob("*")))
+
+
+class AutomationHelper:
+    def __init__(self, socket_path: Path, max_workers: int = MAX_WORKERS) -> None:
+        super(AutomationHelper, self).__init__()
+        self._socket_path = socket_path
+        self._max_workers = max_workers
+        self._workers: Set[int] = set()
+        self._server: Optional[socket.socket] = None
+        self._plugins_fingerprint: Fingerprint = ()
+        self._config_fingerprint: Optional[Fingerprint] = None
+
+    def serve_forever(self, restart_command: List[str]) -> NoReturn:
+        self._plugins_fingerprint = plugins_fingerprint()
+        for error in config.load_all_agent_based_plugins(check_api.get_check_api_context):
+            logger.warning(error)
+
+        self._server = self._listen()
+        logger.info("Listening on %s", self._socket_path)
+        try:
+            while True:
+                self._reap_workers()
+                try:
+                    connection, _address = self._server.accept()
+                except socket.timeout:
+                    continue
+
+                with connection:
+                    restart = self._handle_connection(connection)
+
+                if restart:
+                    logger.info("The local plugins have changed, restarting")
+                    self._close()
+                    os.execv(restart_command[0], restart_command)
+        finally:
+            self._close()
+
+    def _listen(self) -> socket.socket:
+        with suppress(FileNotFoundError):
+            self._socket_path.unlink()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self._socket_path))
+        server.listen(socket.SOMAXCONN)
+        server.settimeout(ACCEPT_TIMEOUT)
+        return server
+
+    def _close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        self._server = None
+        with suppress(FileNotFoundError):
+            self._socket_path.unlink()
+
+    def _reap_workers(self) -> None:
+        """Collect the finished workers"""
+        while True:
+            try:
+                pid, _status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self._workers.discard(pid)
+
+    def _handle_connection(self, connection: socket.socket) -> bool:
+        """Start a worker for the request. Returns True in case the helper needs a restart"""
+        connection.settimeout(REQUEST_TIMEOUT)
+        try:
+            request = AutomationRequest.deserialize(receive_all(connection))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Invalid request: %s", e)
+            return False
+
+        if request.command in UNSUPPORTED_COMMANDS:
+            self._decline(connection, "Command %s is not supported" % request.command)
+            return False
+
+        # The client executes the call in a subprocess instead of waiting for a worker
+        if len(self._workers) >= self._max_workers:
+            self._decline(connection, "All workers are busy")
+            return False
+
+        if plugins_fingerprint() != self._plugins_fingerprint:
+            self._decline(connection, "The local plugins have changed")
+            return True
+
+        if not self._load_config():
+            self._decline(connection, "Failed to load the configuration")
+            return False
+
+        self._start_worker(connection, request)
+        return False
+
+    def _decline(self, connection: socket.socket, reason: str) -> None:
+        logger.info("Declining request: %s", reason)
+        with suppress(OSError):
+            connection.sendall(serialize_unavailable(reason))
+
+    def _load_config(self) -> bool:
+        # Take the fingerprint before loading. Changes made during loading are picked
+        # up with the next request.
+        fingerprint = config_fingerprint()
+        if fingerprint == self._config_fingerprint:
+            return True
+
+        logger.info("Loading configuration")
+        self._config_fingerprint = None
+        try:
+            config.load(validate_hosts=False)
+        except MKTerminate:
+            raise
+        except (Exception, SystemExit) as e:
+            logger.exception("Failed to load the configuration: %s", e)
+            return False
+
+        self._config_fingerprint = fingerprint
+        return True
+
+    def _start_worker(self, connection: socket.socket, request: AutomationRequest) -> None:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if pid:
+            self._workers.add(pid)
+            return
+
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if self._server is not None:
+                self._server.close()
+
+            response = execute_request(request)
+
+            connection.settimeout(None)
+            connection.sendall(serialize_response(response))
+            connection.close()
+        except BaseException:
+            with suppress(Exception):
+                logger.exception("Failed to execute automation %s", request.command)
+        finally:
+            os._exit(0)
+
+
+def execute_request(request: AutomationRequest) -> AutomationResponse:
+    """Execute the automation in this process like "cmk --automation" would do
+
+    The output to stdout and stderr is collected on file descriptor level to
+    catch all output, including the one of subprocesses."""
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        os.dup2(stdout.fileno(), 1)
+        os.dup2(stderr.fileno(), 2)
+        sys.stdin = io.StringIO(request.stdin)
+        sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+        sys.stderr = open(2, "w", encoding="utf-8", closefd=False)
+
+        log.setup_console_logging()
+        log.logger.setLevel(log.verbosity_to_log_level(request.verbosity))
+        if request.command not in _COMMANDS_WITH_CONSOLE_LOGGING:
+            log.clear_console_logging()
+
+        try:
+            exit_code = automations.automations.execute(request.command,
+                                                        list(request.args),
+                                                        preloaded=True)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        return AutomationResponse(
+            exit_code=exit_code,
+            stdout=_read_output(stdout),
+            stderr=_read_output(stderr),
+        )
+
+
+def _read_output(f: IO[bytes]) -> str:
+    f.seek(0)
+    return f.read().decode("utf-8", errors="replace")
+
+
+def _raise_terminate(signum: int, stackframe: Optional[FrameType]) -> NoReturn:
+    raise MKTerminate()
+
+
+def run(foreground: bool) -> None:
+    # The working directory is changed when daemonizing
+    restart_command = [sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:]
+
+    if not foreground:
+        daemon.daemonize()
+        log.open_log(Path(cmk.utils.paths.log_dir, "automation-helper.log"))
+
+    signal.signal(signal.SIGTERM, _raise_terminate)
+
+    with daemon.pid_file_lock(Path(cmk.utils.paths.automation_helper_pid_file)):
+        try:
+            helper = AutomationHelper(Path(cmk.utils.paths.automation_helper_socket))
+            helper.serve_forever(restart_command)
+        except MKTerminate:
+            logger.info("Terminated")
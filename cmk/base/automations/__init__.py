@@ -37,7 +37,11 @@ class Automations:
             raise TypeError()
         self._automations[automation.cmd] = automation
 
-    def execute(self, cmd: str, args: List[str]) -> Any:
+    def execute(self, cmd: str, args: List[str], preloaded: bool = False) -> Any:
+        """Execute the automation and print its result
+
+        The automation helper has already loaded the plugins and the configuration and
+        sets preloaded to skip loading them again."""
         self._handle_generic_arguments(args)
 
         try:
@@ -46,10 +50,10 @@ class Automations:
             except KeyError:
                 raise MKAutomationError("Automation command '%s' is not implemented." % cmd)
 
-            if automation.needs_checks:
+            if automation.needs_checks and not preloaded:
                 config.load_all_agent_based_plugins(check_api.get_check_api_context)
 
-            if automation.needs_config:
+            if automation.needs_config and not preloaded:
                 config.load(validate_hosts=False)
 
             result = automation.execute(args)
@@ -23,10 +23,12 @@ import cmk.utils.debug
 import cmk.utils.log as log
 import cmk.utils.man_pages as man_pages
 import cmk.utils.paths
+import cmk.utils.store as store
 from cmk.utils.check_utils import maincheckify
 from cmk.utils.diagnostics import deserialize_cl_parameters, DiagnosticsCLParameters
 from cmk.utils.encoding import ensure_str_with_fallback
 from cmk.utils.exceptions import MKGeneralException, MKBailOut
+from cmk.utils.inventory_archive import InventoryArchive
 from cmk.utils.labels import DiscoveredHostLabelsStore
 from cmk.utils.macros import replace_macros_in_str
 from cmk.utils.type_defs import (
@@ -364,6 +366,7 @@ class AutomationRenameHosts(Automation):
 
         # SNMP walks
         if self._rename_host_file(cmk.utils.paths.snmpwalks_dir, oldname, newname):
+            self._rename_host_file(cmk.utils.paths.snmpwalks_index_dir, oldname, newname)
             actions.append("snmpwalk")
 
         # HW/SW-Inventory
@@ -735,12 +738,26 @@ class AutomationDeleteHosts(Automation):
         for hostname in args:
             self._delete_host_files(hostname)
 
+    def _materialize_inventory_archive(self, hostname: HostName) -> None:
+        """The archived trees are stored relative to the current tree, which is deleted"""
+        filepath = Path(cmk.utils.paths.inventory_output_dir, hostname)
+        if not filepath.exists():
+            return
+
+        archive = InventoryArchive(Path(cmk.utils.paths.inventory_archive_dir, hostname))
+        try:
+            archive.materialize_newest(store.load_object_from_file(str(filepath), default={}))
+        except MKGeneralException:
+            if cmk.utils.debug.enabled():
+                raise
+
     def _delete_host_files(self, hostname: HostName) -> None:
 
         # The inventory_archive as well as the performance data is kept
         # we do not want to loose any historic data for accidently deleted hosts.
         #
         # These files are cleaned up by the disk space mechanism.
+        self._materialize_inventory_archive(hostname)
 
         # single files
         for path in [
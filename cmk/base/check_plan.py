@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Precomputed plans for checking hosts
+
+Everything that is needed to check a host and that only depends on the
+configuration and the autochecks is computed once and kept until the
+configuration is reloaded or the autochecks of the host change.
+
+What depends on the time of the check (the check periods of the services
+and the time specific check parameters) is evaluated on every check.
+"""
+
+from typing import FrozenSet, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+
+from cmk.utils.caching import config_cache as _config_cache
+from cmk.utils.type_defs import CheckPluginName, HostName, SectionName, ServiceName, TimeperiodName
+
+import cmk.base.api.agent_based.register as agent_based_register
+import cmk.base.autochecks as autochecks
+import cmk.base.check_table as check_table
+import cmk.base.config as config
+from cmk.base.api.agent_based.register.check_plugins_legacy import wrap_parameters
+from cmk.base.api.agent_based.type_defs import Parameters
+from cmk.base.check_utils import Service, ServiceID
+
+AutochecksStamps = Tuple[Optional[Tuple[int, int]], ...]
+
+
+class CheckPlan(NamedTuple):
+    host_name: HostName
+    # The services to check on this host, ordered by their dependencies.
+    # The services of a node that are assigned to a cluster are not included.
+    services: Sequence[Service]
+    check_periods: Mapping[ServiceName, Optional[TimeperiodName]]
+    # Parameters of the services that are not time specific
+    parameters: Mapping[ServiceID, Parameters]
+    # Raw sections needed for the services, including the clustered ones
+    needed_sections: FrozenSet[SectionName]
+    autochecks_stamps: AutochecksStamps
+
+    def services_to_check(
+        self,
+        run_only_plugin_names: Optional[Set[CheckPluginName]] = None,
+    ) -> List[Service]:
+        if run_only_plugin_names is None:
+            return list(self.services)
+        return [s for s in self.services if s.check_plugin_name in run_only_plugin_names]
+
+
+def get_check_plan(config_cache: config.ConfigCache, host_name: HostName) -> CheckPlan:
+    """Return the check plan of the host
+
+    The plans are kept until the configuration is reloaded. A plan is
+    recomputed when the autochecks of the host or its nodes change.
+    """
+    cache = _config_cache.get("check_plans")
+    autochecks_stamps = _get_autochecks_stamps(config_cache, host_name)
+
+    plan = cache.get(host_name)
+    if plan is not None:
+        if plan.autochecks_stamps == autochecks_stamps:
+            return plan
+        config_cache.invalidate_autochecks()
+
+    plan = cache[host_name] = _compute_check_plan(config_cache, host_name, autochecks_stamps)
+    return plan
+
+
+def _get_autochecks_stamps(config_cache: config.ConfigCache,
+                           host_name: HostName) -> AutochecksStamps:
+    host_names = [host_name] + (config_cache.nodes_of(host_name) or [])
+    return tuple(autochecks.autochecks_stamp(h) for h in host_names)
+
+
+def _compute_check_plan(
+    config_cache: config.ConfigCache,
+    host_name: HostName,
+    autochecks_stamps: AutochecksStamps,
+) -> CheckPlan:
+    # When monitoring Checkmk clusters, the cluster nodes are responsible for fetching all
+    # information from the monitored host and cache the result for the cluster checks to be
+    # performed on the cached information.
+    #
+    # This means that in case of SNMP nodes, they need to take the clustered services of the
+    # node into account, fetch the needed sections and cache them for the cluster host.
+    #
+    # But later, when checking the node services, the node has to only deal with the unclustered
+    # services.
+    belongs_to_cluster = len(config_cache.clusters_of(host_name)) > 0
+
+    services_to_fetch = _get_services_to_fetch(host_name)
+    services = _filter_clustered_services(
+        config_cache=config_cache,
+        host_name=host_name,
+        belongs_to_cluster=belongs_to_cluster,
+        services=services_to_fetch,
+    )
+
+    return CheckPlan(
+        host_name=host_name,
+        services=services,
+        check_periods={
+            service.description: config_cache.check_period_of_service(
+                host_name,
+                service.description,
+            ) for service in services
+        },
+        parameters={
+            service.id(): Parameters(wrap_parameters(service.parameters))
+            for service in services
+            if not isinstance(service.parameters, config.TimespecificParamList)
+        },
+        needed_sections=frozenset(
+            agent_based_register.get_relevant_raw_sections(
+                check_plugin_names={s.check_plugin_name for s in services_to_fetch},
+                inventory_plugin_names=(),
+            )),
+        autochecks_stamps=autochecks_stamps,
+    )
+
+
+def _get_services_to_fetch(host_name: HostName) -> Sequence[Service]:
+    """Gather list of services to fetch the sections for
+
+    Please note that explicitly includes the services that are assigned to cluster nodes.  In SNMP
+    clusters the nodes have to fetch the information for the checking phase of the clustered
+    services.
+    """
+    host_check_table = check_table.get_check_table(
+        host_name, filter_mode=check_table.FilterMode.INCLUDE_CLUSTERED)
+
+    return config.resolve_service_dependencies(
+        host_name=host_name,
+        services=sorted(host_check_table.values(), key=lambda s: s.description),
+    )
+
+
+def _filter_clustered_services(
+    *,
+    config_cache: config.ConfigCache,
+    host_name: HostName,
+    belongs_to_cluster: bool,
+    services: Sequence[Service],
+) -> List[Service]:
+    """If the host belongs to a cluster, exclude the services that are not assigned to this host"""
+    if not belongs_to_cluster:
+        return list(services)
+
+    return [
+        service for service in services
+        if host_name == config_cache.host_of_clustered_service(host_name, service.description)
+    ]
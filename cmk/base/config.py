@@ -10,6 +10,7 @@ import copy
 import inspect
 import itertools
 import marshal
+import mmap
 import numbers
 import os
 import pickle
@@ -261,7 +262,8 @@ def load(with_conf_d: bool = True,
     _verify_no_deprecated_variables_used()
 
 
-def load_packed_config(serial: OptionalConfigSerial) -> None:
+def load_packed_config(serial: OptionalConfigSerial,
+                       hostnames: Optional[Iterable[HostName]] = None) -> None:
     """Load the configuration for the CMK helpers of CMC
 
     These files are written by PackedConfig().
@@ -270,12 +272,30 @@ def load_packed_config(serial: OptionalConfigSerial) -> None:
     check helpers would only need check related config variables.
 
     The validations which are performed during load() also don't need to be performed.
+
+    In case hostnames are given, only the configuration of these hosts (and their clusters
+    or nodes) is loaded from the sharded packed config. All other hosts are unknown then.
     """
     _initialize_config()
-    globals().update(PackedConfigStore(serial).read())
+    globals().update(_read_packed_config(serial, hostnames))
     _perform_post_config_loading_actions()
 
 
+def _read_packed_config(serial: OptionalConfigSerial,
+                        hostnames: Optional[Iterable[HostName]]) -> Mapping[str, Any]:
+    if hostnames is not None:
+        try:
+            shards = ShardedPackedConfigStore(serial).read(hostnames)
+        except FileNotFoundError:
+            shards = None
+
+        if shards is not None:
+            global_config, host_records = shards
+            return merge_packed_config_shards(global_config, host_records)
+
+    return PackedConfigStore(serial).read()
+
+
 def _initialize_config() -> None:
     _add_check_variables_to_default_config()
     load_default_config()
@@ -599,9 +619,36 @@ def all_nonfunction_vars() -> Set[str]:
     }
 
 
-def save_packed_config(serial: OptionalConfigSerial, config_cache: "ConfigCache") -> None:
-    """Create and store a precompiled configuration for Checkmk helper processes"""
-    PackedConfigStore(serial).write(PackedConfigGenerator(config_cache).generate())
+# These variables map the host names to host specific values. They are split up into the
+# host records of the sharded packed config.
+_HOST_KEYED_CONFIG_VARIABLE_NAMES = [
+    "host_tags",
+    "host_labels",
+    "host_paths",
+    "host_attributes",
+    "ipaddresses",
+    "ipv6addresses",
+    "additional_ipv4addresses",
+    "additional_ipv6addresses",
+    "explicit_snmp_communities",
+    "management_protocol",
+    "management_snmp_credentials",
+    "management_ipmi_credentials",
+]
+
+
+def save_packed_config(serial: OptionalConfigSerial,
+                       config_cache: "ConfigCache",
+                       sharded: bool = False) -> None:
+    """Create and store a precompiled configuration for Checkmk helper processes
+
+    With sharded, the sharded packed config read by the precompiled host checks is
+    stored, too."""
+    generator = PackedConfigGenerator(config_cache)
+    helper_config = generator.generate()
+    PackedConfigStore(serial).write(helper_config)
+    if sharded:
+        ShardedPackedConfigStore(serial).write(*generator.shard(helper_config))
 
 
 class PackedConfigGenerator:
@@ -724,6 +771,74 @@ class PackedConfigGenerator:
 
         return helper_config
 
+    def shard(
+        self,
+        helper_config: Mapping[str, Any],
+    ) -> Tuple[Dict[str, Any], Dict[HostName, Dict[str, Any]]]:
+        """Split the helper config into a global part and one record per host
+
+        The host records contain the host entries of all_hosts and clusters and the values
+        of the host keyed variables. Entries of hosts without record are dropped. The
+        records are merged again by merge_packed_config_shards()."""
+        global_config = dict(helper_config)
+        host_records: Dict[HostName, Dict[str, Any]] = {}
+
+        def record_of(hostname: HostName) -> Dict[str, Any]:
+            return host_records.setdefault(
+                hostname, {
+                    "all_hosts": [],
+                    "clusters": {},
+                    "variables": {},
+                    "explicit_host_conf": {},
+                    "related_hosts": [],
+                })
+
+        for host_entry in global_config.pop("all_hosts", []):
+            record_of(host_entry.split("|", 1)[0])["all_hosts"].append(host_entry)
+
+        for cluster_entry, cluster_nodes in global_config.pop("clusters", {}).items():
+            record_of(cluster_entry.split("|", 1)[0])["clusters"][cluster_entry] = cluster_nodes
+
+        for hostname, record in host_records.items():
+            record["related_hosts"] = sorted(
+                set(self._config_cache.clusters_of(hostname)) |
+                set(self._config_cache.nodes_of(hostname) or []))
+
+        for varname in _HOST_KEYED_CONFIG_VARIABLE_NAMES:
+            for hostname, value in global_config.pop(varname, {}).items():
+                if hostname in host_records:
+                    host_records[hostname]["variables"][varname] = value
+
+        for varname, values in global_config.pop("explicit_host_conf", {}).items():
+            for hostname, value in values.items():
+                if hostname in host_records:
+                    host_records[hostname]["explicit_host_conf"][varname] = value
+
+        return global_config, host_records
+
+
+def merge_packed_config_shards(
+    global_config: Mapping[str, Any],
+    host_records: Mapping[HostName, Mapping[str, Any]],
+) -> Dict[str, Any]:
+    """Create the helper config of the given hosts from the sharded packed config"""
+    helper_config = dict(global_config)
+    helper_config["all_hosts"] = []
+    helper_config["clusters"] = {}
+    helper_config["explicit_host_conf"] = {}
+    for varname in _HOST_KEYED_CONFIG_VARIABLE_NAMES:
+        helper_config[varname] = {}
+
+    for hostname, record in host_records.items():
+        helper_config["all_hosts"].extend(record["all_hosts"])
+        helper_config["clusters"].update(record["clusters"])
+        for varname, value in record["variables"].items():
+            helper_config[varname][hostname] = value
+        for varname, value in record["explicit_host_conf"].items():
+            helper_config["explicit_host_conf"].setdefault(varname, {})[hostname] = value
+
+    return helper_config
+
 
 class PackedConfigStore:
     """Caring about persistence of the packed configuration"""
@@ -743,6 +858,74 @@ class PackedConfigStore:
             return pickle.load(f)
 
 
+class ShardedPackedConfigStore:
+    """Caring about persistence of the sharded packed configuration
+
+    The file starts with the length of the pickled index followed by the index. It holds the
+    positions of the pickled global part and of the pickled host records. Readers map the file
+    into memory and only unpickle the parts they need."""
+    _header = struct.Struct("!Q")
+
+    def __init__(self, serial: OptionalConfigSerial) -> None:
+        base_path: Final[Path] = cmk.utils.paths.make_helper_config_path(serial)
+        self.path: Final[Path] = base_path / "precompiled_check_config.shards"
+
+    def write(self, global_config: Mapping[str, Any],
+              host_records: Mapping[HostName, Mapping[str, Any]]) -> None:
+        chunks = [pickle.dumps(global_config, pickle.HIGHEST_PROTOCOL)]
+        hosts = {}
+        offset = len(chunks[0])
+        for hostname, record in host_records.items():
+            chunk = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+            hosts[hostname] = (offset, len(chunk))
+            offset += len(chunk)
+            chunks.append(chunk)
+
+        index = pickle.dumps({
+            "global": (0, len(chunks[0])),
+            "hosts": hosts,
+        }, pickle.HIGHEST_PROTOCOL)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".compiled")
+        with tmp_path.open("wb") as compiled_file:
+            compiled_file.write(self._header.pack(len(index)))
+            compiled_file.write(index)
+            for chunk in chunks:
+                compiled_file.write(chunk)
+        tmp_path.rename(self.path)
+
+    def read(
+        self, hostnames: Iterable[HostName]
+    ) -> Optional[Tuple[Mapping[str, Any], Dict[HostName, Mapping[str, Any]]]]:
+        """Read the global part and the records of the hosts and their related hosts
+
+        Returns None in case one of the hosts has no record."""
+        with self.path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            index_length, = self._header.unpack_from(data)
+            start = self._header.size + index_length
+            index = pickle.loads(data[self._header.size:start])
+
+            def load_chunk(position: Tuple[int, int]) -> Any:
+                offset, length = position
+                return pickle.loads(data[start + offset:start + offset + length])
+
+            host_records: Dict[HostName, Mapping[str, Any]] = {}
+            for hostname in hostnames:
+                if hostname not in index["hosts"]:
+                    return None
+
+                pending = [hostname]
+                while pending:
+                    hostname = pending.pop()
+                    if hostname in host_records or hostname not in index["hosts"]:
+                        continue
+                    host_records[hostname] = load_chunk(index["hosts"][hostname])
+                    pending.extend(host_records[hostname]["related_hosts"])
+
+            return load_chunk(index["global"]), host_records
+
+
 def make_core_autochecks_dir(serial: OptionalConfigSerial) -> Path:
     return cmk.utils.paths.make_helper_config_path(serial) / "autochecks"
 
@@ -1428,6 +1611,23 @@ def load_all_agent_based_plugins(get_check_api_context: GetCheckApiContext,) ->
     return errors
 
 
+def load_selected_agent_based_plugins(
+    get_check_api_context: GetCheckApiContext,
+    modules: Iterable[str],
+    check_files: List[str],
+) -> List[str]:
+    """Load only the given agent based plugin modules and legacy check files
+
+    Used instead of load_all_agent_based_plugins() by commands which know the plugins
+    they need in advance (see cmk.base.plugin_index)."""
+    _initialize_data_structures()
+
+    errors = agent_based_register.load_selected_plugins(modules)
+    errors.extend(load_checks(get_check_api_context, check_files))
+
+    return errors
+
+
 def _initialize_data_structures() -> None:
     """Initialize some data structures which are populated while loading the checks"""
     global _all_checks_loaded
@@ -2584,6 +2784,17 @@ class HostConfig:
 
         return None
 
+    @property
+    def snmp_fetch_concurrency(self) -> int:
+        """Return the maximum number of concurrent SNMP walks for this host
+
+        A value of 1 (the default) fetches the sections one after another.
+        """
+        entries = self._config_cache.host_extra_conf(self.hostname, snmp_fetch_concurrency)
+        if not entries:
+            return 1
+        return entries[0]
+
     def disabled_snmp_sections(self) -> Set[SectionName]:
         """Return a set of disabled snmp sections
         """
@@ -3557,6 +3768,11 @@ class ConfigCache:
             service_description,  # this is the global function!
         )
 
+    def invalidate_autochecks(self) -> None:
+        """Forget the autochecks and the check tables, e.g. after a rediscovery"""
+        self._autochecks_manager = autochecks.AutochecksManager()
+        self.check_table_cache.clear()
+
     def section_name_of(self, section: CheckPluginNameStr) -> str:
         try:
             return self._cache_section_name_of[section]
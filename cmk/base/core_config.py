@@ -37,6 +37,7 @@ import cmk.base.api.agent_based.register as agent_based_register
 import cmk.base.obsolete_output as out
 import cmk.base.config as config
 import cmk.base.ip_lookup as ip_lookup
+import cmk.base.plugin_index as plugin_index
 from cmk.base.config import (
     HostConfig,
     ConfigCache,
@@ -401,6 +402,9 @@ def _create_core_config(core: MonitoringCore) -> ConfigurationWarnings:
             new_helper_config_serial()).create() as helper_config, _backup_objects_file(core):
         core.create_config(helper_config.serial)
 
+    if config.all_checks_loaded():
+        plugin_index.create_plugin_index(config.get_config_cache())
+
     cmk.utils.password_store.save(config.stored_passwords)
 
     return get_configuration_warnings()
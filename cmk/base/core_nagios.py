@@ -6,13 +6,15 @@
 """Code for support of Nagios (and compatible) cores"""
 
 import base64
+import multiprocessing
 import os
 import py_compile
+import re
 import socket
 import sys
 from io import StringIO
 from pathlib import Path
-from typing import Any, Dict, IO, Iterable, List, Optional, Set, Tuple, Union
+from typing import Any, Dict, IO, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
 
 from six import ensure_binary, ensure_str
 
@@ -122,6 +124,9 @@ class NagiosConfig:
         # TODO: Something seems to be mixed up in our call sites...
         self._outfile.write(ensure_str(x))
 
+    def hostcheck_command_name(self) -> CoreCommandName:
+        return "check-mk-host-custom-%d" % (len(self.hostcheck_commands_to_define) + 1)
+
 
 def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None:
     if config.host_notification_periods != []:
@@ -152,8 +157,12 @@ def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None
 
     _output_conf_header(cfg)
 
-    for hostname in sorted(hostnames):
-        _create_nagios_config_host(cfg, config_cache, hostname)
+    if config.core_config_processes > 1 and len(hostnames) > 1:
+        _create_nagios_config_hosts_in_parallel(cfg, sorted(hostnames),
+                                                config.core_config_processes)
+    else:
+        for hostname in sorted(hostnames):
+            _create_nagios_config_host(cfg, config_cache, hostname)
 
     _create_nagios_config_contacts(cfg, hostnames)
     _create_nagios_config_hostgroups(cfg)
@@ -167,6 +176,147 @@ def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None
         cfg.write(config.extra_nagios_conf)
 
 
+# Shards are smaller than needed to use all processes to balance the load
+_SHARDS_PER_PROCESS = 4
+
+# The names of the host check commands are numbered in the order of the hosts.
+# The shards use placeholders, which are numbered when merging them.
+_HOSTCHECK_COMMAND_PLACEHOLDER = "\0check-mk-host-custom-%d\0"
+_HOSTCHECK_COMMAND_PLACEHOLDER_RE = re.compile("\0check-mk-host-custom-([0-9]+)\0")
+
+
+class _RecordingSet(set):
+    """A set that remembers the order in which the elements were added
+
+    The iteration order of a set depends on the order of the insertions.
+    Replaying them in the same order results in the same iteration order.
+    """
+    def __init__(self) -> None:
+        super(_RecordingSet, self).__init__()
+        self.added: List[Any] = []
+
+    def add(self, element: Any) -> None:
+        if element not in self:
+            self.added.append(element)
+            super(_RecordingSet, self).add(element)
+
+    def update(self, *others: Iterable[Any]) -> None:
+        for other in others:
+            for element in other:
+                self.add(element)
+
+
+class _ShardResult(NamedTuple):
+    text: str
+    hostgroups_to_define: List[HostgroupName]
+    servicegroups_to_define: List[ServicegroupName]
+    contactgroups_to_define: List[ContactgroupName]
+    checknames_to_define: List[CheckPluginName]
+    active_checks_to_define: List[CheckPluginNameStr]
+    custom_commands_to_define: List[CoreCommandName]
+    hostcheck_commands_to_define: List[Tuple[CoreCommand, str]]
+    configuration_warnings: List[str]
+    failed_ip_lookups: List[HostName]
+
+
+class _NagiosConfigShard(NagiosConfig):
+    """The definitions of a part of the hosts, computed in a worker process"""
+    def __init__(self, hostnames: List[HostName]) -> None:
+        self._buffer = StringIO()
+        super(_NagiosConfigShard, self).__init__(self._buffer, hostnames)
+        self.hostgroups_to_define = _RecordingSet()
+        self.servicegroups_to_define = _RecordingSet()
+        self.contactgroups_to_define = _RecordingSet()
+        self.checknames_to_define = _RecordingSet()
+        self.active_checks_to_define = _RecordingSet()
+        self.custom_commands_to_define = _RecordingSet()
+
+    def hostcheck_command_name(self) -> CoreCommandName:
+        return _HOSTCHECK_COMMAND_PLACEHOLDER % (len(self.hostcheck_commands_to_define) + 1)
+
+    def result(self, configuration_warnings: List[str],
+               failed_ip_lookups: List[HostName]) -> _ShardResult:
+        return _ShardResult(
+            text=self._buffer.getvalue(),
+            hostgroups_to_define=_added(self.hostgroups_to_define),
+            servicegroups_to_define=_added(self.servicegroups_to_define),
+            contactgroups_to_define=_added(self.contactgroups_to_define),
+            checknames_to_define=_added(self.checknames_to_define),
+            active_checks_to_define=_added(self.active_checks_to_define),
+            custom_commands_to_define=_added(self.custom_commands_to_define),
+            hostcheck_commands_to_define=self.hostcheck_commands_to_define,
+            configuration_warnings=configuration_warnings,
+            failed_ip_lookups=failed_ip_lookups,
+        )
+
+
+def _added(elements: Set[Any]) -> List[Any]:
+    assert isinstance(elements, _RecordingSet)
+    return elements.added
+
+
+def _create_nagios_config_hosts_in_parallel(cfg: NagiosConfig, hostnames: List[HostName],
+                                            processes: int) -> None:
+    """Compute the definitions of the hosts in worker processes
+
+    The hosts are split into shards of consecutive hosts. The shards are merged
+    in the order of the hosts, so that the result is the same as computing the
+    definitions host by host in this process.
+    """
+    num_shards = min(len(hostnames), processes * _SHARDS_PER_PROCESS)
+    shards = [
+        hostnames[len(hostnames) * index // num_shards:len(hostnames) * (index + 1) // num_shards]
+        for index in range(num_shards)
+    ]
+
+    # The workers are forked and inherit the loaded configuration. Pending output
+    # would be written by them as well.
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        for shard_result in pool.imap(_create_nagios_config_shard, shards):
+            _merge_nagios_config_shard(cfg, shard_result)
+
+
+def _create_nagios_config_shard(hostnames: List[HostName]) -> _ShardResult:
+    num_warnings = len(core_config.g_configuration_warnings)
+    num_failed_ip_lookups = len(core_config.failed_ip_lookups())
+
+    config_cache = config.get_config_cache()
+    shard = _NagiosConfigShard(hostnames)
+    for hostname in hostnames:
+        _create_nagios_config_host(shard, config_cache, hostname)
+
+    return shard.result(
+        configuration_warnings=core_config.g_configuration_warnings[num_warnings:],
+        failed_ip_lookups=core_config.failed_ip_lookups()[num_failed_ip_lookups:],
+    )
+
+
+def _merge_nagios_config_shard(cfg: NagiosConfig, shard_result: _ShardResult) -> None:
+    offset = len(cfg.hostcheck_commands_to_define)
+
+    def number_hostcheck_commands(text: str) -> str:
+        return _HOSTCHECK_COMMAND_PLACEHOLDER_RE.sub(
+            lambda match: "check-mk-host-custom-%d" % (offset + int(match.group(1))), text)
+
+    cfg.write(number_hostcheck_commands(shard_result.text))
+    cfg.hostgroups_to_define.update(shard_result.hostgroups_to_define)
+    cfg.servicegroups_to_define.update(shard_result.servicegroups_to_define)
+    cfg.contactgroups_to_define.update(shard_result.contactgroups_to_define)
+    cfg.checknames_to_define.update(shard_result.checknames_to_define)
+    cfg.active_checks_to_define.update(shard_result.active_checks_to_define)
+    cfg.custom_commands_to_define.update(shard_result.custom_commands_to_define)
+    cfg.hostcheck_commands_to_define.extend(
+        (number_hostcheck_commands(command_name), command_line)
+        for command_name, command_line in shard_result.hostcheck_commands_to_define)
+
+    # The warnings have already been printed by the worker
+    core_config.g_configuration_warnings.extend(shard_result.configuration_warnings)
+    core_config.failed_ip_lookups().extend(shard_result.failed_ip_lookups)
+
+
 def _output_conf_header(cfg: NagiosConfig) -> None:
     cfg.write("""#
 # Created by Check_MK. Do not edit.
@@ -216,7 +366,7 @@ def _create_nagios_host_spec(cfg: NagiosConfig, config_cache: ConfigCache, hostn
             host_spec[key] = value
 
     def host_check_via_service_status(service: ServiceName) -> CoreCommand:
-        command = "check-mk-host-custom-%d" % (len(cfg.hostcheck_commands_to_define) + 1)
+        command = cfg.hostcheck_command_name()
         service_with_hostname = replace_macros_in_str(
             service,
             {'$HOSTNAME$': host_config.hostname},
@@ -976,7 +1126,7 @@ def _precompile_hostchecks(serial: ConfigSerial) -> None:
     console.verbose("Creating precompiled host check config...\n")
     config_cache = config.get_config_cache()
 
-    config.save_packed_config(serial, config_cache)
+    config.save_packed_config(serial, config_cache, sharded=True)
 
     console.verbose("Precompiling host checks...\n")
 
@@ -1101,7 +1251,7 @@ if '-d' in sys.argv:
     for check_plugin_name in sorted(needed_legacy_check_plugin_names):
         console.verbose(" %s%s%s", tty.green, check_plugin_name, tty.normal, stream=sys.stderr)
 
-    output.write("config.load_packed_config(serial=LATEST_SERIAL)\n")
+    output.write("config.load_packed_config(serial=LATEST_SERIAL, hostnames=[%r])\n" % hostname)
 
     # IP addresses
     needed_ipaddresses, needed_ipv6addresses, = {}, {}
@@ -74,6 +74,8 @@ non_inline_snmp_hosts: _List = []
 snmp_limit_oid_range: _List = []
 # Ruleset to customize bulk size
 snmp_bulk_size: _List = []
+# Ruleset to fetch independent SNMP sections concurrently
+snmp_fetch_concurrency: _List = []
 snmp_default_community = 'public'
 snmp_communities: _List = []
 # override the rule based configuration
@@ -127,6 +129,9 @@ summary_service_template = 'check_mk_summarized'
 service_dependency_template = 'check_mk'
 generate_hostconf = True
 generate_dummy_commands = True
+# Number of processes computing the host and service definitions of the core
+# configuration. With 1 they are computed in the main process.
+core_config_processes = 1
 dummy_check_commandline = 'echo "ERROR - you did an active check on this service - please disable active checks" && exit 1'
 nagios_illegal_chars = '`;~!$%^&*|\'"<>?,()='
 
@@ -17,11 +17,19 @@ item. The value is free form.
 Note: The item state is kept in tmpfs and not reboot-persistant.
 Do not store long-time things here. Also do not store complex
 structures like log files or stuff.
+
+The item states of a host are stored in one binary file: a snapshot of
+all item states followed by the changes of the following saves
+(see _ItemStateFile). Saving only appends the changes, until they
+get larger than the snapshot and the file is rewritten.
 """
 
+import ast
+import marshal
 import os
+import struct
 import traceback
-from typing import Any, AnyStr, Dict, List, Optional, Tuple, Union
+from typing import Any, AnyStr, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import cmk.utils.cleanup
 import cmk.utils.paths
@@ -49,6 +57,108 @@ class MKCounterWrapped(MKException):
     pass
 
 
+# Layout of the item state files, see _ItemStateFile
+_FILE_MAGIC = b"CMIS"
+_FILE_FORMAT_VERSION = 1
+_FILE_HEADER = struct.Struct("!4sHH")
+_RECORD_LENGTH = struct.Struct("!I")
+
+
+class _ItemStateFile(NamedTuple):
+    """What we know about the item state file since we last read or wrote it
+
+    File layout:
+
+        <FILE MAGIC><FILE FORMAT VERSION><MARSHAL VERSION>
+        <RECORD LENGTH><record: the snapshot>
+        <RECORD LENGTH><record: the changes of a save>
+        ...
+
+    A record is the marshalled tuple (removed keys, updated item states).
+    Replaying the records is the same as merging the changes on save().
+    """
+    identity: Tuple[int, int, int]
+    snapshot_size: int
+    journal_size: int
+    appendable: bool
+
+    @staticmethod
+    def identify(stat: os.stat_result) -> Tuple[int, int, int]:
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def header() -> bytes:
+        return _FILE_HEADER.pack(_FILE_MAGIC, _FILE_FORMAT_VERSION, marshal.version)
+
+    @staticmethod
+    def record(removed: List[ItemStateKey], updated: ItemStates) -> bytes:
+        data = marshal.dumps((removed, updated))
+        return _RECORD_LENGTH.pack(len(data)) + data
+
+    @classmethod
+    def read(cls, filename: str) -> Tuple[ItemStates, Optional["_ItemStateFile"]]:
+        try:
+            with open(filename, "rb") as f:
+                identity = cls.identify(os.fstat(f.fileno()))
+                data = f.read()
+        except FileNotFoundError:
+            return {}, None
+
+        if data[:len(_FILE_MAGIC)] != _FILE_MAGIC:
+            # Empty or written by an older version with repr()
+            legacy_item_states = ast.literal_eval(data.decode("utf-8")) if data.strip() else {}
+            return legacy_item_states, cls(identity, 0, 0, appendable=False)
+
+        if data[:_FILE_HEADER.size] != cls.header():
+            # Written by another version of Checkmk or Python. The item
+            # states are not reboot-persistant either, so we start over.
+            logger.debug("Ignoring item states of unknown format in %s", filename)
+            return {}, cls(identity, 0, 0, appendable=False)
+
+        item_states: ItemStates = {}
+        snapshot_size = 0
+        offset = _FILE_HEADER.size
+        while offset < len(data):
+            try:
+                length, = _RECORD_LENGTH.unpack_from(data, offset)
+                begin = offset + _RECORD_LENGTH.size
+                if begin + length > len(data):
+                    raise ValueError("Truncated record")
+                removed, updated = marshal.loads(memoryview(data)[begin:begin + length])
+            except (struct.error, EOFError, TypeError, ValueError):
+                # A save has been interrupted. Keep what we have and rewrite the file.
+                logger.debug("Ignoring invalid item states at %d in %s", offset, filename)
+                return item_states, cls(identity, snapshot_size, 0, appendable=False)
+
+            for key in removed:
+                item_states.pop(key, None)
+            item_states.update(updated)
+
+            if not snapshot_size:
+                snapshot_size = begin + length
+            offset = begin + length
+
+        return item_states, cls(
+            identity,
+            snapshot_size,
+            len(data) - snapshot_size,
+            appendable=bool(snapshot_size),
+        )
+
+    @classmethod
+    def write(cls, filename: str, item_states: ItemStates) -> None:
+        store.save_bytes_to_file(filename, cls.header() + cls.record([], item_states))
+
+    def append(self, filename: str, record: bytes) -> bool:
+        """Append the record if this is cheaper than rewriting the file"""
+        if not self.appendable or self.journal_size + len(record) > self.snapshot_size:
+            return False
+
+        with open(filename, "ab") as f:
+            f.write(record)
+        return True
+
+
 class CachedItemStates:
     def __init__(self) -> None:
         self._logger = logger
@@ -58,8 +168,8 @@ class CachedItemStates:
     def reset(self) -> None:
         self._item_states: ItemStates = {}
         self._item_state_prefix: ItemStateKey = ()
-        # timestamp of last modification
-        self._last_mtime: Optional[float] = None
+        # state of the file when it was last read
+        self._file: Optional[_ItemStateFile] = None
         self._removed_item_state_keys: List[ItemStateKey] = []
         self._updated_item_states: ItemStates = {}
 
@@ -72,17 +182,12 @@ class CachedItemStates:
         self._logger.debug("Loading item states")
         filename = cmk.utils.paths.counters_dir + "/" + hostname
         try:
-            # TODO: refactoring. put these two values into a named tuple
-            self._item_states = store.load_object_from_file(
-                filename,
-                default={},
-                lock=True,
-            )
-            self._last_mtime = os.stat(filename).st_mtime
+            store.aquire_lock(filename)
+            self._item_states, self._file = _ItemStateFile.read(filename)
         finally:
             store.release_lock(filename)
 
-    # TODO: self._last_mtime needs be updated accordingly after the save_object_to_file operation
+    # TODO: self._file needs be updated accordingly after the write operation
     #       right now, the current mechanism is sufficient enough, since the save() function is only
     #       called as the final operation, just before the lifecycle of the CachedItemState ends
     def save(self, hostname: HostName) -> None:
@@ -91,6 +196,9 @@ class CachedItemStates:
         If the data on disk has been changed in the meantime, the cached data is updated from disk.
         Afterwards only the actual modifications (update/remove) are applied to the updated cached
         data before it is written back to disk.
+
+        Only the modifications are appended to the file, unless rewriting the file is
+        cheaper (see _ItemStateFile).
         """
         self._logger.debug("Saving item states")
         filename = cmk.utils.paths.counters_dir + "/" + hostname
@@ -102,9 +210,9 @@ class CachedItemStates:
                 os.makedirs(cmk.utils.paths.counters_dir)
 
             store.aquire_lock(filename)
-            last_mtime = os.stat(filename).st_mtime
-            if last_mtime != self._last_mtime:
-                self._item_states = store.load_object_from_file(filename, default={})
+            if (self._file is None or
+                    _ItemStateFile.identify(os.stat(filename)) != self._file.identity):
+                self._item_states, self._file = _ItemStateFile.read(filename)
 
                 # Remove obsolete keys
                 for key in self._removed_item_state_keys:
@@ -116,7 +224,18 @@ class CachedItemStates:
                 # Add updated keys
                 self._item_states.update(self._updated_item_states)
 
-            store.save_object_to_file(filename, self._item_states, pretty=False)
+            # Replaying the record must result in self._item_states, also for
+            # keys that have been removed after they have been updated.
+            record = _ItemStateFile.record(
+                self._removed_item_state_keys,
+                {
+                    key: value
+                    for key, value in self._updated_item_states.items()
+                    if key in self._item_states
+                },
+            )
+            if self._file is None or not self._file.append(filename, record):
+                _ItemStateFile.write(filename, self._item_states)
         except Exception:
             raise MKGeneralException("Cannot write to %s: %s" % (filename, traceback.format_exc()))
         finally:
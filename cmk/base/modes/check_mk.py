@@ -1293,6 +1293,32 @@ modes.register(
         short_help="Internal helper to invoke Check_MK actions",
     ))
 
+
+def mode_automation_helper(options: Dict) -> None:
+    import cmk.base.automation_helper as automation_helper  # pylint: disable=import-outside-toplevel
+    automation_helper.run(foreground="foreground" in options)
+
+
+modes.register(
+    Mode(
+        long_option="automation-helper",
+        handler_function=mode_automation_helper,
+        needs_config=False,
+        needs_checks=False,
+        short_help="Internal helper to execute the automation calls of the GUI",
+        long_help=[
+            "Starts a long running process which keeps the plugins and the configuration "
+            "loaded and executes the automation calls of the GUI. The process daemonizes "
+            "itself unless the option --foreground is given.",
+        ],
+        sub_options=[
+            Option(
+                long_option="foreground",
+                short_help="Do not daemonize",
+            ),
+        ],
+    ))
+
 #.
 #   .--notify--------------------------------------------------------------.
 #   |                                 _   _  __                            |
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Index of the check plugins for loading only the plugins needed by single hosts
+
+Loading all plugins takes a substantial part of the runtime of commands like "cmk -v HOST".
+All plugins are loaded anyway while the configuration of the core is created. At this time the
+index is written. It maps the check plugin names and section names to the agent based plugin
+modules and the legacy check files (including their check includes) defining them. It also
+contains the check plugins each host needs according to the configuration.
+
+The check mode then only loads the plugins needed by the host and its current autochecks. In
+case the index is missing, outdated (plugins or configuration changed) or lacks a needed plugin,
+all plugins are loaded as usual.
+"""
+
+import marshal
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import cmk.utils.debug
+import cmk.utils.paths
+import cmk.utils.store as store
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.log import console
+from cmk.utils.type_defs import CheckPluginName, HostName
+
+import cmk.base.api.agent_based.register as agent_based_register
+from cmk.base.api.agent_based.type_defs import SectionPlugin
+import cmk.base.autochecks as autochecks
+import cmk.base.config as config
+from cmk.base.config import ConfigCache, GetCheckApiContext
+
+PluginIndex = Dict[str, Any]
+Fingerprint = List[Tuple[str, int]]
+
+_INDEX_VERSION = 2
+
+
+def _index_path() -> Path:
+    return Path(cmk.utils.paths.precompiled_checks_dir, "plugin_index")
+
+
+def _plugin_directories() -> List[str]:
+    import cmk.base.plugins.agent_based  # pylint: disable=import-outside-toplevel
+    return [
+        cmk.utils.paths.checks_dir,
+        str(cmk.utils.paths.local_checks_dir),
+        str(cmk.utils.paths.local_agent_based_plugins_dir),
+        *getattr(cmk.base.plugins.agent_based, "__path__", []),
+    ]
+
+
+def _fingerprint() -> Fingerprint:
+    """Changes whenever a plugin or configuration file is added, changed or removed
+
+    The plugins needed by a host depend on the configuration, e.g. on enforced services.
+    Commands like "cmk -v HOST" use the current configuration, which may not have been
+    activated yet. The autochecks are read when the plugins are loaded."""
+    paths = [
+        str(path) for path in config._get_config_file_paths(with_conf_d=True)  # pylint: disable=protected-access
+    ]
+    for directory in sorted(set(_plugin_directories())):
+        for dirpath, _dirnames, filenames in os.walk(directory):
+            paths.extend(os.path.join(dirpath, filename) for filename in filenames)
+
+    fingerprint = []
+    for path in paths:
+        try:
+            fingerprint.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            continue
+    return sorted(fingerprint)
+
+
+def create_plugin_index(config_cache: ConfigCache) -> None:
+    """Write the plugin index. Needs all plugins to be loaded"""
+    path = _index_path()
+    try:
+        index = {
+            "version": _INDEX_VERSION,
+            "fingerprint": _fingerprint(),
+            "sections": _section_entries(),
+            "check_plugins": _check_plugin_entries(),
+            "hosts": _host_entries(config_cache),
+        }
+    except Exception as e:
+        if cmk.utils.debug.enabled():
+            raise
+        console.warning("Failed to create the plugin index: %s" % e)
+        store.save_bytes_to_file(path, b"")
+        return
+
+    store.save_bytes_to_file(path, marshal.dumps(index))
+
+
+def _legacy_check_files(legacy_check_plugin_names: Iterable[str]) -> List[str]:
+    from cmk.base import core_nagios  # pylint: disable=import-outside-toplevel
+    return core_nagios._get_legacy_check_file_names_to_load(  # pylint: disable=protected-access
+        set(legacy_check_plugin_names))
+
+
+def _section_entries() -> Dict[str, Dict[str, List[str]]]:
+    sections: List[SectionPlugin] = [
+        *agent_based_register.iter_all_agent_sections(),
+        *agent_based_register.iter_all_snmp_sections(),
+    ]
+
+    superseded_by: Dict[str, Set[str]] = {}
+    for section in sections:
+        for superseded in section.supersedes:
+            superseded_by.setdefault(str(superseded), set()).add(str(section.name))
+
+    entries = {}
+    for section in sections:
+        if section.module is None:
+            # Created from a legacy check, which is found by the section name
+            try:
+                check_files = _legacy_check_files([str(section.name)])
+            except MKGeneralException:
+                continue  # Unknown origin: Not indexed, all plugins will be loaded
+            modules = []
+        else:
+            check_files = []
+            modules = [section.module]
+
+        entries[str(section.name)] = {
+            "modules": modules,
+            "check_files": check_files,
+            "superseded_by": sorted(superseded_by.get(str(section.name), [])),
+        }
+    return entries
+
+
+def _check_plugin_entries() -> Dict[str, Dict[str, List[str]]]:
+    from cmk.base import core_nagios  # pylint: disable=import-outside-toplevel
+
+    entries = {}
+    for plugin in agent_based_register.iter_all_check_plugins():
+        legacy_name = core_nagios._resolve_legacy_plugin_name(plugin.name)  # pylint: disable=protected-access
+        try:
+            check_files = _legacy_check_files([legacy_name] if legacy_name else [])
+        except MKGeneralException:
+            continue
+
+        entries[str(plugin.name)] = {
+            "modules": [plugin.module] if plugin.module else [],
+            "check_files": check_files,
+            "sections": sorted(
+                str(section_name)
+                for section_name in agent_based_register.get_relevant_raw_sections(
+                    check_plugin_names=[plugin.name],
+                    inventory_plugin_names=[],
+                )),
+        }
+    return entries
+
+
+def _host_entries(config_cache: ConfigCache) -> Dict[HostName, Dict[str, List[str]]]:
+    from cmk.base import core_nagios  # pylint: disable=import-outside-toplevel
+
+    entries = {}
+    for hostname in sorted(config_cache.all_active_hosts()):
+        host_config = config_cache.get_host_config(hostname)
+        if host_config.do_status_data_inventory:
+            continue  # Needs all inventory plugins
+
+        try:
+            (legacy_check_plugin_names, check_plugin_names,
+             _inventory_plugin_names) = core_nagios._get_needed_plugin_names(host_config)  # pylint: disable=protected-access
+            check_files = _legacy_check_files(legacy_check_plugin_names)
+        except MKGeneralException:
+            continue
+
+        autochecks_of = list(host_config.nodes or []) if host_config.is_cluster else [hostname]
+        entries[hostname] = {
+            "check_plugins": sorted(str(n) for n in check_plugin_names),
+            "check_files": check_files,
+            "autochecks_of": autochecks_of,
+        }
+    return entries
+
+
+def load_plugins_of_hosts(
+    get_check_api_context: GetCheckApiContext,
+    hostnames: Sequence[HostName],
+) -> Optional[List[str]]:
+    """Load the plugins needed for checking the given hosts
+
+    Returns the errors like config.load_all_agent_based_plugins(). Returns None without loading
+    anything in case the index can not tell the needed plugins. The caller has to load all
+    plugins in this case."""
+    index = _load_index()
+    if index is None:
+        return None
+
+    try:
+        modules, check_files = _needed_plugins(index, hostnames)
+    except Exception as e:
+        # Unknown host or plugin, broken autochecks, ...: Let the regular code deal with it
+        console.vverbose("Not using the plugin index: %s\n" % e)
+        return None
+
+    console.vverbose("Loading %d plugin modules and %d check files using the plugin index\n" %
+                     (len(modules), len(check_files)))
+    return config.load_selected_agent_based_plugins(get_check_api_context, modules, check_files)
+
+
+def _load_index() -> Optional[PluginIndex]:
+    try:
+        index = marshal.loads(_index_path().read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if not isinstance(index, dict) or index.get("version") != _INDEX_VERSION:
+        return None
+
+    if index["fingerprint"] != _fingerprint():
+        console.vverbose("The plugin index is outdated\n")
+        return None
+
+    return index
+
+
+def _needed_plugins(index: PluginIndex,
+                    hostnames: Sequence[HostName]) -> Tuple[List[str], List[str]]:
+    check_plugin_names: Set[str] = set()
+    check_files: List[str] = []
+    for hostname in hostnames:
+        host_entry = index["hosts"][hostname]
+        check_plugin_names.update(host_entry["check_plugins"])
+        _extend_unique(check_files, host_entry["check_files"])
+        for autochecks_hostname in host_entry["autochecks_of"]:
+            check_plugin_names.update(
+                str(n) for n in autochecks.check_plugin_names_of(autochecks_hostname))
+
+    modules: Set[str] = set()
+    section_names: List[str] = []
+    for check_plugin_name in sorted(check_plugin_names):
+        plugin_entry = _check_plugin_entry(index, check_plugin_name)
+        modules.update(plugin_entry["modules"])
+        _extend_unique(check_files, plugin_entry["check_files"])
+        _extend_unique(section_names, plugin_entry["sections"])
+
+    # Sections superseding a needed section have to be loaded for superseding it
+    for section_name in section_names:
+        section_entry = index["sections"][section_name]
+        modules.update(section_entry["modules"])
+        _extend_unique(check_files, section_entry["check_files"])
+        _extend_unique(section_names, section_entry["superseded_by"])
+
+    return sorted(modules), check_files
+
+
+def _check_plugin_entry(index: PluginIndex, check_plugin_name: str) -> Dict[str, List[str]]:
+    try:
+        return index["check_plugins"][check_plugin_name]
+    except KeyError:
+        plugin_name = CheckPluginName(check_plugin_name)
+        if not plugin_name.is_management_name():
+            raise
+    # Management board plugins are created on the fly from the regular plugins
+    return index["check_plugins"][str(plugin_name.create_basic_name())]
+
+
+def _extend_unique(items: List[str], new_items: Iterable[str]) -> None:
+    for item in new_items:
+        if item not in items:
+            items.append(item)
@@ -7,7 +7,6 @@
 
 import json
 import logging
-import math
 import os
 import time
 from typing import Optional, List, Any, cast, Dict, Union, Callable, Tuple, TypedDict
@@ -26,7 +25,7 @@ from cmk.utils.prediction import (
     TimeSeriesValues,
     Seconds,
     TimeWindow,
-    RRDColumnFunction,
+    RRDColumnsFunction,
     PredictionInfo,
     ConsolidationFunctionName,
     EstimatedLevels,
@@ -159,13 +158,14 @@ def _time_slices(
 
 
 def _retrieve_grouped_data_from_rrd(
-    rrd_column: RRDColumnFunction,
+    rrd_columns: RRDColumnsFunction,
     time_windows: _TimeSlices,
 ) -> Tuple[TimeWindow, List[TimeSeriesValues]]:
     "Collect all time slices and up-sample them to same resolution"
     from_time = time_windows[0][0]
 
-    slices = [(rrd_column(start, end), from_time - start) for start, end in time_windows]
+    slices = [(ts, from_time - start)
+              for ts, (start, _end) in zip(rrd_columns(time_windows), time_windows)]
 
     # The resolutions of the different time ranges differ. We upsample
     # to the best resolution. We assume that the youngest slice has the
@@ -179,30 +179,43 @@ def _retrieve_grouped_data_from_rrd(
 
 def _data_stats(slices: List[TimeSeriesValues]) -> _DataStats:
     "Statistically summarize all the upsampled RRD data"
-
-    descriptors: _DataStats = []
-
-    for time_column in zip(*slices):
-        point_line = [x for x in time_column if x is not None]
-        if point_line:
-            average = sum(point_line) / float(len(point_line))
-            descriptors.append([
-                average,
-                min(point_line),
-                max(point_line),
-                _std_dev(point_line, average),
-            ])
-        else:
-            descriptors.append([None, None, None, None])
-
+    # numpy is only needed when the predictions are (re-)computed
+    import numpy as np  # type: ignore[import] # pylint: disable=import-outside-toplevel
+
+    # One row per slice, one column per point in time. Missing values are NaN.
+    points = np.array(slices, dtype=float).reshape(len(slices), -1)
+    present = ~np.isnan(points)
+    samples = present.sum(axis=0)
+    values = np.where(present, points, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = values.sum(axis=0) / samples
+        # In the case of a single data-point an unbiased standard deviation is
+        # undefined. In this case we take the magnitude of the measured value
+        # itself as a measure of the dispersion.
+        std_dev = np.where(
+            samples == 1,
+            np.abs(average),
+            np.sqrt(np.abs((values**2).sum(axis=0) - average**2 * samples) / (samples - 1)),
+        )
+
+    descriptors = np.stack([
+        average,
+        np.fmin.reduce(points, axis=0),
+        np.fmax.reduce(points, axis=0),
+        std_dev,
+    ],
+                           axis=1).tolist()
+    for index in np.flatnonzero(samples == 0).tolist():
+        descriptors[index] = [None, None, None, None]
     return descriptors
 
 
 def _calculate_data_for_prediction(
     time_windows: _TimeSlices,
-    rrd_datacolumn: RRDColumnFunction,
+    rrd_datacolumns: RRDColumnsFunction,
 ) -> _PredictionData:
-    twindow, slices = _retrieve_grouped_data_from_rrd(rrd_datacolumn, time_windows)
+    twindow, slices = _retrieve_grouped_data_from_rrd(rrd_datacolumns, time_windows)
 
     descriptors = _data_stats(slices)
 
@@ -222,18 +235,7 @@ def _save_predictions(
 ) -> None:
     with open(pred_file + '.info', "w") as fname:
         json.dump(info, fname)
-    with open(pred_file, "w") as fname:
-        json.dump(data_for_pred, fname)
-
-
-def _std_dev(point_line: List[float], average: float) -> float:
-    samples = len(point_line)
-    # In the case of a single data-point an unbiased standard deviation is
-    # undefined. In this case we take the magnitude of the measured value
-    # itself as a measure of the dispersion.
-    if samples == 1:
-        return abs(average)
-    return math.sqrt(abs(sum(p**2 for p in point_line) - average**2 * samples) / float(samples - 1))
+    cmk.utils.prediction.save_prediction_data(pred_file, cast(PredictionInfo, data_for_pred))
 
 
 def _is_prediction_up_to_date(
@@ -302,10 +304,10 @@ def get_levels(
 
         time_windows = _time_slices(now, int(params["horizon"] * 86400), period_info, timegroup)
 
-        rrd_datacolumn = cmk.utils.prediction.rrd_datacolum(hostname, service_description, dsname,
-                                                            cf)
+        rrd_datacolumns = cmk.utils.prediction.rrd_datacolumns(hostname, service_description,
+                                                               dsname, cf)
 
-        data_for_pred = _calculate_data_for_prediction(time_windows, rrd_datacolumn)
+        data_for_pred = _calculate_data_for_prediction(time_windows, rrd_datacolumns)
 
         info: PredictionInfo = {
             u"time": now,
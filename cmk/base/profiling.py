@@ -5,13 +5,17 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Dict, Iterator
 
 import cmk.base.obsolete_output as out
 from cmk.utils.log import console
 
 _profile = None
 _profile_path = Path("profile.out")
+_durations: Dict[str, float] = {}
 
 
 def enable() -> None:
@@ -26,10 +30,23 @@ def enabled() -> bool:
     return _profile is not None
 
 
+@contextmanager
+def measure(title: str) -> Iterator[None]:
+    """Measure the duration of a processing step to be reported in the profile output"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        _durations[title] = _durations.get(title, 0.0) + time.time() - start
+
+
 def output_profile() -> None:
     if not _profile:
         return
 
+    for title, duration in _durations.items():
+        out.output("%s: %.3f s\n" % (title, duration), stream=sys.stderr)
+
     _profile.dump_stats(str(_profile_path))
     show_profile = _profile_path.with_name("show_profile.py")
 
@@ -82,4 +82,5 @@ class AgentSource(Source[AgentRawData, AgentHostSections]):
             encoding_fallback=config.fallback_agent_output_encoding,
             simulation=config.agent_simulator,
             logger=self._logger,
+            streaming=True,
         )
@@ -26,7 +26,7 @@ from cmk.core_helpers.snmp import (
 from cmk.core_helpers.type_defs import Mode, NO_SELECTION, SectionNameCollection
 
 import cmk.base.api.agent_based.register as agent_based_register
-import cmk.base.check_table as check_table
+import cmk.base.check_plan as check_plan
 import cmk.base.config as config
 
 from ._abstract import Source
@@ -166,6 +166,7 @@ class SNMPSource(Source[SNMPRawData, SNMPHostSections]):
             do_status_data_inventory=self.host_config.do_status_data_inventory,
             section_store_path=self.persisted_sections_file_path,
             snmp_config=self.snmp_config,
+            max_concurrency=self.host_config.snmp_fetch_concurrency,
         )
 
     def _make_sections(self) -> Dict[SectionName, SectionMeta]:
@@ -206,13 +207,10 @@ class SNMPSource(Source[SNMPRawData, SNMPHostSections]):
             checking_sections = self.selected_sections
         else:
             checking_sections = set(
-                agent_based_register.get_relevant_raw_sections(
-                    check_plugin_names=check_table.get_check_table(
-                        self.hostname,
-                        filter_mode=check_table.FilterMode.INCLUDE_CLUSTERED,
-                        skip_ignored=True,
-                    ).needed_check_names(),
-                    inventory_plugin_names=()))
+                check_plan.get_check_plan(
+                    config.get_config_cache(),
+                    self.hostname,
+                ).needed_sections)
         return {
             s for s in checking_sections
             if agent_based_register.is_registered_snmp_section_plugin(s)
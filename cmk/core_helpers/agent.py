@@ -5,6 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import abc
+import codecs
 import logging
 import time
 from typing import (
@@ -13,7 +14,9 @@ from typing import (
     final,
     Final,
     Iterable,
+    Iterator,
     List,
+    Mapping,
     MutableMapping,
     NamedTuple,
     Optional,
@@ -47,9 +50,7 @@ from cmk.utils.werks import parse_check_mk_version
 from ._base import Fetcher, Parser, Summarizer
 from .cache import FileCache, FileCacheFactory, SectionStore
 from .host_sections import HostSections
-from .type_defs import Mode, NO_SELECTION, SectionNameCollection
-
-AgentHostSections = HostSections[AgentRawDataSection]
+from .type_defs import Mode, NO_SELECTION, SectionCacheInfo, SectionNameCollection
 
 
 class AgentFileCache(FileCache[AgentRawData]):
@@ -238,6 +239,140 @@ class SectionMarker(NamedTuple):
         return None
 
 
+def _iter_lines(data: bytes) -> Iterator[bytes]:
+    """Iterate over the lines of the data, skipping empty lines"""
+    for line in data.split(b"\n"):
+        line = line.rstrip(b"\r")
+        if line.strip():
+            yield line
+
+
+def _is_marker(line: bytes) -> bool:
+    """Tell whether the line is a section or piggyback header or footer"""
+    line = line.strip()
+    return line.startswith(b"<<<") and line.endswith(b">>>")
+
+
+def _iter_chunks(raw_data: bytes) -> Iterator[Tuple[slice, Optional[bytes]]]:
+    """Split the agent output at the marker lines
+
+    Yield the slice of the data up to the next marker line together with
+    this marker line.  The data after the last marker line comes with `None`.
+
+    Only the marker lines are copied.
+
+    """
+    chunk_start = 0
+    position = raw_data.find(b"<<<")
+    while position != -1:
+        line_start = raw_data.rfind(b"\n", 0, position) + 1
+        line_end = raw_data.find(b"\n", position)
+        if line_end == -1:
+            line_end = len(raw_data)
+        line = raw_data[line_start:line_end].rstrip(b"\r")
+        if _is_marker(line):
+            yield slice(chunk_start, line_start), line
+            chunk_start = line_end + 1
+        position = raw_data.find(b"<<<", line_end)
+    yield slice(chunk_start, len(raw_data)), None
+
+
+class AgentRawSections(MutableMapping[SectionName, AgentRawDataSection]):
+    """The sections of the agent output, decoded on first access
+
+    The streaming parser only records where the lines of a section are
+    in the raw data.  The lines are decoded and split when the section
+    is looked up for the first time, so that sections nobody asks for
+    never are.
+
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self._sections: Dict[SectionName, AgentRawDataSection] = {}
+        # Raw data to be appended to the content in `_sections`, in order.
+        self._raw: Dict[SectionName, List[Tuple[SectionMarker, memoryview]]] = {}
+
+    def __repr__(self) -> str:
+        return "%s(%r)" % (type(self).__name__, dict(self))
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def __iter__(self) -> Iterator[SectionName]:
+        return iter(self._sections)
+
+    def __contains__(self, section_name: object) -> bool:
+        return section_name in self._sections
+
+    def __getitem__(self, section_name: SectionName) -> AgentRawDataSection:
+        section = self._sections[section_name]
+        for header, data in self._raw.pop(section_name, ()):
+            section.extend(AgentRawSections._decode(header, data))
+        return section
+
+    def __setitem__(self, section_name: SectionName, section: AgentRawDataSection) -> None:
+        self._raw.pop(section_name, None)
+        self._sections[section_name] = section
+
+    def __delitem__(self, section_name: SectionName) -> None:
+        self._raw.pop(section_name, None)
+        del self._sections[section_name]
+
+    def is_decoded(self, section_name: SectionName) -> bool:
+        return section_name not in self._raw
+
+    def add_raw(self, header: SectionMarker, data: memoryview) -> None:
+        """Append the raw lines `data` to the section described by `header`"""
+        self._sections.setdefault(header.name, [])
+        self._raw.setdefault(header.name, []).append((header, data))
+
+    def extend(self, sections: "AgentRawSections") -> None:
+        """Append the sections, without decoding them if possible"""
+        for section_name in sections:
+            if sections._sections[section_name]:
+                self.setdefault(section_name, []).extend(sections[section_name])
+                continue
+            self._sections.setdefault(section_name, [])
+            if not sections.is_decoded(section_name):
+                self._raw.setdefault(section_name, []).extend(sections._raw[section_name])
+
+    @staticmethod
+    def _decode(header: SectionMarker, data: memoryview) -> AgentRawDataSection:
+        lines = _iter_lines(bytes(data))
+        if not header.nostrip:
+            lines = (line.strip() for line in lines)
+        return [
+            ensure_str_with_fallback(
+                line,
+                encoding=header.encoding,
+                fallback="latin-1",
+            ).split(header.separator) for line in lines
+        ]
+
+
+class AgentHostSections(HostSections[AgentRawDataSection]):
+    def __init__(
+        self,
+        sections: Optional[MutableMapping[SectionName, AgentRawDataSection]] = None,
+        *,
+        cache_info: Optional[SectionCacheInfo] = None,
+        piggybacked_raw_data: Optional[Dict[HostName, List[bytes]]] = None,
+    ) -> None:
+        super().__init__(
+            sections,
+            cache_info=cache_info,
+            piggybacked_raw_data=piggybacked_raw_data,
+        )
+        if not sections:
+            self.sections = AgentRawSections()
+
+    def _add_sections(self, sections: Mapping[SectionName, AgentRawDataSection]) -> None:
+        if isinstance(self.sections, AgentRawSections) and isinstance(sections, AgentRawSections):
+            self.sections.extend(sections)
+            return
+        super()._add_sections(sections)
+
+
 class ParserState(abc.ABC):
     """Base class for the state machine.
 
@@ -309,6 +444,13 @@ class ParserState(abc.ABC):
     def on_piggyback_footer(self, line: bytes) -> "ParserState":
         raise NotImplementedError()
 
+    def consume(self, data: memoryview) -> "ParserState":
+        """Process all the lines up to the next header or footer at once"""
+        parser: ParserState = self
+        for line in bytes(data).split(b"\n"):
+            parser = parser(line.rstrip(b"\r"))
+        return parser
+
     def to_noop_parser(self) -> "NOOPParser":
         self._logger.debug("Transition %s -> %s", type(self).__name__, NOOPParser.__name__)
         return NOOPParser(
@@ -409,6 +551,9 @@ class NOOPParser(ParserState):
     def do_action(self, line: bytes) -> "ParserState":
         return self
 
+    def consume(self, data: memoryview) -> "ParserState":
+        return self
+
     def on_piggyback_header(self, line: bytes) -> "ParserState":
         piggyback_header = PiggybackMarker.from_headerline(
             line,
@@ -461,6 +606,15 @@ class PiggybackParser(ParserState):
         ).append(line)
         return self
 
+    def consume(self, data: memoryview) -> "ParserState":
+        lines = list(_iter_lines(bytes(data)))
+        if lines:
+            self.host_sections.piggybacked_raw_data.setdefault(
+                self.piggyback_header.hostname,
+                [],
+            ).extend(lines)
+        return self
+
     def on_piggyback_header(self, line: bytes) -> "ParserState":
         piggyback_header = PiggybackMarker.from_headerline(
             line,
@@ -527,6 +681,14 @@ class PiggybackSectionParser(ParserState):
         self.host_sections.piggybacked_raw_data[self.piggyback_header.hostname].append(line)
         return self
 
+    def consume(self, data: memoryview) -> "ParserState":
+        if not self.selected:
+            return self
+
+        self.host_sections.piggybacked_raw_data[self.piggyback_header.hostname].extend(
+            _iter_lines(bytes(data)))
+        return self
+
     def on_piggyback_header(self, line: bytes) -> "ParserState":
         piggyback_header = PiggybackMarker.from_headerline(
             line,
@@ -595,6 +757,24 @@ class HostSectionParser(ParserState):
             ).split(self.section_header.separator))
         return self
 
+    def consume(self, data: memoryview) -> "ParserState":
+        if not self.selected:
+            return self
+
+        sections = self.host_sections.sections
+        if not isinstance(sections, AgentRawSections):
+            return super().consume(data)
+
+        try:
+            codecs.lookup(self.section_header.encoding)
+        except LookupError:
+            # Fail on the first line, as the line based parser does.
+            return super().consume(data)
+
+        if data:
+            sections.add_raw(self.section_header, data)
+        return self
+
     def on_piggyback_header(self, line: bytes) -> "ParserState":
         piggyback_header = PiggybackMarker.from_headerline(
             line,
@@ -635,6 +815,7 @@ class AgentParser(Parser[AgentRawData, AgentHostSections]):
         encoding_fallback: str,
         simulation: bool,
         logger: logging.Logger,
+        streaming: bool = False,
     ) -> None:
         super().__init__()
         self.hostname: Final = hostname
@@ -644,6 +825,7 @@ class AgentParser(Parser[AgentRawData, AgentHostSections]):
         self.translation: Final = translation
         self.encoding_fallback: Final = encoding_fallback
         self.simulation: Final = simulation
+        self.streaming: Final = streaming
         self._logger = logger
 
     def parse(
@@ -689,7 +871,14 @@ class AgentParser(Parser[AgentRawData, AgentHostSections]):
         *,
         selection: SectionNameCollection,
     ) -> ParserState:
-        """Split agent output in chunks, splits lines by whitespaces."""
+        """Split agent output in chunks, splits lines by whitespaces.
+
+        In streaming mode, only the header and footer lines are handled
+        one by one.  The lines in between are handed over at once, and
+        the lines of the host sections are only decoded and split when
+        the section is accessed (see `AgentRawSections`).
+
+        """
         parser: ParserState = NOOPParser(
             self.hostname,
             AgentHostSections(),
@@ -699,8 +888,16 @@ class AgentParser(Parser[AgentRawData, AgentHostSections]):
             encoding_fallback=self.encoding_fallback,
             logger=self._logger,
         )
-        for line in raw_data.split(b"\n"):
-            parser = parser(line.rstrip(b"\r"))
+        if not self.streaming:
+            for line in raw_data.split(b"\n"):
+                parser = parser(line.rstrip(b"\r"))
+            return parser
+
+        view = memoryview(raw_data)
+        for chunk, marker in _iter_chunks(raw_data):
+            parser = parser.consume(view[chunk])
+            if marker is not None:
+                parser = parser(marker)
 
         return parser
 
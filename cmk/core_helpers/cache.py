@@ -84,11 +84,13 @@ class PersistedSections(
         cached_at: int,
     ) -> "PersistedSections[TRawDataSection]":
         self = cls({})
-        for section_name, section_content in sections.items():
+        for section_name in sections:
             fetch_interval = interval_lookup[section_name]
             if fetch_interval is None:
                 continue
-            self[section_name] = (cached_at, fetch_interval, section_content)
+            # Only look up the content of the persisted sections: the
+            # agent sections are decoded on first access.
+            self[section_name] = (cached_at, fetch_interval, sections[section_name])
 
         return self
 
@@ -12,13 +12,13 @@ import signal
 import traceback
 from pathlib import Path
 from types import FrameType
-from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional
 
 import cmk.utils.cleanup
 import cmk.utils.paths as paths
 from cmk.utils.cpu_tracking import CPUTracker, Snapshot
 from cmk.utils.exceptions import MKTimeout
-from cmk.utils.type_defs import ConfigSerial, HostName, result
+from cmk.utils.type_defs import ConfigSerial, HostName, result, SectionName
 
 from . import FetcherType, protocol
 from .snmp import SNMPFetcher, SNMPPluginStore
@@ -169,9 +169,12 @@ def run_fetcher(entry: Dict[str, Any], mode: Mode) -> protocol.FetcherMessage:
     except KeyError as exc:
         return protocol.FetcherMessage.error(fetcher_type, exc)
 
+    section_durations: Mapping[SectionName, float] = {}
     try:
         with CPUTracker() as tracker, fetcher_type.from_json(fetcher_params) as fetcher:
             raw_data = fetcher.fetch(mode)
+            if isinstance(fetcher, SNMPFetcher):
+                section_durations = fetcher.section_durations
     except Exception as exc:
         raw_data = result.Error(exc)
 
@@ -179,6 +182,7 @@ def run_fetcher(entry: Dict[str, Any], mode: Mode) -> protocol.FetcherMessage:
         raw_data,
         tracker.duration,
         fetcher_type,
+        section_durations=section_durations,
     )
 
 
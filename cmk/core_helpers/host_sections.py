@@ -6,7 +6,19 @@
 
 import abc
 import logging
-from typing import Callable, cast, Dict, Generic, List, Mapping, MutableMapping, Optional, TypeVar
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    TypeVar,
+)
 
 from cmk.utils.type_defs import HostName, SectionName
 
@@ -56,11 +68,7 @@ class HostSections(Generic[TRawDataSection], metaclass=abc.ABCMeta):
     #       Would this be correct here?
     def add(self, host_sections: "HostSections") -> None:
         """Add the content of `host_sections` to this HostSection."""
-        for section_name, section_content in host_sections.sections.items():
-            self.sections.setdefault(
-                section_name,
-                cast(TRawDataSection, []),
-            ).extend(section_content)
+        self._add_sections(host_sections.sections)
 
         for hostname, raw_lines in host_sections.piggybacked_raw_data.items():
             self.piggybacked_raw_data.setdefault(hostname, []).extend(raw_lines)
@@ -68,6 +76,13 @@ class HostSections(Generic[TRawDataSection], metaclass=abc.ABCMeta):
         if host_sections.cache_info:
             self.cache_info.update(host_sections.cache_info)
 
+    def _add_sections(self, sections: Mapping[SectionName, TRawDataSection]) -> None:
+        for section_name, section_content in sections.items():
+            self.sections.setdefault(
+                section_name,
+                cast(TRawDataSection, []),
+            ).extend(cast(Iterable[Any], section_content))
+
     def add_persisted_sections(
         self,
         sections: Mapping[SectionName, TRawDataSection],
@@ -28,7 +28,7 @@ import json
 import logging
 import pickle
 import struct
-from typing import Final, Iterator, Sequence, Type, Union
+from typing import Any, Dict, Final, Iterator, Mapping, Optional, Sequence, Type, Union
 
 import cmk.utils.log as log
 from cmk.utils.cpu_tracking import Snapshot
@@ -36,6 +36,7 @@ from cmk.utils.exceptions import MKTimeout
 from cmk.utils.type_defs import AgentRawData, result, SectionName
 from cmk.utils.type_defs.protocol import Protocol
 
+import cmk.snmplib.serialization as snmp_serialization
 from cmk.snmplib.type_defs import AbstractRawData, SNMPRawData
 
 from . import FetcherType
@@ -102,18 +103,42 @@ class ResultMessage(Protocol):
 
 
 class ResultStats(Protocol):
-    def __init__(self, duration: Snapshot) -> None:
+    def __init__(
+        self,
+        duration: Snapshot,
+        *,
+        section_durations: Optional[Mapping[SectionName, float]] = None,
+    ) -> None:
         self.duration: Final = duration
+        # Wall clock time per fetched section (seconds), only reported by the SNMP fetcher.
+        self.section_durations: Final[Mapping[SectionName, float]] = (section_durations or {})
 
     def __repr__(self) -> str:
-        return "%s(%r)" % (type(self).__name__, self.duration)
+        if not self.section_durations:
+            return "%s(%r)" % (type(self).__name__, self.duration)
+        return "%s(%r, section_durations=%r)" % (
+            type(self).__name__,
+            self.duration,
+            self.section_durations,
+        )
 
     def __iter__(self) -> Iterator[bytes]:
-        yield json.dumps({"duration": self.duration.serialize()}).encode("ascii")
+        serialized: Dict[str, Any] = {"duration": self.duration.serialize()}
+        if self.section_durations:
+            serialized["section_durations"] = {
+                str(k): v for k, v in sorted(self.section_durations.items())
+            }
+        yield json.dumps(serialized).encode("ascii")
 
     @classmethod
     def from_bytes(cls, data: bytes) -> "ResultStats":
-        return ResultStats(Snapshot.deserialize(json.loads(data.decode("ascii"))["duration"]))
+        serialized = json.loads(data.decode("ascii"))
+        return ResultStats(
+            Snapshot.deserialize(serialized["duration"]),
+            section_durations={
+                SectionName(k): v for k, v in serialized.get("section_durations", {}).items()
+            },
+        )
 
 
 class PayloadType(enum.Enum):
@@ -202,14 +227,11 @@ class SNMPResultMessage(ResultMessage):
 
     @staticmethod
     def _serialize(value: SNMPRawData) -> bytes:
-        return json.dumps({str(k): v for k, v in value.items()}).encode("utf8")
+        return snmp_serialization.serialize_raw_data(value)
 
     @staticmethod
     def _deserialize(data: bytes) -> SNMPRawData:
-        try:
-            return {SectionName(k): v for k, v in json.loads(data.decode("utf8")).items()}
-        except json.JSONDecodeError:
-            raise ValueError(repr(data))
+        return snmp_serialization.deserialize_raw_data(data)
 
 
 class ErrorResultMessage(ResultMessage):
@@ -366,8 +388,10 @@ class FetcherMessage(Protocol):
         raw_data: result.Result[AbstractRawData, Exception],
         duration: Snapshot,
         fetcher_type: FetcherType,
+        *,
+        section_durations: Optional[Mapping[SectionName, float]] = None,
     ) -> "FetcherMessage":
-        stats = ResultStats(duration)
+        stats = ResultStats(duration, section_durations=section_durations)
         if raw_data.is_error():
             error_payload = ErrorResultMessage(raw_data.error)
             return cls(
@@ -8,6 +8,7 @@ import ast
 import dataclasses
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import (
     Any,
@@ -15,6 +16,7 @@ from typing import (
     Final,
     Iterable,
     Iterator,
+    List,
     Mapping,
     MutableMapping,
     NamedTuple,
@@ -31,10 +33,13 @@ import cmk.snmplib.snmp_table as snmp_table
 from cmk.snmplib.snmp_scan import gather_available_raw_section_names
 from cmk.snmplib.type_defs import (
     BackendSNMPTree,
+    SNMPBackendEnum,
     SNMPDetectSpec,
     SNMPHostConfig,
     SNMPRawData,
     SNMPRawDataSection,
+    SNMPRowInfo,
+    SpecialColumn,
 )
 
 from . import factory
@@ -177,6 +182,7 @@ class SNMPFetcher(Fetcher[SNMPRawData]):
         do_status_data_inventory: bool,
         section_store_path: Union[Path, str],
         snmp_config: SNMPHostConfig,
+        max_concurrency: int = 1,
     ) -> None:
         super().__init__(file_cache, logging.getLogger("cmk.helper.snmp"))
         self.sections: Final = sections
@@ -184,6 +190,9 @@ class SNMPFetcher(Fetcher[SNMPRawData]):
         self.missing_sys_description: Final = missing_sys_description
         self.do_status_data_inventory: Final = do_status_data_inventory
         self.snmp_config: Final = snmp_config
+        self.max_concurrency: Final = max_concurrency
+        # Wall clock time (in seconds) spent fetching each section during the last fetch.
+        self.section_durations: Dict[SectionName, float] = {}
         self._section_store = SectionStore[SNMPRawDataSection](
             section_store_path,
             logger=self._logger,
@@ -223,6 +232,7 @@ class SNMPFetcher(Fetcher[SNMPRawData]):
             do_status_data_inventory=serialized["do_status_data_inventory"],
             section_store_path=serialized["section_store_path"],
             snmp_config=SNMPHostConfig.deserialize(serialized["snmp_config"]),
+            max_concurrency=serialized.get("max_concurrency", 1),
         )
 
     def to_json(self) -> Dict[str, Any]:
@@ -234,6 +244,7 @@ class SNMPFetcher(Fetcher[SNMPRawData]):
             "do_status_data_inventory": self.do_status_data_inventory,
             "section_store_path": str(self._section_store.path),
             "snmp_config": self.snmp_config.serialize(),
+            "max_concurrency": self.max_concurrency,
         }
 
     def open(self) -> None:
@@ -339,30 +350,118 @@ class SNMPFetcher(Fetcher[SNMPRawData]):
         else:
             walk_cache_msg = "SNMP walk cache is disabled"
 
-        fetched_data: MutableMapping[SectionName, SNMPRawDataSection] = {}
-        for section_name in self._sort_section_names(section_names):
-            try:
-                _from, until, _section = persisted_sections[section_name]
-                if now > until:
-                    raise LookupError(section_name)
-            except LookupError:
+        section_names_to_fetch = [
+            section_name for section_name in self._sort_section_names(section_names)
+            if self._is_outdated(persisted_sections, section_name, now)
+        ]
+
+        def fetch_sections(group: Sequence[SectionName]) -> None:
+            for section_name in group:
                 self._logger.debug("%s: Fetching data (%s)", section_name, walk_cache_msg)
-                section = [
-                    snmp_table.get_snmp_table(
-                        section_name=section_name,
-                        tree=tree,
-                        walk_cache=walk_cache,
-                        backend=self._backend,
-                    ) for tree in self.plugin_store[section_name].trees
-                ]
-
-                if any(section):
-                    fetched_data[section_name] = section
+                fetched_sections[section_name] = self._fetch_section(section_name, walk_cache)
+
+        fetched_sections: MutableMapping[SectionName, Tuple[SNMPRawDataSection, float]] = {}
+        groups = (self._group_independent_sections(section_names_to_fetch, walk_cache)
+                  if self._max_workers() > 1 else [section_names_to_fetch])
+        max_workers = min(self._max_workers(), len(groups))
+        if max_workers > 1:
+            self._logger.debug("Fetching %d independent section groups with %d workers",
+                               len(groups), max_workers)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Consume the results to re-raise exceptions from the workers.
+                list(executor.map(fetch_sections, groups))
+        else:
+            for group in groups:
+                fetch_sections(group)
+
+        self.section_durations = {}
+        fetched_data: MutableMapping[SectionName, SNMPRawDataSection] = {}
+        for section_name in section_names_to_fetch:
+            section, duration = fetched_sections[section_name]
+            self.section_durations[section_name] = duration
+            if any(section):
+                fetched_data[section_name] = section
 
         walk_cache.save()
 
         return fetched_data
 
+    @staticmethod
+    def _is_outdated(
+        persisted_sections: PersistedSections[SNMPRawDataSection],
+        section_name: SectionName,
+        now: int,
+    ) -> bool:
+        try:
+            _from, until, _section = persisted_sections[section_name]
+        except LookupError:
+            return True
+        return now > until
+
+    def _fetch_section(
+        self,
+        section_name: SectionName,
+        walk_cache: MutableMapping[str, Tuple[bool, SNMPRowInfo]],
+    ) -> Tuple[SNMPRawDataSection, float]:
+        start = time.monotonic()
+        section = [
+            snmp_table.get_snmp_table(
+                section_name=section_name,
+                tree=tree,
+                walk_cache=walk_cache,
+                backend=self._backend,
+            ) for tree in self.plugin_store[section_name].trees
+        ]
+        return section, time.monotonic() - start
+
+    def _max_workers(self) -> int:
+        """Determine the number of concurrent walks
+
+        The inline SNMP backend shares a single net-snmp session per host that
+        must not be used from several threads. Concurrent fetching is therefore
+        only available for the classic and the stored walk backends.
+        """
+        if self.snmp_config.snmp_backend is SNMPBackendEnum.INLINE:
+            return 1
+        return max(1, self.max_concurrency)
+
+    def _group_independent_sections(
+        self,
+        section_names: Sequence[SectionName],
+        walk_cache: MutableMapping[str, Tuple[bool, SNMPRowInfo]],
+    ) -> Sequence[Sequence[SectionName]]:
+        """Group the sections that share at least one OID to fetch
+
+        The sections of one group are fetched one after another, so that an OID
+        is walked once and then served from the walk cache for all others.  The
+        groups themselves are independent from each other and may be fetched
+        concurrently.  The order of the sections is kept within each group.
+        """
+        parents = list(range(len(section_names)))
+
+        def find(index: int) -> int:
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        owner_of_fetchoid: Dict[str, int] = {}
+        for index, section_name in enumerate(section_names):
+            for tree in self.plugin_store[section_name].trees:
+                for oid in tree.oids:
+                    if isinstance(oid.column, SpecialColumn):
+                        continue
+                    fetchoid = f"{tree.base}.{oid.column}"
+                    if fetchoid in walk_cache:
+                        continue
+                    owner = owner_of_fetchoid.setdefault(fetchoid, index)
+                    parents[find(index)] = find(owner)
+
+        groups: Dict[int, List[SectionName]] = {}
+        for index, section_name in enumerate(section_names):
+            groups.setdefault(find(index), []).append(section_name)
+        return list(groups.values())
+
     @classmethod
     def _sort_section_names(
         cls,
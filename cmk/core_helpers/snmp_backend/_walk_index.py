@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Binary index for stored SNMP walks.
+
+The index is a file next to the snmpwalks directory.  It is built once per
+walk file and served through mmap, so that a lookup is a binary search
+over fixed size records without reading or parsing the whole walk.
+
+File layout (all integers in network byte order):
+
++---------+--------------------------------------------------------------+
+| header  | magic, size and mtime (ns) of the walk, number of entries    |
++---------+--------------------------------------------------------------+
+| entries | key offset, key length, line offset, line length per OID,    |
+|         | sorted by OID                                                |
++---------+--------------------------------------------------------------+
+| keys    | the OIDs, each sub-identifier packed as unsigned 32 bit int  |
++---------+--------------------------------------------------------------+
+
+All sub-identifiers have the same width, so comparing the packed keys as
+bytes is the same as comparing the OIDs numerically, and a packed OID is
+a prefix of another packed OID iff the OIDs are.
+
+"""
+
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import cmk.utils.store as store
+from cmk.utils.log import console
+
+from cmk.snmplib.type_defs import OID
+
+__all__ = ["WalkIndex"]
+
+_Buffer = Union[bytes, mmap.mmap]
+
+_MAGIC = b"CMKWIDX1"
+_HEADER = struct.Struct("!8sQQQ")
+_ENTRY = struct.Struct("!QHQI")
+
+
+def _pack_oid(oid: OID) -> Optional[bytes]:
+    """Pack an OID for the index; None if the OID is invalid"""
+    try:
+        sub_ids = [int(s) for s in oid.strip(".").split(".")]
+        return struct.pack("!%dI" % len(sub_ids), *sub_ids)
+    except (ValueError, struct.error):
+        return None
+
+
+class WalkIndex:
+    """Lookup OIDs of a stored walk through its index"""
+    def __init__(self, walk: _Buffer, index: _Buffer) -> None:
+        super().__init__()
+        self._walk = walk
+        self._index = index
+        magic, _size, _mtime, self._length = _HEADER.unpack_from(index, 0)
+        if magic != _MAGIC:
+            raise ValueError("Invalid walk index")
+
+    def __len__(self) -> int:
+        return self._length
+
+    @classmethod
+    def open(cls, walk_path: Path, index_path: Path) -> "WalkIndex":
+        """Open the index of the walk, (re)build it if it is missing or outdated
+
+        Note:
+            If the index cannot be written, it is kept in memory.
+
+        """
+        with walk_path.open("rb") as walk_file:
+            stat = os.fstat(walk_file.fileno())
+            walk = _mmap(walk_file)
+
+        index = cls._load_index(index_path, stat)
+        if index is None:
+            console.vverbose("  Building index %s of %s\n" % (index_path, walk_path))
+            index = cls.build(walk, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            try:
+                index_path.parent.mkdir(parents=True, exist_ok=True)
+                store.save_bytes_to_file(index_path, index)
+            except OSError as exc:
+                console.verbose("  Cannot write index %s: %s\n" % (index_path, exc))
+
+        return cls(walk, index)
+
+    @staticmethod
+    def _load_index(index_path: Path, stat: os.stat_result) -> Optional[_Buffer]:
+        try:
+            with index_path.open("rb") as index_file:
+                index = _mmap(index_file)
+        except OSError:
+            return None
+
+        try:
+            magic, size, mtime_ns, length = _HEADER.unpack_from(index, 0)
+        except struct.error:
+            return None
+
+        if (magic, size, mtime_ns) != (_MAGIC, stat.st_size, stat.st_mtime_ns):
+            return None
+        if len(index) < _HEADER.size + length * _ENTRY.size:
+            return None  # truncated
+        return index
+
+    @staticmethod
+    def build(walk: _Buffer, *, size: int, mtime_ns: int) -> bytes:
+        entries: List[Tuple[bytes, int, int]] = []
+        for offset, length in _iter_lines(walk):
+            oid = bytes(walk[offset:offset + length].split(None, 1)[0])
+            key = _pack_oid(oid.decode("ascii", errors="replace"))
+            if key is not None:
+                entries.append((key, offset, length))
+
+        entries.sort(key=lambda e: e[0])  # stable: keep duplicate OIDs in file order
+
+        keys_offset = _HEADER.size + len(entries) * _ENTRY.size
+        chunks = [_HEADER.pack(_MAGIC, size, mtime_ns, len(entries))]
+        for key, offset, length in entries:
+            chunks.append(_ENTRY.pack(keys_offset, len(key), offset, length))
+            keys_offset += len(key)
+        chunks.extend(key for key, _offset, _length in entries)
+        return b"".join(chunks)
+
+    def _key(self, position: int) -> bytes:
+        key_offset, key_length, _offset, _length = _ENTRY.unpack_from(
+            self._index,
+            _HEADER.size + position * _ENTRY.size,
+        )
+        return self._index[key_offset:key_offset + key_length]
+
+    def _line(self, position: int) -> bytes:
+        _key_offset, _key_length, offset, length = _ENTRY.unpack_from(
+            self._index,
+            _HEADER.size + position * _ENTRY.size,
+        )
+        return self._walk[offset:offset + length]
+
+    def _lower_bound(self, key: bytes) -> int:
+        begin, end = 0, self._length
+        while begin < end:
+            current = (begin + end) // 2
+            if self._key(current) < key:
+                begin = current + 1
+            else:
+                end = current
+        return begin
+
+    def lines(self, oid_prefix: OID, *, children_only: bool) -> Iterator[bytes]:
+        """Iterate over the lines of the OID and of all OIDs below it"""
+        prefix = _pack_oid(oid_prefix)
+        if prefix is None:
+            return
+
+        position = self._lower_bound(prefix)
+        while position < self._length:
+            key = self._key(position)
+            if not key.startswith(prefix):
+                return
+            if not (children_only and key == prefix):
+                yield self._line(position)
+            position += 1
+
+
+def _mmap(f) -> _Buffer:
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        return b""  # empty files cannot be mapped
+
+
+def _iter_lines(walk: _Buffer) -> Iterator[Tuple[int, int]]:
+    """Find the lines of the walk as (offset, length)
+
+    Sometimes there are newlines in the data of snmpwalks. Lines that do
+    not start with an OID are continuations of the preceding line.
+    """
+    start = None
+    position = 0
+    end = len(walk)
+    while position < end:
+        newline = walk.find(b"\n", position)
+        next_position = end if newline == -1 else newline + 1
+        if walk[position:position + 1] == b".":
+            if start is not None:
+                yield start, position - start
+            start = position
+        position = next_position
+
+    if start is not None:
+        yield start, end - start
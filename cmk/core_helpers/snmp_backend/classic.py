@@ -7,7 +7,7 @@
 import os
 import signal
 import subprocess
-from typing import List, Optional
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 
 from six import ensure_str
 
@@ -88,6 +88,49 @@ class ClassicSNMPBackend(SNMPBackend):
              check_plugin_name: Optional[str] = None,
              table_base_oid: Optional[str] = None,
              context_name: Optional[str] = None) -> SNMPRowInfo:
+        return self._walk(oid, context_name)
+
+    def walk_columns(
+        self,
+        oids: Sequence[OID],
+        check_plugin_name: Optional[str] = None,
+        table_base_oid: Optional[str] = None,
+        context_name: Optional[str] = None,
+    ) -> Mapping[OID, SNMPRowInfo]:
+        """Walk all columns with a single snmpwalk/snmpbulkwalk process
+
+        We walk the common table base up to the last requested column and sort
+        the rows into the requested columns.  This only pays off if the requested
+        columns make up most of the walked range, otherwise we walk column by
+        column as usual.
+        """
+        columns = _table_columns(table_base_oid, oids)
+        if table_base_oid is None or columns is None:
+            return super().walk_columns(
+                oids,
+                check_plugin_name=check_plugin_name,
+                table_base_oid=table_base_oid,
+                context_name=context_name,
+            )
+
+        end_oid = "%s.%d" % (table_base_oid, max(columns) + 1)
+        return _demultiplex_columns(
+            self._walk(table_base_oid, context_name, end_oid=end_oid),
+            oids,
+        )
+
+    def _walk(
+        self,
+        oid: OID,
+        context_name: Optional[SNMPContextName],
+        *,
+        end_oid: Optional[OID] = None,
+    ) -> SNMPRowInfo:
+        """Walk the subtree of the OID, up to the end OID (excluding) if given
+
+        snmpbulkwalk does not support -CE.  It is stopped as soon as it returns
+        the first row at or after the end OID.
+        """
         protospec = self._snmp_proto_spec()
 
         ipaddress = self.config.ipaddress
@@ -96,11 +139,14 @@ class ClassicSNMPBackend(SNMPBackend):
 
         portspec = self._snmp_port_spec()
         command = self._snmp_walk_command(context_name)
+        if end_oid is not None and not self.config.is_bulkwalk_host:
+            command += ["-CE", end_oid]
         command += ["-OQ", "-OU", "-On", "-Ot", "%s%s%s" % (protospec, ipaddress, portspec), oid]
         console.vverbose("Running '%s'\n" % subprocess.list2cmdline(command))
 
         snmp_process = None
         exitstatus = None
+        stopped = False
         rowinfo: SNMPRowInfo = []
         try:
             snmp_process = subprocess.Popen(command,
@@ -110,7 +156,10 @@ class ClassicSNMPBackend(SNMPBackend):
                                             stderr=subprocess.PIPE,
                                             encoding="utf-8")
 
-            rowinfo = self._get_rowinfo_from_snmp_process(snmp_process)
+            rowinfo, stopped = self._get_rowinfo_from_snmp_process(snmp_process, end_oid)
+            if stopped:
+                # The rows after the end OID are not needed
+                snmp_process.terminate()
 
         except MKTimeout:
             # On timeout exception try to stop the process to prevent child process "leakage"
@@ -131,17 +180,27 @@ class ClassicSNMPBackend(SNMPBackend):
                 if snmp_process.stdout:
                     snmp_process.stdout.close()
 
-        if exitstatus:
+        if exitstatus and not stopped:
             console.verbose(tty.red + tty.bold + "ERROR: " + tty.normal +
                             "SNMP error: %s\n" % ensure_str(error).strip())
             raise MKSNMPError("SNMP Error on %s: %s (Exit-Code: %d)" %
                               (ipaddress, ensure_str(error).strip(), exitstatus))
         return rowinfo
 
-    def _get_rowinfo_from_snmp_process(self, snmp_process: subprocess.Popen) -> SNMPRowInfo:
+    def _get_rowinfo_from_snmp_process(
+        self,
+        snmp_process: subprocess.Popen,
+        end_oid: Optional[OID] = None,
+    ) -> Tuple[SNMPRowInfo, bool]:
+        """Read the rows of the walk, stop at the first row at or after the end OID
+
+        The second value tells whether the walk was stopped before its end.
+        """
         if snmp_process.stdout is None:
             raise TypeError()
 
+        end = None if end_oid is None else _oid_key(end_oid)
+
         line_iter = snmp_process.stdout
         # Ugly(1): in some cases snmpwalk inserts line feed within one
         # dataset. This happens for example on hexdump outputs longer
@@ -149,7 +208,7 @@ class ClassicSNMPBackend(SNMPBackend):
         # So if the value begins with a double quote, but the line
         # does not end with a double quote, we take the next line(s) as
         # a continuation line.
-        rowinfo = []
+        rowinfo: SNMPRowInfo = []
         while True:
             try:
                 line = next(line_iter).strip()
@@ -160,6 +219,8 @@ class ClassicSNMPBackend(SNMPBackend):
             if len(parts) < 2:
                 continue  # broken line, must contain =
             oid = parts[0].strip()
+            if end is not None and _oid_key(oid) >= end:
+                return rowinfo, True  # the rows are ordered by OID
             value = parts[1].strip()
             # Filter out silly error messages from snmpwalk >:-P
             if value.startswith('No more variables') or value.startswith('End of MIB') \
@@ -175,7 +236,7 @@ class ClassicSNMPBackend(SNMPBackend):
                     if value[-1] == '"':
                         break
             rowinfo.append((oid, strip_snmp_value(value)))
-        return rowinfo
+        return rowinfo, False
 
     def _snmp_proto_spec(self) -> str:
         if self.config.is_ipv6_primary:
@@ -277,6 +338,45 @@ class ClassicSNMPBackend(SNMPBackend):
         return command + options
 
 
+def _table_columns(table_base_oid: Optional[OID], oids: Sequence[OID]) -> Optional[List[int]]:
+    """Return the column numbers if the OIDs are worth walking as a whole table
+
+    All OIDs must be direct children of the table base (the usual table entry
+    columns), and they must cover at least half of the column range walked.
+    """
+    if table_base_oid is None or len(oids) < 2:
+        return None
+
+    prefix = table_base_oid + "."
+    columns = []
+    for oid in oids:
+        column = oid[len(prefix):]
+        if not oid.startswith(prefix) or not column.isdigit():
+            return None
+        columns.append(int(column))
+
+    if 2 * len(columns) < max(columns):
+        return None
+    return columns
+
+
+def _oid_key(oid: OID) -> Tuple[int, ...]:
+    """The OIDs returned by the walks are ordered by this key"""
+    return tuple(int(part) for part in oid.strip(".").split("."))
+
+
+def _demultiplex_columns(rows: SNMPRowInfo, oids: Sequence[OID]) -> Mapping[OID, SNMPRowInfo]:
+    columns: Dict[OID, SNMPRowInfo] = {oid: [] for oid in oids}
+    prefixes = [(oid + ".", columns[oid]) for oid in oids]
+    for row in rows:
+        row_oid = row[0] + "."
+        for prefix, column in prefixes:
+            if row_oid.startswith(prefix):
+                column.append(row)
+                break
+    return columns
+
+
 def _auth_proto_for(proto_name: str) -> str:
     if proto_name == "md5":
         return "md5"
@@ -5,23 +5,34 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Abstract classes and types."""
 
-from typing import List, Optional, Tuple
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
-from six import ensure_binary, ensure_str
+from six import ensure_str
 
 import cmk.utils.agent_simulator as agent_simulator
+import cmk.utils.cleanup
 import cmk.utils.paths
-from cmk.utils.exceptions import MKGeneralException, MKSNMPError
+from cmk.utils.exceptions import MKSNMPError
 from cmk.utils.log import console
-from cmk.utils.type_defs import AgentRawData, CheckPluginNameStr
+from cmk.utils.type_defs import AgentRawData, CheckPluginNameStr, HostName
 
-import cmk.snmplib.snmp_cache as snmp_cache
 from cmk.snmplib.type_defs import SNMPBackend, OID, SNMPContextName, SNMPRawValue, SNMPRowInfo
 
 from ._utils import strip_snmp_value
+from ._walk_index import WalkIndex
 
 __all__ = ["StoredWalkSNMPBackend"]
 
+_g_walk_indexes: Dict[HostName, WalkIndex] = {}
+
+
+def _cleanup_walk_indexes() -> None:
+    _g_walk_indexes.clear()
+
+
+cmk.utils.cleanup.register_cleanup(_cleanup_walk_indexes)
+
 
 class StoredWalkSNMPBackend(SNMPBackend):
     def get(self,
@@ -51,102 +62,45 @@ class StoredWalkSNMPBackend(SNMPBackend):
             oid_prefix = oid
             dot_star = False
 
-        host_cache = snmp_cache.host_cache()
-        try:
-            lines = host_cache[self.config.hostname]
-        except KeyError:
-            path = cmk.utils.paths.snmpwalks_dir + "/" + self.config.hostname
-            console.vverbose("  Loading %s from %s\n" % (oid, path))
-            try:
-                lines = StoredWalkSNMPBackend.read_walk_data(path)
-            except IOError:
-                raise MKSNMPError("No snmpwalk file %s" % path)
-            host_cache[self.config.hostname] = lines
-
-        begin = 0
-        end = len(lines)
-        hit = None
-        while end - begin > 0:
-            current = (begin + end) // 2
-            parts = lines[current].split(None, 1)
-            comp = parts[0]
-            hit = StoredWalkSNMPBackend._compare_oids(oid_prefix, comp)
-            if hit == 0:
-                break
-            if hit == 1:  # we are too low
-                begin = current + 1
-            else:
-                end = current
-
-        if hit != 0:
-            return []  # not found
-
-        rowinfo = StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current, -1)
-        rowinfo.reverse()
-        rowinfo += StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current + 1, 1)
+        rowinfo = [
+            StoredWalkSNMPBackend._parse_line(line)
+            for line in self._walk_index(oid).lines(oid_prefix, children_only=dot_star)
+        ]
 
         if dot_star:
-            return [rowinfo[0]]
+            return rowinfo[:1]
 
         return rowinfo
 
-    @staticmethod
-    def read_walk_data(path: str):
-        lines = []
-        with open(path) as f:
-            # Sometimes there are newlines in the data of snmpwalks.
-            # Append the data to the last OID rather than throwing it away/skipping it.
-            for line in f.readlines():
-                if line.startswith("."):
-                    lines.append(line)
-                elif lines:
-                    lines[-1] += line
-        return lines
-
-    @staticmethod
-    def _compare_oids(a: OID, b: OID) -> int:
-        aa = StoredWalkSNMPBackend._to_bin_string(a)
-        bb = StoredWalkSNMPBackend._to_bin_string(b)
-        if len(aa) <= len(bb) and bb[:len(aa)] == aa:
-            result = 0
-        else:
-            result = (aa > bb) - (aa < bb)
-        return result
+    def _walk_index(self, oid: OID) -> WalkIndex:
+        try:
+            return _g_walk_indexes[self.config.hostname]
+        except KeyError:
+            pass
 
-    @staticmethod
-    def _to_bin_string(oid: OID) -> Tuple[int, ...]:
+        path = Path(cmk.utils.paths.snmpwalks_dir, self.config.hostname)
+        console.vverbose("  Loading %s from %s\n" % (oid, path))
         try:
-            return tuple(map(int, oid.strip(".").split(".")))
-        except Exception:
-            raise MKGeneralException("Invalid OID %s" % oid)
+            walk_index = WalkIndex.open(
+                path,
+                Path(cmk.utils.paths.snmpwalks_index_dir, self.config.hostname),
+            )
+        except IOError:
+            raise MKSNMPError("No snmpwalk file %s" % path)
+
+        _g_walk_indexes[self.config.hostname] = walk_index
+        return walk_index
 
     @staticmethod
-    def _collect_until(oid: OID, oid_prefix: OID, lines: List[str], index: int,
-                       direction: int) -> SNMPRowInfo:
-        rows = []
-        # Handle case, where we run after the end of the lines list
-        if index >= len(lines):
-            if direction > 0:
-                return []
-            index -= 1
-        while True:
-            line = lines[index]
-            parts = line.split(None, 1)
-            o = parts[0]
-            if o.startswith('.'):
-                o = o[1:]
-            if o == oid or o.startswith(oid_prefix + "."):
-                if len(parts) > 1:
-                    # FIXME: This encoding ping-pong os horrible...
-                    value = ensure_str(
-                        agent_simulator.process(AgentRawData(ensure_binary(parts[1]),),),)
-                else:
-                    value = ""
-                # Fix for missing starting oids
-                rows.append(('.' + o, strip_snmp_value(value)))
-                index += direction
-                if index < 0 or index >= len(lines):
-                    break
-            else:
-                break
-        return rows
+    def _parse_line(line: bytes) -> Tuple[OID, SNMPRawValue]:
+        parts = line.replace(b"\r\n", b"\n").split(None, 1)
+        o = ensure_str(parts[0])
+        if o.startswith('.'):
+            o = o[1:]
+        if len(parts) > 1:
+            # FIXME: This encoding ping-pong os horrible...
+            value = ensure_str(agent_simulator.process(AgentRawData(parts[1])))
+        else:
+            value = ""
+        # Fix for missing starting oids
+        return ('.' + o, strip_snmp_value(value))
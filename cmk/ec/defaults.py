@@ -34,6 +34,7 @@ def default_config() -> Dict[str, Any]:
         "actions": [],
         "debug_rules": False,
         "rule_optimizer": True,
+        "event_processes": 1,
         "log_level": {
             "cmk.mkeventd": logging.INFO,
             "cmk.mkeventd.EventServer": logging.INFO,
@@ -45,6 +46,7 @@ def default_config() -> Dict[str, Any]:
         "log_rulehits": False,
         "log_messages": False,
         "retention_interval": 60,
+        "status_journal": True,
         "housekeeping_interval": 60,
         "statistics_interval": 5,
         "history_lifetime": 365,  # days
@@ -17,6 +17,7 @@ from cmk.utils.log import VERBOSE
 from cmk.utils.render import date_and_time
 
 from .actions import quote_shell_string
+from .history_index import HistoryFileIndex, index_path_of, LineRange, POSTING_COLUMNS
 from .query import QueryGET
 from .settings import Settings
 
@@ -36,6 +37,8 @@ class History:
         self._lock = threading.Lock()
         self._mongodb = MongoDB()
         self._active_history_period = ActiveHistoryPeriod()
+        # Indexes of the history files, see _history_file_index
+        self._history_file_indexes: Dict[Path, HistoryFileIndex] = {}
         self.reload_configuration(config)
 
     def reload_configuration(self, config: Dict[str, Any]) -> None:
@@ -296,10 +299,30 @@ def _reload_configuration_files(history: History) -> None:
 
 def _flush_files(history: History) -> None:
     _expire_logfiles(history._settings, history._config, history._logger, history._lock, True)
+    _forget_expired_indexes(history)
 
 
 def _housekeeping_files(history: History) -> None:
     _expire_logfiles(history._settings, history._config, history._logger, history._lock, False)
+    _forget_expired_indexes(history)
+
+
+def _forget_expired_indexes(history: History) -> None:
+    with history._lock:
+        for path in list(history._history_file_indexes):
+            if not path.exists():
+                del history._history_file_indexes[path]
+
+
+def _history_file_index(history: History, path: Path) -> HistoryFileIndex:
+    """The index of the history file, history._lock has to be held
+
+    The access to the index itself is serialized by its own lock."""
+    try:
+        return history._history_file_indexes[path]
+    except KeyError:
+        index = history._history_file_indexes[path] = HistoryFileIndex(path, history._logger)
+        return index
 
 
 # Make a new entry in the event history. Each entry is tab-separated line
@@ -323,9 +346,21 @@ def _add_files(history: History, event: Dict[str, Any], what: str, who: str, add
             for colname, defval in history._event_columns
         ]
 
-        with get_logfile(history._config, history._settings.paths.history_dir.value,
-                         history._active_history_period).open(mode='ab') as f:
-            f.write(b"\t".join(columns) + b"\n")
+        path = get_logfile(history._config, history._settings.paths.history_dir.value,
+                           history._active_history_period)
+        line = b"\t".join(columns) + b"\n"
+        with path.open(mode='ab') as f:
+            offset = f.tell()
+            f.write(line)
+
+        # A query building the index must not block the writing of the history. The
+        # line is read from the log by the next update of the index in this case.
+        index = _history_file_index(history, path)
+        if index.lock.acquire(blocking=False):
+            try:
+                index.add(offset, line)
+            finally:
+                index.lock.release()
 
 
 def quote_tab(col: Any) -> bytes:
@@ -410,6 +445,9 @@ def _expire_logfiles(settings: Settings, config: Dict[str, Any], logger: Logger,
                     logger.info("Deleting log file %s (age %s)" %
                                 (path, date_and_time(path.stat().st_mtime)))
                     path.unlink()
+                    index_path = index_path_of(path)
+                    if index_path.exists():
+                        index_path.unlink()
         except Exception as e:
             if settings.options.debug:
                 raise
@@ -468,6 +506,30 @@ def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[An
     time_filters = [f for f in filters if f[0].split("_")[-1] == "time"]
     logger.debug("Time filters: %r", time_filters)
 
+    # The indexes of the history files know which parts of the files may contain
+    # entries for the filters on the history time, hosts, rule IDs and event IDs.
+    index_time_filters = [(operator_name, predicate)
+                          for column_name, operator_name, predicate, _argument in filters
+                          if column_name == "history_time"]
+    index_key_filters: List[Tuple[str, List[str]]] = []
+    for column_name, operator_name, _predicate, argument in filters:
+        if column_name in POSTING_COLUMNS:
+            if operator_name in ['=', '=~']:
+                index_key_filters.append((column_name, [argument]))
+            elif operator_name == 'in':
+                # The argument is the list of values
+                index_key_filters.append((column_name, list(argument)))
+
+    # Texts which are contained in all matching lines. Other types are written
+    # differently to the history files, see quote_tab. The line number is not
+    # part of the lines.
+    needles = [
+        str(argument).encode("utf-8")
+        for column_name, operator_name, _predicate, argument in filters
+        if column_name != "history_line" and operator_name == '=' and
+        type(argument) in [str, int] and str(argument)
+    ]
+
     # We do not want to open all files. So our strategy is:
     # look for "time" filters and first apply the filter to
     # the first entry and modification time of the file. Only
@@ -481,9 +543,10 @@ def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[An
     # already be done by the GUI, so we don't do that twice. Skipping
     # this # will lead into some lines of a single file to be limited in
     # wrong order. But this should be better than before.
-    for ts, path in sorted(((int(str(path.name)[:-4]), path)
-                            for path in history._settings.paths.history_dir.value.glob('*.log')),
-                           reverse=True):
+    paths = sorted(((int(str(path.name)[:-4]), path)
+                    for path in history._settings.paths.history_dir.value.glob('*.log')),
+                   reverse=True)
+    for nr, (ts, path) in enumerate(paths):
         if limit is not None and limit <= 0:
             break
         first_entry, last_entry = _get_logfile_timespan(path)
@@ -501,7 +564,22 @@ def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[An
                     history._logger.info("Skipping logfile %s.log because of time filter" % ts)
                 continue  # skip this file
 
-        new_entries = _parse_history_file(history, path, query, greptexts, limit, history._logger)
+        with history._lock:
+            index = _history_file_index(history, path)
+        # Building the index of a large file takes a while, the history is written meanwhile
+        with index.lock:
+            # Only the latest file grows
+            index.update(complete=nr > 0)
+            ranges = index.candidate_ranges(index_time_filters, index_key_filters)
+            num_ranges = len(index)
+
+        if greptexts and len(ranges) == num_ranges:
+            # The index does not help, grep is the fastest way to read the whole file
+            new_entries = _parse_history_file(history, path, query, greptexts, limit,
+                                              history._logger)
+        else:
+            new_entries = _parse_history_file_ranges(history, path, ranges, query, needles, limit,
+                                                     history._logger)
         history_entries += new_entries
         if limit is not None:
             limit -= len(new_entries)
@@ -509,6 +587,38 @@ def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[An
     return history_entries
 
 
+def _parse_history_file_ranges(history: History, path: Path, ranges: List[LineRange], query: Any,
+                               needles: List[bytes], limit: Optional[int],
+                               logger: Logger) -> List[Any]:
+    """Read the entries of the given ranges of the history file, the latest first
+
+    The line numbers count the lines from the end of the file, like the ones of
+    _parse_history_file without greptexts.
+    """
+    entries: List[Any] = []
+    with path.open("rb") as f:
+        for line_range in ranges:
+            f.seek(line_range.offset)
+            lines = f.read(line_range.length).split(b"\n")[:-1]
+            for line_no, line in enumerate(reversed(lines), start=line_range.lines_after + 1):
+                if limit is not None and len(entries) > limit:
+                    return entries
+
+                if not all(needle in line for needle in needles):
+                    continue
+
+                try:
+                    parts: List[Any] = line.decode('utf-8').split('\t')
+                    _convert_history_line(history, parts)
+                    values = [line_no] + parts
+                    if query.filter_row(values):
+                        entries.append(values)
+                except Exception as e:
+                    logger.exception("Invalid line '%r' in history file %s: %s" % (line, path, e))
+
+    return entries
+
+
 def _parse_history_file(history: History, path: Path, query: Any, greptexts: List[str],
                         limit: Optional[int], logger: Logger) -> List[Any]:
     entries: List[Any] = []
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Sidecar indexes of the history files of the Event Console
+
+The lines of a history file <timestamp>.log are grouped into blocks of
+consecutive lines. The index <timestamp>.idx records the position and the
+time range of each block and the hosts, rule IDs and event IDs occurring in
+it. A query only needs to read the blocks that can contain matching lines.
+
+Index file layout (integers in network byte order):
+
+    <MAGIC><FORMAT VERSION><MARSHAL VERSION>
+    <length><block>
+    <length><block>
+    ...
+
+A block is appended once it is complete. The lines after the last block
+are kept in memory. Index files with another version are rebuilt.
+"""
+
+import marshal
+import os
+import struct
+import threading
+from logging import Logger
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+__all__ = [
+    "HistoryFileIndex",
+    "index_path_of",
+    "POSTING_COLUMNS",
+]
+
+MAGIC = b"CMKECIDX"
+FORMAT_VERSION = 1
+
+# Number of lines per block
+BLOCK_LINES = 1000
+
+_HEADER = struct.Struct("!8sHH")
+_LENGTH = struct.Struct("!I")
+
+# Columns with postings and their position in the history lines. See
+# history._add_files for the layout of the lines. The values are stored
+# in lower case, so they can be used for the case insensitive operators.
+POSTING_COLUMNS = {
+    "event_id": 4,
+    "event_host": 11,
+    "event_rule_id": 17,
+}
+_POSTING_POSITIONS = sorted(POSTING_COLUMNS.values())
+
+# Operators of time filters, for which a block matches if the first or the last
+# entry of the block matches
+_MONOTONIC_OPERATORS = {"<", "<=", ">", ">="}
+
+
+def index_path_of(log_path: Path) -> Path:
+    return log_path.with_suffix(".idx")
+
+
+class Block(NamedTuple):
+    offset: int
+    length: int
+    num_lines: int
+    first_time: float
+    last_time: float
+    # The values per posting column, in the order of POSTING_COLUMNS
+    keys: Tuple[Tuple[str, ...], ...]
+
+
+class LineRange(NamedTuple):
+    offset: int
+    length: int
+    # Number of lines of the file after this range
+    lines_after: int
+
+
+class _BlockBuilder:
+    def __init__(self, offset: int) -> None:
+        super().__init__()
+        self.offset = offset
+        self.length = 0
+        self.num_lines = 0
+        self.first_time = float("inf")
+        self.last_time = float("-inf")
+        self.keys: List[Set[str]] = [set() for _position in _POSTING_POSITIONS]
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+    def add(self, line: bytes) -> None:
+        self.length += len(line)
+        self.num_lines += 1
+        columns = line.rstrip(b"\n").split(b"\t", _POSTING_POSITIONS[-1] + 1)
+        try:
+            entry_time = float(columns[0])
+        except ValueError:
+            entry_time = 0.0
+        self.first_time = min(self.first_time, entry_time)
+        self.last_time = max(self.last_time, entry_time)
+        for keys, position in zip(self.keys, _POSTING_POSITIONS):
+            if position < len(columns):
+                keys.add(columns[position].decode("utf-8", errors="replace").lower())
+
+    def block(self) -> Block:
+        return Block(
+            self.offset,
+            self.length,
+            self.num_lines,
+            self.first_time,
+            self.last_time,
+            tuple(tuple(sorted(keys)) for keys in self.keys),
+        )
+
+
+class HistoryFileIndex:
+    """The index of a history file
+
+    The index is not thread safe. The callers have to serialize the access
+    to it with its lock.
+    """
+    def __init__(self, log_path: Path, logger: Logger) -> None:
+        super().__init__()
+        self.lock = threading.Lock()
+        self.log_path = log_path
+        self.index_path = index_path_of(log_path)
+        self._logger = logger
+        self._reset()
+        self._load()
+
+    def _reset(self) -> None:
+        self._log_id: Optional[int] = None
+        self._blocks: List[Block] = []
+        self._postings: List[Dict[str, Set[int]]] = [{} for _position in _POSTING_POSITIONS]
+        self._pending = _BlockBuilder(0)
+
+    def __len__(self) -> int:
+        """Number of ranges of the file, see candidate_ranges()"""
+        return len(self._blocks) + (1 if self._pending.num_lines else 0)
+
+    def _load(self) -> None:
+        try:
+            data = self.index_path.read_bytes()
+        except FileNotFoundError:
+            data = b""
+        except OSError as e:
+            self._logger.warning("Cannot read history index %s: %s" % (self.index_path, e))
+            return
+
+        if data[:_HEADER.size] != _HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version):
+            self._write_header()
+            return
+
+        position = _HEADER.size
+        while position + _LENGTH.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, position)
+            end = position + _LENGTH.size + length
+            if end > len(data):
+                break  # torn write
+            try:
+                block = Block(*marshal.loads(data[position + _LENGTH.size:end]))
+            except (EOFError, TypeError, ValueError):
+                break
+            self._add_block(block)
+            position = end
+
+        if position < len(data):
+            self._logger.warning("Truncating history index %s after %d bytes" %
+                                 (self.index_path, position))
+            with self.index_path.open("r+b") as index_file:
+                index_file.truncate(position)
+
+    def _write_header(self) -> None:
+        try:
+            with self.index_path.open("wb") as index_file:
+                index_file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version))
+        except OSError as e:
+            self._logger.warning("Cannot write history index %s: %s" % (self.index_path, e))
+
+    def _add_block(self, block: Block) -> None:
+        number = len(self._blocks)
+        self._blocks.append(block)
+        for postings, keys in zip(self._postings, block.keys):
+            for key in keys:
+                postings.setdefault(key, set()).add(number)
+        self._pending = _BlockBuilder(block.offset + block.length)
+
+    def _complete_block(self) -> None:
+        block = self._pending.block()
+        self._add_block(block)
+        record = marshal.dumps(tuple(block))
+        try:
+            with self.index_path.open("ab") as index_file:
+                index_file.write(_LENGTH.pack(len(record)) + record)
+        except OSError as e:
+            self._logger.warning("Cannot write history index %s: %s" % (self.index_path, e))
+
+    def add(self, offset: int, line: bytes) -> None:
+        """Index a line that has just been appended to the log at the given offset"""
+        if offset != self._pending.end or self._log_id is None:
+            # Lines written by someone else, read them from the log
+            self.update()
+            return
+
+        self._pending.add(line)
+        if self._pending.num_lines >= BLOCK_LINES:
+            self._complete_block()
+
+    def update(self, complete: bool = False) -> None:
+        """Index the lines of the log that have not been indexed yet
+
+        With complete, the last lines are written to the index even if they do
+        not fill a block. This is done for logs that do not grow anymore.
+        """
+        try:
+            with self.log_path.open("rb") as log_file:
+                stat = os.fstat(log_file.fileno())
+                if stat.st_ino != self._log_id and self._log_id is not None or \
+                   stat.st_size < self._pending.end:
+                    # The log has been replaced, start over
+                    self._reset()
+                    self._write_header()
+                self._log_id = stat.st_ino
+
+                log_file.seek(self._pending.end)
+                for line in log_file:
+                    if not line.endswith(b"\n"):
+                        break  # incomplete line, it will be indexed later
+                    self._pending.add(line)
+                    if self._pending.num_lines >= BLOCK_LINES:
+                        self._complete_block()
+        except FileNotFoundError:
+            self._reset()
+            return
+
+        if complete and self._pending.num_lines:
+            self._complete_block()
+
+    def candidate_ranges(
+        self,
+        time_filters: Iterable[Tuple[str, Callable[[float], bool]]],
+        key_filters: Iterable[Tuple[str, Sequence[str]]],
+    ) -> List[LineRange]:
+        """The ranges of the log that may contain matching lines, the latest first
+
+        time_filters: The operators and predicates of the filters of the history time
+        key_filters: The values of POSTING_COLUMNS of which one has to match (case insensitive)
+        """
+        monotonic_predicates = [
+            predicate for operator_name, predicate in time_filters
+            if operator_name in _MONOTONIC_OPERATORS
+        ]
+
+        candidates: Optional[Set[int]] = None
+        matches_pending = True
+        for column_name, values in key_filters:
+            column = _POSTING_POSITIONS.index(POSTING_COLUMNS[column_name])
+            lowered_values = {str(value).lower() for value in values}
+
+            postings = self._postings[column]
+            matching_blocks: Set[int] = set().union(
+                *(postings.get(value, ()) for value in lowered_values))
+            candidates = matching_blocks if candidates is None else candidates & matching_blocks
+            matches_pending &= not self._pending.keys[column].isdisjoint(lowered_values)
+
+        # Number of lines after each block, the pending lines come last
+        lines_after = [self._pending.num_lines] * (len(self._blocks) + 1)
+        for number in range(len(self._blocks) - 1, 0, -1):
+            lines_after[number - 1] = lines_after[number] + self._blocks[number].num_lines
+
+        ranges: List[LineRange] = []
+        if self._pending.num_lines and matches_pending and _in_time_range(
+                self._pending.first_time, self._pending.last_time, monotonic_predicates):
+            ranges.append(LineRange(self._pending.offset, self._pending.length, 0))
+
+        for number in range(len(self._blocks) - 1, -1, -1):
+            block = self._blocks[number]
+            if candidates is not None and number not in candidates:
+                continue
+            if _in_time_range(block.first_time, block.last_time, monotonic_predicates):
+                ranges.append(LineRange(block.offset, block.length, lines_after[number]))
+        return ranges
+
+
+def _in_time_range(first_time: float, last_time: float,
+                   predicates: Iterable[Callable[[float], bool]]) -> bool:
+    return all(predicate(first_time) or predicate(last_time) for predicate in predicates)
@@ -13,12 +13,16 @@
 
 import abc
 import ast
+import collections
 import errno
 import json
 from logging import Logger, getLogger
+import multiprocessing
+import multiprocessing.pool
 import os
 from pathlib import Path
 import pprint
+import queue
 import re
 import select
 import signal
@@ -28,7 +32,8 @@ import threading
 import time
 import traceback
 from types import FrameType
-from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+from typing import (Any, AnyStr, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set,
+                    Tuple, Type, Union)
 
 from six import ensure_binary
 
@@ -50,8 +55,9 @@ import livestatus
 from .actions import do_notify, do_event_action, do_event_actions, event_has_opened
 from .crash_reporting import ECCrashReport, CrashReportStore
 from .history import ActiveHistoryPeriod, History, scrub_string, quote_tab, get_logfile
-from .query import MKClientError, Query, QueryGET, filter_operator_in
+from .query import MKClientError, Query, QueryGET
 from .rule_packs import load_config as load_config_using
+from .rule_prefilter import RulePrefilter
 from .settings import FileDescriptor, PortNumber, Settings, settings as create_settings
 from .snmp import SNMPTrapEngine
 
@@ -489,6 +495,12 @@ class Perfcounters:
         "overflows",
         "events",
         "connects",
+        "queue_overflows",
+    ]
+
+    # Current values, e.g. the length of a queue
+    _gauge_names = [
+        "queued_messages",
     ]
 
     # Average processing times
@@ -503,8 +515,8 @@ class Perfcounters:
         super().__init__()
         self._lock = ECLock(logger)
 
-        # Initialize counters
-        self._counters = {n: 0 for n in self._counter_names}
+        # Initialize counters, the gauges are stored along with them
+        self._counters = {n: 0 for n in self._counter_names + self._gauge_names}
         self._old_counters: Dict[str, int] = {}
         self._rates: Dict[str, float] = {}
         self._average_rates: Dict[str, float] = {}
@@ -513,9 +525,13 @@ class Perfcounters:
 
         self._logger = logger.getChild("Perfcounters")
 
-    def count(self, counter: str) -> None:
+    def count(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += value
+
+    def set_gauge(self, gauge: str, value: int) -> None:
         with self._lock:
-            self._counters[counter] += 1
+            self._counters[gauge] = value
 
     def count_time(self, counter: str, ptime: float) -> None:
         with self._lock:
@@ -531,9 +547,9 @@ class Perfcounters:
                 duration = now - self._last_statistics
             else:
                 duration = 0
-            for name, value in self._counters.items():
+            for name in self._counter_names:
                 if duration:
-                    delta = value - self._old_counters[name]
+                    delta = self._counters[name] - self._old_counters[name]
                     rate = delta / duration
                     self._rates[name] = rate
                     if name in self._average_rates:
@@ -554,6 +570,9 @@ class Perfcounters:
             columns.append(("status_" + name.rstrip("s") + "_rate", 0.0))
             columns.append(("status_average_" + name.rstrip("s") + "_rate", 0.0))
 
+        for name in cls._gauge_names:
+            columns.append(("status_" + name, 0))
+
         for name in cls._weights:
             columns.append(("status_average_%s_time" % name, 0.0))
 
@@ -568,6 +587,9 @@ class Perfcounters:
                 row.append(self._rates.get(name, 0.0))
                 row.append(self._average_rates.get(name, 0.0))
 
+            for name in self._gauge_names:
+                row.append(self._counters[name])
+
             for name in self._weights:
                 row.append(self._times.get(name, 0.0))
 
@@ -586,6 +608,24 @@ class Perfcounters:
 #   |  Verarbeitung und Klassifizierung von eingehenden Events.            |
 #   '----------------------------------------------------------------------'
 
+# Maximum number of received messages waiting for being processed. Further
+# messages are dropped.
+MAX_QUEUED_MESSAGES = 100000
+
+# Maximum number of messages handed over to an event process at once
+MAX_BATCH_SIZE = 100
+
+# Seconds to wait for room in the message queue before reading further spool files
+SPOOL_RETRY_INTERVAL = 0.1
+
+# A message waiting for being processed: The raw data of one or more lines and
+# the address of the sender or an event created from an SNMP trap
+QueuedMessage = Tuple[str, Any, Any]
+
+# An event created and matched by an EventWorker: The event, the hits (with the
+# rules given by their position), the number of tries and the processing time
+MatchedEvent = Tuple[Dict[str, Any], List[Tuple[int, Tuple[bool, Dict[str, Any]]]], int, float]
+
 
 class EventServer(ECServerThread):
     month_names = {
@@ -627,6 +667,8 @@ class EventServer(ECServerThread):
 
         # TODO: Improve type!
         self._rules: List[Any] = []
+        self._rule_hash: Dict[int, Dict[int, Any]] = {}
+        self._rule_prefilter = RulePrefilter([])
         self._hash_stats = []
         for _unused_facility in range(32):
             self._hash_stats.append([0] * 8)
@@ -640,6 +682,8 @@ class EventServer(ECServerThread):
         self._message_period = ActiveHistoryPeriod()
         self._rule_matcher = RuleMatcher(self._logger, config)
         self._event_creator = EventCreator(self._logger, config)
+        self._message_queue: 'queue.Queue[QueuedMessage]' = queue.Queue(MAX_QUEUED_MESSAGES)
+        self._queue_processor: Optional[threading.Thread] = None
 
         # HACK for testing: The real fix would involve breaking up these huge
         # class monsters.
@@ -817,9 +861,17 @@ class EventServer(ECServerThread):
         return os.open(str(self.settings.paths.event_pipe.value), os.O_RDWR | os.O_NONBLOCK)
 
     def handle_snmptrap(self, trap, ipaddress):
-        self.process_event(self._event_creator.create_event_from_trap(trap, ipaddress))
+        self._queue_message(
+            ("event", self._event_creator.create_event_from_trap(trap, ipaddress), None), 1)
 
     def serve(self) -> None:
+        # The received messages are processed by another thread, so this one can
+        # keep on reading while they are processed
+        if self._queue_processor is None or not self._queue_processor.is_alive():
+            self._queue_processor = threading.Thread(target=self._process_queue,
+                                                     name="EventProcessor")
+            self._queue_processor.start()
+
         pipe_fragment = b''
         pipe = self.open_pipe()
         listen_list = [pipe]
@@ -844,7 +896,7 @@ class EventServer(ECServerThread):
         # read data that is not yet processed. Map from
         # fd to (fileobject, data)
         client_sockets: Dict[int, Tuple[socket.socket, Any, bytes]] = {}
-        select_timeout = 1
+        select_timeout: float = 1
         while not self._terminate_event.is_set():
             try:
                 readable = select.select(listen_list + list(client_sockets.keys()), [], [],
@@ -888,14 +940,14 @@ class EventServer(ECServerThread):
                         # Do we have any complete messages?
                         if b'\n' in data:
                             complete, rest = data.rsplit(b"\n", 1)
-                            self.process_raw_lines(complete + b"\n", address)
+                            self.queue_raw_lines(complete + b"\n", address)
                         else:
                             rest = data  # keep for next time
 
                     # Only complete messages
                     else:
                         if data:
-                            self.process_raw_lines(data, address)
+                            self.queue_raw_lines(data, address)
                         rest = b""
 
                     # Connection still open?
@@ -918,11 +970,11 @@ class EventServer(ECServerThread):
                         if data[-1:] != b'\n':
                             if b'\n' in data:  # at least one complete message contained
                                 messages, pipe_fragment = data.rsplit(b'\n', 1)
-                                self.process_raw_lines(messages + b'\n')  # got lost in split
+                                self.queue_raw_lines(messages + b'\n')  # got lost in split
                             else:
                                 pipe_fragment = data  # keep beginning of message, wait for \n
                         else:
-                            self.process_raw_lines(data)
+                            self.queue_raw_lines(data)
                     else:  # EOF
                         os.close(pipe)
                         pipe = self.open_pipe()
@@ -936,30 +988,175 @@ class EventServer(ECServerThread):
                 except Exception:
                     pass
 
-            # Read events from builtin syslog server
+            # Read events from builtin syslog server. Read all waiting messages
+            # (up to a limit), this keeps the receive buffer from overflowing.
             if self._syslog is not None and self._syslog.fileno() in readable:
-                self.process_raw_lines(*self._syslog.recvfrom(4096))
+                for _nr in range(MAX_BATCH_SIZE):
+                    try:
+                        self.queue_raw_lines(*self._syslog.recvfrom(4096, socket.MSG_DONTWAIT))
+                    except BlockingIOError:
+                        break
 
             # Read events from builtin snmptrap server
             if self._snmptrap is not None and self._snmptrap.fileno() in readable:
                 try:
                     message, sender_address = self._snmptrap.recvfrom(65535)
-                    self.process_raw_data(
-                        lambda: self._snmp_trap_engine.process_snmptrap(message, sender_address))
+                    self._snmp_trap_engine.process_snmptrap(message, sender_address)
                 except Exception:
                     self._logger.exception(
                         'Exception handling a SNMP trap from "%s". Skipping this one' %
                         sender_address[0])
 
+            # Spool files are kept until there is room for their messages
+            if self._message_queue.full():
+                select_timeout = SPOOL_RETRY_INTERVAL
+                continue
+
             try:
                 # process the first spool file we get
                 spool_file = next(self.settings.paths.spool_dir.value.glob('[!.]*'))
-                self.process_raw_lines(spool_file.read_bytes())
+                self.queue_raw_lines(spool_file.read_bytes())
                 spool_file.unlink()
                 select_timeout = 0  # enable fast processing to process further files
             except StopIteration:
                 select_timeout = 1  # restore default select timeout
 
+        self._queue_processor.join()
+        self._process_remaining_messages()
+
+    def queue_raw_lines(self, data: bytes, address: Optional[Any] = None) -> None:
+        """Hands over received lines to the thread processing them"""
+        self._queue_message(("lines", data, address), max(1, data.count(b"\n")))
+
+    def _queue_message(self, message: QueuedMessage, num_lines: int) -> None:
+        try:
+            self._message_queue.put_nowait(message)
+        except queue.Full:
+            self._perfcounters.count("queue_overflows", num_lines)
+
+    def _process_queue(self) -> None:
+        """Processes the queued messages in the order in which they have been received
+
+        With more than one event process, the events are created and matched by
+        EventWorkers in these processes. This thread hands over the messages in
+        batches and applies the results in the order of the batches.
+        """
+        self._logger.info("Starting up message processing")
+        while not self._terminate_event.is_set():
+            try:
+                self._process_batches()
+            except Exception:
+                self._logger.exception("Exception in message processing")
+                if self.settings.options.debug:
+                    raise
+                time.sleep(1)
+
+    def _process_batches(self) -> None:
+        pool: Optional[multiprocessing.pool.Pool] = None
+        # Configuration and rules of the processes, they get them when being started
+        pool_processes, pool_config, pool_rules = 0, None, None
+        pending: Deque[Tuple[List[Dict[str, Any]], Any]] = collections.deque()
+        try:
+            while not self._terminate_event.is_set():
+                batch = self._next_batch(block=not pending)
+                with self._lock_configuration:
+                    config, rules, rule_hash = self._config, self._rules, self._rule_hash
+
+                processes = config["event_processes"]
+                if pool is not None and (processes != pool_processes or pool_config is not config or
+                                         pool_rules is not rules):
+                    while pending:
+                        self._apply_matched_events(*pending.popleft())
+                    pool.terminate()
+                    pool = None
+
+                if batch and processes <= 1:
+                    self._process_batch(batch)
+                elif batch:
+                    if pool is None:
+                        pool_processes, pool_config, pool_rules = processes, config, rules
+                        pool = self._start_event_workers(processes, config, rules, rule_hash)
+                    pending.append((rules, pool.apply_async(_process_in_event_worker, (batch,))))
+
+                # Wait for the results when there is nothing else to do or too much to do
+                while pending and (not batch or len(pending) > 2 * processes or
+                                   pending[0][1].ready()):
+                    self._apply_matched_events(*pending.popleft())
+
+            # Do not lose the messages already handed over to the event processes
+            while pending:
+                self._apply_matched_events(*pending.popleft())
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _process_remaining_messages(self) -> None:
+        """Processes the messages still queued when terminating"""
+        while True:
+            batch = self._next_batch(block=False)
+            if not batch:
+                return
+            self._process_batch(batch)
+
+    def _next_batch(self, block: bool) -> List[QueuedMessage]:
+        batch: List[QueuedMessage] = []
+        try:
+            batch.append(
+                self._message_queue.get(timeout=1) if block else self._message_queue.get_nowait())
+            while len(batch) < MAX_BATCH_SIZE:
+                batch.append(self._message_queue.get_nowait())
+        except queue.Empty:
+            pass
+        self._perfcounters.set_gauge("queued_messages", self._message_queue.qsize())
+        return batch
+
+    def _start_event_workers(
+        self,
+        processes: int,
+        config: Dict[str, Any],
+        rules: List[Dict[str, Any]],
+        rule_hash: Dict[int, Dict[int, Any]],
+    ) -> multiprocessing.pool.Pool:
+        self._logger.info("Starting %d event processes" % processes)
+        log_file = None if self.settings.options.foreground else str(
+            self.settings.paths.log_file.value)
+        # The processes are spawned, forking could inherit locks held by other threads
+        return multiprocessing.get_context("spawn").Pool(
+            processes, _init_event_worker,
+            (log_file, self._logger.getEffectiveLevel(), config, rules, rule_hash))
+
+    def _process_batch(self, batch: List[QueuedMessage]) -> None:
+        for kind, data, address in batch:
+            if kind == "lines":
+                self.process_raw_lines(data, address)
+                continue
+
+            try:
+
+                def handler(event=data):
+                    self.process_event(event)
+
+                self.process_raw_data(handler)
+            except Exception:
+                self._logger.exception('Exception handling a SNMP trap. Skipping this one')
+
+    def _apply_matched_events(self, rules: List[Dict[str, Any]], async_result: Any) -> None:
+        for event, hits, rule_tries, processing_time in async_result.get():
+            self._perfcounters.count("messages")
+            self._perfcounters.count("rule_tries", rule_tries)
+            before = time.time()
+            # In replication slave mode (when not took over), ignore all events
+            if not is_replication_slave(self._config) or self._slave_status["mode"] != "sync":
+                try:
+                    self.process_rule_hits(event,
+                                           ((rules[number], result) for number, result in hits))
+                except Exception as e:
+                    self._logger.exception('Exception handling a log line (skipping this one): %s' %
+                                           e)
+            elif self.settings.options.debug:
+                self._logger.info("Replication: we are in slave mode, ignoring event")
+            self._perfcounters.count_time("processing", processing_time + time.time() - before)
+
     # Processes incoming data, just a wrapper between the real data and the
     # handler function to record some statistics etc.
     def process_raw_data(self, handler):
@@ -1078,6 +1275,8 @@ class EventServer(ECServerThread):
                                 event["phase"] = "closed"
                                 self._history.add(event, "COUNTFAILED")
                                 events_to_delete.append(nr)
+                            else:
+                                self._event_status.update_event(event)
 
                     else:  # algorithm 'interval'
                         if event["first"] + count["period"] <= now:  # End of period reached
@@ -1096,6 +1295,7 @@ class EventServer(ECServerThread):
                     self._logger.info("Delayed event %d of rule %s is now activated." %
                                       (event["id"], event["rule_id"]))
                     event["phase"] = "open"
+                    self._event_status.update_event(event)
                     self._history.add(event, "DELAYOVER")
                     if rule:
                         event_has_opened(self._history, self.settings, self._config, self._logger,
@@ -1167,9 +1367,9 @@ class EventServer(ECServerThread):
                 # First look for case 1: rule that already have at least one hit
                 # and this events in the state "counting" exist.
                 events_to_delete = []
-                events = self._event_status.events()
+                events = self._event_status.events_of_rule(rule["id"])
                 for nr, event in enumerate(events):
-                    if event["rule_id"] == rule["id"] and event["phase"] == "counting":
+                    if event["phase"] == "counting":
                         # time has elapsed. Now lets see if we have reached
                         # the neccessary count:
                         if event["count"] < expected_count:  # no -> trigger alarm
@@ -1213,10 +1413,8 @@ class EventServer(ECServerThread):
             merge, reset_ack = merge
 
         if merge != "never":
-            for event in self._event_status.events():
-                if event["rule_id"] == rule["id"] and \
-                        (event["phase"] == "open" or
-                         (event["phase"] == "ack" and merge == "acked")):
+            for event in self._event_status.events_of_rule(rule["id"]):
+                if event["phase"] == "open" or (event["phase"] == "ack" and merge == "acked"):
                     merge_event = event
                     break
 
@@ -1235,6 +1433,7 @@ class EventServer(ECServerThread):
             # Better rewrite (again). Rule might have changed. Also we have changed
             # the text and the user might have his own text added via set_text.
             self.rewrite_event(rule, merge_event, {}, set_first=False)
+            self._event_status.update_event(merge_event)
             self._history.add(merge_event, "COUNTFAILED")
         else:
             # Create artifical event from scratch. Make sure that all important
@@ -1283,7 +1482,8 @@ class EventServer(ECServerThread):
         self._rules = []
         self._rule_by_id = {}
         # Speedup-Hash for rule execution
-        self._rule_hash: Dict[int, Dict[int, Any]] = {}
+        self._rule_hash = {}
+        self._rule_prefilter = RulePrefilter([])
         count_disabled = 0
         count_rules = 0
         count_unspecific = 0
@@ -1350,9 +1550,13 @@ class EventServer(ECServerThread):
         self._logger.info("Compiled %d active rules (ignoring %d disabled rules)" %
                           (count_rules, count_disabled))
         if self._config["rule_optimizer"]:
+            self._rule_prefilter = RulePrefilter(
+                rule for rule in self._rules if not rule.get("disabled"))
             self._logger.info(
                 "Rule hash: %d rules - %d hashed, %d unspecific" %
                 (len(self._rules), len(self._rules) - count_unspecific, count_unspecific))
+            self._logger.info("Rule prefilter: %d rules with required texts" %
+                              len(self._rule_prefilter))
             for facility in list(range(23)) + [31]:
                 if facility in self._rule_hash:
                     stats = []
@@ -1436,7 +1640,14 @@ class EventServer(ECServerThread):
 
     def process_event(self, event):
         self.do_translate_hostname(event)
-
+        self.process_rule_hits(
+            event,
+            rule_hits(self._logger, self._config, self._rule_prefilter,
+                      rule_candidates(self._config, self._rules, self._rule_hash, event), event,
+                      self.event_rule_matches))
+
+    def process_rule_hits(self, event, hits):
+        """Applies the rules matching an event, see rule_hits()"""
         # Log all incoming messages into a syslog-like text file if that is enabled
         if self._config["log_messages"]:
             self.log_message(event)
@@ -1444,122 +1655,105 @@ class EventServer(ECServerThread):
         # Rule optimizer
         if self._config["rule_optimizer"]:
             self._hash_stats[event["facility"]][event["priority"]] += 1
-            rule_candidates = self._rule_hash.get(event["facility"], {}).get(event["priority"], [])
-        else:
-            rule_candidates = self._rules
 
-        skip_pack = None
-        for rule in rule_candidates:
-            if skip_pack and rule["pack"] == skip_pack:
-                continue  # still in the rule pack that we want to skip
-            skip_pack = None  # new pack, reset skipping
+        for rule, (cancelling, match_groups) in hits:
+            self._perfcounters.count("rule_hits")
 
-            try:
-                result = self.event_rule_matches(rule, event)
-            except Exception as e:
-                self._logger.exception('  Exception during matching:\n%s' % e)
-                result = False
+            if self._config["debug_rules"]:
+                self._logger.info("  matching groups:\n%s" % pprint.pformat(match_groups))
 
-            if result:  # A tuple with (True/False, {match_info}).. O.o
-                self._perfcounters.count("rule_hits")
-                cancelling, match_groups = result
+            self._event_status.count_rule_match(rule["id"])
+            if self._config["log_rulehits"]:
+                self._logger.info("Rule '%s/%s' hit by message %s/%s - '%s'." %
+                                  (rule["pack"], rule["id"], SyslogFacility(event["facility"]),
+                                   SyslogPriority(event["priority"]), event["text"]))
 
-                if self._config["debug_rules"]:
-                    self._logger.info("  matching groups:\n%s" % pprint.pformat(match_groups))
+            if rule.get("drop"):
+                if rule["drop"] == "skip_pack":
+                    if self._config["debug_rules"]:
+                        self._logger.info("  skipping this rule pack (%s)" % rule["pack"])
+                    continue
+                self._perfcounters.count("drops")
+                return
 
-                self._event_status.count_rule_match(rule["id"])
-                if self._config["log_rulehits"]:
-                    self._logger.info("Rule '%s/%s' hit by message %s/%s - '%s'." %
-                                      (rule["pack"], rule["id"], SyslogFacility(event["facility"]),
-                                       SyslogPriority(event["priority"]), event["text"]))
+            if cancelling:
+                self._event_status.cancel_events(self, self._event_columns, event, match_groups,
+                                                 rule)
+                return
 
-                if rule.get("drop"):
-                    if rule["drop"] == "skip_pack":
-                        skip_pack = rule["pack"]
-                        if self._config["debug_rules"]:
-                            self._logger.info("  skipping this rule pack (%s)" % skip_pack)
-                        continue
-                    self._perfcounters.count("drops")
-                    return
-
-                if cancelling:
-                    self._event_status.cancel_events(self, self._event_columns, event, match_groups,
-                                                     rule)
-                    return
-
-                # Remember the rule id that this event originated from
-                event["rule_id"] = rule["id"]
-
-                # Attach optional contact group information for visibility
-                # and eventually for notifications
-                self._add_rule_contact_groups_to_event(rule, event)
-
-                # Store groups from matching this event. In order to make
-                # persistence easier, we do not safe them as list but join
-                # them on ASCII-1.
-                event["match_groups"] = match_groups.get("match_groups_message", ())
-                event["match_groups_syslog_application"] = match_groups.get(
-                    "match_groups_syslog_application", ())
-                self.rewrite_event(rule, event, match_groups)
-
-                # Lookup the monitoring core hosts and add the core host
-                # name to the event when one can be matched.
-                #
-                # Needs to be done AFTER event rewriting, because the rewriting
-                # may change the "host" field.
-                #
-                # For the moment we have no rule/condition matching on this
-                # field. So we only add the core host info for matched events.
-                self._add_core_host_to_new_event(event)
-
-                if "count" in rule:
-                    count = rule["count"]
-                    # Check if a matching event already exists that we need to
-                    # count up. If the count reaches the limit, the event will
-                    # be opened and its rule actions performed.
-                    existing_event = \
-                        self._event_status.count_event(self, event, rule, count)
-                    if existing_event:
-                        if "delay" in rule:
-                            if self._config["debug_rules"]:
-                                self._logger.info("Event opening will be delayed for %d seconds" %
-                                                  rule["delay"])
-                            existing_event["delay_until"] = time.time() + rule["delay"]
-                            existing_event["phase"] = "delayed"
-                        else:
-                            event_has_opened(self._history, self.settings, self._config,
-                                             self._logger, self, self._event_columns, rule,
-                                             existing_event)
+            # Remember the rule id that this event originated from
+            event["rule_id"] = rule["id"]
 
-                        self._history.add(existing_event, "COUNTREACHED")
+            # Attach optional contact group information for visibility
+            # and eventually for notifications
+            self._add_rule_contact_groups_to_event(rule, event)
 
-                        if "delay" not in rule and rule.get("autodelete"):
-                            existing_event["phase"] = "closed"
-                            self._history.add(existing_event, "AUTODELETE")
-                            with self._event_status.lock:
-                                self._event_status.remove_event(existing_event)
-                elif "expect" in rule:
-                    self._event_status.count_expected_event(self, event)
-                else:
+            # Store groups from matching this event. In order to make
+            # persistence easier, we do not safe them as list but join
+            # them on ASCII-1.
+            event["match_groups"] = match_groups.get("match_groups_message", ())
+            event["match_groups_syslog_application"] = match_groups.get(
+                "match_groups_syslog_application", ())
+            self.rewrite_event(rule, event, match_groups)
+
+            # Lookup the monitoring core hosts and add the core host
+            # name to the event when one can be matched.
+            #
+            # Needs to be done AFTER event rewriting, because the rewriting
+            # may change the "host" field.
+            #
+            # For the moment we have no rule/condition matching on this
+            # field. So we only add the core host info for matched events.
+            self._add_core_host_to_new_event(event)
+
+            if "count" in rule:
+                count = rule["count"]
+                # Check if a matching event already exists that we need to
+                # count up. If the count reaches the limit, the event will
+                # be opened and its rule actions performed.
+                existing_event = \
+                    self._event_status.count_event(self, event, rule, count)
+                if existing_event:
                     if "delay" in rule:
                         if self._config["debug_rules"]:
                             self._logger.info("Event opening will be delayed for %d seconds" %
                                               rule["delay"])
-                        event["delay_until"] = time.time() + rule["delay"]
-                        event["phase"] = "delayed"
+                        existing_event["delay_until"] = time.time() + rule["delay"]
+                        existing_event["phase"] = "delayed"
+                        self._event_status.update_event(existing_event)
                     else:
-                        event["phase"] = "open"
+                        event_has_opened(self._history, self.settings, self._config, self._logger,
+                                         self, self._event_columns, rule, existing_event)
 
-                    if self.new_event_respecting_limits(event):
-                        if event["phase"] == "open":
-                            event_has_opened(self._history, self.settings, self._config,
-                                             self._logger, self, self._event_columns, rule, event)
-                            if rule.get("autodelete"):
-                                event["phase"] = "closed"
-                                self._history.add(event, "AUTODELETE")
-                                with self._event_status.lock:
-                                    self._event_status.remove_event(event)
-                return
+                    self._history.add(existing_event, "COUNTREACHED")
+
+                    if "delay" not in rule and rule.get("autodelete"):
+                        existing_event["phase"] = "closed"
+                        self._history.add(existing_event, "AUTODELETE")
+                        with self._event_status.lock:
+                            self._event_status.remove_event(existing_event)
+            elif "expect" in rule:
+                self._event_status.count_expected_event(self, event)
+            else:
+                if "delay" in rule:
+                    if self._config["debug_rules"]:
+                        self._logger.info("Event opening will be delayed for %d seconds" %
+                                          rule["delay"])
+                    event["delay_until"] = time.time() + rule["delay"]
+                    event["phase"] = "delayed"
+                else:
+                    event["phase"] = "open"
+
+                if self.new_event_respecting_limits(event):
+                    if event["phase"] == "open":
+                        event_has_opened(self._history, self.settings, self._config, self._logger,
+                                         self, self._event_columns, rule, event)
+                        if rule.get("autodelete"):
+                            event["phase"] = "closed"
+                            self._history.add(event, "AUTODELETE")
+                            with self._event_status.lock:
+                                self._event_status.remove_event(event)
+            return
 
         # End of loop over rules.
         if self._config["archive_orphans"]:
@@ -1615,20 +1809,7 @@ class EventServer(ECServerThread):
     def event_rule_matches(self, rule, event):
         self._perfcounters.count("rule_tries")
         with self._lock_configuration:
-            result = self._rule_matcher.event_rule_matches_non_inverted(rule, event)
-            if rule.get("invert_matching"):
-                if result is False:
-                    result = False, {}
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would not match, but due to inverted matching does.")
-                else:
-                    result = False
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would match, but due to inverted matching does not.")
-
-            return result
+            return self._rule_matcher.event_rule_matches(rule, event)
 
     # Rewrite texts and compute other fields in the event
     def rewrite_event(self, rule, event, groups, set_first=True):
@@ -1675,54 +1856,10 @@ class EventServer(ECServerThread):
     # There is still no common library. Please keep this in sync with the
     # original code
     def translate_hostname(self, backedhost):
-        translation = self._config["hostname_translation"]
-
-        # Here comes the original code from modules/check_mk_base.py
-        if translation:
-            # 1. Case conversion
-            caseconf = translation.get("case")
-            if caseconf == "upper":
-                backedhost = backedhost.upper()
-            elif caseconf == "lower":
-                backedhost = backedhost.lower()
-
-            # 2. Drop domain part (not applied to IP addresses!)
-            if translation.get("drop_domain") and backedhost:
-                # only apply if first part does not convert successfully into an int
-                firstpart = backedhost.split(".", 1)[0]
-                try:
-                    int(firstpart)
-                except Exception:
-                    backedhost = firstpart
-
-            # 3. Regular expression conversion
-            if "regex" in translation:
-                for regex, subst in translation["regex"]:
-                    if not regex.endswith('$'):
-                        regex += '$'
-                    rcomp = cmk.utils.regex.regex(regex)
-                    mo = rcomp.match(backedhost)
-                    if mo:
-                        backedhost = subst
-                        for nr, text in enumerate(mo.groups()):
-                            backedhost = backedhost.replace("\\%d" % (nr + 1), text)
-                        break
-
-            # 4. Explicity mapping
-            for from_host, to_host in translation.get("mapping", []):
-                if from_host == backedhost:
-                    backedhost = to_host
-                    break
-
-        return backedhost
+        return translate_hostname(self._config["hostname_translation"], backedhost)
 
     def do_translate_hostname(self, event):
-        try:
-            event["host"] = self.translate_hostname(event["host"])
-        except Exception as e:
-            if self._config["debug_rules"]:
-                self._logger.exception('Unable to parse host "%s" (%s)' % (event.get("host"), e))
-            event["host"] = ""
+        translate_event_host(self._logger, self._config, event)
 
     def log_message(self, event):
         try:
@@ -2240,6 +2377,19 @@ class RuleMatcher:
     def _debug_rules(self):
         return self._config["debug_rules"]
 
+    def event_rule_matches(self, rule, event):
+        result = self.event_rule_matches_non_inverted(rule, event)
+        if rule.get("invert_matching"):
+            if result is False:
+                result = False, {}
+                if self._debug_rules:
+                    self._logger.info("  Rule would not match, but due to inverted matching does.")
+            else:
+                result = False
+                if self._debug_rules:
+                    self._logger.info("  Rule would match, but due to inverted matching does not.")
+        return result
+
     def event_rule_matches_non_inverted(self, rule, event):
         if self._debug_rules:
             self._logger.info("Trying rule %s/%s..." % (rule["pack"], rule["id"]))
@@ -2455,6 +2605,192 @@ class RuleMatcher:
         return True
 
 
+def translate_hostname(translation: Dict[str, Any], backedhost: str) -> str:
+    # Here comes the original code from modules/check_mk_base.py
+    if translation:
+        # 1. Case conversion
+        caseconf = translation.get("case")
+        if caseconf == "upper":
+            backedhost = backedhost.upper()
+        elif caseconf == "lower":
+            backedhost = backedhost.lower()
+
+        # 2. Drop domain part (not applied to IP addresses!)
+        if translation.get("drop_domain") and backedhost:
+            # only apply if first part does not convert successfully into an int
+            firstpart = backedhost.split(".", 1)[0]
+            try:
+                int(firstpart)
+            except Exception:
+                backedhost = firstpart
+
+        # 3. Regular expression conversion
+        if "regex" in translation:
+            for regex, subst in translation["regex"]:
+                if not regex.endswith('$'):
+                    regex += '$'
+                rcomp = cmk.utils.regex.regex(regex)
+                mo = rcomp.match(backedhost)
+                if mo:
+                    backedhost = subst
+                    for nr, text in enumerate(mo.groups()):
+                        backedhost = backedhost.replace("\\%d" % (nr + 1), text)
+                    break
+
+        # 4. Explicity mapping
+        for from_host, to_host in translation.get("mapping", []):
+            if from_host == backedhost:
+                backedhost = to_host
+                break
+
+    return backedhost
+
+
+def translate_event_host(logger: Logger, config: Dict[str, Any], event: Dict[str, Any]) -> None:
+    try:
+        event["host"] = translate_hostname(config["hostname_translation"], event["host"])
+    except Exception as e:
+        if config["debug_rules"]:
+            logger.exception('Unable to parse host "%s" (%s)' % (event.get("host"), e))
+        event["host"] = ""
+
+
+def rule_candidates(
+    config: Dict[str, Any],
+    rules: List[Dict[str, Any]],
+    rule_hash: Dict[int, Dict[int, Any]],
+    event: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """The rules to try for an event, in their order"""
+    if config["rule_optimizer"]:
+        return rule_hash.get(event["facility"], {}).get(event["priority"], [])
+    return rules
+
+
+def rule_hits(
+    logger: Logger,
+    config: Dict[str, Any],
+    rule_prefilter: RulePrefilter,
+    rules: Iterable[Dict[str, Any]],
+    event: Dict[str, Any],
+    rule_matches: Callable[[Dict[str, Any], Dict[str, Any]], Any],
+) -> Iterator[Tuple[Dict[str, Any], Tuple[bool, Dict[str, Any]]]]:
+    """Yields the rules matching an event together with the outcome of the matching
+
+    A hit of a rule dropping the rest of its rule pack continues with the next
+    rule pack. Every other hit decides about the event and ends the iteration.
+    The hits only depend on the event and the rules, not on the open events.
+    """
+    skip_pack = None
+    for rule, may_match in rule_prefilter.filter(rules, event):
+        if skip_pack and rule["pack"] == skip_pack:
+            continue  # still in the rule pack that we want to skip
+        skip_pack = None  # new pack, reset skipping
+
+        if not may_match:
+            if config["debug_rules"]:
+                logger.info("Skipping rule %s/%s, the event lacks its required texts" %
+                            (rule["pack"], rule["id"]))
+            continue
+
+        try:
+            result = rule_matches(rule, event)
+        except Exception as e:
+            logger.exception('  Exception during matching:\n%s' % e)
+            result = False
+
+        if not result:
+            continue
+
+        yield rule, result
+
+        if rule.get("drop") != "skip_pack":
+            return
+        skip_pack = rule["pack"]
+
+
+class EventWorker:
+    """Creates the events of incoming messages and finds the rules matching them
+
+    This is the part of the event processing which does not need the open events,
+    so it can be done in worker processes, see EventServer._process_queue().
+    """
+    def __init__(self, logger: Logger, config: Dict[str, Any], rules: List[Dict[str, Any]],
+                 rule_hash: Dict[int, Dict[int, Any]]) -> None:
+        super().__init__()
+        self._logger = logger
+        self._config = config
+        self._rules = rules
+        self._rule_hash = rule_hash
+        self._rule_numbers = {id(rule): number for number, rule in enumerate(rules)}
+        self._rule_prefilter = RulePrefilter(
+            rule for rule in rules
+            if not rule.get("disabled")) if config["rule_optimizer"] else RulePrefilter([])
+        self._event_creator = EventCreator(logger, config)
+        self._rule_matcher = RuleMatcher(logger, config)
+        self._rule_tries = 0
+
+    def process(self, messages: Iterable[QueuedMessage]) -> List[MatchedEvent]:
+        matched_events: List[MatchedEvent] = []
+        for kind, data, address in messages:
+            if kind == "event":
+                matched_events.append(self._match_event(data, time.time()))
+                continue
+
+            for line_bytes in data.splitlines():
+                line = scrub_and_decode(line_bytes.rstrip())
+                if line:
+                    try:
+                        matched_events.append(self._process_line(line, address))
+                    except Exception as e:
+                        self._logger.exception(
+                            'Exception handling a log line (skipping this one): %s' % e)
+        return matched_events
+
+    def _process_line(self, line: str, address: Any) -> MatchedEvent:
+        before = time.time()
+        if self._config["debug_rules"]:
+            if address:
+                self._logger.info(u"Processing message from %r: '%s'" % (address, line))
+            else:
+                self._logger.info(u"Processing message '%s'" % line)
+        return self._match_event(self._event_creator.create_event_from_line(line, address), before)
+
+    def _match_event(self, event: Dict[str, Any], before: float) -> MatchedEvent:
+        self._rule_tries = 0
+        translate_event_host(self._logger, self._config, event)
+        hits = [(self._rule_numbers[id(rule)], result) for rule, result in rule_hits(
+            self._logger, self._config, self._rule_prefilter,
+            rule_candidates(self._config, self._rules, self._rule_hash, event), event,
+            self._event_rule_matches)]
+        return event, hits, self._rule_tries, time.time() - before
+
+    def _event_rule_matches(self, rule: Dict[str, Any], event: Dict[str, Any]) -> Any:
+        self._rule_tries += 1
+        return self._rule_matcher.event_rule_matches(rule, event)
+
+
+# The EventWorker of a worker process
+_event_worker: Optional[EventWorker] = None
+
+
+def _init_event_worker(log_file: Optional[str], log_level: int, config: Dict[str, Any],
+                       rules: List[Dict[str, Any]], rule_hash: Dict[int, Dict[int, Any]]) -> None:
+    global _event_worker
+    if log_file is None:
+        log.setup_logging_handler(sys.stderr)
+    else:
+        log.open_log(log_file)
+    logger = getLogger("cmk.mkeventd.EventServer")
+    logger.setLevel(log_level)
+    _event_worker = EventWorker(logger, config, rules, rule_hash)
+
+
+def _process_in_event_worker(messages: List[QueuedMessage]) -> List[MatchedEvent]:
+    assert _event_worker is not None
+    return _event_worker.process(messages)
+
+
 #.
 #   .--Status Queries------------------------------------------------------.
 #   |  ____  _        _                ___                  _              |
@@ -2610,12 +2946,10 @@ class StatusTableEvents(StatusTable):
         self._event_status = event_status
 
     def _enumerate(self, query: QueryGET) -> Iterable[List[Any]]:
-        for event in self._event_status.get_events():
-            # Optimize filters that are set by the check_mkevents active check. Since users
-            # may have a lot of those checks running, it is a good idea to optimize this.
-            if query.only_host and not filter_operator_in(event["host"], query.only_host):
-                continue
-
+        # Optimize filters that are set by the check_mkevents active check and the GUI.
+        # Since users may have a lot of those checks running, it is a good idea to
+        # optimize this. The filters are applied to the rows afterwards.
+        for event in self._event_status.select_events(query.filters):
             row = []
             for column_name in self.column_names:
                 try:
@@ -2968,6 +3302,7 @@ class StatusServer(ECServerThread):
             event["contact"] = contact
         if user:
             event["owner"] = user
+        self._event_status.update_event(event)
         self._history.add(event, "UPDATE", user)
 
     def handle_command_create(self, arguments: List[str]) -> None:
@@ -2987,6 +3322,7 @@ class StatusServer(ECServerThread):
         event["state"] = int(newstate)
         if user:
             event["owner"] = user
+        self._event_status.update_event(event)
         self._history.add(event, "CHANGESTATE", user)
 
     def handle_command_reload(self) -> None:
@@ -3028,6 +3364,7 @@ class StatusServer(ECServerThread):
         event = self._event_status.event(int(event_id))
         if user:
             event["owner"] = user
+            self._event_status.update_event(event)
 
         if action_id == "@NOTIFY":
             do_notify(self._event_server, self._logger, event, user, is_cancelling=False)
@@ -3158,6 +3495,10 @@ def run_eventd(terminate_main_event: Any, settings: Settings, config: Dict[str,
 #   | durch ein Lock vor gleichzeitigen Zugriffen durch die Threads.       |
 #   '----------------------------------------------------------------------'
 
+# The journal is compacted into a new snapshot when it gets larger than half
+# of the snapshot, but not before it reaches this size
+MIN_JOURNAL_SIZE = 1024 * 1024
+
 
 class EventStatus:
     def __init__(self, settings: Settings, config: Dict[str, Any], perfcounters: Perfcounters,
@@ -3168,6 +3509,7 @@ class EventStatus:
         self.lock = threading.Lock()
         self._history = history
         self._logger = logger
+        self._journal_generation = 0
         self.flush()
 
     def reload_configuration(self, config: Dict[str, Any]) -> None:
@@ -3175,12 +3517,14 @@ class EventStatus:
 
     def flush(self) -> None:
         # TODO: Improve types!
-        self._events: List[Any] = []
+        # The open events by their ID, the oldest first
+        self._events: Dict[int, Any] = {}
         self._next_event_id = 1
         self._rule_stats: Dict[str, int] = {}
         # needed for expecting rules
         self._interval_starts: Dict[str, int] = {}
         self._initialize_event_limit_status()
+        self._reset_journal()
 
         # TODO: might introduce some performance counters, like:
         # - number of received messages
@@ -3189,12 +3533,13 @@ class EventStatus:
 
     def events(self) -> List[Any]:
         # TODO: Improve type!
-        return self._events
+        return list(self._events.values())
 
     def event(self, eid):
-        for event in self._events:
-            if event["id"] == eid:
-                return event
+        return self._events.get(eid)
+
+    def events_of_rule(self, rule_id: Optional[str]) -> List[Any]:
+        return list(self._events_by_rule.get(rule_id, {}).values())
 
     # Return beginning of current expectation interval. For new rules
     # we start with the next interval in future.
@@ -3202,6 +3547,7 @@ class EventStatus:
         if rule_id not in self._interval_starts:
             start = self.next_interval_start(interval, time.time())
             self._interval_starts[rule_id] = start
+            self._changed_interval_starts.add(rule_id)
             return start
         start = self._interval_starts[rule_id]
         # Make sure that if the user switches from day to hour and we
@@ -3211,6 +3557,7 @@ class EventStatus:
         if start > next_interval:
             start = next_interval
             self._interval_starts[rule_id] = start
+            self._changed_interval_starts.add(rule_id)
         return start
 
     def next_interval_start(self, interval, previous_start):
@@ -3231,43 +3578,150 @@ class EventStatus:
         current_start = self.interval_start(rule_id, interval)
         next_start = self.next_interval_start(interval, current_start)
         self._interval_starts[rule_id] = next_start
+        self._changed_interval_starts.add(rule_id)
         self._logger.debug("Rule %s: next interval starts %s (i.e. now + %.2f sec)" %
                            (rule_id, next_start, time.time() - next_start))
 
     def pack_status(self):
         return {
             "next_event_id": self._next_event_id,
-            "events": self._events,
+            "events": list(self._events.values()),
             "rule_stats": self._rule_stats,
             "interval_starts": self._interval_starts,
         }
 
     def unpack_status(self, status):
         self._next_event_id = status["next_event_id"]
-        self._events = status["events"]
+        self._events = {event["id"]: event for event in status["events"]}
         self._rule_stats = status["rule_stats"]
         self._interval_starts = status["interval_starts"]
+        self._initialize_event_limit_status()
+        self._snapshot_needed = True
+
+    # The state is saved as a full snapshot in the status file. In journal mode
+    # the changes since the last snapshot are appended to the status journal,
+    # one line per save, until the journal gets too large compared to the
+    # snapshot. The journal entries belong to the snapshot with the same
+    # generation, older entries are ignored when loading.
+    def _reset_journal(self):
+        self._snapshot_size = 0
+        self._journal_size = 0
+        self._snapshot_needed = True
+        self._clear_changes()
+
+    def _clear_changes(self):
+        self._changed_event_ids: Set[int] = set()
+        self._deleted_event_ids: Set[int] = set()
+        self._changed_rule_stats: Set[str] = set()
+        self._changed_interval_starts: Set[str] = set()
 
     def save_status(self):
+        if self._snapshot_needed or not self._config["status_journal"] or \
+           self._journal_size > max(self._snapshot_size // 2, MIN_JOURNAL_SIZE):
+            self._save_snapshot()
+        else:
+            self._append_to_journal()
+
+    def _save_snapshot(self):
         now = time.time()
+        self._journal_generation += 1
         status = self.pack_status()
+        status["journal_generation"] = self._journal_generation
         path = self.settings.paths.status_file.value
         path_new = path.parent / (path.name + '.new')
         # Believe it or not: cPickle is more than two times slower than repr()
+        data = (repr(status) + "\n").encode("utf-8")
         with path_new.open(mode='wb') as f:
-            f.write((repr(status) + "\n").encode("utf-8"))
+            f.write(data)
             f.flush()
             os.fsync(f.fileno())
         path_new.rename(path)
+        # The journal belongs to the previous generation now
+        try:
+            self.settings.paths.status_journal_file.value.unlink()
+        except FileNotFoundError:
+            pass
+        self._snapshot_size = len(data)
+        self._journal_size = 0
+        self._snapshot_needed = False
+        self._clear_changes()
         elapsed = time.time() - now
         self._logger.log(VERBOSE, "Saved event state to %s in %.3fms.", path, elapsed * 1000)
 
+    def _append_to_journal(self):
+        now = time.time()
+        events = [
+            self._events[event_id]
+            for event_id in sorted(self._changed_event_ids)
+            if event_id in self._events
+        ]
+        entry = {
+            "generation": self._journal_generation,
+            "next_event_id": self._next_event_id,
+            "events": events,
+            "deleted_events": sorted(self._deleted_event_ids),
+            "rule_stats": {
+                rule_id: self._rule_stats.get(rule_id) for rule_id in self._changed_rule_stats
+            },
+            "interval_starts": {
+                rule_id: self._interval_starts[rule_id] for rule_id in self._changed_interval_starts
+            },
+        }
+        path = self.settings.paths.status_journal_file.value
+        data = (repr(entry) + "\n").encode("utf-8")
+        with path.open(mode='ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_size += len(data)
+        self._clear_changes()
+        elapsed = time.time() - now
+        self._logger.log(VERBOSE, "Saved %d changed events to %s in %.3fms.", len(events), path,
+                         elapsed * 1000)
+
+    def _replay_journal(self):
+        path = self.settings.paths.status_journal_file.value
+        try:
+            lines = path.read_bytes().split(b"\n")
+        except FileNotFoundError:
+            return
+
+        num_entries = 0
+        for line in lines:
+            if not line:
+                continue
+            try:
+                entry = ast.literal_eval(line.decode("utf-8"))
+            except (SyntaxError, ValueError, UnicodeDecodeError):
+                # Only the last entry can be incomplete, e.g. after a crash
+                self._logger.warning("Ignoring incomplete entry of %s" % path)
+                break
+            if entry["generation"] != self._journal_generation:
+                continue
+
+            self._next_event_id = entry["next_event_id"]
+            for event in entry["events"]:
+                self._events[event["id"]] = event
+            for event_id in entry["deleted_events"]:
+                self._events.pop(event_id, None)
+            for rule_id, count in entry["rule_stats"].items():
+                if count is None:
+                    self._rule_stats.pop(rule_id, None)
+                else:
+                    self._rule_stats[rule_id] = count
+            self._interval_starts.update(entry["interval_starts"])
+            num_entries += 1
+
+        self._logger.info("Replayed %d entries of %s." % (num_entries, path))
+
     def reset_counters(self, rule_id):
         if rule_id:
             if rule_id in self._rule_stats:
                 del self._rule_stats[rule_id]
+                self._changed_rule_stats.add(rule_id)
         else:
             self._rule_stats = {}
+            self._snapshot_needed = True
         self.save_status()
 
     def load_status(self, event_server):
@@ -3276,16 +3730,18 @@ class EventStatus:
             try:
                 status = ast.literal_eval(path.read_text(encoding="utf-8"))
                 self._next_event_id = status["next_event_id"]
-                self._events = status["events"]
+                self._events = {event["id"]: event for event in status["events"]}
                 self._rule_stats = status["rule_stats"]
                 self._interval_starts = status.get("interval_starts", {})
+                self._journal_generation = status.get("journal_generation", 0)
                 self._logger.info("Loaded event state from %s." % path)
+                self._replay_journal()
             except Exception as e:
                 self._logger.exception("Error loading event state from %s: %s" % (path, e))
                 raise
 
         # Add new columns
-        for event in self._events:
+        for event in self._events.values():
             event.setdefault("ipaddress", "")
 
             if "core_host" not in event:
@@ -3294,44 +3750,155 @@ class EventStatus:
 
         # core_host is needed to initialize the status
         self._initialize_event_limit_status()
+        self._snapshot_needed = True
 
     # Called on Event Console initialization from status file to initialize
     # the current event limit state -> Sets internal counters which are
-    # updated during runtime.
+    # updated during runtime. Also builds the indexes of the events.
     def _initialize_event_limit_status(self):
         self.num_existing_events = len(self._events)
 
         self.num_existing_events_by_host = {}
         self.num_existing_events_by_rule = {}
-        for event in self._events:
+        # The events by rule ID, by host and core host and by phase. Like in
+        # self._events, the events of a rule are ordered by their ID.
+        self._events_by_rule: Dict[Any, Dict[int, Any]] = {}
+        self._events_by_host: Dict[Tuple[str, str], Dict[int, Any]] = {}
+        self._events_by_phase: Dict[str, Dict[int, Any]] = {}
+        # The keys of the indexes of each event
+        self._index_keys: Dict[int, Tuple[Any, Tuple[str, str], str]] = {}
+        for event in self._events.values():
             self._count_event_add(event)
 
     def _count_event_add(self, event):
-        host_key = (event["host"], event["core_host"])
+        rule_id, host_key, _phase = self._index_event(event)
         if host_key not in self.num_existing_events_by_host:
             self.num_existing_events_by_host[host_key] = 1
         else:
             self.num_existing_events_by_host[host_key] += 1
 
-        if event["rule_id"] not in self.num_existing_events_by_rule:
-            self.num_existing_events_by_rule[event["rule_id"]] = 1
+        if rule_id not in self.num_existing_events_by_rule:
+            self.num_existing_events_by_rule[rule_id] = 1
         else:
-            self.num_existing_events_by_rule[event["rule_id"]] += 1
+            self.num_existing_events_by_rule[rule_id] += 1
 
     def _count_event_remove(self, event):
-        host_key = (event["host"], event["core_host"])
+        rule_id, host_key, _phase = self._unindex_event(event)
 
         self.num_existing_events -= 1
         self.num_existing_events_by_host[host_key] -= 1
-        self.num_existing_events_by_rule[event["rule_id"]] -= 1
+        self.num_existing_events_by_rule[rule_id] -= 1
+
+    def _index_event(self, event):
+        rule_id = event["rule_id"]
+        host_key = (event["host"], event["core_host"])
+        phase = event.get("phase", "")
+        self._index_keys[event["id"]] = (rule_id, host_key, phase)
+        self._events_by_rule.setdefault(rule_id, {})[event["id"]] = event
+        self._events_by_host.setdefault(host_key, {})[event["id"]] = event
+        self._events_by_phase.setdefault(phase, {})[event["id"]] = event
+        return rule_id, host_key, phase
+
+    def _unindex_event(self, event):
+        rule_id, host_key, phase = self._index_keys.pop(event["id"])
+        _remove_from_index(self._events_by_rule, rule_id, event["id"])
+        _remove_from_index(self._events_by_host, host_key, event["id"])
+        _remove_from_index(self._events_by_phase, phase, event["id"])
+        return rule_id, host_key, phase
+
+    def update_event(self, event):
+        """Needs to be called after an open event has been changed"""
+        if event["id"] not in self._index_keys:
+            return
+        self._changed_event_ids.add(event["id"])
+        rule_id, old_host_key, old_phase = self._index_keys[event["id"]]
+        host_key = (event["host"], event["core_host"])
+        phase = event.get("phase", "")
+        if host_key != old_host_key:
+            _remove_from_index(self._events_by_host, old_host_key, event["id"])
+            self._events_by_host.setdefault(host_key, {})[event["id"]] = event
+            self.num_existing_events_by_host[old_host_key] -= 1
+            self.num_existing_events_by_host[host_key] = \
+                self.num_existing_events_by_host.get(host_key, 0) + 1
+        if phase != old_phase:
+            _remove_from_index(self._events_by_phase, old_phase, event["id"])
+            self._events_by_phase.setdefault(phase, {})[event["id"]] = event
+        self._index_keys[event["id"]] = (rule_id, host_key, phase)
+
+    # protected by self.lock
+    def select_events(self, filters: Iterable[Tuple[str, str, Any, Any]]) -> List[Any]:
+        """The events that may match the filters of a query, the oldest first
+
+        Filters on the ID, rule, host, core host and phase are looked up in the
+        indexes. The other filters are ignored, the caller has to apply all of
+        them to the returned events.
+        """
+        candidates: Optional[Dict[int, Any]] = None
+        for column_name, operator_name, _predicate, argument in filters:
+            matching = self._indexed_events(column_name, operator_name, argument)
+            if matching is None:
+                continue
+            if candidates is None:
+                candidates = matching
+            else:
+                if len(matching) < len(candidates):
+                    candidates, matching = matching, candidates
+                candidates = {
+                    event_id: event
+                    for event_id, event in candidates.items()
+                    if event_id in matching
+                }
+
+        if candidates is None:
+            return list(self._events.values())
+        return [candidates[event_id] for event_id in sorted(candidates)]
+
+    def _indexed_events(self, column_name: str, operator_name: str,
+                        argument: Any) -> Optional[Dict[int, Any]]:
+        if operator_name not in ("=", "=~", "in"):
+            return None
+        values = argument if operator_name == "in" else [argument]
+
+        if column_name == "event_id":
+            if operator_name == "=~":
+                return None
+            return {
+                event_id: self._events[event_id] for event_id in values if event_id in self._events
+            }
+
+        indexes: Dict[str, Tuple[Dict[Any, Dict[int, Any]], Callable[[Any], Any]]] = {
+            "event_rule_id": (self._events_by_rule, lambda key: key),
+            "event_host": (self._events_by_host, lambda key: key[0]),
+            "event_core_host": (self._events_by_host, lambda key: key[1]),
+            "event_phase": (self._events_by_phase, lambda key: key),
+        }
+        if column_name not in indexes:
+            return None
+        index, column_of_key = indexes[column_name]
+
+        # See the filter operators of cmk.ec.query
+        if operator_name == "=":
+            keys = [key for key in index if column_of_key(key) == argument]
+        else:
+            lower_values = {value.lower() for value in values}
+            keys = [
+                key for key in index if isinstance(column_of_key(key), str) and
+                column_of_key(key).lower() in lower_values
+            ]
+
+        matching: Dict[int, Any] = {}
+        for key in keys:
+            matching.update(index[key])
+        return matching
 
     def new_event(self, event):
         self._perfcounters.count("events")
         event["id"] = self._next_event_id
         self._next_event_id += 1
-        self._events.append(event)
+        self._events[event["id"]] = event
         self.num_existing_events += 1
         self._count_event_add(event)
+        self._changed_event_ids.add(event["id"])
         self._history.add(event, "NEW")
 
     def archive_event(self, event):
@@ -3343,21 +3910,18 @@ class EventStatus:
 
     def remove_event(self, event):
         try:
-            self._events.remove(event)
+            del self._events[event["id"]]
             self._count_event_remove(event)
-        except ValueError:
+            self._changed_event_ids.discard(event["id"])
+            self._deleted_event_ids.add(event["id"])
+        except KeyError:
             self._logger.exception("Cannot remove event %d: not present" % event["id"])
 
-    # protected by self.lock
-    def _remove_event_by_nr(self, index):
-        event = self._events.pop(index)
-        self._count_event_remove(event)
-
     # protected by self.lock
     def remove_oldest_event(self, ty, event):
         if ty == "overall":
             self._logger.log(VERBOSE, "  Removing oldest event")
-            self._remove_event_by_nr(0)
+            self.remove_event(next(iter(self._events.values())))
         elif ty == "by_rule":
             self._logger.log(VERBOSE, "  Removing oldest event of rule \"%s\"", event["rule_id"])
             self._remove_oldest_event_of_rule(event["rule_id"])
@@ -3367,17 +3931,19 @@ class EventStatus:
 
     # protected by self.lock
     def _remove_oldest_event_of_rule(self, rule_id):
-        for event in self._events:
-            if event["rule_id"] == rule_id:
-                self.remove_event(event)
-                return
+        events = self.events_of_rule(rule_id)
+        if events:
+            self.remove_event(events[0])
 
     # protected by self.lock
     def _remove_oldest_event_of_host(self, hostname):
-        for event in self._events:
-            if event["host"] == hostname:
-                self.remove_event(event)
-                return
+        event_ids = [
+            min(events)
+            for (host, _core_host), events in self._events_by_host.items()
+            if host == hostname
+        ]
+        if event_ids:
+            self.remove_event(self._events[min(event_ids)])
 
     # protected by self.lock
     def get_num_existing_events_by(self, ty, event):
@@ -3394,47 +3960,46 @@ class EventStatus:
     def cancel_events(self, event_server, event_columns, new_event, match_groups, rule):
         with self.lock:
             to_delete = []
-            for nr, event in enumerate(self._events):
-                if event["rule_id"] == rule["id"]:
-                    if self.cancelling_match(match_groups, new_event, event, rule):
-                        # Fill a few fields of the cancelled event with data from
-                        # the cancelling event so that action scripts have useful
-                        # values and the logfile entry if more relevant.
-                        previous_phase = event["phase"]
-                        event["phase"] = "closed"
-                        # TODO: Why do we use OK below and not new_event["state"]???
-                        event["state"] = 0  # OK
-                        event["text"] = new_event["text"]
-                        # TODO: This is a hack and partial copy-n-paste from rewrite_events...
-                        if "set_text" in rule:
-                            event["text"] = replace_groups(rule["set_text"], event["text"],
-                                                           match_groups)
-                        event["time"] = new_event["time"]
-                        event["last"] = new_event["time"]
-                        event["priority"] = new_event["priority"]
-                        self._history.add(event, "CANCELLED")
-                        actions = rule.get("cancel_actions", [])
-                        if actions:
-                            if previous_phase != "open" \
-                               and rule.get("cancel_action_phases", "always") == "open":
-                                self._logger.info(
-                                    "Do not execute cancelling actions, event %s's phase "
-                                    "is not 'open' but '%s'" % (event["id"], previous_phase))
-                            else:
-                                do_event_actions(self._history,
-                                                 self.settings,
-                                                 self._config,
-                                                 self._logger,
-                                                 event_server,
-                                                 event_columns,
-                                                 actions,
-                                                 event,
-                                                 is_cancelling=True)
-
-                        to_delete.append(nr)
-
-            for nr in to_delete[::-1]:
-                self._remove_event_by_nr(nr)
+            for event in self.events_of_rule(rule["id"]):
+                if self.cancelling_match(match_groups, new_event, event, rule):
+                    # Fill a few fields of the cancelled event with data from
+                    # the cancelling event so that action scripts have useful
+                    # values and the logfile entry if more relevant.
+                    previous_phase = event["phase"]
+                    event["phase"] = "closed"
+                    # TODO: Why do we use OK below and not new_event["state"]???
+                    event["state"] = 0  # OK
+                    event["text"] = new_event["text"]
+                    # TODO: This is a hack and partial copy-n-paste from rewrite_events...
+                    if "set_text" in rule:
+                        event["text"] = replace_groups(rule["set_text"], event["text"],
+                                                       match_groups)
+                    event["time"] = new_event["time"]
+                    event["last"] = new_event["time"]
+                    event["priority"] = new_event["priority"]
+                    self._history.add(event, "CANCELLED")
+                    actions = rule.get("cancel_actions", [])
+                    if actions:
+                        if previous_phase != "open" \
+                           and rule.get("cancel_action_phases", "always") == "open":
+                            self._logger.info("Do not execute cancelling actions, event %s's phase "
+                                              "is not 'open' but '%s'" %
+                                              (event["id"], previous_phase))
+                        else:
+                            do_event_actions(self._history,
+                                             self.settings,
+                                             self._config,
+                                             self._logger,
+                                             event_server,
+                                             event_columns,
+                                             actions,
+                                             event,
+                                             is_cancelling=True)
+
+                    to_delete.append(event)
+
+            for event in to_delete:
+                self.remove_event(event)
 
     def cancelling_match(self, match_groups, new_event, event, rule):
         debug = self._config["debug_rules"]
@@ -3511,6 +4076,7 @@ class EventStatus:
         with self.lock:
             self._rule_stats.setdefault(rule_id, 0)
             self._rule_stats[rule_id] += 1
+            self._changed_rule_stats.add(rule_id)
 
     def count_event_up(self, found, event):
         # Update event with new information from new occurrance,
@@ -3529,10 +4095,11 @@ class EventStatus:
                 preserve["contact"] = found["contact"]
         found.update(event)
         found.update(preserve)
+        self.update_event(found)
 
     def count_expected_event(self, event_server, event):
-        for ev in self._events:
-            if ev["rule_id"] == event["rule_id"] and ev["phase"] == "counting":
+        for ev in self.events_of_rule(event["rule_id"]):
+            if ev["phase"] == "counting":
                 self.count_event_up(ev, event)
                 return
 
@@ -3547,31 +4114,30 @@ class EventStatus:
         # we do never modify events that are already in the state "open"
         # since the event has been created because the count was too
         # low in the specified period of time.
-        for ev in self._events:
-            if ev["rule_id"] == event["rule_id"]:
-                if ev["phase"] == "ack" and not count["count_ack"]:
-                    continue  # skip acknowledged events
+        for ev in self.events_of_rule(event["rule_id"]):
+            if ev["phase"] == "ack" and not count["count_ack"]:
+                continue  # skip acknowledged events
 
-                if count["separate_host"] and ev["host"] != event["host"]:
-                    continue  # treat events with separated hosts separately
+            if count["separate_host"] and ev["host"] != event["host"]:
+                continue  # treat events with separated hosts separately
 
-                if count["separate_application"] and ev["application"] != event["application"]:
-                    continue  # same for application
+            if count["separate_application"] and ev["application"] != event["application"]:
+                continue  # same for application
 
-                if count["separate_match_groups"] and ev["match_groups"] != event["match_groups"]:
-                    continue
+            if count["separate_match_groups"] and ev["match_groups"] != event["match_groups"]:
+                continue
 
-                if count.get("count_duration"
-                            ) is not None and ev["first"] + count["count_duration"] < event["time"]:
-                    # Counting has been discontinued on this event after a certain time
-                    continue
+            if count.get("count_duration"
+                        ) is not None and ev["first"] + count["count_duration"] < event["time"]:
+                # Counting has been discontinued on this event after a certain time
+                continue
 
-                if ev["host_in_downtime"] != event["host_in_downtime"]:
-                    continue  # treat events with different downtime states separately
+            if ev["host_in_downtime"] != event["host_in_downtime"]:
+                continue  # treat events with different downtime states separately
 
-                found = ev
-                self.count_event_up(found, event)
-                break
+            found = ev
+            self.count_event_up(found, event)
+            break
         else:
             event["count"] = 1
             event["phase"] = "counting"
@@ -3581,28 +4147,32 @@ class EventStatus:
         # Did we just count the event that was just one too much?
         if found["phase"] == "counting" and found["count"] >= count["count"]:
             found["phase"] = "open"
+            self.update_event(found)
             return found  # do event action, return found copy of event
         return False  # do not do event action
 
     # locked with self.lock
     def delete_event(self, event_id, user):
-        for nr, event in enumerate(self._events):
-            if event["id"] == event_id:
-                event["phase"] = "closed"
-                if user:
-                    event["owner"] = user
-                self._history.add(event, "DELETE", user)
-                self._remove_event_by_nr(nr)
-                return
-        raise MKClientError("No event with id %s" % event_id)
-
-    def get_events(self):
-        return self._events
+        event = self._events.get(event_id)
+        if event is None:
+            raise MKClientError("No event with id %s" % event_id)
+        event["phase"] = "closed"
+        if user:
+            event["owner"] = user
+        self._history.add(event, "DELETE", user)
+        self.remove_event(event)
 
     def get_rule_stats(self):
         return sorted(self._rule_stats.items(), key=lambda x: x[0])
 
 
+def _remove_from_index(index: Dict[Any, Dict[int, Any]], key: Any, event_id: int) -> None:
+    events = index[key]
+    del events[event_id]
+    if not events:
+        del index[key]
+
+
 #.
 #   .--Replication---------------------------------------------------------.
 #   |           ____            _ _           _   _                        |
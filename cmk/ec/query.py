@@ -5,7 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 from logging import Logger
-from typing import Any, Callable, List, Optional, Set, Tuple
+from typing import Any, Callable, List, Optional, Tuple
 
 from cmk.utils.exceptions import MKException
 import cmk.utils.regex
@@ -47,8 +47,6 @@ class Query:
 
 
 def filter_operator_in(a, b):
-    # implemented as a named function, as it is used in a second filter
-    # cmk.ec.main: StatusTableEvents._enumerate
     # not implemented as regex/IGNORECASE due to performance
     return a.lower() in (e.lower() for e in b)
 
@@ -79,11 +77,10 @@ class QueryGET(Query):
         self.table_name = self.method_arg
         self.table = status_server.table(self.table_name)
         self.requested_columns = self.table.column_names
-        # NOTE: history's _get_mongodb and _get_files access filters and limits directly.
+        # NOTE: history's _get_mongodb and _get_files and StatusTableEvents access filters
+        # and limits directly.
         self.filters: List[Tuple[str, str, Callable, str]] = []
         self.limit: Optional[int] = None
-        # NOTE: StatusTableEvents uses only_host for optimization.
-        self.only_host: Optional[Set[Any]] = None
         self._parse_header_lines(raw_query, logger)
 
     def _parse_header_lines(self, raw_query: List[str], logger: Logger) -> None:
@@ -104,9 +101,6 @@ class QueryGET(Query):
             self.requested_columns = argument.split(" ")
         elif header == "Filter":
             column_name, operator_name, predicate, argument = self._parse_filter(argument)
-            # Needed for later optimization (check_mkevents)
-            if column_name == "event_host" and operator_name == 'in':
-                self.only_host = set(argument)
             self.filters.append((column_name, operator_name, predicate, argument))
         elif header == "Limit":
             self.limit = int(argument)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Literal prefilter for the rules of the Event Console
+
+Most rules can only match a message if the message contains a certain text,
+e.g. the regex "sshd.*failed (password|publickey)" needs "failed ". For each
+rule, such a required literal of the host, the syslog application or the
+message text is determined. All these literals are searched in one pass over
+the event fields. Rules whose literal does not occur need no evaluation.
+
+The literals of regexes are only used for ASCII texts. For other texts Python
+treats some non ASCII characters as case insensitive equal to ASCII ones, e.g.
+"ſ" and "s".
+"""
+
+import re
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Pattern, Set, Tuple
+
+try:
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:
+    import sre_parse  # type: ignore[no-redef]
+
+__all__ = ["RulePrefilter"]
+
+# The event fields with their patterns. The first pattern has to match, the
+# second one is an alternative for canceling rules.
+_FIELDS = [
+    ("host", "match_host", None),
+    ("application", "match_application", "cancel_application"),
+    ("text", "match", "match_ok"),
+]
+
+# Longer literals are cut, this keeps the size of the automaton small
+MAX_LITERAL_LENGTH = 32
+
+# Maximum number of alternatives of a text, e.g. "(sda|sdb) full" has two
+MAX_ALTERNATIVES = 16
+
+# The alternatives of which at least one occurs in a matching text
+Requirement = FrozenSet[str]
+
+
+class RulePrefilter:
+    """Finds the rules that may match an event
+
+    The rules have to be compiled, see EventServer.compile_rules().
+    """
+    def __init__(self, rules: Iterable[Dict[str, Any]]) -> None:
+        super().__init__()
+        candidates_by_rule = [(rule, _requirements_of_rule(rule)) for rule in rules]
+
+        # Literals shared by many rules do not help much, prefer the rare ones
+        frequencies: Dict[Tuple[str, str], int] = {}
+        for _rule, candidates in candidates_by_rule:
+            rule_literals = {
+                (field, literal) for field, requirement in candidates for literal in requirement
+            }
+            for field, literal in rule_literals:
+                frequencies[field, literal] = frequencies.get((field, literal), 0) + 1
+
+        def cost(candidate: Tuple[str, Requirement]) -> Tuple[int, int]:
+            field, requirement = candidate
+            return (sum(frequencies[field, literal] for literal in requirement),
+                    -min(len(literal) for literal in requirement))
+
+        # The rules are identified by id(), they are kept alive by EventServer._rules
+        self._anchors: Dict[int, Tuple[str, Requirement]] = {}
+        literals: Dict[str, Set[str]] = {field: set() for field, _key, _alternative_key in _FIELDS}
+        for rule, candidates in candidates_by_rule:
+            if not candidates:
+                continue
+            field, requirement = min(candidates, key=cost)
+            self._anchors[id(rule)] = field, requirement
+            literals[field] |= requirement
+
+        self._scanners = {
+            field: _LiteralScanner(field_literals) for field, field_literals in literals.items()
+        }
+
+    def __len__(self) -> int:
+        """Number of rules that are filtered"""
+        return len(self._anchors)
+
+    def filter(self, rules: Iterable[Dict[str, Any]],
+               event: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], bool]]:
+        """Yields the rules together with the information whether they may match"""
+        found = self._found_literals(event)
+        for rule in rules:
+            anchor = self._anchors.get(id(rule))
+            if anchor is None:
+                yield rule, True
+                continue
+            field, requirement = anchor
+            literals = found[field]
+            yield rule, literals is None or not literals.isdisjoint(requirement)
+
+    def _found_literals(self, event: Dict[str, Any]) -> Dict[str, Optional[Set[str]]]:
+        """The literals occurring in the event fields, None for unknown"""
+        found: Dict[str, Optional[Set[str]]] = {}
+        for field, scanner in self._scanners.items():
+            text = event.get(field, "")
+            found[field] = scanner.find(text.lower()) if text.isascii() else None
+        return found
+
+
+class _LiteralScanner:
+    """Finds all occurrences of a set of literals in a text in one pass
+
+    The literals are arranged in a trie, which is compiled into a lookahead
+    regex. At each position, the regex finds the longest literal starting there.
+    The shorter ones starting there are its prefixes.
+    """
+    def __init__(self, literals: Iterable[str]) -> None:
+        super().__init__()
+        literal_set = set(literals)
+        self._prefixes: Dict[str, List[str]] = {}
+        for literal in literal_set:
+            prefixes = (literal[:end] for end in range(1, len(literal) + 1))
+            self._prefixes[literal] = [prefix for prefix in prefixes if prefix in literal_set]
+
+        self._regex: Optional[Pattern[str]] = None
+        if literal_set:
+            self._regex = re.compile("(?=(%s))" % _trie_pattern(_make_trie(literal_set)))
+
+    def find(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        if self._regex is None:
+            return found
+        for m in self._regex.finditer(text):
+            found.update(self._prefixes[m.group(1)])
+        return found
+
+
+def _make_trie(literals: Iterable[str]) -> Dict[str, Any]:
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return trie
+
+
+def _trie_pattern(node: Dict[str, Any]) -> str:
+    alternatives = [
+        re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char
+    ]
+    if not alternatives:
+        return ""
+    pattern = alternatives[0] if len(alternatives) == 1 else "(?:%s)" % "|".join(alternatives)
+    if "" in node:
+        # Greedy, so the longest literal is preferred
+        pattern = "(?:%s)?" % pattern
+    return pattern
+
+
+def _requirements_of_rule(rule: Dict[str, Any]) -> List[Tuple[str, Requirement]]:
+    """The fields and the requirements of a rule, each of them holds for matching events"""
+    if rule.get("invert_matching"):
+        return []
+
+    return [(field, requirement)
+            for field, pattern_key, alternative_key in _FIELDS
+            for requirement in _requirements_of_field(rule, pattern_key, alternative_key)]
+
+
+def _requirements_of_field(rule: Dict[str, Any], pattern_key: str,
+                           alternative_key: Optional[str]) -> List[Requirement]:
+    # A canceling rule matches if one of both patterns matches, see RuleMatcher.
+    # Without a pattern for the text every text matches, in contrast to the
+    # syslog application, where the canceling pattern has to match then.
+    if pattern_key == "match" and "match" not in rule:
+        return []
+
+    requirements: List[Requirement] = [frozenset()]
+    for key in (pattern_key, alternative_key):
+        if key is None or key not in rule:
+            continue
+        requirements = [
+            requirement | literals
+            for requirement in requirements
+            for literals in required_literals(rule[key])
+        ]
+    return [requirement for requirement in requirements if requirement]
+
+
+def _length(requirement: Requirement) -> int:
+    return min(len(literal) for literal in requirement)
+
+
+def required_literals(pattern: Any) -> List[Requirement]:
+    """Lower case texts required by a pattern
+
+    The pattern is a compiled regex or a lower case string, see
+    EventServer._compile_matching_value. Each text matching the pattern contains
+    one of the literals of each of the returned requirements.
+    """
+    if isinstance(pattern, str):
+        return [frozenset([pattern[:MAX_LITERAL_LENGTH]])] if pattern else []
+
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except (re.error, RecursionError):
+        return []
+    return _required_literals_of_sequence(parsed)
+
+
+def _required_literals_of_sequence(items: Iterable[Tuple[Any, Any]]) -> List[Requirement]:
+    requirements: List[Requirement] = []
+    # The alternatives of the text matched by the last items
+    run: Set[str] = {""}
+
+    def end_run() -> None:
+        if "" not in run:
+            requirements.append(frozenset(text[:MAX_LITERAL_LENGTH] for text in run))
+        run.clear()
+        run.add("")
+
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue  # zero width, the texts around it are adjacent
+
+        texts = _exact_texts(op, av)
+        if texts is not None and len(run) * len(texts) <= MAX_ALTERNATIVES:
+            run = {text + suffix for text in run for suffix in texts}
+            continue
+
+        end_run()
+        if op is sre_parse.SUBPATTERN:
+            requirements += _required_literals_of_sequence(av[-1])
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            requirements += _required_literals_of_sequence(av[2])
+        elif op is sre_parse.BRANCH:
+            requirements += _required_literals_of_branches(av[1])
+    end_run()
+    return requirements
+
+
+def _required_literals_of_branches(branches: Iterable[Any]) -> List[Requirement]:
+    requirement: Set[str] = set()
+    for branch in branches:
+        requirements = _required_literals_of_sequence(branch)
+        if not requirements:
+            return []
+        longest: Requirement = max(requirements, key=_length)
+        requirement |= longest
+    return [frozenset(requirement)]
+
+
+def _exact_texts(op: Any, av: Any) -> Optional[Set[str]]:
+    """The lower case texts matched by an item, None if they are not a few ASCII texts"""
+    if op is sre_parse.LITERAL:
+        return {chr(av).lower()} if av < 128 else None
+
+    if op is sre_parse.IN:
+        # E.g. "(a|b)" is optimized to "[ab]"
+        if not all(item_op is sre_parse.LITERAL and item_av < 128 for item_op, item_av in av):
+            return None
+        return {chr(item_av).lower() for _item_op, item_av in av}
+
+    if op is sre_parse.SUBPATTERN:
+        return _exact_texts_of_sequence(av[-1])
+
+    if op is sre_parse.BRANCH:
+        texts: Set[str] = set()
+        for branch in av[1]:
+            branch_texts = _exact_texts_of_sequence(branch)
+            if branch_texts is None:
+                return None
+            texts |= branch_texts
+        return texts if len(texts) <= MAX_ALTERNATIVES else None
+
+    return None
+
+
+def _exact_texts_of_sequence(items: Iterable[Tuple[Any, Any]]) -> Optional[Set[str]]:
+    texts = {""}
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue
+        item_texts = _exact_texts(op, av)
+        if item_texts is None or len(texts) * len(item_texts) > MAX_ALTERNATIVES:
+            return None
+        texts = {text + suffix for text in texts for suffix in item_texts}
+    return texts
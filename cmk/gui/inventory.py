@@ -18,6 +18,7 @@ import dicttoxml  # type: ignore[import]
 import livestatus
 
 import cmk.utils.paths
+from cmk.utils.inventory_archive import InventoryArchive
 from cmk.utils.structured_data import StructuredDataTree, Container, Numeration, Attributes
 from cmk.utils.exceptions import (
     MKException,
@@ -174,6 +175,8 @@ def get_history_deltas(hostname, search_timestamp=None):
             required_timestamps = [search_timestamp]
 
     tree_lookup: Dict[str, Any] = {}
+    inventory_archive = InventoryArchive(Path(inventory_archive_dir))
+    current_raw_tree: List[Dict] = []
 
     def get_tree(timestamp):
         if timestamp is None:
@@ -188,9 +191,17 @@ def get_history_deltas(hostname, search_timestamp=None):
                 return
             tree_lookup[timestamp] = inventory_tree
         else:
-            inventory_archive_path = "%s/%s" % (inventory_archive_dir, timestamp)
+            # The archived trees are reconstructed from the unfiltered current tree
+            try:
+                if not current_raw_tree:
+                    current_raw_tree.append(store.load_object_from_file(inventory_path, default={}))
+                raw_tree = inventory_archive.load_raw_tree(timestamp, current_raw_tree[0])
+            except Exception as e:
+                if config.debug:
+                    html.show_warning("%s" % e)
+                raise LoadStructuredDataError()
             tree_lookup[timestamp] = _filter_tree(
-                StructuredDataTree().load_from(inventory_archive_path))
+                StructuredDataTree().create_tree_from_raw_tree(raw_tree))
         return tree_lookup[timestamp]
 
     corrupted_history_files = []
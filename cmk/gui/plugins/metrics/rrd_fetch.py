@@ -7,14 +7,14 @@
 
 import time
 import collections
-from typing import Any, Callable, Dict, List, Set, Tuple, Union, Optional, Iterator
+from typing import Any, Callable, Dict, FrozenSet, List, Set, Tuple, Union, Optional, Iterator
 
 import livestatus
 
 import cmk.utils.version as cmk_version
 from cmk.gui.plugins.metrics.utils import check_metrics, reverse_translate_metric_name
 import cmk.gui.plugins.metrics.timeseries as ts
-from cmk.utils.prediction import livestatus_lql, TimeSeries
+from cmk.utils.prediction import livestatus_lql, lq_logic, TimeSeries
 from cmk.gui.i18n import _
 from cmk.gui.exceptions import MKGeneralException
 import cmk.gui.sites as sites
@@ -26,15 +26,11 @@ def fetch_rrd_data_for_graph(graph_recipe, graph_data_range):
     needed_rrd_data = get_needed_sources(graph_recipe["metrics"])
 
     by_service = group_needed_rrd_data_by_service(needed_rrd_data)
+    fetched = fetch_rrd_data_of_services(by_service, graph_recipe, graph_data_range)
     rrd_data: Dict[Tuple[str, str, str, str, str, str], TimeSeries] = {}
-    for (site, host_name, service_description), entries in by_service.items():
-        try:
-            for (perfvar, cf, scale), data in \
-                fetch_rrd_data(site, host_name, service_description, entries, graph_recipe, graph_data_range):
-                rrd_data[(site, host_name, service_description, perfvar, cf,
-                          scale)] = TimeSeries(data)
-        except livestatus.MKLivestatusNotFoundError:
-            pass
+    for (site, host_name, service_description) in by_service:
+        for (perfvar, cf, scale), data in fetched.get((site, host_name, service_description), []):
+            rrd_data[(site, host_name, service_description, perfvar, cf, scale)] = TimeSeries(data)
 
     align_and_resample_rrds(rrd_data, graph_recipe["consolidation_function"])
     chop_last_empty_step(graph_data_range, rrd_data)
@@ -134,7 +130,74 @@ def group_needed_rrd_data_by_service(needed_rrd_data):
     return by_service
 
 
-def fetch_rrd_data(site, host_name, service_description, entries, graph_recipe, graph_data_range):
+def fetch_rrd_data_of_services(by_service, graph_recipe, graph_data_range):
+    """Fetch the RRD data of many services with as few Livestatus queries as possible
+
+    The services needing the same RRD columns are fetched with a single query. The query
+    is sent to all affected sites at once. Services which are not found are missing in
+    the result, just like with fetch_rrd_data()."""
+    by_columns: Dict[Tuple[bool, FrozenSet], List[Tuple[str, str, str]]] = \
+        collections.defaultdict(list)
+    fetched: Dict[Tuple[str, str, str], List[Tuple[Any, Any]]] = {}
+    for service, entries in by_service.items():
+        site, host_name, service_description = service
+        if not site:
+            # Can not map the rows of the batched query to a service without site
+            try:
+                fetched[service] = fetch_rrd_data(site, host_name, service_description, entries,
+                                                  graph_recipe, graph_data_range)
+            except livestatus.MKLivestatusNotFoundError:
+                pass
+            continue
+
+        is_host = service_description == "_HOST_"
+        by_columns[(is_host, frozenset(entries))].append(service)
+
+    point_range = _point_range(graph_data_range)
+    for (is_host, entries_set), services in by_columns.items():
+        entries = list(entries_set)
+        lql_columns = list(rrd_columns(entries, graph_recipe["consolidation_function"],
+                                       point_range))
+        query = livestatus_lql_of_services(services, lql_columns, is_host)
+
+        with sites.only_sites(sorted({site for site, _host_name, _service in services})), \
+                sites.prepend_site():
+            rows = sites.live().query(query)
+
+        for row in rows:
+            if is_host:
+                site, host_name, rrd_values = row[0], row[1], row[2:]
+                service_description = "_HOST_"
+            else:
+                site, host_name, service_description, rrd_values = row[0], row[1], row[2], row[3:]
+            fetched[(site, host_name, service_description)] = list(zip(entries, rrd_values))
+
+    return fetched
+
+
+def livestatus_lql_of_services(services: List[Tuple[str, str, str]], columns: List[ColumnName],
+                               is_host: bool) -> str:
+    """Query the given columns of many services (or hosts) identified by their names
+
+    The name columns are the first columns of the result rows"""
+    if is_host:
+        query = u"GET hosts\nColumns: host_name %s\n" % u" ".join(columns)
+        query += lq_logic(u"Filter: host_name =",
+                          sorted({host_name for _site, host_name, _service in services}), u"Or")
+        return query
+
+    query = u"GET services\nColumns: host_name service_description %s\n" % u" ".join(columns)
+    service_names = sorted({(host_name, service) for _site, host_name, service in services})
+    for host_name, service_description in service_names:
+        query += u"Filter: host_name = %s\n" % livestatus.lqencode(host_name)
+        query += u"Filter: service_description = %s\n" % livestatus.lqencode(service_description)
+        query += u"And: 2\n"
+    if len(service_names) > 1:
+        query += u"Or: %d\n" % len(service_names)
+    return query
+
+
+def _point_range(graph_data_range) -> str:
     start_time, end_time = graph_data_range["time_range"]
 
     step: Union[int, float, str] = graph_data_range["step"]
@@ -142,7 +205,11 @@ def fetch_rrd_data(site, host_name, service_description, entries, graph_recipe,
     if not isinstance(step, str):
         step = max(1, step)
 
-    point_range = ":".join(map(str, (start_time, end_time, step)))
+    return ":".join(map(str, (start_time, end_time, step)))
+
+
+def fetch_rrd_data(site, host_name, service_description, entries, graph_recipe, graph_data_range):
+    point_range = _point_range(graph_data_range)
     lql_columns = list(rrd_columns(entries, graph_recipe["consolidation_function"], point_range))
     query = livestatus_lql([host_name], lql_columns, service_description)
 
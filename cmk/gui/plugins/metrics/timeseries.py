@@ -8,7 +8,7 @@ import operator
 import functools
 from typing import List, Literal
 
-from cmk.utils.prediction import TimeSeries
+from cmk.utils.prediction import get_numpy, TimeSeries
 import cmk.utils.version as cmk_version
 import cmk.gui.escaping as escaping
 from cmk.gui.exceptions import MKGeneralException
@@ -131,9 +131,58 @@ def time_series_math(operator_id: Literal["+", "*", "-", "/", "MAX", "MIN", "AVE
     _op_title, op_func = operators[operator_id]
     twindow = operands_evaluated[0].twindow
 
+    np = get_numpy()
+    if np is not None:
+        array = time_series_math_vectorized(np, operator_id, operands_evaluated)
+        if array is not None:
+            return TimeSeries.from_array(array, twindow)
+
     return TimeSeries([op_func_wrapper(op_func, tsp) for tsp in zip(*operands_evaluated)], twindow)
 
 
+def time_series_math_vectorized(np, operator_id, operands_evaluated):
+    """Same as time_series_math() on float arrays with NaN for the gaps
+
+    Returns the resulting array or None in case the operator can not be applied to the
+    operands."""
+    if operator_id in ["-", "/"] and len(operands_evaluated) < 2:
+        return None
+
+    num_points = min(len(operand) for operand in operands_evaluated)
+    # One row per operand, one column per point in time
+    data = np.array([operand.to_array(np)[:num_points] for operand in operands_evaluated])
+    gaps = np.isnan(data)
+    all_gaps = gaps.all(axis=0)
+    any_gaps = gaps.any(axis=0)
+
+    with np.errstate(all="ignore"):
+        if operator_id in ["+", "AVERAGE"]:
+            # Add up the operands one after another to get the same result as sum()
+            result = np.cumsum(np.where(gaps, 0.0, data), axis=0)[-1]
+            if operator_id == "AVERAGE":
+                result = result / np.maximum((~gaps).sum(axis=0), 1)
+            result[all_gaps] = np.nan
+        elif operator_id == "*":
+            result = np.cumprod(data, axis=0)[-1]
+            result[any_gaps] = np.nan
+        elif operator_id == "-":
+            result = data[0] - data[1]
+            result[any_gaps] = np.nan
+        elif operator_id == "/":
+            result = data[0] / data[1]
+            result[any_gaps | (data[1] == 0)] = np.nan
+        elif operator_id == "MAX":
+            result = np.fmax.reduce(data, axis=0)
+        elif operator_id == "MIN":
+            result = np.fmin.reduce(data, axis=0)
+        elif operator_id == "MERGE":
+            result = data[np.argmax(~gaps, axis=0), np.arange(num_points)]
+        else:
+            return None
+
+    return result
+
+
 def op_func_wrapper(op_func, tsp):
     if tsp.count(None) < len(tsp):  # At least one non-None value
         try:
@@ -15,9 +15,11 @@ import contextlib
 import datetime as dt
 import io
 import itertools
+import json
 import operator
 import os
 import re
+import socket
 import statistics
 import time
 from typing import (
@@ -63,9 +65,23 @@ Tables = Dict[TableName, Dict[SiteName, ResultList]]
 class FakeSocket:
     def __init__(self, mock_live: MockSingleSiteConnection) -> None:
         self.mock_live = mock_live
+        # The responses are read with selectors, which need a file descriptor. This one is
+        # always readable.
+        self._readable, self._writable = socket.socketpair()
+        self._writable.send(b"\n")
+        self._timeout: Optional[float] = None
 
-    def settimeout(self, timeout: Optional[int]) -> None:
-        pass
+    def fileno(self) -> int:
+        return self._readable.fileno()
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self._timeout = timeout
+
+    def gettimeout(self) -> Optional[float]:
+        return self._timeout
+
+    def setblocking(self, flag: bool) -> None:
+        self._timeout = None if flag else 0.0
 
     def connect(self, address: str) -> None:
         pass
@@ -77,7 +93,7 @@ class FakeSocket:
         return self.mock_live.socket_send(data)
 
 
-def _make_livestatus_response(response) -> str:
+def _make_livestatus_response(response, output_format: str = "python3") -> str:
     """Build a (somewhat) convincing LiveStatus response
 
     Special response headers are not honored yet.
@@ -88,15 +104,20 @@ def _make_livestatus_response(response) -> str:
     >>> _make_livestatus_response([['foo'], [1, {}]])[:16]
     '200          18\\n'
 
+    >>> _make_livestatus_response([['foo'], [1, {}]], "json")
+    '200          18\\n[["foo"], [1, {}]]'
+
     Args:
         response:
             Some python struct.
+        output_format:
+            The requested output format, "python3" or "json".
 
     Returns:
         The fake LiveStatus response as a string.
 
     """
-    data = repr(response)
+    data = json.dumps(response) if output_format == "json" else repr(response)
     code = 200
     length = len(data)
     return f"{code:<3} {length:>11}\n{data}"
@@ -562,8 +583,10 @@ class MockSingleSiteConnection:
     def socket_send(self, data: bytes) -> None:
         if data[-2:] == b"\n\n":
             data = data[:-2]
-        response = self.result_of_next_query(data.decode('utf-8'))
-        self._last_response = io.StringIO(_make_livestatus_response(response))
+        query = data.decode('utf-8')
+        response = self.result_of_next_query(query)
+        output_format = _unpack_headers(query).get("OutputFormat", "python3")
+        self._last_response = io.StringIO(_make_livestatus_response(response, output_format))
 
     def __enter__(self):
         pass
@@ -14,7 +14,7 @@ import hashlib
 from pathlib import Path
 import traceback
 from typing import (Callable, NamedTuple, Hashable, TYPE_CHECKING, Any, Set, Tuple, List, Optional,
-                    Union, Dict, Type, cast)
+                    Union, Dict, Type, Iterable, Iterator, cast)
 from contextlib import suppress
 
 from six import ensure_str
@@ -762,10 +762,24 @@ class RowTableLivestatus(RowTable):
 
         columns, dynamic_columns = self._prepare_columns(columns, view)
         query = self.prepare_lql(columns, headers + datasource.add_headers)
-        data = query_livestatus(query, only_sites, limit, datasource.auth_domain)
 
-        if datasource.merge_by:
-            data = _merge_data(data, columns)
+        # The painters use no blob columns, so the faster to decode JSON output format is fine
+        data: Iterable[LivestatusRow]
+        if (view.user_sorters or view.spec.get("sorters")) and not datasource.merge_by:
+            # The rows are sorted later anyways, so process the rows of every site as soon as
+            # they arrive
+            data = iter_livestatus_rows(query,
+                                        only_sites,
+                                        limit,
+                                        datasource.auth_domain,
+                                        output_format="json")
+        else:
+            site_rows = query_livestatus(query,
+                                         only_sites,
+                                         limit,
+                                         datasource.auth_domain,
+                                         output_format="json")
+            data = _merge_data(site_rows, columns) if datasource.merge_by else site_rows
 
         # convert lists-rows into dictionaries.
         # performance, but makes live much easier later.
@@ -779,9 +793,41 @@ class RowTableLivestatus(RowTable):
         return rows
 
 
-def query_livestatus(query: LivestatusQuery, only_sites: OnlySites, limit: Optional[int],
-                     auth_domain: str) -> List[LivestatusRow]:
+def query_livestatus(query: LivestatusQuery,
+                     only_sites: OnlySites,
+                     limit: Optional[int],
+                     auth_domain: str,
+                     output_format: str = "python3") -> List[LivestatusRow]:
+    _show_livestatus_query(query)
+
+    sites.live().set_auth_domain(auth_domain)
+    with sites.only_sites(only_sites), sites.prepend_site(), sites.set_limit(limit):
+        data = sites.live().query(livestatus.Query(query, output_format=output_format))
+
+    sites.live().set_auth_domain("read")
+
+    return data
+
+
+def iter_livestatus_rows(query: LivestatusQuery,
+                         only_sites: OnlySites,
+                         limit: Optional[int],
+                         auth_domain: str,
+                         output_format: str = "python3") -> Iterator[LivestatusRow]:
+    """Like query_livestatus(), but yields the rows of every site as soon as they arrive
+
+    The rows are not ordered by site."""
+    _show_livestatus_query(query)
 
+    sites.live().set_auth_domain(auth_domain)
+    try:
+        with sites.only_sites(only_sites), sites.prepend_site(), sites.set_limit(limit):
+            yield from sites.live().query_rows(livestatus.Query(query, output_format=output_format))
+    finally:
+        sites.live().set_auth_domain("read")
+
+
+def _show_livestatus_query(query: LivestatusQuery) -> None:
     if all((
             config.debug_livestatus_queries,
             html.output_format == "html",
@@ -791,14 +837,6 @@ def query_livestatus(query: LivestatusQuery, only_sites: OnlySites, limit: Optio
         html.tt(query.replace('\n', '<br>\n'))
         html.close_div()
 
-    sites.live().set_auth_domain(auth_domain)
-    with sites.only_sites(only_sites), sites.prepend_site(), sites.set_limit(limit):
-        data = sites.live().query(query)
-
-    sites.live().set_auth_domain("read")
-
-    return data
-
 
 # TODO: Return value of render() could be cleaned up e.g. to a named tuple with an
 # optional CSS class. A lot of painters don't specify CSS classes.
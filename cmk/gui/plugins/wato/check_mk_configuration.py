@@ -4347,6 +4347,31 @@ rulespec_registry.register(
     ))
 
 
+def _valuespec_snmp_fetch_concurrency():
+    return Integer(
+        title=_("Concurrent fetching of SNMP sections"),
+        label=_("Maximum number of concurrent walks: "),
+        minvalue=1,
+        maxvalue=32,
+        default_value=4,
+        help=_("By default Checkmk fetches the SNMP sections of a host one after another. "
+               "For devices with many sections the duration of the Check_MK service is "
+               "then dominated by the network round trip times. With this rule, sections "
+               "that do not share any OIDs are fetched concurrently, using at most the "
+               "configured number of walks at the same time. This only applies to the "
+               "classic SNMP backend and to stored walks. Be aware: Some devices do not "
+               "cope well with concurrent requests."),
+    )
+
+
+rulespec_registry.register(
+    HostRulespec(
+        group=RulespecGroupAgentSNMP,
+        name="snmp_fetch_concurrency",
+        valuespec=_valuespec_snmp_fetch_concurrency,
+    ))
+
+
 def _help_snmp_without_sys_descr():
     return _("Devices which do not publish the system description OID .1.3.6.1.2.1.1.1.0 are "
              "normally ignored by the SNMP inventory. Use this ruleset to select hosts which "
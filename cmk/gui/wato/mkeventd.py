@@ -3305,6 +3305,28 @@ class ConfigVariableEventConsoleRetentionInterval(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableEventConsoleStatusJournal(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupEventConsoleGeneric
+
+    def domain(self):
+        return ConfigDomainEventConsole
+
+    def ident(self):
+        return "status_journal"
+
+    def valuespec(self):
+        return Checkbox(
+            title=_("Journal of the event state"),
+            label=_("Only save the changes of the event state"),
+            help=_("When saving its state, the event daemon only appends the changes since the "
+                   "last save to a journal instead of writing the whole state. From time to time "
+                   "the whole state is saved and the journal is started over. This keeps saving "
+                   "fast even with a large number of open events."),
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableEventConsoleHousekeepingInterval(ConfigVariable):
     def group(self):
@@ -3389,6 +3411,30 @@ class ConfigVariableEventConsoleRuleOptimizer(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableEventConsoleEventProcesses(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupEventConsoleGeneric
+
+    def domain(self):
+        return ConfigDomainEventConsole
+
+    def ident(self):
+        return "event_processes"
+
+    def valuespec(self):
+        return Integer(
+            title=_("Processes for matching events"),
+            help=_("The event daemon receives messages in one thread and processes them in "
+                   "another one. With more than one process, the events are created from the "
+                   "messages and matched against the rules in this number of worker processes. "
+                   "The results are applied in the order in which the messages have been "
+                   "received. This helps with high message rates and many rules."),
+            minvalue=1,
+            unit=_("processes"),
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableEventConsoleActions(ConfigVariable):
     def group(self):
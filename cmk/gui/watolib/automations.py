@@ -13,7 +13,7 @@ import re
 import subprocess
 import time
 import uuid
-from typing import Tuple, Dict, Any, Optional, NamedTuple, Sequence
+from typing import Tuple, Dict, Any, Optional, NamedTuple, Sequence, List
 
 import urllib3  # type: ignore[import]
 import requests
@@ -24,6 +24,7 @@ from livestatus import SiteId, SiteConfiguration
 
 from cmk.utils.log import VERBOSE
 from cmk.utils.type_defs import AutomationDiscoveryResponse, DiscoveryResult
+import cmk.utils.automation_helper as automation_helper
 import cmk.utils.store as store
 import cmk.utils.version as cmk_version
 
@@ -94,11 +95,17 @@ def check_mk_local_automation(command: str,
     if timeout:
         new_args = ["--timeout", "%d" % timeout] + new_args
 
+    verbosity = 0
+    if auto_logger.isEnabledFor(logging.DEBUG):
+        verbosity = 2
+    elif auto_logger.isEnabledFor(VERBOSE):
+        verbosity = 1
+
     cmd = ['check_mk']
 
-    if auto_logger.isEnabledFor(logging.DEBUG):
+    if verbosity == 2:
         cmd.append("-vv")
-    elif auto_logger.isEnabledFor(VERBOSE):
+    elif verbosity == 1:
         cmd.append("-v")
 
     cmd += ['--automation', command] + new_args
@@ -107,34 +114,14 @@ def check_mk_local_automation(command: str,
         call_hook_pre_activate_changes()
 
     cmd = [ensure_str(a) for a in cmd]
-    try:
-        # This debug output makes problems when doing bulk inventory, because
-        # it garbles the non-HTML response output
-        # if config.debug:
-        #     html.write("<div class=message>Running <tt>%s</tt></div>\n" % subprocess.list2cmdline(cmd))
-        auto_logger.info("RUN: %s" % subprocess.list2cmdline(cmd))
-        p = subprocess.Popen(cmd,
-                             stdin=subprocess.PIPE,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             close_fds=True,
-                             encoding="utf-8")
-    except Exception as e:
-        raise _local_automation_failure(command=command, cmdline=cmd, exc=e)
 
-    assert p.stdin is not None
-    assert p.stdout is not None
-    assert p.stderr is not None
-
-    auto_logger.info("STDIN: %r" % stdin_data)
-    p.stdin.write(stdin_data)
-    p.stdin.close()
+    result = _execute_by_automation_helper(command, new_args, stdin_data, verbosity, cmd)
+    if result is None:
+        result = _execute_by_subprocess(command, stdin_data, cmd)
+    exitcode, outdata, errdata = result
 
-    outdata = p.stdout.read()
-    exitcode = p.wait()
     auto_logger.info("FINISHED: %d" % exitcode)
     auto_logger.debug("OUTPUT: %r" % outdata)
-    errdata = p.stderr.read()
     if errdata:
         auto_logger.warning("'%s' returned '%s'" % (" ".join(cmd), errdata))
     if exitcode != 0:
@@ -156,6 +143,59 @@ def check_mk_local_automation(command: str,
         raise _local_automation_failure(command=command, cmdline=cmd, out=outdata, exc=e)
 
 
+def _execute_by_automation_helper(command: str, args: List[str], stdin_data: str, verbosity: int,
+                                  cmdline: List[str]) -> Optional[Tuple[int, str, str]]:
+    """Let the automation helper execute the call, in case it is running
+
+    Returns None in case the helper did not execute the call."""
+    request = automation_helper.AutomationRequest(command=command,
+                                                  args=args,
+                                                  stdin=stdin_data,
+                                                  verbosity=verbosity)
+    try:
+        response = automation_helper.execute_automation(request)
+    except MKGeneralException as e:
+        raise _local_automation_failure(command=command, cmdline=cmdline, exc=e)
+
+    if response is None:
+        return None
+
+    auto_logger.info("RUN (automation helper): %s" % subprocess.list2cmdline(cmdline))
+    auto_logger.info("STDIN: %r" % stdin_data)
+    return response.exit_code, response.stdout, response.stderr
+
+
+def _execute_by_subprocess(command: str, stdin_data: str,
+                           cmdline: List[str]) -> Tuple[int, str, str]:
+    try:
+        # This debug output makes problems when doing bulk inventory, because
+        # it garbles the non-HTML response output
+        # if config.debug:
+        #     html.write("<div class=message>Running <tt>%s</tt></div>\n" % subprocess.list2cmdline(cmd))
+        auto_logger.info("RUN: %s" % subprocess.list2cmdline(cmdline))
+        p = subprocess.Popen(cmdline,
+                             stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             close_fds=True,
+                             encoding="utf-8")
+    except Exception as e:
+        raise _local_automation_failure(command=command, cmdline=cmdline, exc=e)
+
+    assert p.stdin is not None
+    assert p.stdout is not None
+    assert p.stderr is not None
+
+    auto_logger.info("STDIN: %r" % stdin_data)
+    p.stdin.write(stdin_data)
+    p.stdin.close()
+
+    outdata = p.stdout.read()
+    exitcode = p.wait()
+    errdata = p.stderr.read()
+    return exitcode, outdata, errdata
+
+
 def _local_automation_failure(command, cmdline, code=None, out=None, err=None, exc=None):
     call = subprocess.list2cmdline(cmdline) if config.debug else command
     msg = "Error running automation call <tt>%s</tt>" % call
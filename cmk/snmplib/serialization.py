@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compact binary encoding of SNMP raw data and walks.
+
+The data is encoded with `marshal` behind a small versioned header:
+
+    <MAGIC><FORMAT VERSION><MARSHAL VERSION><payload>
+
+Both the fetcher protocol and the walk cache are only ever read by the
+same Checkmk version (and so the same Python interpreter) that wrote them.
+Data with another version is rejected with a `ValueError`, which lets
+the callers fall back to fetching the data again.
+
+"""
+
+import marshal
+import struct
+from typing import Any
+
+from cmk.utils.type_defs import SectionName
+
+from .type_defs import SNMPRawData, SNMPRowInfo
+
+__all__ = [
+    "deserialize_raw_data",
+    "deserialize_rowinfo",
+    "is_serialized",
+    "serialize_raw_data",
+    "serialize_rowinfo",
+]
+
+MAGIC = b"CSNM"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("!4sHH")
+
+
+def is_serialized(data: bytes) -> bool:
+    """Tell whether the data has been serialized with this module (of any version)"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def serialize_raw_data(raw_data: SNMPRawData) -> bytes:
+    return _dumps({str(k): v for k, v in raw_data.items()})
+
+
+def deserialize_raw_data(data: bytes) -> SNMPRawData:
+    raw_data = _loads(data)
+    if not isinstance(raw_data, dict):
+        raise ValueError(repr(data))
+    return {SectionName(k): v for k, v in raw_data.items()}
+
+
+def serialize_rowinfo(rowinfo: SNMPRowInfo) -> bytes:
+    return _dumps(rowinfo)
+
+
+def deserialize_rowinfo(data: bytes) -> SNMPRowInfo:
+    rowinfo = _loads(data)
+    if not isinstance(rowinfo, list):
+        raise ValueError(repr(data))
+    return rowinfo
+
+
+def _dumps(obj: Any) -> bytes:
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version) + marshal.dumps(obj)
+
+
+def _loads(data: bytes) -> Any:
+    try:
+        magic, format_version, marshal_version = _HEADER.unpack_from(data)
+    except struct.error as exc:
+        raise ValueError(repr(data[:_HEADER.size])) from exc
+
+    if (magic, format_version, marshal_version) != (MAGIC, FORMAT_VERSION, marshal.version):
+        raise ValueError("Unsupported format: %r" % data[:_HEADER.size])
+
+    try:
+        return marshal.loads(memoryview(data)[_HEADER.size:])
+    except (EOFError, TypeError, ValueError) as exc:
+        raise ValueError("Invalid data") from exc
@@ -5,8 +5,21 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Provide methods to get an snmp table with or without caching
 """
-from typing import Callable, Iterable, Iterator, List, MutableMapping, Optional, Set, Tuple
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
+import ast
 from pathlib import Path
 from six import ensure_binary
 
@@ -16,6 +29,7 @@ from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import console
 from cmk.utils.type_defs import HostName, SectionName
 
+from . import serialization
 from .type_defs import (
     SNMPBackend,
     OID,
@@ -82,7 +96,7 @@ class WalkCache(MutableMapping[str, Tuple[bool, SNMPRowInfo]]):
 
                 console.vverbose(f"  Loading {fetchoid} from walk cache {path}\n")
                 try:
-                    read_walk = store.load_object_from_file(path)
+                    read_walk = WalkCache._read_walk(path)
                 except Exception:
                     console.verbose(f"  Failed to load {fetchoid} from walk cache {path}\n")
                     if cmk.utils.debug.enabled():
@@ -101,7 +115,17 @@ class WalkCache(MutableMapping[str, Tuple[bool, SNMPRowInfo]]):
 
             path = self._path / fetchoid
             console.vverbose(f"  Saving walk of {fetchoid} to walk cache {path}\n")
-            store.save_object_to_file(path, rowinfo, pretty=False)
+            store.save_bytes_to_file(path, serialization.serialize_rowinfo(rowinfo))
+
+    @staticmethod
+    def _read_walk(path: Path) -> Optional[SNMPRowInfo]:
+        data = store.load_bytes_from_file(path)
+        if not data:
+            return None
+        if serialization.is_serialized(data):
+            return serialization.deserialize_rowinfo(data)
+        # Walk cache written by previous versions of Checkmk
+        return ast.literal_eval(data.decode("utf-8"))
 
 
 def get_snmp_table(
@@ -119,6 +143,8 @@ def get_snmp_table(
     max_len = 0
     max_len_col = -1
 
+    _prefetch_snmpwalks(section_name, tree, walk_cache=walk_cache, backend=backend)
+
     for oid in tree.oids:
         fetchoid: OID = "%s.%s" % (tree.base, oid.column)
         # column may be integer or string like "1.5.4.2.3"
@@ -249,6 +275,39 @@ def _get_snmpwalk(
     return rowinfo
 
 
+def _prefetch_snmpwalks(
+    section_name: Optional[SectionName],
+    tree: BackendSNMPTree,
+    *,
+    walk_cache: MutableMapping[str, Tuple[bool, SNMPRowInfo]],
+    backend: SNMPBackend,
+) -> None:
+    """Walk all columns of the tree missing in the walk cache at once
+
+    This gives the backend the opportunity to fetch the columns with a
+    single request.  The result is put into the walk cache, where
+    `_get_snmpwalk` picks it up.
+    """
+    save_flags: Dict[OID, bool] = {}
+    for oid in tree.oids:
+        if isinstance(oid.column, SpecialColumn):
+            continue
+        fetchoid = "%s.%s" % (tree.base, oid.column)
+        if fetchoid not in walk_cache:
+            save_flags[fetchoid] = save_flags.get(fetchoid, False) or oid.save_to_cache
+
+    if len(save_flags) < 2:
+        return
+
+    for fetchoid, rowinfo in _perform_snmpwalk_columns(
+            section_name,
+            tree.base,
+            list(save_flags),
+            backend=backend,
+    ).items():
+        walk_cache[fetchoid] = (save_flags[fetchoid], rowinfo)
+
+
 def _perform_snmpwalk(
     section_name: Optional[SectionName],
     base_oid: str,
@@ -268,26 +327,57 @@ def _perform_snmpwalk(
             table_base_oid=base_oid,
             context_name=context_name,
         )
-
-        # I've seen a broken device (Mikrotik Router), that broke after an
-        # update to RouterOS v6.22. It would return 9 time the same OID when
-        # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
-        # by removing any duplicate OID information
-        if len(rows) > 1 and rows[0][0] == rows[1][0]:
-            console.vverbose("Detected broken SNMP agent. Ignoring duplicate OID %s.\n" %
-                             rows[0][0])
-            rows = rows[:1]
-
-        for row_oid, val in rows:
-            if row_oid in added_oids:
-                console.vverbose("Duplicate OID found: %s (%r)\n" % (row_oid, val))
-            else:
-                rowinfo.append((row_oid, val))
-                added_oids.add(row_oid)
+        _add_rows(rowinfo, rows, added_oids=added_oids)
 
     return rowinfo
 
 
+def _perform_snmpwalk_columns(
+    section_name: Optional[SectionName],
+    base_oid: str,
+    fetchoids: Sequence[OID],
+    *,
+    backend: SNMPBackend,
+) -> Mapping[OID, SNMPRowInfo]:
+    added_oids: Dict[OID, Set[OID]] = {fetchoid: set() for fetchoid in fetchoids}
+    rowinfos: Dict[OID, SNMPRowInfo] = {fetchoid: [] for fetchoid in fetchoids}
+
+    for context_name in backend.config.snmpv3_contexts_of(section_name):
+        columns = backend.walk_columns(
+            fetchoids,
+            # revert back to legacy "possilbly-empty-string"-Type
+            # TODO: pass Optional[SectionName] along!
+            check_plugin_name=str(section_name) if section_name else "",
+            table_base_oid=base_oid,
+            context_name=context_name,
+        )
+        for fetchoid in fetchoids:
+            _add_rows(
+                rowinfos[fetchoid],
+                columns.get(fetchoid, []),
+                added_oids=added_oids[fetchoid],
+            )
+
+    return rowinfos
+
+
+def _add_rows(rowinfo: SNMPRowInfo, rows: SNMPRowInfo, *, added_oids: Set[OID]) -> None:
+    # I've seen a broken device (Mikrotik Router), that broke after an
+    # update to RouterOS v6.22. It would return 9 time the same OID when
+    # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
+    # by removing any duplicate OID information
+    if len(rows) > 1 and rows[0][0] == rows[1][0]:
+        console.vverbose("Detected broken SNMP agent. Ignoring duplicate OID %s.\n" % rows[0][0])
+        rows = rows[:1]
+
+    for row_oid, val in rows:
+        if row_oid in added_oids:
+            console.vverbose("Duplicate OID found: %s (%r)\n" % (row_oid, val))
+        else:
+            rowinfo.append((row_oid, val))
+            added_oids.add(row_oid)
+
+
 def _sanitize_snmp_encoding(columns: ResultColumnsSanitized,
                             snmp_config: SNMPHostConfig) -> ResultColumnsDecoded:
     return [
@@ -202,6 +202,28 @@ class SNMPBackend(metaclass=abc.ABCMeta):
              context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
         return []
 
+    def walk_columns(
+        self,
+        oids: Sequence[OID],
+        check_plugin_name: Optional[_CheckPluginName] = None,
+        table_base_oid: Optional[OID] = None,
+        context_name: Optional[SNMPContextName] = None,
+    ) -> Mapping[OID, SNMPRowInfo]:
+        """Walk several columns of the table below `table_base_oid`
+
+        Backends that are able to fetch all the columns in a single
+        request should override this.  The default implementation
+        walks the columns one after another.
+        """
+        return {
+            oid: self.walk(
+                oid,
+                check_plugin_name=check_plugin_name,
+                table_base_oid=table_base_oid,
+                context_name=context_name,
+            ) for oid in oids
+        }
+
 
 class SpecialColumn(enum.IntEnum):
     # Until we remove all but the first, its worth having an enum
@@ -42,6 +42,7 @@ from cmk.utils.exceptions import MKGeneralException
 import cmk.utils.paths
 import cmk.utils
 from cmk.utils.check_utils import maincheckify
+from cmk.utils.inventory_archive import ARCHIVE_FILE_MAGIC
 from cmk.utils.type_defs import CheckPluginName, UserId
 from cmk.utils.bi.bi_legacy_config_converter import BILegacyPacksConverter
 from cmk.gui.bi import BIManager  # pylint: disable=cmk-module-layer-violation
@@ -822,6 +823,11 @@ class UpdateConfig:
         return p.returncode
 
     def _needs_to_be_converted(self, filepath: Path) -> Optional[Path]:
+        with filepath.open("rb") as bf:
+            if bf.read(len(ARCHIVE_FILE_MAGIC)) == ARCHIVE_FILE_MAGIC:
+                # Binary inventory archive files are written by this version
+                return None
+
         with filepath.open(encoding="utf-8") as f:
             # Try to evaluate data with ast.literal_eval
             try:
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Protocol and client of the automation helper
+
+The automation helper ("cmk --automation-helper") is a long running process which keeps the
+check plugins and the configuration loaded. It receives automation calls on a unix socket and
+executes each of them in a forked worker process. This saves the startup of a "cmk --automation"
+process for every automation call triggered by the GUI.
+
+The client sends a single JSON encoded request, shuts down the writing side of the socket and
+reads the JSON encoded response until the helper closes the connection. In case the helper is
+not running or can not execute the command, the caller has to execute the automation itself.
+"""
+
+import json
+import socket
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import cmk.utils.paths
+from cmk.utils.exceptions import MKGeneralException
+
+
+class AutomationRequest(NamedTuple):
+    command: str
+    args: List[str]
+    stdin: str
+    verbosity: int
+
+    def serialize(self) -> bytes:
+        return json.dumps(self._asdict()).encode("utf-8")
+
+    @classmethod
+    def deserialize(cls, raw: bytes) -> "AutomationRequest":
+        request = json.loads(raw.decode("utf-8"))
+        return cls(
+            command=str(request["command"]),
+            args=[str(a) for a in request["args"]],
+            stdin=str(request["stdin"]),
+            verbosity=int(request["verbosity"]),
+        )
+
+
+class AutomationResponse(NamedTuple):
+    exit_code: int
+    stdout: str
+    stderr: str
+
+
+def serialize_response(response: AutomationResponse) -> bytes:
+    return json.dumps({"result": response._asdict()}).encode("utf-8")
+
+
+def serialize_unavailable(reason: str) -> bytes:
+    """The helper can not execute the request. The caller has to do it on its own."""
+    return json.dumps({"unavailable": reason}).encode("utf-8")
+
+
+def deserialize_response(raw: bytes) -> Optional[AutomationResponse]:
+    """Returns None in case the helper declined to execute the request"""
+    response: Dict[str, Any] = json.loads(raw.decode("utf-8"))
+    if "unavailable" in response:
+        return None
+    result = response["result"]
+    return AutomationResponse(
+        exit_code=int(result["exit_code"]),
+        stdout=str(result["stdout"]),
+        stderr=str(result["stderr"]),
+    )
+
+
+def receive_all(sock: socket.socket) -> bytes:
+    """Read from the socket until the other side shuts down its writing side"""
+    chunks: List[bytes] = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def execute_automation(request: AutomationRequest,
+                       socket_path: Optional[Path] = None) -> Optional[AutomationResponse]:
+    """Let the automation helper execute an automation call
+
+    Returns None in case the helper is not running or not able to execute the command.
+    Nothing has been executed in this case.
+    """
+    if socket_path is None:
+        socket_path = Path(cmk.utils.paths.automation_helper_socket)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            # Not running (or not reachable): Nothing was sent, the caller can safely fall back
+            return None
+
+        try:
+            sock.sendall(request.serialize())
+            sock.shutdown(socket.SHUT_WR)
+            raw = receive_all(sock)
+        except OSError as e:
+            raise MKGeneralException("Communication with the automation helper failed: %s" % e)
+    finally:
+        sock.close()
+
+    if not raw:
+        raise MKGeneralException("The automation helper closed the connection without response")
+
+    try:
+        return deserialize_response(raw)
+    except (ValueError, KeyError, TypeError) as e:
+        raise MKGeneralException("Invalid response from the automation helper: %s" % e)
@@ -7,19 +7,28 @@
 import os
 import time
 import cmk
+import hashlib
+import json
 import marshal
+import multiprocessing
 from pathlib import Path
 from typing import (
     TYPE_CHECKING,
+    Any,
     Dict,
     Set,
+    NamedTuple,
     Optional,
+    Tuple,
     TypedDict,
     List,
 )
 
 from cmk.utils.log import logger
+from cmk.utils.bi.bi_actions import BICallARuleAction
+from cmk.utils.bi.bi_lib import BIHostData
 from cmk.utils.bi.bi_packs import BIAggregationPacks
+from cmk.utils.bi.bi_rule import BIRule
 from cmk.utils.bi.bi_searcher import BISearcher
 from cmk.utils.bi.bi_data_fetcher import (
     BIStructureFetcher,
@@ -46,6 +55,26 @@ class ConfigStatus(TypedDict):
     online_sites: Set[SiteProgramStart]
 
 
+# Aggregations are only compiled in worker processes if each of them gets at least this many
+MIN_AGGREGATIONS_PER_PROCESS = 10
+
+COMPILATION_STATE_VERSION = 1
+
+# Site and fingerprint of the structure data of a host
+HostFingerprint = Tuple[str, str]
+
+
+class AggregationDependencies(NamedTuple):
+    all_hosts: bool
+    host_names: List[str]
+
+
+class CompilationResult(NamedTuple):
+    compiled_aggregation: BICompiledAggregation
+    serialized: Dict[str, Any]
+    dependencies: AggregationDependencies
+
+
 class BICompiler:
     def __init__(self, bi_configuration_file, sites_callback: SitesCallback):
         self._sites_callback = sites_callback
@@ -55,6 +84,7 @@ class BICompiler:
         self._compiled_aggregations: Dict[str, BICompiledAggregation] = {}
         self._path_compilation_lock = Path(get_cache_dir(), "compilation.LOCK")
         self._path_compilation_timestamp = Path(get_cache_dir(), "last_compilation")
+        self._path_compilation_state = Path(get_cache_dir(), "compilation_state")
         self._path_compiled_aggregations = Path(get_cache_dir(), "compiled_aggregations")
         self._path_compiled_aggregations.mkdir(parents=True, exist_ok=True)
 
@@ -105,34 +135,196 @@ class BICompiler:
                 return
 
             self.prepare_for_compilation(current_configstatus["online_sites"])
-
-            # Compile the raw tree
-            for aggregation in self._bi_packs.get_all_aggregations():
-                start = time.time()
-                self._compiled_aggregations[aggregation.id] = aggregation.compile(self.bi_searcher)
-                self._logger.debug("Compilation of %s took %f" %
-                                   (aggregation.id, time.time() - start))
-
-            self._verify_aggregation_title_uniqueness(self._compiled_aggregations)
-
-            for aggr_id, aggr in self._compiled_aggregations.items():
-                start = time.time()
-                result = aggr.serialize()
-                self._logger.debug("Schema dump %s took config took %f (%d branches)" %
-                                   (aggr_id, time.time() - start, len(aggr.branches)))
-                self._marshal_save_data(self._path_compiled_aggregations.joinpath(aggr_id), result)
-
-            self._generate_part_of_aggregation_lookup(self._compiled_aggregations)
+            self._compile_outdated_aggregations(current_configstatus)
 
         known_sites = {kv[0]: kv[1] for kv in current_configstatus.get("known_sites", set())}
-        self._cleanup_vanished_aggregations()
         self._bi_structure_fetcher.cleanup_orphaned_files(known_sites)
 
         self._path_compilation_timestamp.write_text(
             str(current_configstatus["configfile_timestamp"]))
 
-    def _cleanup_vanished_aggregations(self):
-        valid_aggregations = list(self._compiled_aggregations.keys())
+    def _compile_outdated_aggregations(self, current_configstatus: ConfigStatus) -> None:
+        """Compiles the aggregations affected by changes since the last compilation
+
+        An aggregation is compiled again if its configuration (including all rules it
+        calls) changed or if the structure data of any host it looked up changed. The
+        other aggregations are loaded from the previous compilation.
+        """
+        state = self._load_compilation_state()
+        online_sites = dict(current_configstatus["online_sites"])
+        host_fingerprints, changed_hosts = self._update_host_fingerprints(state, online_sites)
+
+        aggregations = {
+            aggregation.id: aggregation for aggregation in self._bi_packs.get_all_aggregations()
+        }
+        fingerprints = {
+            aggr_id: self._aggregation_fingerprint(aggregation)
+            for aggr_id, aggregation in aggregations.items()
+        }
+        outdated_aggregations = self._outdated_aggregations(state, fingerprints, changed_hosts)
+        self._logger.debug("Compiling %d of %d aggregations (%d changed hosts)" %
+                           (len(outdated_aggregations), len(aggregations), len(changed_hosts)))
+
+        for aggr_id in list(self._compiled_aggregations):
+            if aggr_id not in aggregations or aggr_id in outdated_aggregations:
+                del self._compiled_aggregations[aggr_id]
+        self._cleanup_vanished_aggregations(set(aggregations))
+
+        results = self._compile_aggregations(
+            [aggregations[aggr_id] for aggr_id in sorted(outdated_aggregations)])
+        for aggr_id, result in results.items():
+            self._compiled_aggregations[aggr_id] = result.compiled_aggregation
+
+        # The unchanged aggregations are needed for the checks and the lookup below
+        self._load_compiled_aggregations()
+
+        self._verify_aggregation_title_uniqueness(self._compiled_aggregations)
+
+        for aggr_id, result in results.items():
+            self._save_compiled_aggregation(aggr_id, result.serialized)
+
+        known_aggregations = state.get("aggregations", {})
+        aggregation_states = {}
+        for aggr_id, fingerprint in fingerprints.items():
+            if aggr_id in results:
+                dependencies = results[aggr_id].dependencies._asdict()
+            else:
+                dependencies = known_aggregations[aggr_id]
+            aggregation_states[aggr_id] = {**dependencies, "fingerprint": fingerprint}
+        self._save_compilation_state({
+            "version": COMPILATION_STATE_VERSION,
+            "sites": online_sites,
+            "hosts": host_fingerprints,
+            "aggregations": aggregation_states,
+        })
+
+        self._generate_part_of_aggregation_lookup(self._compiled_aggregations)
+
+    def _load_compilation_state(self) -> Dict[str, Any]:
+        if not self._path_compilation_state.exists():
+            return {}
+        state = self._marshal_load_data(str(self._path_compilation_state))
+        if state.get("version") != COMPILATION_STATE_VERSION:
+            return {}
+        return state
+
+    def _save_compilation_state(self, state: Dict[str, Any]) -> None:
+        self._marshal_save_data(str(self._path_compilation_state), state)
+
+    def _update_host_fingerprints(
+            self, state: Dict[str, Any],
+            online_sites: Dict[str, int]) -> Tuple[Dict[str, HostFingerprint], Set[str]]:
+        """Returns the fingerprints of all hosts and the names of the changed hosts
+
+        The structure data of a site only changes with its program start, so only the hosts
+        of restarted, added or removed sites are looked at.
+        """
+        known_sites: Dict[str, int] = state.get("sites", {})
+        known_hosts: Dict[str, HostFingerprint] = state.get("hosts", {})
+        changed_sites = {
+            site_id for site_id, program_start in online_sites.items()
+            if known_sites.get(site_id) != program_start
+        }
+        changed_sites.update(set(known_sites) - set(online_sites))
+        if not changed_sites:
+            return known_hosts, set()
+
+        host_fingerprints = {
+            host_name: host_fingerprint
+            for host_name, host_fingerprint in known_hosts.items()
+            if host_fingerprint[0] not in changed_sites
+        }
+        for host_name, host in self._bi_structure_fetcher.hosts.items():
+            if host.site_id in changed_sites and host.site_id in online_sites:
+                host_fingerprints[host_name] = (host.site_id, _host_fingerprint(host))
+
+        changed_hosts = {
+            host_name for host_name in set(host_fingerprints) | set(known_hosts)
+            if host_fingerprints.get(host_name) != known_hosts.get(host_name)
+        }
+        return host_fingerprints, changed_hosts
+
+    def _outdated_aggregations(self, state: Dict[str, Any], fingerprints: Dict[str, str],
+                               changed_hosts: Set[str]) -> Set[str]:
+        known_aggregations = state.get("aggregations", {})
+        outdated_aggregations = set()
+        for aggr_id, fingerprint in fingerprints.items():
+            known_aggregation = known_aggregations.get(aggr_id)
+            if (known_aggregation is None or known_aggregation["fingerprint"] != fingerprint or
+                    not self._path_compiled_aggregations.joinpath(aggr_id).exists()):
+                outdated_aggregations.add(aggr_id)
+            elif changed_hosts and (known_aggregation["all_hosts"] or
+                                    not changed_hosts.isdisjoint(known_aggregation["host_names"])):
+                outdated_aggregations.add(aggr_id)
+        return outdated_aggregations
+
+    def _aggregation_fingerprint(self, aggregation: BIAggregation) -> str:
+        """Fingerprint of the configuration of an aggregation and all rules it calls"""
+        rules: Dict[str, BIRule] = {}
+        nodes = [aggregation.node]
+        while nodes:
+            node = nodes.pop()
+            if not isinstance(node.action, BICallARuleAction) or node.action.rule_id in rules:
+                continue
+            rule = self._bi_packs.get_rule(node.action.rule_id)
+            if rule is None:
+                continue
+            rules[rule.id] = rule
+            nodes.extend(rule.get_nodes())
+
+        configuration = [aggregation.serialize()]
+        configuration.extend(rules[rule_id].serialize() for rule_id in sorted(rules))
+        return _fingerprint(configuration)
+
+    def _compile_aggregations(self,
+                              aggregations: List[BIAggregation]) -> Dict[str, CompilationResult]:
+        processes = min(os.cpu_count() or 1, len(aggregations) // MIN_AGGREGATIONS_PER_PROCESS)
+        if processes < 2:
+            results = {}
+            for aggregation in aggregations:
+                compiled_aggregation, dependencies = self._compile_aggregation(aggregation)
+                results[aggregation.id] = CompilationResult(compiled_aggregation,
+                                                            compiled_aggregation.serialize(),
+                                                            dependencies)
+            return results
+
+        # The workers are forked and inherit the loaded configuration and structure data
+        global _worker_compiler
+        _worker_compiler = self
+        try:
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                return {
+                    aggr_id: CompilationResult(BIAggregation.create_trees_from_schema(serialized),
+                                               serialized, dependencies)
+                    for aggr_id, serialized, dependencies in pool.imap_unordered(
+                        _compile_aggregation_in_worker, [x.id for x in aggregations])
+                }
+        finally:
+            _worker_compiler = None
+
+    def _compile_aggregation(
+            self,
+            aggregation: BIAggregation) -> Tuple[BICompiledAggregation, AggregationDependencies]:
+        start = time.time()
+        with self.bi_searcher.record_host_lookups() as host_lookups:
+            compiled_aggregation = aggregation.compile(self.bi_searcher)
+        self._logger.debug("Compilation of %s took %f" % (aggregation.id, time.time() - start))
+        return compiled_aggregation, AggregationDependencies(
+            host_lookups.all_hosts,
+            [] if host_lookups.all_hosts else sorted(host_lookups.host_names),
+        )
+
+    def _save_compiled_aggregation(self, aggr_id: str, serialized: Dict[str, Any]) -> None:
+        # Unchanged results are not written again. Other processes keep their loaded copy.
+        path = self._path_compiled_aggregations.joinpath(aggr_id)
+        data = marshal.dumps(serialized)
+        if path.exists() and path.read_bytes() == data:
+            return
+        with path.open("wb") as f:
+            f.write(data)
+            os.fsync(f.fileno())
+
+    def _cleanup_vanished_aggregations(self, valid_aggregations: Set[str]) -> None:
         for path_object in self._path_compiled_aggregations.iterdir():
             if path_object.is_dir():
                 continue
@@ -314,3 +506,24 @@ class BICompiler:
             pipeline.delete(*obsolete_keys)
 
         pipeline.execute()
+
+
+# The compiler of the parent process, inherited by the forked workers
+_worker_compiler: Optional[BICompiler] = None
+
+
+def _compile_aggregation_in_worker(
+        aggr_id: str) -> Tuple[str, Dict[str, Any], AggregationDependencies]:
+    assert _worker_compiler is not None
+    aggregation = _worker_compiler._bi_packs.get_aggregation_mandatory(aggr_id)
+    compiled_aggregation, dependencies = _worker_compiler._compile_aggregation(aggregation)
+    return aggr_id, compiled_aggregation.serialize(), dependencies
+
+
+def _host_fingerprint(host: BIHostData) -> str:
+    return _fingerprint(host)
+
+
+def _fingerprint(data: Any) -> str:
+    # Sets (e.g. tags) are sorted to get the same fingerprint in every process
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=sorted).encode("utf-8")).hexdigest()
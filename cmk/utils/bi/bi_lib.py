@@ -9,6 +9,8 @@ from typing import (
     Callable,
     TypeVar,
     Any,
+    Iterable,
+    Mapping,
     NamedTuple,
     Optional,
     Union,
@@ -345,7 +347,7 @@ def replace_macros_in_string(pattern: str, macros: MacroMapping) -> str:
 
 class ABCBISearcher(metaclass=abc.ABCMeta):
     def __init__(self):
-        self.hosts = {}
+        self.hosts: Mapping[HostName, BIHostData] = {}
         self._host_regex_match_cache = {}
         self._host_regex_miss_cache = {}
 
@@ -358,7 +360,7 @@ class ABCBISearcher(metaclass=abc.ABCMeta):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def get_host_name_matches(self, hosts: List[BIHostData],
+    def get_host_name_matches(self, hosts: Iterable[BIHostData],
                               pattern: str) -> Tuple[List[BIHostData], Dict]:
         raise NotImplementedError()
 
@@ -368,7 +370,7 @@ class ABCBISearcher(metaclass=abc.ABCMeta):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def filter_host_choice(self, hosts: List[BIHostData],
+    def filter_host_choice(self, hosts: Iterable[BIHostData],
                            condition: Dict) -> Tuple[List[BIHostData], Dict]:
         raise NotImplementedError()
 
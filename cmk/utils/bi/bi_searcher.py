@@ -4,8 +4,20 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+from contextlib import contextmanager
 from cmk.utils.regex import regex
-from typing import Dict, List, Tuple
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    ValuesView,
+)
 from cmk.utils.rulesets.ruleset_matcher import matches_labels, matches_tag_spec
 
 from cmk.utils.bi.bi_lib import (
@@ -26,6 +38,58 @@ from cmk.utils.bi.bi_lib import (
 
 # Search data used by bi_searcher
 
+
+class BIHostLookups(Mapping[str, BIHostData]):
+    """The hosts of a BISearcher, recording which of them are looked up
+
+    Iterating over the hosts counts as a lookup of all hosts, including the
+    ones that are not there yet. The other methods of the Mapping, like get(),
+    keys() and items(), are based on the ones defined here.
+    """
+    def __init__(self, hosts: Mapping[str, BIHostData]) -> None:
+        super().__init__()
+        self._hosts = hosts
+        self.all_hosts = False
+        self.host_names: Set[str] = set()
+
+    def __getitem__(self, host_name: str) -> BIHostData:
+        self.host_names.add(host_name)
+        return self._hosts[host_name]
+
+    def __contains__(self, host_name: object) -> bool:
+        if isinstance(host_name, str):
+            self.host_names.add(host_name)
+        return host_name in self._hosts
+
+    def __iter__(self) -> Iterator[str]:
+        self.all_hosts = True
+        return iter(self._hosts)
+
+    def __len__(self) -> int:
+        self.all_hosts = True
+        return len(self._hosts)
+
+    def values(self) -> ValuesView[BIHostData]:
+        # Only iterating over the values counts as a lookup of all hosts. Plain host names
+        # are looked up by name, even if the values are passed to the search.
+        return _BIHostLookupsValues(self)
+
+    def iter_values(self) -> Iterator[BIHostData]:
+        self.all_hosts = True
+        return iter(self._hosts.values())
+
+
+class _BIHostLookupsValues(ValuesView[BIHostData]):
+    _mapping: BIHostLookups
+
+    def __iter__(self) -> Iterator[BIHostData]:
+        return self._mapping.iter_values()
+
+
+def _is_regex_pattern(pattern: str) -> bool:
+    return any(x in pattern for x in ["(", ")", "*", "$", "|", "[", "]"])
+
+
 #   .--BISearcher----------------------------------------------------------.
 #   |         ____ ___ ____                      _                         |
 #   |        | __ )_ _/ ___|  ___  __ _ _ __ ___| |__   ___ _ __           |
@@ -37,9 +101,40 @@ from cmk.utils.bi.bi_lib import (
 
 
 class BISearcher(ABCBISearcher):
+    def __init__(self):
+        super().__init__()
+        # Indexes of the hosts, built by set_hosts()
+        self._host_list: List[BIHostData] = []
+        self._host_order: Dict[str, int] = {}
+        self._hosts_by_tag: Dict[str, Set[str]] = {}
+        self._hosts_by_label: Dict[Tuple[str, str], Set[str]] = {}
+        # Results of searches over all hosts and of service searches, per pattern
+        self._host_name_regex_results: Dict[str, Tuple[List[BIHostData], Dict]] = {}
+        self._service_regex_results: Dict[str, Dict[str, List[Tuple[str, Tuple]]]] = {}
+
     def set_hosts(self, hosts: Dict[str, BIHostData]) -> None:
         self.cleanup()
         self.hosts = hosts
+        self._build_indexes(hosts)
+
+    def _build_indexes(self, hosts: Dict[str, BIHostData]) -> None:
+        for host_name, host in hosts.items():
+            self._host_order[host_name] = len(self._host_list)
+            self._host_list.append(host)
+            for tag in host.tags:
+                self._hosts_by_tag.setdefault(tag, set()).add(host_name)
+            for label in host.labels.items():
+                self._hosts_by_label.setdefault(label, set()).add(host_name)
+
+    @contextmanager
+    def record_host_lookups(self) -> Iterator[BIHostLookups]:
+        """Records the hosts looked up while searching, e.g. while compiling an aggregation"""
+        hosts = self.hosts
+        self.hosts = BIHostLookups(hosts)
+        try:
+            yield self.hosts
+        finally:
+            self.hosts = hosts
 
     def cleanup(self) -> None:
         # Note: Do not call clear() on hosts
@@ -47,18 +142,103 @@ class BISearcher(ABCBISearcher):
         self.hosts = {}
         self._host_regex_match_cache.clear()
         self._host_regex_miss_cache.clear()
+        self._host_list = []
+        self._host_order.clear()
+        self._hosts_by_tag.clear()
+        self._hosts_by_label.clear()
+        self._host_name_regex_results.clear()
+        self._service_regex_results.clear()
 
     def search_hosts(self, conditions: Dict) -> List[BIHostSearchMatch]:
-        matched_hosts, matched_re_groups = self.filter_host_choice(list(self.hosts.values()),
-                                                                   conditions["host_choice"])
-        matched_hosts = self.filter_host_tags(matched_hosts, conditions["host_tags"])
-        matched_hosts = self.filter_host_labels(matched_hosts, conditions["host_labels"])
+        host_choice = conditions["host_choice"]
+        if host_choice["type"] == "host_name_regex" and not _is_regex_pattern(
+                host_choice["pattern"]):
+            # A single host, looked up by its name
+            matched_hosts, matched_re_groups = self.get_host_name_matches(
+                self.hosts.values(), host_choice["pattern"])
+            matched_hosts = self.filter_host_tags(matched_hosts, conditions["host_tags"])
+            matched_hosts = self.filter_host_labels(matched_hosts, conditions["host_labels"])
+            return [BIHostSearchMatch(x, matched_re_groups[x.name]) for x in matched_hosts]
+
+        # The tag and label conditions narrow down the hosts before any regex is applied
+        candidates = self._indexed_host_candidates(conditions["host_tags"],
+                                                   conditions["host_labels"])
+        if candidates is None and host_choice["type"] == "host_name_regex":
+            matched_hosts, matched_re_groups = self._get_all_host_name_matches(
+                host_choice["pattern"])
+        else:
+            matched_hosts, matched_re_groups = self.filter_host_choice(
+                self.hosts.values() if candidates is None else candidates, host_choice)
         return [BIHostSearchMatch(x, matched_re_groups[x.name]) for x in matched_hosts]
 
-    def filter_host_choice(self, hosts: List[BIHostData],
+    def _indexed_host_candidates(self, host_tags: Dict,
+                                 host_labels: Dict) -> Optional[List[BIHostData]]:
+        """The hosts matching the tag and label conditions, None without any condition"""
+        if not host_tags and not host_labels:
+            return None
+
+        # The hosts are not looked up one by one, see record_host_lookups()
+        if isinstance(self.hosts, BIHostLookups):
+            self.hosts.all_hosts = True
+
+        candidates: Optional[Set[str]] = None
+        for tag_spec in host_tags.values():
+            candidates = self._narrow_candidates(candidates, *self._hosts_of_tag_spec(tag_spec))
+        for label_id, label_spec in host_labels.items():
+            is_not = isinstance(label_spec, dict)
+            if is_not:
+                label_spec = label_spec["$ne"]
+            candidates = self._narrow_candidates(
+                candidates, self._hosts_by_label.get((label_id, label_spec), set()), is_not)
+
+        assert candidates is not None
+        # Keep the order of the hosts, it determines the order of the branches
+        return [self._host_list[x] for x in sorted(self._host_order[x] for x in candidates)]
+
+    def _narrow_candidates(self, candidates: Optional[Set[str]], host_names: Set[str],
+                           is_not: bool) -> Set[str]:
+        if is_not:
+            if candidates is None:
+                return {x for x in self._host_order if x not in host_names}
+            return candidates - host_names
+        return set(host_names) if candidates is None else candidates & host_names
+
+    def _hosts_of_tag_spec(self, tag_spec: Union[Dict, str]) -> Tuple[Set[str], bool]:
+        """The hosts having a tag and whether the tag spec is negated, see matches_tag_spec()"""
+        if not isinstance(tag_spec, dict):
+            return self._hosts_by_tag.get(tag_spec, set()), False
+
+        if "$ne" in tag_spec:
+            return self._hosts_by_tag.get(tag_spec["$ne"], set()), True
+
+        if "$or" in tag_spec:
+            return self._hosts_of_tag_specs(tag_spec["$or"]), False
+
+        if "$nor" in tag_spec:
+            return self._hosts_of_tag_specs(tag_spec["$nor"]), True
+
+        raise NotImplementedError()
+
+    def _hosts_of_tag_specs(self, tag_specs: List[Union[Dict, str]]) -> Set[str]:
+        host_names: Set[str] = set()
+        for tag_spec in tag_specs:
+            host_names |= self._narrow_candidates(None, *self._hosts_of_tag_spec(tag_spec))
+        return host_names
+
+    def _get_all_host_name_matches(self, pattern: str) -> Tuple[List[BIHostData], Dict]:
+        if isinstance(self.hosts, BIHostLookups):
+            self.hosts.all_hosts = True
+
+        if pattern not in self._host_name_regex_results:
+            self._host_name_regex_results[pattern] = self.get_host_name_matches(
+                self._host_list, pattern)
+        return self._host_name_regex_results[pattern]
+
+    def filter_host_choice(self, hosts: Iterable[BIHostData],
                            condition: Dict) -> Tuple[List[BIHostData], Dict]:
         if condition["type"] == "all_hosts":
-            return hosts, self._host_match_groups(hosts)
+            all_hosts = list(hosts)
+            return all_hosts, self._host_match_groups(all_hosts)
 
         if condition["type"] == "host_name_regex":
             return self.get_host_name_matches(hosts, condition["pattern"])
@@ -71,14 +251,14 @@ class BISearcher(ABCBISearcher):
     def _host_match_groups(self, hosts: List[BIHostData], match="name"):
         return {host.name: (getattr(host, match),) for host in hosts}
 
-    def get_host_name_matches(self, hosts: List[BIHostData],
+    def get_host_name_matches(self, hosts: Iterable[BIHostData],
                               pattern: str) -> Tuple[List[BIHostData], Dict]:
 
         if pattern == "(.*)":
-            return hosts, self._host_match_groups(hosts)
+            all_hosts = list(hosts)
+            return all_hosts, self._host_match_groups(all_hosts)
 
-        is_regex_match = any(map(lambda x: x in pattern, ["(", ")", "*", "$", "|", "[", "]"]))
-        if not is_regex_match:
+        if not _is_regex_pattern(pattern):
             host = self.hosts.get(pattern)
             if host:
                 return [host], {pattern: (pattern,)}
@@ -113,10 +293,11 @@ class BISearcher(ABCBISearcher):
             matched_re_groups[host.name] = pattern_match_cache[host.name]
         return matched_hosts, matched_re_groups
 
-    def get_host_alias_matches(self, hosts: List[BIHostData],
+    def get_host_alias_matches(self, hosts: Iterable[BIHostData],
                                pattern: str) -> Tuple[List[BIHostData], Dict]:
         if pattern == "(.*)":
-            return hosts, self._host_match_groups(hosts, "alias")
+            all_hosts = list(hosts)
+            return all_hosts, self._host_match_groups(all_hosts, "alias")
 
         # TODO: alias matches currently costs way more performance than the host matches
         #       requires alias lookup cache to fix
@@ -134,16 +315,26 @@ class BISearcher(ABCBISearcher):
     def get_service_description_matches(self, hosts: List[BIHostData],
                                         pattern: str) -> List[BIServiceSearchMatch]:
         matched_services = []
-        regex_pattern = regex(pattern)
+        pattern_results = self._service_regex_results.setdefault(pattern, {})
         for host in hosts:
-            for service_description in host.services.keys():
-                match = regex_pattern.match(service_description)
-                if match is None:
-                    continue
+            host_results = pattern_results.get(host.name)
+            if host_results is None:
+                host_results = pattern_results[host.name] = self._match_services(host, pattern)
+            for service_description, match_groups in host_results:
                 matched_services.append(
-                    BIServiceSearchMatch(host, service_description, tuple(match.groups())))
+                    BIServiceSearchMatch(host, service_description, match_groups))
         return matched_services
 
+    def _match_services(self, host: BIHostData, pattern: str) -> List[Tuple[str, Tuple]]:
+        host_results = []
+        regex_pattern = regex(pattern)
+        for service_description in host.services.keys():
+            match = regex_pattern.match(service_description)
+            if match is None:
+                continue
+            host_results.append((service_description, tuple(match.groups())))
+        return host_results
+
     def search_services(self, conditions: Dict) -> List[BIServiceSearchMatch]:
         host_matches: List[BIHostSearchMatch] = self.search_hosts(conditions)
         service_matches = self.get_service_description_matches([x.host for x in host_matches],
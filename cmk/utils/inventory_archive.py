@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""The archived inventory trees of a host
+
+The current inventory tree of a host is the base of its archive. Each archived tree is
+stored as a delta to the next newer tree ("reverse delta"), i.e. the newest archived tree
+as delta to the current tree. Removing the oldest files, as the disk space cleanup does,
+keeps all newer trees readable. The deltas refer to the hash of their base tree, so only
+a changed content of the current tree breaks the chain, not e.g. a rewrite of its file.
+
+The files are named after the time the tree was replaced, like before. Archives written by
+older versions contain complete trees in the repr format. They are still read and cut
+the chain of deltas.
+"""
+
+import hashlib
+import marshal
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cmk.utils.store as store
+from cmk.utils.exceptions import MKGeneralException
+
+# Prefix of the binary archive files, see InventoryArchive
+ARCHIVE_FILE_MAGIC = b"CMKINVARCHIVE1\n"
+
+RawTree = Dict[str, Any]
+# ("=", value) | ("d", updated, sub_deltas, removed_keys, key_order) | ("l", list_ops)
+RawTreeDelta = Tuple
+
+
+class InventoryArchive:
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._raw_trees: Dict[str, RawTree] = {}
+
+    def timestamps(self) -> List[str]:
+        try:
+            return sorted(os.listdir(str(self._path)))
+        except OSError:
+            return []
+
+    def add(self, timestamp: int, raw_tree: RawTree, current_raw_tree: RawTree) -> None:
+        """Archives the tree replaced by the current tree at the given time
+
+        In case the tree has been replaced within the same second as the previously archived
+        tree, the previously archived tree is kept and the replaced tree is not archived.
+        The previously archived tree is stored relative to the current tree then."""
+        self._path.mkdir(parents=True, exist_ok=True)
+        if (self._path / str(timestamp)).exists():
+            raw_tree = self.load_raw_tree(str(timestamp), raw_tree)
+        self._save(
+            str(timestamp), {
+                "base": compute_raw_tree_hash(current_raw_tree),
+                "delta": compute_raw_tree_delta(current_raw_tree, raw_tree),
+            })
+
+    def materialize_newest(self, current_raw_tree: RawTree) -> None:
+        """Stores the newest archived tree completely, e.g. before the current tree is removed"""
+        timestamps = self.timestamps()
+        if not timestamps:
+            return
+        newest_timestamp = timestamps[-1]
+        self._save(newest_timestamp, {
+            "tree": self.load_raw_tree(newest_timestamp, current_raw_tree),
+        })
+
+    def _save(self, timestamp: str, content: Dict[str, Any]) -> None:
+        path = self._path / timestamp
+        store.save_bytes_to_file(path, ARCHIVE_FILE_MAGIC + marshal.dumps(content))
+        # The disk space cleanup removes the oldest archive files first
+        os.utime(str(path), (int(timestamp), int(timestamp)))
+
+    def load_raw_tree(self, timestamp: str, current_raw_tree: RawTree) -> RawTree:
+        """Reconstructs an archived tree from the newer trees
+
+        The reconstructed trees are kept, so loading all trees of an archive only reads
+        every file once. Raises MKGeneralException if the chain of deltas is broken.
+        """
+        timestamps = self.timestamps()
+        # Walk to the newer trees up to a complete or already reconstructed one
+        deltas: List[Tuple[str, Dict[str, Any]]] = []
+        for index in range(timestamps.index(timestamp), len(timestamps)):
+            archived_timestamp = timestamps[index]
+            if archived_timestamp in self._raw_trees:
+                raw_tree = self._raw_trees[archived_timestamp]
+                break
+
+            content = self._load(archived_timestamp)
+            if "tree" in content:
+                raw_tree = self._raw_trees[archived_timestamp] = content["tree"]
+                break
+            deltas.append((archived_timestamp, content))
+        else:
+            raw_tree = current_raw_tree
+
+        for archived_timestamp, content in reversed(deltas):
+            if compute_raw_tree_hash(raw_tree) != content["base"]:
+                raise MKGeneralException("Missing base of archived inventory tree %s" %
+                                         archived_timestamp)
+            raw_tree = self._raw_trees[archived_timestamp] = apply_raw_tree_delta(
+                raw_tree, content["delta"])
+        return raw_tree
+
+    def _load(self, timestamp: str) -> Dict[str, Any]:
+        path = self._path / timestamp
+        content = store.load_bytes_from_file(path)
+        if content.startswith(ARCHIVE_FILE_MAGIC):
+            return marshal.loads(content[len(ARCHIVE_FILE_MAGIC):])
+        # Complete trees written by older versions
+        return {"tree": store.load_object_from_file(path, default={})}
+
+
+def compute_raw_tree_hash(raw_tree: RawTree) -> str:
+    """Identifies the content of a tree, the trees are stored as their repr()"""
+    return hashlib.sha256(repr(raw_tree).encode("utf-8")).hexdigest()
+
+
+def compute_raw_tree_delta(base: Any, target: Any) -> Optional[RawTreeDelta]:
+    """Computes the delta turning base into target, None if they are equal"""
+    if base == target:
+        return None
+
+    if isinstance(base, dict) and isinstance(target, dict):
+        updated = {}
+        sub_deltas = {}
+        for key, value in target.items():
+            if key not in base:
+                updated[key] = value
+            elif isinstance(value, (dict, list)) and type(value) is type(base[key]):
+                sub_delta = compute_raw_tree_delta(base[key], value)
+                if sub_delta is not None:
+                    sub_deltas[key] = sub_delta
+            elif base[key] != value:
+                updated[key] = value
+        removed_keys = [key for key in base if key not in target]
+
+        key_order = [key for key in base if key in target]
+        key_order += [key for key in target if key not in base]
+        return ("d", updated, sub_deltas, removed_keys,
+                None if key_order == list(target) else list(target))
+
+    if isinstance(base, list) and isinstance(target, list):
+        return ("l", _compute_list_ops(base, target))
+
+    return ("=", target)
+
+
+def _compute_list_ops(base: List, target: List) -> List:
+    """Ranges of base entries as (start, length), target entries not in base as lists"""
+    first_indices: Dict[bytes, int] = {}
+    base_keys = []
+    for index, entry in enumerate(base):
+        key = marshal.dumps(entry)
+        base_keys.append(key)
+        first_indices.setdefault(key, index)
+
+    ops: List = []
+    for entry in target:
+        key = marshal.dumps(entry)
+        if ops and isinstance(ops[-1], tuple):
+            start, length = ops[-1]
+            if start + length < len(base) and base_keys[start + length] == key:
+                ops[-1] = (start, length + 1)
+                continue
+
+        if key in first_indices:
+            ops.append((first_indices[key], 1))
+        elif ops and isinstance(ops[-1], list):
+            ops[-1].append(entry)
+        else:
+            ops.append([entry])
+    return ops
+
+
+def apply_raw_tree_delta(base: Any, delta: Optional[RawTreeDelta]) -> Any:
+    """Applies a delta computed by compute_raw_tree_delta(), base is not modified"""
+    if delta is None:
+        return base
+
+    if delta[0] == "d":
+        _type, updated, sub_deltas, removed_keys, key_order = delta
+        removed = set(removed_keys)
+        result = {key: value for key, value in base.items() if key not in removed}
+        for key, sub_delta in sub_deltas.items():
+            result[key] = apply_raw_tree_delta(base[key], sub_delta)
+        result.update(updated)
+        if key_order is not None:
+            result = {key: result[key] for key in key_order}
+        return result
+
+    if delta[0] == "l":
+        result_list: List = []
+        for op in delta[1]:
+            if isinstance(op, tuple):
+                start, length = op
+                result_list.extend(base[start:start + length])
+            else:
+                result_list.extend(op)
+        return result_list
+
+    return delta[1]
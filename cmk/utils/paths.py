@@ -45,6 +45,7 @@ core_helper_config_dir = Path(_omd_path("var/check_mk/core/helper_config"))
 autochecks_dir = base_autochecks_dir
 precompiled_hostchecks_dir = _omd_path("var/check_mk/precompiled")
 snmpwalks_dir = _omd_path("var/check_mk/snmpwalks")
+snmpwalks_index_dir = _omd_path("var/check_mk/snmpwalks_index")
 counters_dir = _omd_path("tmp/check_mk/counters")
 tcp_cache_dir = _omd_path("tmp/check_mk/cache")
 data_source_cache_dir = _omd_path("tmp/check_mk/data_source_cache")
@@ -63,6 +64,8 @@ nagios_binary = _omd_path("bin/nagios")
 apache_config_dir = _omd_path("etc/apache")
 htpasswd_file = _omd_path("etc/htpasswd")
 livestatus_unix_socket = _omd_path("tmp/run/live")
+automation_helper_socket = _omd_path("tmp/run/automation-helper")
+automation_helper_pid_file = _omd_path("tmp/run/automation-helper.pid")
 livebackendsdir = _omd_path("share/check_mk/livestatus")
 inventory_output_dir = _omd_path("var/check_mk/inventory")
 inventory_archive_dir = _omd_path("var/check_mk/inventory_archive")
@@ -4,11 +4,15 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import array
+import functools
 import json
 import logging
+import marshal
+import math
 import os
 import time
-from typing import Dict, Callable, List, Optional, Tuple, Iterator
+from typing import Any, Dict, Callable, List, Optional, Tuple, Iterator
 
 from six import ensure_str
 
@@ -17,12 +21,13 @@ from cmk.utils.exceptions import MKGeneralException
 import cmk.utils.debug
 from cmk.utils.log import VERBOSE
 import cmk.utils.paths
+import cmk.utils.store as store
 from cmk.utils.type_defs import Timestamp, Seconds, MetricName, ServiceName, HostName
 
 logger = logging.getLogger("cmk.prediction")
 
 TimeWindow = Tuple[Timestamp, Timestamp, Seconds]
-RRDColumnFunction = Callable[[Timestamp, Timestamp], "TimeSeries"]
+RRDColumnsFunction = Callable[[List[Tuple[Timestamp, Timestamp]]], List["TimeSeries"]]
 TimeSeriesValue = Optional[float]
 TimeSeriesValues = List[TimeSeriesValue]
 ConsolidationFunctionName = str
@@ -31,6 +36,10 @@ EstimatedLevel = Optional[float]
 EstimatedLevels = Tuple[EstimatedLevel, EstimatedLevel, EstimatedLevel, EstimatedLevel]
 PredictionInfo = Dict  # TODO: improve this type
 
+# Prefix of the binary prediction data files, see save_prediction_data()
+PREDICTION_FILE_MAGIC = b"CMKPREDICTION1\n"
+_NAN = float("nan")
+
 
 def is_dst(timestamp: float) -> bool:
     """Check wether a certain time stamp lies with in daylight saving time (DST)"""
@@ -49,6 +58,30 @@ def rrd_timestamps(twindow: TimeWindow) -> List[Timestamp]:
     return [t + step for t in range(start, end, step)]
 
 
+@functools.lru_cache(maxsize=None)
+def get_numpy() -> Any:
+    """NumPy for vectorized time series computations, None in case it is not available
+
+    NumPy is imported on first use, because importing it takes a noticeable time."""
+    try:
+        import numpy  # type: ignore[import] # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return numpy
+
+
+def values_to_array(np: Any, values: TimeSeriesValues) -> Any:
+    """Convert time series values to a float array with NaN for the gaps"""
+    return np.array(values, dtype=float)
+
+
+def array_to_values(np: Any, array: Any) -> TimeSeriesValues:
+    """Convert a float array with NaN for the gaps to time series values"""
+    values = array.astype(object)
+    values[np.isnan(array)] = None
+    return values.tolist()
+
+
 def aggregation_functions(series: TimeSeriesValues,
                           aggr: Optional[ConsolidationFunctionName]) -> TimeSeriesValue:
     """Aggregate data in series list according to aggr
@@ -105,9 +138,41 @@ class TimeSeries:
         self.start = int(timewindow[0])
         self.end = int(timewindow[1])
         self.step = int(timewindow[2])
-        self.values = data
+        # Either the values or the array (see from_array()) is set
+        self._values: Optional[TimeSeriesValues] = data
+        self._array: Any = None
         self.metadata = metadata
 
+    @classmethod
+    def from_array(cls, array: Any, timewindow: TimeWindow, **metadata: str) -> "TimeSeries":
+        """Create a time series from a NumPy float array with NaN for the gaps
+
+        The values are only converted to a list once they are accessed. Until then
+        computations can use the array directly, see to_array()."""
+        time_series = cls([], timewindow, **metadata)
+        time_series._values = None
+        time_series._array = array
+        return time_series
+
+    @property
+    def values(self) -> TimeSeriesValues:
+        if self._values is None:
+            # The list may be modified from now on, so it is the only representation
+            self._values = array_to_values(get_numpy(), self._array)
+            self._array = None
+        return self._values
+
+    @values.setter
+    def values(self, values: TimeSeriesValues) -> None:
+        self._values = values
+        self._array = None
+
+    def to_array(self, np: Any) -> Any:
+        """The values as float array with NaN for the gaps"""
+        if self._values is None:
+            return self._array
+        return values_to_array(np, self._values)
+
     @property
     def twindow(self) -> TimeWindow:
         return self.start, self.end, self.step
@@ -121,8 +186,14 @@ class TimeSeries:
         upsa = []
         i = 0
         start, end, step = twindow
-        current_times = rrd_timestamps(self.twindow)
         if start != self.start or end != self.end or step != self.step:
+            np = get_numpy()
+            if np is not None:
+                vectorized = self._bfill_upsample_vectorized(np, twindow, shift)
+                if vectorized is not None:
+                    return vectorized
+
+            current_times = rrd_timestamps(self.twindow)
             for t in range(start, end, step):
                 if t >= current_times[i] + shift:
                     i += 1
@@ -146,8 +217,14 @@ class TimeSeries:
         i = 0
         co: TimeSeriesValues = []
         start, end, step = twindow
-        desired_times = rrd_timestamps(twindow)
         if start != self.start or end != self.end or step != self.step:
+            np = get_numpy()
+            if np is not None:
+                vectorized = self._downsample_vectorized(np, twindow, cf)
+                if vectorized is not None:
+                    return vectorized
+
+            desired_times = rrd_timestamps(twindow)
             for t, val in self.time_data_pairs():
                 if t > desired_times[i]:
                     dwsa.append(aggregation_functions(co, cf))
@@ -163,6 +240,71 @@ class TimeSeries:
             return dwsa
         return self.values
 
+    # The vectorized variants compute the same values as the loops above. The loops
+    # advance at most one interval per step. The vectorized variants look up the
+    # interval of each step directly. This is the same as long as no interval is
+    # skipped. In the other (unusual) cases None is returned and the loops are used.
+
+    def _bfill_upsample_vectorized(self, np: Any, twindow: TimeWindow,
+                                   shift: Seconds) -> Optional[TimeSeriesValues]:
+        start, end, step = twindow
+        if step <= 0 or self.step <= 0:
+            return None
+
+        boundaries = np.arange(self.start, self.end, self.step) + self.step + shift
+        indexes = np.searchsorted(boundaries, np.arange(start, end, step), side="right")
+        if not len(indexes):
+            return []
+
+        if (indexes[0] > 1 or np.any(np.diff(indexes) > 1) or
+                indexes[-1] >= min(len(boundaries), len(self))):
+            return None
+
+        return np.array(self.values, dtype=object)[indexes].tolist()
+
+    def _downsample_vectorized(self, np: Any, twindow: TimeWindow,
+                               cf: ConsolidationFunctionName) -> Optional[TimeSeriesValues]:
+        start, end, step = twindow
+        cf = "max" if cf is None else cf.lower()
+        if step <= 0 or self.step <= 0 or cf not in ("max", "min", "average"):
+            return None
+
+        desired_times = np.arange(start, end, step) + step
+        times = np.arange(self.start, self.end, self.step) + self.step
+        num_points = min(len(times), len(self))
+        if not len(desired_times) or not num_points:
+            return None
+
+        indexes = np.searchsorted(desired_times, times[:num_points], side="left")
+        if (indexes[0] > 1 or np.any(np.diff(indexes) > 1) or
+            (num_points > 1 and indexes[-2] >= len(desired_times))):
+            return None
+
+        # Only the last point may be behind the desired times. It is dropped.
+        num_intervals = min(int(indexes[-1]) + 1, len(desired_times))
+        num_points -= int(indexes[-1] >= len(desired_times))
+        if not num_points:
+            return [None] * len(desired_times)
+
+        indexes = indexes[:num_points]
+        data = self.to_array(np)[:num_points]
+        valid = ~np.isnan(data)
+
+        counts = np.bincount(indexes, weights=valid, minlength=num_intervals)
+        starts = np.searchsorted(indexes, np.arange(num_intervals), side="left")
+        if cf == "average":
+            # Sum up the values of each interval in order to get the same result as sum()
+            sizes = np.diff(np.append(starts, num_points))
+            summands = np.zeros((num_intervals, sizes.max()))
+            summands[indexes, np.arange(num_points) - starts[indexes]] = np.where(valid, data, 0.0)
+            aggregated = np.cumsum(summands, axis=1)[:, -1] / np.maximum(counts, 1)
+        else:
+            reduce_function = np.fmax if cf == "max" else np.fmin
+            aggregated = reduce_function.reduceat(data, np.minimum(starts, num_points - 1))
+
+        aggregated[counts == 0] = np.nan
+        return array_to_values(np, aggregated) + [None] * (len(desired_times) - num_intervals)
+
     def time_data_pairs(self) -> List[Tuple[Timestamp, TimeSeriesValue]]:
         return list(zip(rrd_timestamps(self.twindow), self.values))
 
@@ -179,7 +321,9 @@ class TimeSeries:
         return self.values[i]
 
     def __len__(self) -> int:
-        return len(self.values)
+        if self._values is None:
+            return len(self._array)
+        return len(self._values)
 
     def __iter__(self) -> Iterator[TimeSeriesValue]:
         yield from self.values
@@ -234,38 +378,58 @@ def get_rrd_data(hostname: HostName,
           x---v---v---v---v---y
 
     """
+    return get_rrd_data_of_time_windows(hostname, service_description, varname, cf,
+                                        [(fromtime, untiltime)], max_entries)[0]
 
-    step = 1
-    rpn = "%s.%s" % (varname, cf.lower())  # "MAX" -> "max"
-    point_range = ":".join(
-        livestatus.lqencode(str(x)) for x in (fromtime, untiltime, step, max_entries))
-    column = "rrddata:m1:%s:%s" % (rpn, point_range)
 
-    lql = livestatus_lql([hostname], [column], service_description) + "OutputFormat: python\n"
+def get_rrd_data_of_time_windows(hostname: HostName,
+                                 service_description: ServiceName,
+                                 varname: MetricName,
+                                 cf: ConsolidationFunctionName,
+                                 time_windows: List[Tuple[Timestamp, Timestamp]],
+                                 max_entries: int = 400) -> List[TimeSeries]:
+    """Fetch the RRD data of several time ranges with a single Livestatus query
+
+    Every time range is requested as separate rrddata column, see get_rrd_data()"""
+    columns = [
+        _rrddata_column(varname, cf, fromtime, untiltime, max_entries)
+        for fromtime, untiltime in time_windows
+    ]
+    lql = livestatus_lql([hostname], columns, service_description) + "OutputFormat: python\n"
 
     try:
         connection = livestatus.SingleSiteConnection("unix:%s" %
                                                      cmk.utils.paths.livestatus_unix_socket)
-        response = connection.query_value(lql)
+        response = connection.query_row(lql)
     except livestatus.MKLivestatusNotFoundError as e:
         if cmk.utils.debug.enabled():
             raise
         raise MKGeneralException("Cannot get historic metrics via Livestatus: %s" % e)
 
-    if response is None:
+    if not response or any(data is None for data in response):
         raise MKGeneralException("Cannot retrieve historic data with Nagios Core")
 
-    return TimeSeries(response)
+    return [TimeSeries(data) for data in response]
+
+
+def _rrddata_column(varname: MetricName, cf: ConsolidationFunctionName, fromtime: Timestamp,
+                    untiltime: Timestamp, max_entries: int) -> str:
+    step = 1
+    rpn = "%s.%s" % (varname, cf.lower())  # "MAX" -> "max"
+    point_range = ":".join(
+        livestatus.lqencode(str(x)) for x in (fromtime, untiltime, step, max_entries))
+    return "rrddata:m1:%s:%s" % (rpn, point_range)
 
 
-def rrd_datacolum(hostname: HostName, service_description: ServiceName, varname: MetricName,
-                  cf: ConsolidationFunctionName) -> RRDColumnFunction:
-    "Partial helper function to get rrd data"
+def rrd_datacolumns(hostname: HostName, service_description: ServiceName, varname: MetricName,
+                    cf: ConsolidationFunctionName) -> RRDColumnsFunction:
+    "Partial helper function to get the rrd data of several time ranges at once"
 
-    def time_boundaries(fromtime: Timestamp, untiltime: Timestamp) -> TimeSeries:
-        return get_rrd_data(hostname, service_description, varname, cf, fromtime, untiltime)
+    def time_windows_data(time_windows: List[Tuple[Timestamp, Timestamp]]) -> List[TimeSeries]:
+        return get_rrd_data_of_time_windows(hostname, service_description, varname, cf,
+                                            time_windows)
 
-    return time_boundaries
+    return time_windows_data
 
 
 def predictions_dir(hostname: HostName, service_description: ServiceName,
@@ -285,15 +449,41 @@ def clean_prediction_files(pred_file: str, force: bool = False) -> None:
             os.remove(file_path)
 
 
+def save_prediction_data(pred_file: str, data_for_pred: PredictionInfo) -> None:
+    """Store the prediction data in the binary format
+
+    The points are packed as doubles, missing values as NaN. This is way smaller and faster
+    to read than JSON."""
+    values = (value for point in data_for_pred["points"] for value in point)
+    points = array.array("d", (_NAN if value is None else value for value in values))
+    content = dict(data_for_pred, points=points.tobytes())
+    store.save_bytes_to_file(pred_file, PREDICTION_FILE_MAGIC + marshal.dumps(content))
+
+
+def _parse_prediction_data(raw_content: bytes) -> PredictionInfo:
+    content = marshal.loads(raw_content[len(PREDICTION_FILE_MAGIC):])
+    values = array.array("d")
+    values.frombytes(content["points"])
+    width = len(content["columns"])
+    rows = (values[index:index + width] for index in range(0, len(values), width))
+    content["points"] = [[None if math.isnan(value) else value for value in row] for row in rows]
+    return content
+
+
 # TODO: We should really *parse* the loaded data, currently the type signature
 # is a blatant lie!
 # (mo) And, in fact, this function returns at least 2 different types of dataset.
 def retrieve_data_for_prediction(info_file: str, timegroup: Timegroup) -> Optional[PredictionInfo]:
     try:
-        return json.loads(open(info_file).read())
+        with open(info_file, "rb") as f:
+            raw_content = f.read()
+        if raw_content.startswith(PREDICTION_FILE_MAGIC):
+            return _parse_prediction_data(raw_content)
+        # The info files and the prediction data of older versions are JSON
+        return json.loads(raw_content)
     except IOError:
         logger.log(VERBOSE, "No previous prediction for group %s available.", timegroup)
-    except ValueError:
+    except (ValueError, EOFError, TypeError, KeyError):
         logger.log(VERBOSE, "Invalid prediction file %s, old format", info_file)
         pred_file = info_file[:-5] if info_file.endswith(".info") else info_file
         clean_prediction_files(pred_file, force=True)
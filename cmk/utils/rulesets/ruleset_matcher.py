@@ -5,7 +5,19 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """This module provides generic Check_MK ruleset processing functionality"""
 
-from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional, Pattern, Set, Tuple
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+)
 
 from cmk.utils.rulesets.tuple_rulesets import (
     ALL_HOSTS,
@@ -24,8 +36,12 @@ if TYPE_CHECKING:
 LabelConditions = Dict  # TODO: Optimize this
 PreprocessedHostRuleset = Dict[HostName, List[RuleValue]]
 PreprocessedPattern = Tuple[bool, Pattern[str]]
-PreprocessedServiceRuleset = List[Tuple[RuleValue, Set[HostName], LabelConditions, Tuple,
-                                        PreprocessedPattern]]
+PreprocessedServiceRule = Tuple[RuleValue, Set[HostName], LabelConditions, PreprocessedPattern]
+PreprocessedServiceRuleset = List[PreprocessedServiceRule]
+
+# Number of (pattern, service description) pairs remembered by the service
+# description matching. Large setups have far more distinct pairs than this.
+SERVICE_DESCRIPTION_MATCH_CACHE_SIZE = 65536
 
 
 class RulesetMatchObject:
@@ -91,8 +107,6 @@ class RulesetMatcher:
             nodes_of,
         )
 
-        self._service_match_cache: Dict = {}
-
     def is_matching_host_ruleset(self, match_object: RulesetMatchObject,
                                  ruleset: List[Dict]) -> bool:
         """Compute outcome of a ruleset set that just says yes/no
@@ -166,30 +180,19 @@ class RulesetMatcher:
         Replaces service_extra_conf"""
         self.tuple_transformer.transform_in_place(ruleset, is_service=True, is_binary=is_binary)
 
+        if match_object.host_name is None or match_object.service_description is None:
+            return
+
         with_foreign_hosts = match_object.host_name not in \
                                 self.ruleset_optimizer.all_processed_hosts()
-        optimized_ruleset = self.ruleset_optimizer.get_service_ruleset(ruleset,
-                                                                       with_foreign_hosts,
-                                                                       is_binary=is_binary)
-
-        for value, hosts, service_labels_condition, service_labels_condition_cache_id, service_description_condition in optimized_ruleset:
-            if match_object.service_description is None:
-                continue
-
-            if match_object.host_name not in hosts:
-                continue
-
-            service_cache_id = (match_object.service_cache_id, service_description_condition,
-                                service_labels_condition_cache_id)
-
-            if service_cache_id in self._service_match_cache:
-                match = self._service_match_cache[service_cache_id]
-            else:
-                match = self._matches_service_conditions(service_description_condition,
-                                                         service_labels_condition, match_object)
-                self._service_match_cache[service_cache_id] = match
-
-            if match:
+        rules_of_host = self.ruleset_optimizer.get_service_rules_of_host(ruleset,
+                                                                         match_object.host_name,
+                                                                         with_foreign_hosts,
+                                                                         is_binary=is_binary)
+
+        for value, _hosts, service_labels_condition, service_description_condition in rules_of_host:
+            if self._matches_service_conditions(service_description_condition,
+                                                service_labels_condition, match_object):
                 yield value
 
     def _matches_service_conditions(self, service_description_condition: Tuple[bool, Pattern[str]],
@@ -212,7 +215,7 @@ class RulesetMatcher:
         negate, pattern = service_description_condition
 
         if match_object.service_description is not None \
-            and pattern.match(match_object.service_description) is not None:
+            and _matches_service_description(pattern, match_object.service_description):
             return not negate
         return negate
 
@@ -274,29 +277,18 @@ class RulesetOptimizer:
         # may contain a reduced set of hosts, since each process handles a subset
         self._all_processed_hosts = self._all_configured_hosts
 
-        # A factor which indicates how much hosts share the same host tag configuration (excluding folders).
-        # len(all_processed_hosts) / len(different tag combinations)
-        # It is used to determine the best rule evualation method
-        self._all_processed_hosts_similarity = 1.0
-
-        self._service_ruleset_cache: Dict = {}
+        self._service_ruleset_cache: Dict[Tuple[int, bool], _ServiceRulesetLookup] = {}
         self._host_ruleset_cache: Dict = {}
         self._all_matching_hosts_match_cache: Dict = {}
 
         # Reference dirname -> hosts in this dir including subfolders
         self._folder_host_lookup: Dict[Tuple[bool, str], Set[HostName]] = {}
 
-        # Provides a list of hosts with the same hosttags, excluding the folder
-        self._hosts_grouped_by_tags: Dict = {}
-        # Reference hostname -> tag group reference
-        self._host_grouped_ref: Dict = {}
-
-        # TODO: The folder will not be part of new dict tags anymore. This can
-        # be cleaned up then.
-        self._hosttags_without_folder: Dict[HostName, TagList] = {}
-
-        # TODO: Clean this one up?
-        self._initialize_host_lookup()
+        # Inverted indexes of the relevant hosts, see _all_matching_hosts. They are
+        # keyed by "with_foreign_hosts" and built on first use.
+        self._hosts_by_path: Dict[bool, Dict[str, Set[HostName]]] = {}
+        self._hosts_by_tag: Dict[bool, Dict[str, Set[HostName]]] = {}
+        self._hosts_by_label: Dict[bool, Dict[Tuple[str, str], Set[HostName]]] = {}
 
     def clear_ruleset_caches(self) -> None:
         self._host_ruleset_cache.clear()
@@ -305,6 +297,8 @@ class RulesetOptimizer:
     def clear_caches(self) -> None:
         self._host_ruleset_cache.clear()
         self._all_matching_hosts_match_cache.clear()
+        # The host labels may have changed
+        self._hosts_by_label.clear()
 
     def all_processed_hosts(self) -> Set[HostName]:
         """Returns a set of all processed hosts"""
@@ -323,28 +317,13 @@ class RulesetOptimizer:
 
         self._all_processed_hosts.update(nodes_and_clusters)
 
-        # The folder host lookup includes a list of all -processed- hosts within a given
-        # folder. Any update with set_all_processed hosts invalidates this cache, because
-        # the scope of relevant hosts has changed. This is -good-, since the values in this
-        # lookup are iterated one by one later on in all_matching_hosts
+        # The folder host lookup and the host indexes include all -processed- hosts.
+        # Any update with set_all_processed hosts invalidates them, because the scope
+        # of relevant hosts has changed.
         self._folder_host_lookup = {}
-
-        self._adjust_processed_hosts_similarity()
-
-    def _adjust_processed_hosts_similarity(self) -> None:
-        """ This function computes the tag similarities between of the processed hosts
-        The result is a similarity factor, which helps finding the most perfomant operation
-        for the current hostset """
-        used_groups = set()
-        for hostname in self._all_processed_hosts:
-            used_groups.add(self._host_grouped_ref.get(hostname, ()))
-
-        if not used_groups:
-            self._all_processed_hosts_similarity = 1.0
-            return
-
-        self._all_processed_hosts_similarity = (1.0 * len(self._all_processed_hosts) /
-                                                len(used_groups))
+        self._hosts_by_path = {}
+        self._hosts_by_tag = {}
+        self._hosts_by_label = {}
 
     def get_host_ruleset(self, ruleset: Ruleset, with_foreign_hosts: bool,
                          is_binary: bool) -> PreprocessedHostRuleset:
@@ -376,16 +355,28 @@ class RulesetOptimizer:
 
     def get_service_ruleset(self, ruleset: Ruleset, with_foreign_hosts: bool,
                             is_binary: bool) -> PreprocessedServiceRuleset:
+        return self._get_service_ruleset_lookup(ruleset, with_foreign_hosts, is_binary).ruleset
+
+    def get_service_rules_of_host(self, ruleset: Ruleset, hostname: HostName,
+                                  with_foreign_hosts: bool,
+                                  is_binary: bool) -> PreprocessedServiceRuleset:
+        """The preprocessed rules of the service ruleset that apply to the host"""
+        return self._get_service_ruleset_lookup(ruleset, with_foreign_hosts,
+                                                is_binary).rules_of_host(hostname)
+
+    def _get_service_ruleset_lookup(self, ruleset: Ruleset, with_foreign_hosts: bool,
+                                    is_binary: bool) -> "_ServiceRulesetLookup":
         cache_id = id(ruleset), with_foreign_hosts
 
         if cache_id in self._service_ruleset_cache:
             return self._service_ruleset_cache[cache_id]
 
-        cached_ruleset = self._convert_service_ruleset(ruleset,
-                                                       with_foreign_hosts=with_foreign_hosts,
-                                                       is_binary=is_binary)
-        self._service_ruleset_cache[cache_id] = cached_ruleset
-        return cached_ruleset
+        lookup = _ServiceRulesetLookup(
+            self._convert_service_ruleset(ruleset,
+                                          with_foreign_hosts=with_foreign_hosts,
+                                          is_binary=is_binary))
+        self._service_ruleset_cache[cache_id] = lookup
+        return lookup
 
     def _convert_service_ruleset(self, ruleset: Ruleset, with_foreign_hosts: bool,
                                  is_binary: bool) -> PreprocessedServiceRuleset:
@@ -398,15 +389,9 @@ class RulesetOptimizer:
             # recomputation later
             hosts = self._all_matching_hosts(rule["condition"], with_foreign_hosts)
 
-            # Prepare cache id
-            service_labels_condition = rule["condition"].get("service_labels", {})
-            service_labels_condition_cache_id = tuple(
-                (label_id, _tags_or_labels_cache_id(label_spec))
-                for label_id, label_spec in service_labels_condition.items())
-
             # And now preprocess the configured patterns in the servlist
             new_rules.append(
-                (rule["value"], hosts, service_labels_condition, service_labels_condition_cache_id,
+                (rule["value"], hosts, rule["condition"].get("service_labels", {}),
                  self._convert_pattern_list(rule["condition"].get("service_description"))))
         return new_rules
 
@@ -433,7 +418,11 @@ class RulesetOptimizer:
     def _all_matching_hosts(self, condition: Dict[str, Any],
                             with_foreign_hosts: bool) -> Set[HostName]:
         """Returns a set containing the names of hosts that match the given
-        tags and hostlist conditions."""
+        tags and hostlist conditions.
+
+        The folder, tag and label conditions are looked up in inverted indexes
+        of the relevant hosts, so they are evaluated by intersecting sets of
+        hosts instead of checking each host individually."""
         hostlist = condition.get("host_name")
         tags = condition.get("host_tags", {})
         labels = condition.get("host_labels", {})
@@ -456,49 +445,31 @@ class RulesetOptimizer:
         valid_hosts = self.get_hosts_within_folder(rule_path,
                                                    with_foreign_hosts).intersection(valid_hosts)
 
-        if tags and hostlist is None and not labels:
-            # TODO: Labels could also be optimized like the tags
-            matched_by_tags = self._match_hosts_by_tags(cache_id, valid_hosts, tags)
-            if matched_by_tags is not None:
-                return matched_by_tags
-
-        matching: Set[str] = set()
         only_specific_hosts = (hostlist is not None and not isinstance(hostlist, dict) and
                                all(not isinstance(x, dict) for x in hostlist))
 
         if hostlist == []:
-            pass  # Empty host list -> Nothing matches
+            matching: Set[HostName] = set()  # Empty host list -> Nothing matches
 
-        elif not tags and not labels and not hostlist:
-            # If no tags are specified and the hostlist only include @all (all hosts)
+        else:
             matching = valid_hosts
 
-        elif not tags and not labels and only_specific_hosts and hostlist is not None:
-            # If no tags are specified and there are only specific hosts we already have the matches
-            matching = valid_hosts.intersection(hostlist)
-
-        else:
-            # If the rule has only exact host restrictions, we can thin out the list of hosts to check
+            # If the rule has only exact host restrictions, we already have the candidates
             if only_specific_hosts and hostlist is not None:
-                hosts_to_check = valid_hosts.intersection(hostlist)
-            else:
-                hosts_to_check = valid_hosts
-
-            for hostname in hosts_to_check:
-                # When no tag matching is requested, do not filter by tags. Accept all hosts
-                # and filter only by hostlist
-                if tags and not self.matches_host_tags(self._host_tag_lists[hostname], tags):
-                    continue
+                matching = matching.intersection(hostlist)
 
-                if labels:
-                    host_labels = self._labels.labels_of_host(self._ruleset_matcher, hostname)
-                    if not matches_labels(host_labels, labels):
-                        continue
+            if tags:
+                matching = self._match_hosts_by_tags(matching, tags, with_foreign_hosts)
 
-                if not self.matches_host_name(hostlist, hostname):
-                    continue
+            if labels:
+                matching = self._match_hosts_by_labels(matching, labels, with_foreign_hosts)
 
-                matching.add(hostname)
+            # Negated host lists and regular expressions have to be checked host by host,
+            # but only for the hosts that are left
+            if hostlist and not only_specific_hosts:
+                matching = {
+                    hostname for hostname in matching if self.matches_host_name(hostlist, hostname)
+                }
 
         self._all_matching_hosts_match_cache[cache_id] = matching
         return matching
@@ -548,7 +519,8 @@ class RulesetOptimizer:
                 host_parts.append(h)
 
         return (
-            tuple(sorted(host_parts)),
+            # An empty host list matches no host, a missing one all hosts
+            None if hostlist is None else tuple(sorted(host_parts)),
             tuple(
                 (tag_id, _tags_or_labels_cache_id(tag_spec)) for tag_id, tag_spec in tags.items()),
             tuple((label_id, _tags_or_labels_cache_id(label_spec))
@@ -556,93 +528,140 @@ class RulesetOptimizer:
             rule_path,
         )
 
-    # TODO: Generalize this optimization: Build some kind of key out of the tag conditions
-    # (positive, negative, ...). Make it work with the new tag group based "$or" handling.
-    def _match_hosts_by_tags(self, cache_id, valid_hosts, tags):
-        matching = set()
-        negative_match_tags = set()
-        positive_match_tags = set()
-        for tag in tags.values():
-            if isinstance(tag, dict):
-                if "$ne" in tag:
-                    negative_match_tags.add(tag["$ne"])
-                    continue
+    def _match_hosts_by_tags(self, hosts: Set[HostName], required_tags: Dict[str, Any],
+                             with_foreign_hosts: bool) -> Set[HostName]:
+        """Set based equivalent of matches_host_tags()"""
+        hosts_by_tag = self._get_hosts_by_tag(with_foreign_hosts)
+        for tag_spec in required_tags.values():
+            if not hosts:
+                break
+            hosts = _match_hosts_by_tag_spec(hosts, tag_spec, hosts_by_tag)
+        return hosts
+
+    def _match_hosts_by_labels(self, hosts: Set[HostName], required_labels: LabelConditions,
+                               with_foreign_hosts: bool) -> Set[HostName]:
+        """Set based equivalent of matches_labels()"""
+        hosts_by_label = self._get_hosts_by_label(with_foreign_hosts)
+        for label_group_id, label_spec in required_labels.items():
+            if not hosts:
+                break
+
+            if isinstance(label_spec, dict):
+                excluded = hosts_by_label.get((label_group_id, label_spec["$ne"]), set())
+                hosts = hosts.difference(excluded)
+            else:
+                hosts = hosts.intersection(hosts_by_label.get((label_group_id, label_spec), ()))
+        return hosts
 
-                if "$or" in tag:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
+    def get_hosts_within_folder(self, folder_path: str, with_foreign_hosts: bool) -> Set[HostName]:
+        cache_id = with_foreign_hosts, folder_path
+        if cache_id not in self._folder_host_lookup:
+            hosts_in_folder: Set[HostName] = set()
+            for host_path, hosts in self._get_hosts_by_path(with_foreign_hosts).items():
+                if host_path.startswith(folder_path):
+                    hosts_in_folder.update(hosts)
 
-                if "$nor" in tag:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
+            self._folder_host_lookup[cache_id] = hosts_in_folder
+            return hosts_in_folder
 
-                raise NotImplementedError()
+        return self._folder_host_lookup[cache_id]
 
-            positive_match_tags.add(tag)
+    def _relevant_hosts(self, with_foreign_hosts: bool) -> Set[HostName]:
+        return self._all_configured_hosts if with_foreign_hosts else self._all_processed_hosts
+
+    def _get_hosts_by_path(self, with_foreign_hosts: bool) -> Dict[str, Set[HostName]]:
+        if with_foreign_hosts not in self._hosts_by_path:
+            self._hosts_by_path[with_foreign_hosts] = _build_index(
+                (hostname, [self._host_paths.get(hostname, "/")])
+                for hostname in self._relevant_hosts(with_foreign_hosts))
+        return self._hosts_by_path[with_foreign_hosts]
+
+    def _get_hosts_by_tag(self, with_foreign_hosts: bool) -> Dict[str, Set[HostName]]:
+        if with_foreign_hosts not in self._hosts_by_tag:
+            self._hosts_by_tag[with_foreign_hosts] = _build_index(
+                (hostname, self._host_tag_lists[hostname])
+                for hostname in self._relevant_hosts(with_foreign_hosts))
+        return self._hosts_by_tag[with_foreign_hosts]
+
+    def _get_hosts_by_label(self, with_foreign_hosts: bool) -> Dict[Tuple[str, str], Set[HostName]]:
+        if with_foreign_hosts not in self._hosts_by_label:
+            self._hosts_by_label[with_foreign_hosts] = _build_index(
+                (hostname, self._labels.labels_of_host(self._ruleset_matcher, hostname).items())
+                for hostname in self._relevant_hosts(with_foreign_hosts))
+        return self._hosts_by_label[with_foreign_hosts]
+
+
+class _ServiceRulesetLookup:
+    """Finds the rules of a preprocessed service ruleset that apply to a host
+
+    Rules with the same host conditions share the set of matching hosts (see
+    RulesetOptimizer._all_matching_hosts). Only the distinct sets need to be
+    checked to find the rules of a host, and hosts with the same rules share
+    one list of them.
+    """
+    def __init__(self, ruleset: PreprocessedServiceRuleset) -> None:
+        super(_ServiceRulesetLookup, self).__init__()
+        self.ruleset = ruleset
 
-        # TODO:
-        #if has_specific_folder_tag or self._all_processed_hosts_similarity < 3.0:
-        if self._all_processed_hosts_similarity < 3.0:
-            # Without shared folders
-            for hostname in valid_hosts:
-                host_tags = self._host_tag_lists[hostname]
-                if not positive_match_tags - host_tags:
-                    if not negative_match_tags.intersection(host_tags):
-                        matching.add(hostname)
+        host_groups: Dict[int, Tuple[Set[HostName], List[int]]] = {}
+        for position, (_value, hosts, _labels, _pattern) in enumerate(ruleset):
+            host_groups.setdefault(id(hosts), (hosts, []))[1].append(position)
+        self._host_groups = list(host_groups.values())
 
-            self._all_matching_hosts_match_cache[cache_id] = matching
-            return matching
+        self._rules_of_host: Dict[HostName, PreprocessedServiceRuleset] = {}
+        self._rules_by_positions: Dict[Tuple[int, ...], PreprocessedServiceRuleset] = {}
 
-        # With shared folders
-        checked_hosts: Set[str] = set()
-        for hostname in valid_hosts:
-            if hostname in checked_hosts:
-                continue
+    def rules_of_host(self, hostname: HostName) -> PreprocessedServiceRuleset:
+        try:
+            return self._rules_of_host[hostname]
+        except KeyError:
+            pass
 
-            hosts_with_same_tag = self._filter_hosts_with_same_tags_as_host(hostname, valid_hosts)
-            checked_hosts.update(hosts_with_same_tag)
+        positions = tuple(
+            sorted(position for hosts, positions in self._host_groups if hostname in hosts
+                   for position in positions))
+        try:
+            rules = self._rules_by_positions[positions]
+        except KeyError:
+            rules = self._rules_by_positions[positions] = [self.ruleset[p] for p in positions]
 
-            tags = self._host_tag_lists[hostname]
-            if not positive_match_tags - tags:
-                if not negative_match_tags.intersection(tags):
-                    matching.update(hosts_with_same_tag)
+        self._rules_of_host[hostname] = rules
+        return rules
 
-        self._all_matching_hosts_match_cache[cache_id] = matching
-        return matching
 
-    def _filter_hosts_with_same_tags_as_host(self, hostname, hosts):
-        return self._hosts_grouped_by_tags[self._host_grouped_ref[hostname]].intersection(hosts)
+def _build_index(keys_of_hosts: Iterable[Tuple[HostName, Iterable]]) -> Dict[Any, Set[HostName]]:
+    index: Dict[Any, Set[HostName]] = {}
+    for hostname, keys in keys_of_hosts:
+        for key in keys:
+            index.setdefault(key, set()).add(hostname)
+    return index
 
-    def get_hosts_within_folder(self, folder_path: str, with_foreign_hosts: bool) -> Set[HostName]:
-        cache_id = with_foreign_hosts, folder_path
-        if cache_id not in self._folder_host_lookup:
-            hosts_in_folder = set()
-            relevant_hosts = self._all_configured_hosts if with_foreign_hosts else self._all_processed_hosts
 
-            for hostname in relevant_hosts:
-                host_path = self._host_paths.get(hostname, "/")
-                if host_path.startswith(folder_path):
-                    hosts_in_folder.add(hostname)
+def _match_hosts_by_tag_spec(hosts: Set[HostName], tag_spec: Union[dict, str],
+                             hosts_by_tag: Dict[str, Set[HostName]]) -> Set[HostName]:
+    """Set based equivalent of matches_tag_spec()"""
+    if isinstance(tag_spec, dict):
+        if "$ne" in tag_spec:
+            return hosts.difference(hosts_by_tag.get(tag_spec["$ne"], ()))
 
-            self._folder_host_lookup[cache_id] = hosts_in_folder
-            return hosts_in_folder
+        if "$or" in tag_spec:
+            matching: Set[HostName] = set()
+            for sub_tag_spec in tag_spec["$or"]:
+                matching |= _match_hosts_by_tag_spec(hosts, sub_tag_spec, hosts_by_tag)
+            return matching
+
+        if "$nor" in tag_spec:
+            return hosts.difference(*(_match_hosts_by_tag_spec(hosts, sub_tag_spec, hosts_by_tag)
+                                      for sub_tag_spec in tag_spec["$nor"]))
+
+        raise NotImplementedError()
+
+    return hosts.intersection(hosts_by_tag.get(tag_spec, ()))
 
-        return self._folder_host_lookup[cache_id]
 
-    def _initialize_host_lookup(self):
-        # Determine hosttags without folder tag
-        for hostname in self._all_configured_hosts:
-            tags_without_folder = set(self._host_tag_lists[hostname])
-            try:
-                tags_without_folder.remove(self._host_paths.get(hostname, "/"))
-            except (KeyError, ValueError):
-                pass
-
-            self._hosttags_without_folder[hostname] = tags_without_folder
-
-        # Determine hosts with same tag setup (ignoring folder tag)
-        for hostname in self._all_configured_hosts:
-            group_ref = tuple(sorted(self._hosttags_without_folder[hostname]))
-            self._hosts_grouped_by_tags.setdefault(group_ref, set()).add(hostname)
-            self._host_grouped_ref[hostname] = group_ref
+@lru_cache(maxsize=SERVICE_DESCRIPTION_MATCH_CACHE_SIZE)
+def _matches_service_description(pattern: Pattern[str], service_description: ServiceName) -> bool:
+    return pattern.match(service_description) is not None
 
 
 def _tags_or_labels_cache_id(tag_or_label_spec):
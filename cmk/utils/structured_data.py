@@ -12,7 +12,7 @@ import io
 import gzip
 import re
 import pprint
-from typing import AnyStr, Dict, List, Optional
+from typing import AnyStr, Dict, FrozenSet, List, Optional
 
 from six import ensure_str
 
@@ -645,6 +645,11 @@ class Numeration(Leaf):
         return self._numeration == []
 
     def is_equal(self, foreign, edges=None):
+        own_row_keys = _get_row_keys(self._numeration)
+        foreign_row_keys = _get_row_keys(foreign._numeration)
+        if own_row_keys is not None and foreign_row_keys is not None:
+            return set(own_row_keys) == set(foreign_row_keys)
+
         for row in self._numeration:
             if row not in foreign._numeration:
                 return False
@@ -700,6 +705,31 @@ class Numeration(Leaf):
                len(removed_rows) + num_removed, delta_node
 
     def _get_categorized_rows(self, other):
+        own_row_keys = _get_row_keys(self._numeration)
+        other_row_keys = _get_row_keys(other._numeration)
+        if own_row_keys is None or other_row_keys is None:
+            return self._get_categorized_rows_by_comparison(other)
+
+        own_row_key_set = set(own_row_keys)
+        other_row_key_set = set(other_row_keys)
+        identical_rows: List = []
+        identical_row_keys = set()
+        remaining_other_rows = []
+        for row_key, row in zip(other_row_keys, other._numeration):
+            if row_key in own_row_key_set:
+                if row_key not in identical_row_keys:
+                    identical_row_keys.add(row_key)
+                    identical_rows.append(row)
+            else:
+                remaining_other_rows.append(row)
+        # Own rows found in the other rows are already part of the identical rows
+        remaining_new_rows = [
+            row for row_key, row in zip(own_row_keys, self._numeration)
+            if row_key not in other_row_key_set
+        ]
+        return remaining_new_rows, remaining_other_rows, identical_rows
+
+    def _get_categorized_rows_by_comparison(self, other):
         identical_rows: List = []
         remaining_other_rows = []
         remaining_new_rows = []
@@ -1001,6 +1031,17 @@ def _compare_dict_keys(old_dict, new_dict):
            new_keys - old_keys
 
 
+def _get_row_keys(rows: List[Dict]) -> Optional[List[FrozenSet]]:
+    """Hashable keys of the rows, equal if and only if the rows are equal
+
+    Returns None if a row contains unhashable values, e.g. lists.
+    """
+    try:
+        return [frozenset(row.items()) for row in rows]
+    except TypeError:
+        return None
+
+
 def _new_delta_tree_node(value):
     return (None, value)
 
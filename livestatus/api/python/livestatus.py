@@ -6,13 +6,29 @@
 """MK Livestatus Python API"""
 import ast
 import contextlib
+import json
 import os
 import re
+import selectors
 import socket
 import ssl
 import threading
 import time
-from typing import Any, AnyStr, Dict, List, NewType, Optional, Pattern, Set, Tuple, Type, Union
+from typing import (
+    Any,
+    AnyStr,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NewType,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 # TODO: Find a better solution for this issue. Astroid 2.x bug prevents us from using NewType :(
 # (https://github.com/PyCQA/pylint/issues/2296)
@@ -49,6 +65,13 @@ persistent_connections: Dict[str, socket.socket] = {}
 # Regular expression for removing Cache: headers if caching is not allowed
 remove_cache_regex: Pattern = re.compile("\nCache:[^\n]*")
 
+# The supported values of the OutputFormat: header and how to decode the responses. Blobs are
+# returned as bytes in the python3 format, but as latin-1 decoded strings in the JSON format.
+response_decoders: Dict[str, Callable[[str], Any]] = {
+    "python3": ast.literal_eval,
+    "json": json.loads,
+}
+
 
 def _ensure_unicode(value: Union[str, bytes]) -> str:
     if isinstance(value, str):
@@ -264,13 +287,15 @@ class Helpers:
 class Query:
     """This object can be passed to all livestatus methods accepting a livestatus
     query. The object can be used to hand over the handling code some flags, for
-    example to influence the error handling during query processing."""
+    example to influence the error handling during query processing or to request
+    the faster to decode JSON output format."""
 
     default_suppressed_exceptions: Tuple[Type[Exception], ...] = (MKLivestatusTableNotFoundError,)
 
     def __init__(self,
                  query: Union[str, bytes],
-                 suppress_exceptions: Optional[Tuple[Type[Exception], ...]] = None) -> None:
+                 suppress_exceptions: Optional[Tuple[Type[Exception], ...]] = None,
+                 output_format: str = "python3") -> None:
         super(Query, self).__init__()
 
         self._query = _ensure_unicode(query)
@@ -280,6 +305,10 @@ class Query:
         else:
             self.suppress_exceptions = suppress_exceptions
 
+        if output_format not in response_decoders:
+            raise MKLivestatusConfigError("Invalid output format '%s'" % output_format)
+        self.output_format = output_format
+
     def __str__(self) -> str:
         return self._query
 
@@ -342,6 +371,66 @@ def _parse_socket_url(url: str) -> Tuple[socket.AddressFamily, Union[str, tuple]
                                   "Must begin with 'tcp:', 'tcp6:' or 'unix:'" % url)
 
 
+class ResponseReader:
+    """Collects a response piecewise as the data arrives on the socket of a connection
+
+    Used to read the responses of several sites at once (see MultiSiteConnection)."""
+
+    # Chunk size used to read large responses
+    max_chunk_size = 65536
+
+    def __init__(self, connection: "SingleSiteConnection") -> None:
+        self._connection = connection
+        self._chunks: List[bytes] = []
+        self._missing = 16
+        self.header = b""
+        self.data = b""
+
+    def read_available(self) -> bool:
+        """Reads the data available on the socket, returns True when the response is complete"""
+        sock = self._connection.socket
+        if sock is None:
+            raise MKLivestatusSocketError("Socket to '%s' is not connected" %
+                                          self._connection.socketurl)
+
+        # The socket of a connection may have a timeout. With a partially received
+        # TLS record recv() would wait for the rest of it and finally raise
+        # socket.timeout, which makes the connection reconnect.
+        timeout = sock.gettimeout()
+        sock.settimeout(0)
+        try:
+            return self._read_available(sock)
+        finally:
+            sock.settimeout(timeout)
+
+    def _read_available(self, sock: socket.socket) -> bool:
+        while True:
+            try:
+                packet = sock.recv(min(self._missing, self.max_chunk_size))
+            except (ssl.SSLWantReadError, BlockingIOError):
+                return False
+            if not packet:
+                raise MKLivestatusSocketClosed(
+                    "Read zero data from socket, nagios server closed connection")
+
+            self._chunks.append(packet)
+            self._missing -= len(packet)
+            if self._missing <= 0:
+                if self.header:
+                    self.data = b"".join(self._chunks)
+                    return True
+
+                self.header = b"".join(self._chunks)
+                self._chunks = []
+                self._missing = self._connection.response_length(self.header)
+                if self._missing <= 0:
+                    return True
+
+            # Decrypted data buffered by the TLS layer is not signaled by the selectors
+            if not (isinstance(sock, ssl.SSLSocket) and sock.pending()):
+                return False
+
+
 class SingleSiteConnection(Helpers):
 
     # So we only collect in a specific thread, and not in all of them. We also use
@@ -497,7 +586,9 @@ class SingleSiteConnection(Helpers):
     def do_query(self, query_obj: Query, add_headers: str = "") -> LivestatusResponse:
         query = self.build_query(query_obj, add_headers)
         self.send_query(query)
-        return self.recv_response(query, query_obj.suppress_exceptions)
+        return self.recv_response(query,
+                                  query_obj.suppress_exceptions,
+                                  output_format=query_obj.output_format)
 
     def build_query(self, query_obj: Query, add_headers: str) -> str:
         query = str(query_obj)
@@ -508,7 +599,7 @@ class SingleSiteConnection(Helpers):
             self.auth_header,
             self.add_headers,
             f"Localtime: {int(time.time()):d}",
-            "OutputFormat: python3",
+            f"OutputFormat: {query_obj.output_format}",
             "KeepAlive: on",
             "ResponseHeader: fixed16",
             add_headers,
@@ -549,75 +640,117 @@ class SingleSiteConnection(Helpers):
     def recv_response(self,
                       query: str,
                       suppress_exceptions: Tuple[Type[Exception], ...],
-                      timeout_at: Optional[float] = None) -> LivestatusResponse:
+                      timeout_at: Optional[float] = None,
+                      output_format: str = "python3") -> LivestatusResponse:
         try:
             # Headers are always ASCII encoded
-            resp = self.receive_data(16)
-            code = resp[0:3].decode("ascii")
-            try:
-                length = int(resp[4:15].lstrip())
-            except Exception:
-                self.disconnect()
-                raise MKLivestatusSocketError(
-                    "Malformed output. Livestatus TCP socket might be unreachable or wrong"
-                    "encryption settings are used.")
-
-            data = self.receive_data(length).decode("utf-8")
+            header = self.receive_data(16)
+            data = self.receive_data(self.response_length(header))
+            return self.decode_response(header, data, output_format)
 
-            if code == "200":
-                try:
-                    return ast.literal_eval(data)
-                except (ValueError, SyntaxError):
-                    self.disconnect()
-                    raise MKLivestatusSocketError("Malformed output")
+        except (MKLivestatusSocketClosed, IOError) as e:
+            return self._query_again(query, suppress_exceptions, timeout_at, output_format, e)
 
-            elif code == "404":
-                raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, data.strip()))
+        except suppress_exceptions:
+            raise
 
-            elif code == "502":
-                raise MKLivestatusBadGatewayError(data.strip())
+        except Exception as e:
+            # Catches
+            # MKLivestatusQueryError
+            # MKLivestatusSocketError
+            # FIXME: ? self.disconnect()
+            raise MKLivestatusSocketError("Unhandled exception: %s" % e)
 
-            else:
-                raise MKLivestatusQueryError("%s: %s" % (code, data.strip()))
+    def recv_available_response(self, reader: ResponseReader, query: str,
+                                suppress_exceptions: Tuple[Type[Exception], ...],
+                                output_format: str) -> Optional[LivestatusResponse]:
+        """Like recv_response(), but only reads the data available on the socket
 
+        Returns None as long as the response is not complete."""
+        # Other exceptions of the reader are programming errors, they are not wrapped into
+        # MKLivestatusSocketError to not report them as dead site.
+        try:
+            if not reader.read_available():
+                return None
         except (MKLivestatusSocketClosed, IOError) as e:
-            # In case of an IO error or the other side having
-            # closed the socket do a reconnect and try again
-            self.disconnect()
+            return self._query_again(query, suppress_exceptions, None, output_format, e)
 
-            # In case of unix socket connections, do not start any reconnection attempts
-            # The other side (liveproxyd) might have had a good reason to disconnect
-            # Note: In most scenarios the liveproxyd still tries to send back a reasonable
-            # error response back to the client
-            if self.socket and self.socket.family == socket.AF_UNIX:
-                raise MKLivestatusSocketError("Unix socket was closed by peer")
-
-            now = time.time()
-            if not timeout_at or timeout_at > now:
-                if timeout_at is None:
-                    # Try until timeout reached in case there was a timeout configured.
-                    # Otherwise only retry once.
-                    timeout_at = now
-                    if self.timeout:
-                        timeout_at += self.timeout
-
-                time.sleep(0.1)
-                self.connect()
-                self.send_query(query)
-                # do not send query again -> danger of infinite loop
-                return self.recv_response(query, suppress_exceptions, timeout_at)
-            raise MKLivestatusSocketError(str(e))
+        try:
+            return self.decode_response(reader.header, reader.data, output_format)
+
+        except (MKLivestatusSocketClosed, IOError) as e:
+            return self._query_again(query, suppress_exceptions, None, output_format, e)
 
         except suppress_exceptions:
             raise
 
         except Exception as e:
-            # Catches
-            # MKLivestatusQueryError
-            # MKLivestatusSocketError
-            # FIXME: ? self.disconnect()
             raise MKLivestatusSocketError("Unhandled exception: %s" % e)
 
+    def response_length(self, header: bytes) -> int:
+        try:
+            return int(header[4:15].lstrip())
+        except Exception:
+            self.disconnect()
+            raise MKLivestatusSocketError(
+                "Malformed output. Livestatus TCP socket might be unreachable or wrong"
+                "encryption settings are used.")
+
+    def decode_response(self, header: bytes, data: bytes, output_format: str) -> LivestatusResponse:
+        code = header[0:3].decode("ascii")
+        text = data.decode("utf-8")
+
+        if code == "200":
+            try:
+                return response_decoders[output_format](text)
+            except (ValueError, SyntaxError):
+                self.disconnect()
+                raise MKLivestatusSocketError("Malformed output")
+
+        elif code == "404":
+            raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, text.strip()))
+
+        elif code == "502":
+            raise MKLivestatusBadGatewayError(text.strip())
+
+        else:
+            raise MKLivestatusQueryError("%s: %s" % (code, text.strip()))
+
+    def _query_again(
+        self,
+        query: str,
+        suppress_exceptions: Tuple[Type[Exception], ...],
+        timeout_at: Optional[float],
+        output_format: str,
+        e: Exception,
+    ) -> LivestatusResponse:
+        # In case of an IO error or the other side having
+        # closed the socket do a reconnect and try again
+        self.disconnect()
+
+        # In case of unix socket connections, do not start any reconnection attempts
+        # The other side (liveproxyd) might have had a good reason to disconnect
+        # Note: In most scenarios the liveproxyd still tries to send back a reasonable
+        # error response back to the client
+        if self.socket and self.socket.family == socket.AF_UNIX:
+            raise MKLivestatusSocketError("Unix socket was closed by peer")
+
+        now = time.time()
+        if not timeout_at or timeout_at > now:
+            if timeout_at is None:
+                # Try until timeout reached in case there was a timeout configured.
+                # Otherwise only retry once.
+                timeout_at = now
+                if self.timeout:
+                    timeout_at += self.timeout
+
+            time.sleep(0.1)
+            self.connect()
+            self.send_query(query)
+            # do not send query again -> danger of infinite loop
+            return self.recv_response(query, suppress_exceptions, timeout_at, output_format)
+        raise MKLivestatusSocketError(str(e))
+
     def set_prepend_site(self, p: bool) -> None:
         self.prepend_site = p
 
@@ -635,7 +768,8 @@ class SingleSiteConnection(Helpers):
 
         if self.limit is not None:
             normalized_query = Query("%sLimit: %d\n" % (normalized_query, self.limit),
-                                     normalized_query.suppress_exceptions)
+                                     normalized_query.suppress_exceptions,
+                                     normalized_query.output_format)
 
         response = self.do_query(normalized_query, normalized_add_headers)
         if self.prepend_site:
@@ -952,11 +1086,36 @@ class MultiSiteConnection(Helpers):
     # of Limit: since all sites are queried in parallel, the Limit: is simply
     # applied to all sites - resulting in possibly more results then Limit requests.
     def query_parallel(self, query: Query, add_headers: str = u"") -> LivestatusResponse:
-        stillalive = []
+        site_ids = [c[0] for c in self.connections]
+        responses = dict(self._receive_responses(query, add_headers))
+
+        # Keep the order of the sites, independent of the arrival of their responses
+        result = LivestatusResponse([])
+        for site_id in site_ids:
+            result += responses.get(site_id, [])
+        return result
+
+    def query_rows(self,
+                   query: 'QueryTypes',
+                   add_headers: Union[str, bytes] = u"") -> Iterator[LivestatusRow]:
+        """Query all sites in parallel and yield the rows of every site as soon as they arrive
+
+        In contrast to query(), the rows of a fast site are not held back by slower sites.
+        The rows of the sites are not ordered by site."""
+        normalized_add_headers = _ensure_unicode(add_headers)
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        for _site_id, response in self._receive_responses(normalized_query, normalized_add_headers):
+            yield from response
+
+    def _receive_responses(self, query: Query,
+                           add_headers: str) -> Iterator[Tuple[SiteId, LivestatusResponse]]:
+        """Send the query to all sites and yield the responses of the sites as they arrive"""
+        alive_site_ids: Set[SiteId] = set()
         if self.only_sites is not None:
             connect_to_sites = [c for c in self.connections if c[0] in self.only_sites]
             # Unused sites are assumed to be alive
-            stillalive.extend([c for c in self.connections if c[0] not in self.only_sites])
+            alive_site_ids.update(c[0] for c in self.connections if c[0] not in self.only_sites)
         else:
             connect_to_sites = self.connections
 
@@ -967,44 +1126,63 @@ class MultiSiteConnection(Helpers):
             limit_header = u""
 
         # First send all queries
+        selector = selectors.DefaultSelector()
         for sitename, site, connection in connect_to_sites:
             try:
                 str_query = connection.build_query(query, add_headers + limit_header)
                 connection.send_query(str_query)
             except LivestatusTestingError:
                 raise
-            except Exception as e:
-                self.deadsites[sitename] = {
-                    "exception": e,
-                    "site": site,
-                }
-
-        # Then retrieve all answers. We will be as slow as the slowest of all
-        # connections.
-        result = LivestatusResponse([])
-        for sitename, site, connection in connect_to_sites:
-            try:
-                str_query = connection.build_query(query, add_headers + limit_header)
-                r = connection.recv_response(str_query, query.suppress_exceptions)
-                stillalive.append((sitename, site, connection))
-                if self.prepend_site:
-                    for row in r:
-                        row.insert(0, sitename)
-                result += r
-            except query.suppress_exceptions:
-                stillalive.append((sitename, site, connection))
-                continue
-            except LivestatusTestingError:
-                raise
             except Exception as e:
                 connection.disconnect()
                 self.deadsites[sitename] = {
                     "exception": e,
                     "site": site,
                 }
+                continue
+            assert connection.socket is not None
+            selector.register(connection.socket, selectors.EVENT_READ,
+                              (sitename, site, connection, str_query, ResponseReader(connection)))
 
-        self.connections = stillalive
-        return result
+        # Then read the answers as the data arrives. A slow site only delays its own rows.
+        try:
+            while selector.get_map():
+                for key, _events in selector.select():
+                    sitename, site, connection, str_query, reader = key.data
+                    try:
+                        response = connection.recv_available_response(reader, str_query,
+                                                                      query.suppress_exceptions,
+                                                                      query.output_format)
+                        if response is None:
+                            continue
+                    except query.suppress_exceptions:
+                        selector.unregister(key.fileobj)
+                        alive_site_ids.add(sitename)
+                        continue
+                    except LivestatusTestingError:
+                        raise
+                    except (MKLivestatusException, OSError) as e:
+                        selector.unregister(key.fileobj)
+                        connection.disconnect()
+                        self.deadsites[sitename] = {
+                            "exception": e,
+                            "site": site,
+                        }
+                        continue
+
+                    selector.unregister(key.fileobj)
+                    alive_site_ids.add(sitename)
+                    if self.prepend_site:
+                        for row in response:
+                            row.insert(0, sitename)
+                    yield sitename, response
+        finally:
+            # The responses of the remaining sites are dropped in case the caller stopped early
+            for key in list(selector.get_map().values()):
+                key.data[2].disconnect()
+                alive_site_ids.add(key.data[0])
+            selector.close()
+            self.connections = [c for c in self.connections if c[0] in alive_site_ids]
 
     # TODO: Is this SiteId(...) the way to go? Without this mypy complains about incompatible bytes
     # vs. Optional[SiteId]
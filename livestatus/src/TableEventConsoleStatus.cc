@@ -82,6 +82,20 @@ TableEventConsoleStatus::TableEventConsoleStatus(MonitoringCore *mc)
     addColumn(ECRow::makeDoubleColumn("status_average_rule_hit_rate",
                                       "The average rule hit rate", offsets));
 
+    addColumn(ECRow::makeIntColumn(
+        "status_queue_overflows",
+        "The number of messages dropped because too many received messages were waiting for being processed",
+        offsets));
+    addColumn(ECRow::makeDoubleColumn("status_queue_overflow_rate",
+                                      "The queue overflow rate", offsets));
+    addColumn(ECRow::makeDoubleColumn("status_average_queue_overflow_rate",
+                                      "The average queue overflow rate",
+                                      offsets));
+    addColumn(ECRow::makeIntColumn(
+        "status_queued_messages",
+        "The number of received messages waiting for being processed",
+        offsets));
+
     addColumn(ECRow::makeDoubleColumn(
         "status_average_processing_time",
         "The average incoming message processing time", offsets));
@@ -163,9 +163,9 @@ def test_retieve_grouped_data_from_rrd(cfg_setup, utcdate, timezone, params, ref
                                                timegroup)
 
     hostname, service_description, dsname = 'test-prediction', "CPU load", 'load15'
-    rrd_datacolumn = cmk.utils.prediction.rrd_datacolum(hostname, service_description, dsname,
-                                                        "MAX")
-    result = prediction._retrieve_grouped_data_from_rrd(rrd_datacolumn, time_windows)
+    rrd_datacolumns = cmk.utils.prediction.rrd_datacolumns(hostname, service_description, dsname,
+                                                           "MAX")
+    result = prediction._retrieve_grouped_data_from_rrd(rrd_datacolumns, time_windows)
 
     assert result == reference
 
@@ -208,9 +208,9 @@ def test_calculate_data_for_prediction(cfg_setup, utcdate, timezone, params):
                                                timegroup)
 
     hostname, service_description, dsname = 'test-prediction', "CPU load", 'load15'
-    rrd_datacolumn = cmk.utils.prediction.rrd_datacolum(hostname, service_description, dsname,
-                                                        "MAX")
-    data_for_pred = prediction._calculate_data_for_prediction(time_windows, rrd_datacolumn)
+    rrd_datacolumns = cmk.utils.prediction.rrd_datacolumns(hostname, service_description, dsname,
+                                                           "MAX")
+    data_for_pred = prediction._calculate_data_for_prediction(time_windows, rrd_datacolumns)
 
     path = "%s/tests/integration/cmk/base/test-files/%s/%s" % (repo_path(), timezone, timegroup)
     reference = cmk.utils.prediction.retrieve_data_for_prediction(path, timegroup)
@@ -241,6 +241,21 @@ def test_parse_autochecks_file(fix_plugin_legacy, test_config, autochecks_conten
         assert service.parameters == expected[2], service.check_plugin_name
 
 
+def test_check_plugin_names_of():
+    assert autochecks.check_plugin_names_of("host") == set()
+
+    Path(cmk.utils.paths.autochecks_dir, "host.mk").write_text(u"""[
+  {'check_plugin_name': 'df', 'item': u'/', 'parameters': {}, 'service_labels': {}},
+  {'check_plugin_name': 'mem.used', 'item': None, 'parameters': {}, 'service_labels': {}},
+  ('uptime', None, None),
+]""")
+    assert autochecks.check_plugin_names_of("host") == {
+        CheckPluginName("df"),
+        CheckPluginName("mem_used"),
+        CheckPluginName("uptime"),
+    }
+
+
 def test_has_autochecks():
     assert autochecks.has_autochecks("host") is False
     autochecks.save_autochecks_file("host", [])
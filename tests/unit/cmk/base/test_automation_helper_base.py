@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import os
+import socket
+import sys
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.automation_helper as automation_helper
+import cmk.utils.paths
+
+import cmk.base.automation_helper as helper
+import cmk.base.automations as automations
+import cmk.base.config as config
+
+
+class AutomationEcho(automations.Automation):
+    cmd = "echo"
+    needs_checks = True
+    needs_config = True
+
+    def execute(self, args):
+        return {"args": args, "stdin": sys.stdin.read()}
+
+
+@pytest.fixture(name="main_mk")
+def fixture_main_mk(monkeypatch, tmp_path):
+    main_mk = tmp_path / "main.mk"
+    main_mk.write_text(u"")
+    monkeypatch.setattr(cmk.utils.paths, "main_config_file", str(main_mk))
+    monkeypatch.setattr(cmk.utils.paths, "check_mk_config_dir", str(tmp_path / "conf.d"))
+    monkeypatch.setattr(cmk.utils.paths, "final_config_file", str(tmp_path / "final.mk"))
+    monkeypatch.setattr(cmk.utils.paths, "local_config_file", str(tmp_path / "local.mk"))
+    return main_mk
+
+
+@pytest.fixture(name="config_loads")
+def fixture_config_loads(monkeypatch, main_mk):
+    loads = []
+    monkeypatch.setattr(config, "load", lambda **kwargs: loads.append(kwargs))
+    monkeypatch.setitem(automations.automations._automations, "echo", AutomationEcho())
+    return loads
+
+
+def _call(automation_helper_, request):
+    client, server = socket.socketpair()
+    with client, server:
+        client.sendall(request.serialize())
+        client.shutdown(socket.SHUT_WR)
+        with server:
+            restart = automation_helper_._handle_connection(server)
+        raw = automation_helper.receive_all(client)
+
+    for pid in automation_helper_._workers:
+        os.waitpid(pid, 0)
+    automation_helper_._workers.clear()
+
+    assert not restart
+    return automation_helper.deserialize_response(raw)
+
+
+def _echo_request(stdin):
+    return automation_helper.AutomationRequest(command="echo",
+                                               args=["a", "b"],
+                                               stdin=stdin,
+                                               verbosity=0)
+
+
+def test_config_fingerprint(main_mk):
+    fingerprint = helper.config_fingerprint()
+    assert fingerprint == helper.config_fingerprint()
+
+    main_mk.write_text(u"all_hosts = []\n")
+    assert fingerprint != helper.config_fingerprint()
+
+
+def test_plugins_fingerprint(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "local_checks_dir", tmp_path / "checks")
+    monkeypatch.setattr(cmk.utils.paths, "local_inventory_dir", tmp_path / "inventory")
+    monkeypatch.setattr(cmk.utils.paths, "local_agent_based_plugins_dir", tmp_path / "agent_based")
+    fingerprint = helper.plugins_fingerprint()
+    assert fingerprint == ()
+
+    (tmp_path / "agent_based").mkdir()
+    (tmp_path / "agent_based" / "plugin.py").write_text(u"")
+    assert fingerprint != helper.plugins_fingerprint()
+
+
+def test_execute_in_worker(tmp_path, config_loads):
+    automation_helper_ = helper.AutomationHelper(tmp_path / "socket")
+
+    response = _call(automation_helper_, _echo_request("abc"))
+    assert response is not None
+    assert response.exit_code == 0
+    assert response.stdout == "{u'args': [u'a', u'b'], u'stdin': u'abc'}\n"
+    assert len(config_loads) == 1
+
+    # Unchanged configuration: Not loaded again
+    response = _call(automation_helper_, _echo_request("def"))
+    assert response is not None
+    assert response.stdout == "{u'args': [u'a', u'b'], u'stdin': u'def'}\n"
+    assert len(config_loads) == 1
+
+
+def test_reload_changed_config(tmp_path, main_mk, config_loads):
+    automation_helper_ = helper.AutomationHelper(tmp_path / "socket")
+    assert _call(automation_helper_, _echo_request("")) is not None
+
+    main_mk.write_text(u"all_hosts = []\n")
+    assert _call(automation_helper_, _echo_request("")) is not None
+    assert len(config_loads) == 2
+
+
+def test_unsupported_command(tmp_path, config_loads):
+    request = automation_helper.AutomationRequest(command="restart", args=[], stdin="", verbosity=0)
+    assert _call(helper.AutomationHelper(tmp_path / "socket"), request) is None
+    assert not config_loads
+
+
+def test_all_workers_busy(tmp_path, config_loads):
+    automation_helper_ = helper.AutomationHelper(tmp_path / "socket", max_workers=1)
+    pid = os.fork()
+    if not pid:
+        os._exit(0)
+    automation_helper_._workers.add(pid)
+
+    assert _call(automation_helper_, _echo_request("")) is None
+    assert not config_loads
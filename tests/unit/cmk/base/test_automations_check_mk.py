@@ -4,10 +4,16 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import os
+from pathlib import Path
+
 import pytest  # type: ignore[import]
 
 from testlib.base import Scenario
 
+import cmk.utils.paths
+import cmk.utils.store as store
+from cmk.utils.inventory_archive import InventoryArchive
 from cmk.utils.type_defs import result
 
 import cmk.base.automations.check_mk as check_mk
@@ -43,3 +49,23 @@ class TestAutomationDiagHost:
     def test_execute(self, hostname, ipaddress, raw_data):
         args = [hostname, "agent", ipaddress, "", "6557", "10", "5", "5", ""]
         assert check_mk.AutomationDiagHost().execute(args) == (0, raw_data)
+
+
+class TestAutomationDeleteHosts:
+    def test_archived_inventory_trees_are_kept(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(cmk.utils.paths, "inventory_output_dir", str(tmp_path / "inventory"))
+        monkeypatch.setattr(cmk.utils.paths, "inventory_archive_dir", str(tmp_path / "archive"))
+        monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+        current_tree_path = tmp_path / "inventory" / "testhost"
+        store.save_object_to_file(str(current_tree_path), {"version": 2})
+        os.utime(str(current_tree_path), (1002, 1002))
+        archive = InventoryArchive(tmp_path / "archive" / "testhost")
+        archive.add(1000, {"version": 0}, {"version": 1})
+        archive.add(1001, {"version": 1}, {"version": 2})
+
+        check_mk.AutomationDeleteHosts().execute(["testhost"])
+
+        assert not current_tree_path.exists()
+        archive = InventoryArchive(Path(cmk.utils.paths.inventory_archive_dir, "testhost"))
+        assert archive.load_raw_tree("1000", {}) == {"version": 0}
+        assert archive.load_raw_tree("1001", {}) == {"version": 1}
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=protected-access
+
+import pytest  # type: ignore[import]
+
+# No stub file
+from testlib.base import Scenario  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.type_defs import CheckPluginName, SectionName
+
+from cmk.base import check_plan, check_table, config
+from cmk.base.api.agent_based.type_defs import Parameters
+from cmk.base.check_utils import Service
+
+
+def _service(plugin_name, item, parameters):
+    return Service(
+        check_plugin_name=CheckPluginName(plugin_name),
+        item=item,
+        description="%s %s" % (plugin_name, item),
+        parameters=parameters,
+    )
+
+
+_SERVICES = [
+    _service("df", "/", {"levels": (80.0, 90.0)}),
+    _service("df", "/opt", config.TimespecificParamList([dict(levels=(80.0, 90.0))])),
+    _service("uptime", None, (1, 2)),
+]
+
+
+@pytest.fixture(name="check_table_calls")
+def fixture_check_table_calls(monkeypatch):
+    calls = []
+
+    def get_check_table(hostname, **kwargs):
+        calls.append(hostname)
+        return check_table.HostCheckTable(services=_SERVICES)
+
+    monkeypatch.setattr(check_table, "get_check_table", get_check_table)
+    return calls
+
+
+@pytest.fixture(name="autochecks_dir")
+def fixture_autochecks_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "autochecks_dir", str(tmp_path))
+    return tmp_path
+
+
+def test_check_plan(monkeypatch, check_table_calls):
+    config_cache = Scenario().add_host("node").apply(monkeypatch)
+
+    plan = check_plan.get_check_plan(config_cache, "node")
+
+    assert plan.services == _SERVICES
+    assert plan.check_periods == {s.description: None for s in _SERVICES}
+    assert plan.parameters == {
+        _SERVICES[0].id(): Parameters({"levels": (80.0, 90.0)}),
+        _SERVICES[2].id(): Parameters({"auto-migration-wrapper-key": (1, 2)}),
+    }
+    assert plan.services_to_check({CheckPluginName("uptime")}) == _SERVICES[2:]
+
+
+def test_check_plan_is_memoized(monkeypatch, check_table_calls):
+    config_cache = Scenario().add_host("node").apply(monkeypatch)
+
+    assert check_plan.get_check_plan(config_cache, "node") is check_plan.get_check_plan(
+        config_cache, "node")
+    assert check_table_calls == ["node"]
+
+
+def test_check_plan_of_cluster_node(monkeypatch, check_table_calls):
+    ts = Scenario().add_host("node")
+    ts.add_cluster("cluster", nodes=["node"])
+    config_cache = ts.apply(monkeypatch)
+    monkeypatch.setattr(
+        config_cache,
+        "host_of_clustered_service",
+        lambda hostname, description: "cluster" if description.startswith("df") else hostname,
+    )
+
+    def get_relevant_raw_sections(check_plugin_names, inventory_plugin_names):
+        return {SectionName(str(n)): None for n in check_plugin_names}
+
+    monkeypatch.setattr(
+        check_plan.agent_based_register,
+        "get_relevant_raw_sections",
+        get_relevant_raw_sections,
+    )
+
+    plan = check_plan.get_check_plan(config_cache, "node")
+
+    assert plan.services == _SERVICES[2:]
+    # The node still fetches the sections of the clustered services.
+    assert plan.needed_sections == {SectionName("df"), SectionName("uptime")}
+
+
+def test_check_plan_is_invalidated_by_autochecks(monkeypatch, check_table_calls, autochecks_dir):
+    config_cache = Scenario().add_host("node").apply(monkeypatch)
+    autochecks_file = autochecks_dir / "node.mk"
+
+    plan = check_plan.get_check_plan(config_cache, "node")
+    assert check_plan.get_check_plan(config_cache, "node") is plan
+
+    autochecks_file.write_text("[]\n")
+    plan = check_plan.get_check_plan(config_cache, "node")
+    assert check_plan.get_check_plan(config_cache, "node") is plan
+    assert check_table_calls == ["node", "node"]
+
+    autochecks_file.write_text("[\n]\n")
+    check_plan.get_check_plan(config_cache, "node")
+    assert check_table_calls == ["node", "node", "node"]
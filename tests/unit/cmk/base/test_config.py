@@ -2113,6 +2113,8 @@ def test_save_packed_config(monkeypatch, serial):
 
     assert Path(cmk.utils.paths.core_helper_config_dir, serial,
                 "precompiled_check_config.mk").exists()
+    assert not Path(cmk.utils.paths.core_helper_config_dir, serial,
+                    "precompiled_check_config.shards").exists()
 
 
 def test_load_packed_config(serial):
@@ -2159,6 +2161,79 @@ class TestPackedConfigStore:
         }
 
 
+def test_load_packed_config_of_hosts(monkeypatch, serial):
+    ts = Scenario()
+    ts.add_host("node1")
+    ts.add_host("node2")
+    ts.add_host("other")
+    ts.add_cluster("cluster", nodes=["node1", "node2"])
+    ts.set_option("ipaddresses", {"node1": "127.0.0.1", "other": "127.0.0.2"})
+    ts.set_option("explicit_host_conf", {"alias": {"node1": "Node 1", "other": "Other"}})
+    config_cache = ts.apply(monkeypatch)
+
+    config.save_packed_config(serial, config_cache, sharded=True)
+    config.load_packed_config(serial, hostnames=["node1"])
+
+    assert sorted(h.split("|", 1)[0] for h in config.all_hosts) == ["node1", "node2"]
+    assert list(config.clusters) == ["cluster"]
+    assert config.ipaddresses == {"node1": "127.0.0.1"}
+    assert config.explicit_host_conf == {"alias": {"node1": "Node 1"}}
+
+    config_cache = config.get_config_cache()
+    assert config_cache.all_active_hosts() == {"node1", "node2", "cluster"}
+    assert config_cache.get_host_config("node1").is_ipv4_host
+
+
+def test_load_packed_config_of_unknown_host(monkeypatch, serial):
+    ts = Scenario()
+    ts.add_host("bla1")
+    config_cache = ts.apply(monkeypatch)
+    config.save_packed_config(serial, config_cache, sharded=True)
+
+    config.load_packed_config(serial, hostnames=["unknown"])
+
+    assert [h.split("|", 1)[0] for h in config.all_hosts] == ["bla1"]
+
+
+class TestShardedPackedConfigStore:
+    @pytest.fixture()
+    def store(self, serial):
+        return config.ShardedPackedConfigStore(serial)
+
+    def test_path(self, store, serial):
+        assert store.path == Path(cmk.utils.paths.core_helper_config_dir, serial,
+                                  "precompiled_check_config.shards")
+
+    def test_read_not_existing_file(self, store):
+        with pytest.raises(FileNotFoundError):
+            store.read(["abc"])
+
+    def test_write_read(self, store):
+        store.write({"abc": 1}, {
+            "host1": {
+                "related_hosts": ["cluster"],
+            },
+            "host2": {
+                "related_hosts": [],
+            },
+            "cluster": {
+                "related_hosts": ["host1"],
+            },
+        })
+
+        assert store.read(["host1"]) == ({
+            "abc": 1
+        }, {
+            "host1": {
+                "related_hosts": ["cluster"],
+            },
+            "cluster": {
+                "related_hosts": ["host1"],
+            },
+        })
+        assert store.read(["host2", "unknown"]) is None
+
+
 @pytest.mark.parametrize("params, expected_result", [
     (
         None,
@@ -316,3 +316,68 @@ def test_compile_delayed_host_check(monkeypatch, serial):
     assert compiled_file.resolve() != source_file
     with compiled_file.open("rb") as f:
         assert f.read().startswith(importlib.util.MAGIC_NUMBER)
+
+
+@pytest.fixture(name="many_hosts_config")
+def fixture_many_hosts_config(monkeypatch):
+    hostnames = ["host%02d" % index for index in range(30)]
+    ts = Scenario()
+    for index, hostname in enumerate(hostnames):
+        ts.add_host(hostname, ipaddress="127.0.0.%d" % (index + 1))
+    host_check_commands = [
+        (("service", "Custom %d" % index), [], hostnames[index::7], {}) for index in range(3)
+    ]
+    host_check_commands.append(("agent", [], hostnames[20:23], {}))
+    ts.set_option("host_check_commands", host_check_commands)
+    host_groups = [("group%d" % index, [], hostnames[index::5], {}) for index in range(5)]
+    ts.set_option("host_groups", host_groups)
+    define_hostgroups = {"group%d" % index: "Group %d" % index for index in range(3)}
+    ts.set_option("define_hostgroups", define_hostgroups)
+    contactgroups = [("contacts%d" % index, [], hostnames[index::4], {}) for index in range(4)]
+    ts.set_option("host_contactgroups", contactgroups)
+    ts.set_ruleset("custom_checks", [({
+        "service_description": "Custom %d" % index,
+        "command_name": "custom-%d" % index,
+        "command_line": "echo %d" % index,
+    }, [], hostnames[index::3], {}) for index in range(3)])
+    ts.apply(monkeypatch)
+
+
+def _create_config():
+    outfile = io.StringIO()
+    core_nagios.create_config(outfile, hostnames=None)
+    return outfile.getvalue()
+
+
+@pytest.mark.usefixtures("many_hosts_config")
+def test_create_config_in_parallel(monkeypatch):
+    core_config.initialize_warnings()
+    sequential = _create_config()
+    sequential_warnings = core_config.get_configuration_warnings()
+
+    monkeypatch.setattr(config, "core_config_processes", 3)
+    core_config.initialize_warnings()
+    parallel = _create_config()
+
+    assert "check-mk-host-custom-12" in sequential
+    assert parallel == sequential
+    assert core_config.get_configuration_warnings() == sequential_warnings
+
+
+def test_merge_nagios_config_shards():
+    cfg = core_nagios.NagiosConfig(io.StringIO(), ["host1", "host2"])
+    for hostname in ["host1", "host2"]:
+        shard = core_nagios._NagiosConfigShard([hostname])
+        command_name = shard.hostcheck_command_name()
+        shard.hostcheck_commands_to_define.append((command_name, "echo %s" % hostname))
+        shard.write("check_command %s\n" % command_name)
+        shard.hostgroups_to_define.update(["b", hostname, "a"])
+        core_nagios._merge_nagios_config_shard(cfg, shard.result([], []))
+
+    assert cfg._outfile.getvalue() == ("check_command check-mk-host-custom-1\n"
+                                       "check_command check-mk-host-custom-2\n")
+    assert cfg.hostcheck_commands_to_define == [
+        ("check-mk-host-custom-1", "echo host1"),
+        ("check-mk-host-custom-2", "echo host2"),
+    ]
+    assert cfg.hostgroups_to_define == {"a", "b", "host1", "host2"}
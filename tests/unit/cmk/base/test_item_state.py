@@ -5,6 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 # pylint: disable=protected-access
+
 import pytest  # type: ignore[import]
 
 from cmk.base import item_state
@@ -68,3 +69,133 @@ def test_get_average(ini_zero, backlog_min, timeseries):
             initialize_zero=ini_zero,
         )
         assert avg == expected_average, "at [%r]: got %r expected %r" % (idx, avg, expected_average)
+
+
+@pytest.fixture(name="counters_dir")
+def fixture_counters_dir(tmp_path, monkeypatch):
+    counters_dir = tmp_path / "counters"
+    monkeypatch.setattr(item_state.cmk.utils.paths, "counters_dir", str(counters_dir))
+    return counters_dir
+
+
+def _interface_states(num_interfaces, this_time):
+    return {("if", str(index), counter): (this_time, index * this_time)
+            for index in range(num_interfaces) for counter in ("in", "out", "inerr", "outerr")}
+
+
+def _load(hostname):
+    cached_item_states = item_state.CachedItemStates()
+    cached_item_states.load(hostname)
+    return cached_item_states
+
+
+def test_save_and_load(counters_dir):
+    cached_item_states = _load("host")
+    for key, value in _interface_states(10, 60).items():
+        cached_item_states.set_item_state_prefix(key[:-1])
+        cached_item_states.set_item_state(key[-1], value)
+    cached_item_states.save("host")
+
+    assert _load("host").get_all_item_states() == _interface_states(10, 60)
+
+
+def test_save_appends_changes(counters_dir):
+    item_states = _interface_states(100, 60)
+    item_state._ItemStateFile.write(str(counters_dir / "host"), item_states)
+    inode = (counters_dir / "host").stat().st_ino
+    size = (counters_dir / "host").stat().st_size
+
+    cached_item_states = _load("host")
+    cached_item_states.set_item_state_prefix(("if", "0"))
+    cached_item_states.set_item_state("in", (120, 0))
+    cached_item_states.remove_full_key(("if", "1", "in"))
+    cached_item_states.save("host")
+
+    assert (counters_dir / "host").stat().st_ino == inode
+    assert size < (counters_dir / "host").stat().st_size < 2 * size
+
+    item_states[("if", "0", "in")] = (120, 0)
+    del item_states[("if", "1", "in")]
+    assert _load("host").get_all_item_states() == item_states
+
+
+def test_save_rewrites_file_with_large_journal(counters_dir):
+    item_state._ItemStateFile.write(str(counters_dir / "host"), _interface_states(100, 60))
+    for this_time in (120, 180):
+        cached_item_states = _load("host")
+        for key, value in _interface_states(100, this_time).items():
+            cached_item_states.set_item_state_prefix(key[:-1])
+            cached_item_states.set_item_state(key[-1], value)
+        cached_item_states.save("host")
+
+    _item_states, item_state_file = item_state._ItemStateFile.read(str(counters_dir / "host"))
+    assert item_state_file is not None
+    assert item_state_file.journal_size <= item_state_file.snapshot_size
+    assert _load("host").get_all_item_states() == _interface_states(100, 180)
+
+
+def test_save_merges_concurrent_changes(counters_dir):
+    item_state._ItemStateFile.write(str(counters_dir / "host"), {
+        ("a",): 1,
+        ("b",): 2,
+        ("c",): 3,
+    })
+    first = _load("host")
+    second = _load("host")
+
+    first.set_item_state("a", 10)
+    first.remove_full_key(("b",))
+    first.save("host")
+
+    second.set_item_state("c", 30)
+    second.set_item_state("d", 40)
+    second.save("host")
+
+    assert _load("host").get_all_item_states() == {("a",): 10, ("c",): 30, ("d",): 40}
+
+
+def test_removed_after_update_is_not_saved(counters_dir):
+    item_state._ItemStateFile.write(str(counters_dir / "host"), _interface_states(10, 60))
+    cached_item_states = _load("host")
+    cached_item_states.set_item_state("new", 1)
+    cached_item_states.remove_full_key(("new",))
+    cached_item_states.save("host")
+
+    assert _load("host").get_all_item_states() == _interface_states(10, 60)
+
+
+def test_load_legacy_format(counters_dir):
+    counters_dir.mkdir()
+    (counters_dir / "host").write_text(repr(_interface_states(3, 60)))
+
+    cached_item_states = _load("host")
+    assert cached_item_states.get_all_item_states() == _interface_states(3, 60)
+
+    cached_item_states.set_item_state("new", 1)
+    cached_item_states.save("host")
+    assert (counters_dir / "host").read_bytes().startswith(item_state._FILE_MAGIC)
+    assert _load("host").get_all_item_states() == {**_interface_states(3, 60), ("new",): 1}
+
+
+def test_load_ignores_interrupted_save(counters_dir):
+    item_state._ItemStateFile.write(str(counters_dir / "host"), {("a",): 1})
+    with (counters_dir / "host").open("ab") as f:
+        f.write(item_state._ItemStateFile.record([], {("b",): 2})[:-1])
+
+    cached_item_states = _load("host")
+    assert cached_item_states.get_all_item_states() == {("a",): 1}
+
+    cached_item_states.set_item_state("c", 3)
+    cached_item_states.save("host")
+    assert _load("host").get_all_item_states() == {("a",): 1, ("c",): 3}
+
+
+def test_load_legacy_and_binary_format(counters_dir):
+    """Compare to the repr/literal_eval encoding used before"""
+    item_states = _interface_states(5000, 60)
+    counters_dir.mkdir()
+    (counters_dir / "legacy").write_text(repr(item_states))
+    item_state._ItemStateFile.write(str(counters_dir / "binary"), item_states)
+
+    assert _load("binary").get_all_item_states() == _load(
+        "legacy").get_all_item_states() == item_states
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import marshal
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+import cmk.utils.store as store
+from cmk.utils.type_defs import CheckPluginName
+
+import cmk.base.autochecks as autochecks
+import cmk.base.plugin_index as plugin_index
+
+
+def _index():
+    return {
+        "version": plugin_index._INDEX_VERSION,
+        "fingerprint": [("/checks/df", 1)],
+        "sections": {
+            "df": {
+                "modules": ["df_section"],
+                "check_files": [],
+                "superseded_by": ["df_ng"],
+            },
+            "df_ng": {
+                "modules": ["df_ng"],
+                "check_files": [],
+                "superseded_by": [],
+            },
+            "uptime": {
+                "modules": [],
+                "check_files": ["/checks/uptime.include", "/checks/uptime"],
+                "superseded_by": [],
+            },
+        },
+        "check_plugins": {
+            "df": {
+                "modules": ["df"],
+                "check_files": [],
+                "sections": ["df"],
+            },
+            "uptime": {
+                "modules": [],
+                "check_files": ["/checks/uptime.include", "/checks/uptime"],
+                "sections": ["uptime"],
+            },
+        },
+        "hosts": {
+            "host": {
+                "check_plugins": ["uptime"],
+                "check_files": ["/checks/agent_special"],
+                "autochecks_of": ["host"],
+            },
+        },
+    }
+
+
+@pytest.fixture(name="autochecks_of")
+def fixture_autochecks_of(monkeypatch):
+    autochecks_of = {}
+    monkeypatch.setattr(autochecks, "check_plugin_names_of",
+                        lambda hostname: autochecks_of.get(hostname, set()))
+    return autochecks_of
+
+
+def test_needed_plugins(autochecks_of):
+    autochecks_of["host"] = {CheckPluginName("df")}
+    assert plugin_index._needed_plugins(_index(), ["host"]) == (
+        ["df", "df_ng", "df_section"],
+        ["/checks/agent_special", "/checks/uptime.include", "/checks/uptime"],
+    )
+
+
+def test_needed_plugins_management_board(autochecks_of):
+    autochecks_of["host"] = {CheckPluginName("mgmt_df")}
+    modules, _check_files = plugin_index._needed_plugins(_index(), ["host"])
+    assert modules == ["df", "df_ng", "df_section"]
+
+
+@pytest.mark.parametrize("hostname, autochecks", [
+    ("unknown", set()),
+    ("host", {CheckPluginName("not_indexed")}),
+])
+def test_needed_plugins_not_indexed(autochecks_of, hostname, autochecks):
+    autochecks_of["host"] = autochecks
+    with pytest.raises(KeyError):
+        plugin_index._needed_plugins(_index(), [hostname])
+
+
+@pytest.fixture(name="index_path")
+def fixture_index_path(monkeypatch, tmp_path):
+    path = tmp_path / "plugin_index"
+    monkeypatch.setattr(plugin_index, "_index_path", lambda: path)
+    monkeypatch.setattr(plugin_index, "_fingerprint", lambda: [("/checks/df", 1)])
+    return path
+
+
+def test_load_index(index_path):
+    assert plugin_index._load_index() is None
+
+    store.save_bytes_to_file(index_path, b"")
+    assert plugin_index._load_index() is None
+
+    store.save_bytes_to_file(index_path, marshal.dumps(_index()))
+    assert plugin_index._load_index() == _index()
+
+
+def test_load_outdated_index(monkeypatch, index_path):
+    store.save_bytes_to_file(index_path, marshal.dumps(_index()))
+    monkeypatch.setattr(plugin_index, "_fingerprint", lambda: [("/checks/df", 2)])
+    assert plugin_index._load_index() is None
+
+
+def test_load_plugins_of_unknown_host(index_path, autochecks_of):
+    store.save_bytes_to_file(index_path, marshal.dumps(_index()))
+    assert plugin_index.load_plugins_of_hosts(lambda: {}, ["unknown"]) is None
+
+
+def test_fingerprint_of_configuration(monkeypatch, tmp_path):
+    monkeypatch.setattr(plugin_index, "_plugin_directories", lambda: [])
+    monkeypatch.setattr(cmk.utils.paths, "main_config_file", str(tmp_path / "main.mk"))
+    monkeypatch.setattr(cmk.utils.paths, "check_mk_config_dir", str(tmp_path / "conf.d"))
+    (tmp_path / "main.mk").write_text(u"")
+    fingerprint = plugin_index._fingerprint()
+
+    # E.g. a new rule for enforced services, which has not been activated yet
+    (tmp_path / "conf.d").mkdir()
+    (tmp_path / "conf.d" / "rules.mk").write_text(u"static_checks = {}\n")
+    assert plugin_index._fingerprint() != fingerprint
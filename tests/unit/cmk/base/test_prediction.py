@@ -5,6 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import math
+import random
 import time
 from pprint import pprint
 import pytest  # type: ignore[import]
@@ -120,3 +121,31 @@ def test_time_slices(utcdate, timezone, horizon, period_info, timegroup, result)
     ])
 def test_data_stats(slices, result):
     assert prediction._data_stats(slices) == result
+
+
+def _data_stats_reference(slices):
+    descriptors = []
+    for time_column in zip(*slices):
+        point_line = [x for x in time_column if x is not None]
+        if not point_line:
+            descriptors.append([None, None, None, None])
+            continue
+        average = sum(point_line) / len(point_line)
+        std_dev = abs(average) if len(point_line) == 1 else math.sqrt(
+            abs(sum(p**2 for p in point_line) - average**2 * len(point_line)) /
+            (len(point_line) - 1))
+        descriptors.append([average, min(point_line), max(point_line), std_dev])
+    return descriptors
+
+
+def test_data_stats_of_many_slices():
+    rand = random.Random(42)
+    slices = [[None if rand.random() < 0.1 else rand.uniform(-10, 100)
+               for _point in range(1440)]
+              for _slice in range(13)]
+
+    descriptors = prediction._data_stats(slices)
+    reference = _data_stats_reference(slices)
+    assert len(descriptors) == len(reference)
+    for descriptor, expected in zip(descriptors, reference):
+        assert descriptor == (expected if expected[0] is None else pytest.approx(expected))
@@ -5,6 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import collections
+import io
 
 import pytest  # type: ignore[import]
 
@@ -240,3 +241,129 @@ def test_priv_proto(proto, result):
 def test_priv_proto_unknown(proto):
     with pytest.raises(MKGeneralException):
         classic_snmp._priv_proto_for(proto)
+
+
+@pytest.mark.parametrize("table_base_oid, oids, expected", [
+    (None, [".1.2.1", ".1.2.2"], None),
+    (".1.2", [".1.2.1"], None),
+    (".1.2", [".1.2.1", ".1.2.2"], [1, 2]),
+    (".1.2", [".1.2.1", ".1.2.5"], None),
+    (".1.2", [".1.2.1", ".1.2.2.3"], None),
+    (".1.2", [".1.2.1", ".1.3.2"], None),
+])
+def test_table_columns(table_base_oid, oids, expected):
+    assert classic_snmp._table_columns(table_base_oid, oids) == expected
+
+
+def test_demultiplex_columns():
+    rows = [
+        (".1.2.1.1", b"a"),
+        (".1.2.1.2", b"b"),
+        (".1.2.2.1", b"c"),
+        (".1.2.3.1", b"d"),
+        (".1.2.10.1", b"e"),
+    ]
+    assert classic_snmp._demultiplex_columns(rows, [".1.2.1", ".1.2.3", ".1.2.4"]) == {
+        ".1.2.1": [(".1.2.1.1", b"a"), (".1.2.1.2", b"b")],
+        ".1.2.3": [(".1.2.3.1", b"d")],
+        ".1.2.4": [],
+    }
+
+
+class _FakeSNMPProcess:
+    def __init__(self, command, output="", **kwargs):
+        self.pid = 0
+        self.stdout = io.StringIO(output)
+        self.stderr = io.StringIO()
+        self.terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+    def wait(self):
+        return -15 if self.terminated else 0
+
+
+@pytest.mark.parametrize("is_bulkwalk_host,expected", [
+    (False, [
+        ["snmpwalk", "-v1", "-c", "public", "-m", "", "-M", "", "-Cc"] +
+        ["-CE", ".1.2.4", "-OQ", "-OU", "-On", "-Ot", "127.0.0.1", ".1.2"],
+    ]),
+    (True, [
+        ["snmpbulkwalk", "-Cr10", "-v2c", "-c", "public", "-m", "", "-M", "", "-Cc"] +
+        ["-OQ", "-OU", "-On", "-Ot", "127.0.0.1", ".1.2"],
+    ]),
+])
+def test_walk_columns_command(monkeypatch, is_bulkwalk_host, expected):
+    commands = []
+
+    def popen(command, **kwargs):
+        commands.append(command)
+        return _FakeSNMPProcess(command, **kwargs)
+
+    monkeypatch.setattr(classic_snmp.subprocess, "Popen", popen)
+    snmp_config = SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname="localhost",
+        ipaddress="127.0.0.1",
+        credentials="public",
+        port=161,
+        is_bulkwalk_host=is_bulkwalk_host,
+        is_snmpv2or3_without_bulkwalk_host=False,
+        bulk_walk_size_of=10,
+        timing={},
+        oid_range_limits=[],
+        snmpv3_contexts=[],
+        character_encoding=None,
+        is_usewalk_host=False,
+        snmp_backend=SNMPBackendEnum.CLASSIC,
+    )
+    ClassicSNMPBackend(snmp_config, logger).walk_columns(
+        [".1.2.1", ".1.2.2", ".1.2.3"],
+        table_base_oid=".1.2",
+    )
+    assert commands == expected
+
+
+def test_walk_columns_bulkwalk_stops_at_end_oid(monkeypatch):
+    processes = []
+
+    def popen(command, **kwargs):
+        processes.append(
+            _FakeSNMPProcess(
+                command,
+                output="\n".join([
+                    ".1.2.1.1 = \"a\"",
+                    ".1.2.2.1 = \"b\"",
+                    ".1.2.10.1 = \"c\"",
+                    ".1.2.3.1 = \"d\"",
+                ]),
+                **kwargs,
+            ))
+        return processes[-1]
+
+    monkeypatch.setattr(classic_snmp.subprocess, "Popen", popen)
+    snmp_config = SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname="localhost",
+        ipaddress="127.0.0.1",
+        credentials="public",
+        port=161,
+        is_bulkwalk_host=True,
+        is_snmpv2or3_without_bulkwalk_host=False,
+        bulk_walk_size_of=10,
+        timing={},
+        oid_range_limits=[],
+        snmpv3_contexts=[],
+        character_encoding=None,
+        is_usewalk_host=False,
+        snmp_backend=SNMPBackendEnum.CLASSIC,
+    )
+    assert ClassicSNMPBackend(snmp_config, logger).walk_columns(
+        [".1.2.1", ".1.2.2"],
+        table_base_oid=".1.2",
+    ) == {
+        ".1.2.1": [(".1.2.1.1", b"a")],
+        ".1.2.2": [(".1.2.2.1", b"b")],
+    }
+    assert [p.terminated for p in processes] == [True]
@@ -564,6 +564,54 @@ class TestSNMPFetcherFetch(ABCTestSNMPFetcher):
         )
         assert fetcher.fetch(Mode.DISCOVERY) == result.OK({})
 
+    def test_fetch_from_io_concurrently(self, monkeypatch, fetcher):
+        monkeypatch.setattr(fetcher, "max_concurrency", 4)
+        monkeypatch.setattr(
+            fetcher, "sections", {
+                SectionName(name): SectionMeta(
+                    checking=True,
+                    disabled=False,
+                    fetch_interval=None,
+                ) for name in ("pim", "pam", "pum")
+            })
+        monkeypatch.setattr(
+            snmp_table,
+            "get_snmp_table",
+            lambda tree, **__: [[tree.base]],
+        )
+        assert fetcher.fetch(Mode.CHECKING) == result.OK({
+            SectionName("pam"): [[[".1.2.3"]]],
+            SectionName("pim"): [[[".1.1.1"]]],
+            SectionName("pum"): [[[".2.2.2"]], [[".3.3.3"]]],
+        })
+        assert set(fetcher.section_durations) == {
+            SectionName("pim"),
+            SectionName("pam"),
+            SectionName("pum"),
+        }
+
+    def test_group_independent_sections(self, monkeypatch, fetcher):
+        plugin_store = dict(fetcher.plugin_store)
+        plugin_store[SectionName("pom")] = SNMPPluginStoreItem(
+            trees=[BackendSNMPTree(base=".2.2.2", oids=[BackendOIDSpec("2.2", "string", False)])],
+            detect_spec=SNMPDetectSpec([[]]),
+            inventory=False,
+        )
+        monkeypatch.setattr(SNMPFetcher, "plugin_store", SNMPPluginStore(plugin_store))
+        assert fetcher._group_independent_sections(
+            [SectionName(n) for n in ("pim", "pum", "pam", "pom")],
+            {},
+        ) == [
+            [SectionName("pim")],
+            [SectionName("pum"), SectionName("pom")],
+            [SectionName("pam")],
+        ]
+        # OIDs served from the walk cache do not tie sections together.
+        assert fetcher._group_independent_sections(
+            [SectionName("pum"), SectionName("pom")],
+            {".2.2.2.2.2": (False, [])},
+        ) == [[SectionName("pum")], [SectionName("pom")]]
+
     @pytest.fixture(name="set_sections")
     def _set_sections(self, monkeypatch):
         table = [['1']]
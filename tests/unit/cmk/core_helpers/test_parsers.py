@@ -18,7 +18,7 @@ from cmk.utils.type_defs import AgentRawData, AgentRawDataSection, SectionName
 
 from cmk.snmplib.type_defs import SNMPRawData
 
-from cmk.core_helpers.agent import AgentParser, SectionMarker
+from cmk.core_helpers.agent import AgentHostSections, AgentParser, AgentRawSections, SectionMarker
 from cmk.core_helpers.cache import PersistedSections, SectionStore
 from cmk.core_helpers.snmp import SNMPParser
 from cmk.core_helpers.type_defs import NO_SELECTION
@@ -47,8 +47,8 @@ class TestAgentParser:
     def store(self, store_path, logger):
         return SectionStore[AgentRawDataSection](store_path, logger=logger)
 
-    @pytest.fixture
-    def parser(self, hostname, store, logger):
+    @pytest.fixture(params=[False, True], ids=["lines", "streaming"])
+    def parser(self, hostname, store, logger, request):
         return AgentParser(
             hostname,
             store,
@@ -58,6 +58,7 @@ class TestAgentParser:
             encoding_fallback="ascii",
             simulation=False,
             logger=logger,
+            streaming=request.param,
         )
 
     @pytest.mark.usefixtures("scenario")
@@ -264,6 +265,134 @@ class TestAgentParser:
         }
 
 
+class TestStreamingAgentParser:
+    @pytest.fixture
+    def hostname(self):
+        return "testhost"
+
+    @pytest.fixture
+    def scenario(self, hostname, monkeypatch):
+        ts = Scenario()
+        ts.add_host(hostname)
+        ts.apply(monkeypatch)
+
+    @pytest.fixture(autouse=True)
+    def patch_io(self, monkeypatch):
+        monkeypatch.setattr(SectionStore, "load", lambda self: PersistedSections({}))
+        monkeypatch.setattr(SectionStore, "store", lambda self, sections: None)
+
+    @staticmethod
+    def make_parser(hostname, *, streaming):
+        return AgentParser(
+            hostname,
+            SectionStore[AgentRawDataSection]("/dev/null", logger=logging.getLogger("test")),
+            check_interval=0,
+            keep_outdated=True,
+            translation={},
+            encoding_fallback="ascii",
+            simulation=False,
+            logger=logging.getLogger("test"),
+            streaming=streaming,
+        )
+
+    @pytest.mark.usefixtures("scenario")
+    @pytest.mark.parametrize("selection", [NO_SELECTION, {SectionName("selected")}])
+    def test_same_result_as_line_parser(self, hostname, selection, monkeypatch):
+        monkeypatch.setattr(time, "time", lambda: 1000)
+        raw_data = AgentRawData(b"\r\n".join((
+            b"garbage <<<before>>> the first header",
+            b"<<<selected:sep(59)>>>",
+            b"  a;b  ",
+            b"",
+            b"   ",
+            b"c;<<<d>>>",
+            b"<<<>>>",
+            b"ignored after footer?",
+            b"  <<<other:nostrip>>>  ",
+            b"  leading and trailing  ",
+            b"<<<<%s>>>>" % hostname.encode("ascii"),
+            b"\xe4 latin-1",
+            b"<<<<>>>>",
+            b"<<<selected:encoding(cp1252)>>>",
+            b"\x80 euro",
+            b"<<<<piggy>>>>",
+            b"<<<selected>>>",
+            b"piggy line",
+            b"",
+            b"<<<deselected>>>",
+            b"ignored line",
+            b"<<<<>>>>",
+            b"<<<selected:encoding(no-such-encoding)>>>",
+            b"undecodable",
+            b"<<<deselected>>>",
+            b"last line",
+        )))
+
+        expected = self.make_parser(hostname, streaming=False).parse(
+            raw_data,
+            selection=selection,
+        )
+        ahs = self.make_parser(hostname, streaming=True).parse(raw_data, selection=selection)
+
+        assert ahs.sections == expected.sections
+        assert dict(ahs.sections) == dict(expected.sections)
+        assert ahs.cache_info == expected.cache_info
+        assert ahs.piggybacked_raw_data == expected.piggybacked_raw_data
+
+    @pytest.mark.usefixtures("scenario")
+    def test_sections_are_decoded_on_access(self, hostname):
+        raw_data = AgentRawData(b"\n".join((
+            b"<<<first>>>",
+            b"1st line",
+            b"<<<second>>>",
+            b"2nd line",
+        )))
+
+        ahs = self.make_parser(hostname, streaming=True).parse(raw_data, selection=NO_SELECTION)
+        sections = ahs.sections
+
+        assert isinstance(sections, AgentRawSections)
+        assert list(sections) == [SectionName("first"), SectionName("second")]
+        assert SectionName("first") in sections
+        assert not sections.is_decoded(SectionName("first"))
+        assert not sections.is_decoded(SectionName("second"))
+
+        assert sections[SectionName("first")] == [["1st", "line"]]
+        assert sections.is_decoded(SectionName("first"))
+        assert not sections.is_decoded(SectionName("second"))
+
+    @pytest.mark.usefixtures("scenario")
+    def test_add_host_sections_does_not_decode(self, hostname):
+        parser = self.make_parser(hostname, streaming=True)
+        host_sections = AgentHostSections()
+        for raw_data in [b"<<<section>>>\nfirst line", b"<<<section>>>\nsecond line"]:
+            host_sections.add(parser.parse(AgentRawData(raw_data), selection=NO_SELECTION))
+
+        assert not host_sections.sections.is_decoded(SectionName("section"))
+        assert host_sections.sections == {
+            SectionName("section"): [["first", "line"], ["second", "line"]],
+        }
+
+    @pytest.mark.usefixtures("scenario")
+    def test_streaming_with_deselected_section(self, hostname):
+        ps_lines = [
+            b"(root,%d,%d,00:00:00/1-00:00:00,%d) /usr/bin/python3 -m some.module --flag" %
+            (i, i, i) for i in range(5000)
+        ]
+        raw_data = AgentRawData(b"\n".join([b"<<<ps>>>"] + ps_lines +
+                                           [b"<<<uptime>>>", b"12345 67890"]))
+        selection = {SectionName("uptime")}
+
+        lines_parser = self.make_parser(hostname, streaming=False)
+        lines_sections = lines_parser.parse(raw_data, selection=selection).sections
+        streaming_parser = self.make_parser(hostname, streaming=True)
+        streaming_sections = streaming_parser.parse(raw_data, selection=selection).sections
+
+        assert streaming_sections == lines_sections == {
+            SectionName("uptime"): [["12345", "67890"]],
+        }
+
+
 class TestSectionMarker:
     def test_options_serialize_options(self):
         section_header = SectionMarker.from_headerline(b"<<<" + b":".join((
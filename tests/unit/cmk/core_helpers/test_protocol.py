@@ -410,6 +410,18 @@ class TestResultStats:
     def test_encode_decode(self, l3stats):
         assert ResultStats.from_bytes(bytes(l3stats)) == l3stats
 
+    def test_encode_decode_section_durations(self):
+        stats = ResultStats(
+            Snapshot.null(),
+            section_durations={
+                SectionName("one"): 0.5,
+                SectionName("two"): 1.25
+            },
+        )
+        other = ResultStats.from_bytes(bytes(stats))
+        assert other == stats
+        assert other.section_durations == stats.section_durations
+
 
 class TestFetcherMessage:
     @pytest.fixture
@@ -4,8 +4,15 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import logging
+
 import pytest  # type: ignore[import]
 
+import cmk.utils.cleanup
+import cmk.utils.paths
+
+from cmk.snmplib.type_defs import SNMPBackendEnum, SNMPHostConfig
+
 import cmk.core_helpers.snmp_backend._utils as utils
 from cmk.core_helpers.snmp_backend import StoredWalkSNMPBackend
 
@@ -20,31 +27,70 @@ def test_strip_snmp_value(value, expected):
     assert utils.strip_snmp_value(value) == expected
 
 
-@pytest.mark.usefixtures("create_files")
-class TestStoredWalkSNMPBackend:
-    @pytest.mark.parametrize("a, b, result", [
-        ("1.2.3", "1.2.3", 0),
-        ("1.2.3", ".1.2.3", 0),
-        (".1.2.3", "1.2.3", 0),
-        (".1.2.3", ".1.2.3", 0),
-        ("1.2.3", "1.2.3.4", 0),
-        ("1.2.3.4", "1.2.3", 1),
-        ("1.2.3", "4.5.6", -1),
+class TestStoredWalkSNMPBackendIndex:
+    @pytest.fixture
+    def backend(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path / "snmpwalks"))
+        monkeypatch.setattr(cmk.utils.paths, "snmpwalks_index_dir",
+                            str(tmp_path / "snmpwalks_index"))
+        (tmp_path / "snmpwalks").mkdir()
+        walk = "".join([
+            ".1.2.3.1 \"A\"\n",
+            ".1.2.3.10.1 \"B 1\"\n",
+            ".1.2.3.2.1 \"C\nD\"\n",
+            ".1.2.3.2.2 \"B2 E0 7D 2C 4D 15 \"\n",
+            ".1.2.30.1 3\n",
+        ])
+        (tmp_path / "snmpwalks" / "walkhost").write_text(walk)
+        yield StoredWalkSNMPBackend(
+            SNMPHostConfig(
+                is_ipv6_primary=False,
+                hostname="walkhost",
+                ipaddress="1.2.3.4",
+                credentials="public",
+                port=42,
+                is_bulkwalk_host=False,
+                is_snmpv2or3_without_bulkwalk_host=False,
+                bulk_walk_size_of=0,
+                timing={},
+                oid_range_limits=[],
+                snmpv3_contexts=[],
+                character_encoding=None,
+                is_usewalk_host=True,
+                snmp_backend=SNMPBackendEnum.CLASSIC,
+            ),
+            logging.getLogger("test"),
+        )
+        cmk.utils.cleanup.cleanup_globals()
+
+    @pytest.mark.parametrize("oid, expected", [
+        (".1.2.3", [
+            (".1.2.3.1", b"A"),
+            (".1.2.3.2.1", b"C\nD"),
+            (".1.2.3.2.2", b"\xb2\xe0},M\x15"),
+            (".1.2.3.10.1", b"B 1"),
+        ]),
+        (".1.2.3.2", [(".1.2.3.2.1", b"C\nD"), (".1.2.3.2.2", b"\xb2\xe0},M\x15")]),
+        (".1.2.3.2.*", [(".1.2.3.2.1", b"C\nD")]),
+        (".1.2.30.1", [(".1.2.30.1", b"3")]),
+        (".1.2.4", []),
     ])
-    def test_compare_oids(self, a, b, result):
-        assert StoredWalkSNMPBackend._compare_oids(a, b) == result
-
-    def test_read_walk_data(self, tmpdir):
-        assert StoredWalkSNMPBackend.read_walk_data(
-            tmpdir / "walkdata" / "1.txt") == [".1.2.3 foo\n", ".1.2.4 bar\nfoobar\n"]
-        assert StoredWalkSNMPBackend.read_walk_data(
-            tmpdir / "walkdata" / "2.txt") == [".1.2.3 foo\n\n\n", ".1.2.5 test\n"]
-
-
-@pytest.fixture
-def create_files(tmpdir):
-    tmpdir.mkdir("walkdata")
-    p1 = (tmpdir / "walkdata").join("1.txt")
-    p1.write(".1.2.3 foo\n.1.2.4 bar\nfoobar\n")
-    p2 = (tmpdir / "walkdata").join("2.txt")
-    p2.write(".1.2.3 foo\n\n\n.1.2.5 test\n")
+    def test_walk(self, backend, oid, expected):
+        assert backend.walk(oid) == expected
+
+    def test_index_is_written_and_reused(self, backend, tmp_path):
+        assert backend.walk(".1.2.30") == [(".1.2.30.1", b"3")]
+        index_path = tmp_path / "snmpwalks_index" / "walkhost"
+        assert index_path.exists()
+
+        cmk.utils.cleanup.cleanup_globals()
+        index = index_path.read_bytes()
+        assert backend.walk(".1.2.30") == [(".1.2.30.1", b"3")]
+        assert index_path.read_bytes() == index
+
+    def test_outdated_index_is_rebuilt(self, backend, tmp_path):
+        assert backend.get(".1.2.30.1") == b"3"
+        cmk.utils.cleanup.cleanup_globals()
+
+        (tmp_path / "snmpwalks" / "walkhost").write_text(".1.2.30.1 42\n")
+        assert backend.get(".1.2.30.1") == b"42"
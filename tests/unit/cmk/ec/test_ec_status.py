@@ -16,6 +16,7 @@ from testlib import CMKEventConsole
 import cmk.utils.paths
 import cmk.ec.history
 import cmk.ec.main
+import cmk.ec.query
 import cmk.ec.export as ec
 
 
@@ -206,3 +207,411 @@ def test_mkevent_query_filters(
     status_server.handle_client(status_socket, True, '127.0.0.1')
     response = status_socket.get_response()
     assert (len(response) == 2) is is_match
+
+
+def _new_events(event_status, num_events):
+    for num in range(num_events):
+        event_status.new_event(
+            CMKEventConsole.new_event({
+                "host": "host-%d" % (num % 100),
+                "core_host": "host-%d" % (num % 100),
+                "rule_id": "rule-%d" % (num % 7),
+                "phase": "open" if num % 3 else "ack",
+            }))
+
+
+def _select_events(event_status, status_server, *filters):
+    query = cmk.ec.query.QueryGET(status_server,
+                                  ["GET events"] + ["Filter: %s" % f for f in filters],
+                                  logging.getLogger("cmk.mkeventd"))
+    return [event["id"] for event in event_status.select_events(query.filters)]
+
+
+def test_select_events(event_status, status_server):
+    _new_events(event_status, 1000)
+
+    def expected(predicate):
+        return [event["id"] for event in event_status.events() if predicate(event)]
+
+    assert _select_events(event_status, status_server) == list(range(1, 1001))
+    assert _select_events(event_status, status_server, "event_id = 17") == [17]
+    assert _select_events(event_status, status_server, "event_id in 18 17 2000") == [17, 18]
+    assert _select_events(event_status, status_server,
+                          "event_host = host-1") == expected(lambda e: e["host"] == "host-1")
+    assert _select_events(event_status, status_server, "event_host in HOST-1 host-2",
+                          "event_phase = ack") == expected(
+                              lambda e: e["host"] in ["host-1", "host-2"] and e["phase"] == "ack")
+    assert _select_events(event_status, status_server, "event_core_host =~ HOST-3",
+                          "event_rule_id = rule-3") == expected(
+                              lambda e: e["core_host"] == "host-3" and e["rule_id"] == "rule-3")
+    assert _select_events(event_status, status_server, "event_rule_id = rule-3",
+                          "event_text ~ abc") == expected(lambda e: e["rule_id"] == "rule-3")
+    assert not _select_events(event_status, status_server, "event_host = unknown")
+
+
+def test_event_status_reindex(event_status, status_server):
+    _new_events(event_status, 10)
+    event = event_status.event(4)
+    event["host"] = "other-host"
+    event["phase"] = "closed"
+    event_status.update_event(event)
+
+    assert _select_events(event_status, status_server, "event_host = other-host") == [4]
+    assert _select_events(event_status, status_server, "event_phase = closed") == [4]
+    assert event_status.num_existing_events_by_host[("other-host", "host-3")] == 1
+    assert event_status.num_existing_events_by_host[("host-3", "host-3")] == 0
+
+    event_status.remove_event(event)
+    assert event_status.event(4) is None
+    assert not _select_events(event_status, status_server, "event_host = other-host")
+    assert event_status.num_existing_events_by_host[("other-host", "host-3")] == 0
+
+
+def test_remove_oldest_event(event_status):
+    _new_events(event_status, 20)
+    event_status.remove_oldest_event("overall", None)
+    event_status.remove_oldest_event("by_rule", {"rule_id": "rule-3"})
+    event_status.remove_oldest_event("by_host", {"host": "host-5"})
+    assert [event["id"] for event in event_status.events()
+           ] == [2, 3, 5, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20]
+    assert [event["id"] for event in event_status.events_of_rule("rule-3")] == [11, 18]
+    assert event_status.num_existing_events == 17
+    assert event_status.num_existing_events_by_rule["rule-3"] == 2
+
+
+def test_pack_and_unpack_status(event_status):
+    _new_events(event_status, 20)
+    status = event_status.pack_status()
+    assert [event["id"] for event in status["events"]] == list(range(1, 21))
+
+    event_status.flush()
+    event_status.unpack_status(status)
+    assert event_status.num_existing_events == 20
+    assert [event["id"] for event in event_status.events_of_rule("rule-3")] == [4, 11, 18]
+
+
+def test_event_status_lookup_many_events(event_status, status_server):
+    _new_events(event_status, 20000)
+
+    for event_id in range(1, 20000, 20):
+        assert event_status.event(event_id)["id"] == event_id
+    for num in range(100):
+        assert len(
+            _select_events(event_status, status_server, "event_host in host-%d" % num,
+                           "event_phase in open ack")) == 200
+
+
+@pytest.fixture(name="event_status_in_tmp")
+def fixture_event_status_in_tmp(tmp_path, config, perfcounters, history):
+    settings = ec.settings('1.2.3i45', tmp_path, tmp_path / "etc", ['mkeventd'])
+    settings.paths.status_file.value.parent.mkdir(parents=True)
+    return cmk.ec.main.EventStatus(settings, config, perfcounters, history,
+                                   logging.getLogger("cmk.mkeventd.EventStatus"))
+
+
+def _reloaded(event_status, event_server):
+    reloaded_event_status = cmk.ec.main.EventStatus(event_status.settings, event_status._config,
+                                                    event_status._perfcounters,
+                                                    event_status._history, event_status._logger)
+    reloaded_event_status.load_status(event_server)
+    return reloaded_event_status
+
+
+def test_save_status_journal(event_status_in_tmp, event_server):
+    event_status = event_status_in_tmp
+    paths = event_status.settings.paths
+    _new_events(event_status, 10)
+    event_status.count_rule_match("rule-1")
+    event_status.save_status()
+    assert not paths.status_journal_file.value.exists()
+    snapshot = paths.status_file.value.read_bytes()
+
+    event_status.remove_event(event_status.event(3))
+    event = event_status.event(4)
+    event["comment"] = "changed"
+    event_status.update_event(event)
+    _new_events(event_status, 2)
+    event_status.count_rule_match("rule-1")
+    event_status.count_rule_match("rule-2")
+    event_status.start_next_interval("rule-3", 3600)
+    event_status.save_status()
+    event_status.reset_counters("rule-2")
+
+    assert paths.status_file.value.read_bytes() == snapshot
+    assert len(paths.status_journal_file.value.read_bytes().splitlines()) == 2
+
+    reloaded_event_status = _reloaded(event_status, event_server)
+    assert reloaded_event_status.events() == event_status.events()
+    assert reloaded_event_status.event(4)["comment"] == "changed"
+    assert reloaded_event_status.get_rule_stats() == [("rule-1", 2)]
+    assert reloaded_event_status.pack_status() == event_status.pack_status()
+    assert reloaded_event_status.num_existing_events == 11
+
+    # The first save after loading compacts the journal
+    reloaded_event_status.save_status()
+    assert not paths.status_journal_file.value.exists()
+    assert _reloaded(event_status, event_server).pack_status() == event_status.pack_status()
+
+
+def test_save_status_journal_incomplete_entry(event_status_in_tmp, event_server):
+    event_status = event_status_in_tmp
+    _new_events(event_status, 10)
+    event_status.save_status()
+    _new_events(event_status, 1)
+    event_status.save_status()
+    expected_status = event_status.pack_status()
+    _new_events(event_status, 1)
+    event_status.save_status()
+
+    journal_path = event_status.settings.paths.status_journal_file.value
+    journal_path.write_bytes(journal_path.read_bytes()[:-10])
+
+    assert _reloaded(event_status, event_server).pack_status() == expected_status
+
+
+def test_save_status_journal_of_previous_snapshot(event_status_in_tmp, event_server):
+    event_status = event_status_in_tmp
+    _new_events(event_status, 10)
+    event_status.save_status()
+    _new_events(event_status, 1)
+    event_status.save_status()
+
+    journal_path = event_status.settings.paths.status_journal_file.value
+    journal = journal_path.read_bytes()
+    event_status.flush()
+    event_status.save_status()
+    # E.g. a crash before removing the journal after saving the snapshot
+    journal_path.write_bytes(journal)
+
+    assert not _reloaded(event_status, event_server).events()
+
+
+def test_save_status_journal_compaction(event_status_in_tmp, monkeypatch):
+    monkeypatch.setattr(cmk.ec.main, "MIN_JOURNAL_SIZE", 0)
+    event_status = event_status_in_tmp
+    journal_path = event_status.settings.paths.status_journal_file.value
+    _new_events(event_status, 100)
+    event_status.save_status()
+
+    for num in range(1, 100):
+        event = event_status.event(num)
+        event["comment"] = "changed"
+        event_status.update_event(event)
+        event_status.save_status()
+        if not journal_path.exists():
+            break
+    assert 10 < num < 90
+
+
+def test_save_status_without_journal(event_status_in_tmp, config):
+    config["status_journal"] = False
+    event_status = event_status_in_tmp
+    _new_events(event_status, 10)
+    event_status.save_status()
+    _new_events(event_status, 10)
+    event_status.save_status()
+    assert not event_status.settings.paths.status_journal_file.value.exists()
+
+
+def test_save_status_journal_of_token_bucket(event_status_in_tmp, settings, config, slave_status,
+                                             perfcounters, lock_configuration, history):
+    event_status = event_status_in_tmp
+    event_server = cmk.ec.main.EventServer(logging.getLogger("cmk.mkeventd.EventServer"), settings,
+                                           config, slave_status, perfcounters, lock_configuration,
+                                           history, event_status,
+                                           cmk.ec.main.StatusTableEvents.columns, False)
+    event_server.compile_rules([], [
+        dict(ec.default_rule_pack([
+            _rule("bucket", count={
+                "algorithm": "tokenbucket",
+                "count": 10,
+                "period": 100,
+            }),
+        ]),
+             id="pack-1"),
+    ])
+    event_status.new_event(
+        CMKEventConsole.new_event({
+            "host": "host-1",
+            "core_host": "host-1",
+            "rule_id": "bucket",
+            "phase": "counting",
+            "count": 5,
+            "first": time.time() - 25,
+        }))
+    event_status.save_status()
+
+    event_server.hk_handle_event_timeouts()
+    event_status.save_status()
+
+    event = event_status.events()[0]
+    assert event["count"] == 3
+    reloaded_event = _reloaded(event_status, event_server).events()[0]
+    assert reloaded_event["count"] == 3
+    assert reloaded_event["last_token"] == event["last_token"]
+
+
+def test_save_status_journal_of_many_events(event_status_in_tmp):
+    event_status = event_status_in_tmp
+    paths = event_status.settings.paths
+    _new_events(event_status, 20000)
+    event_status.save_status()
+    snapshot = paths.status_file.value.read_bytes()
+
+    event = event_status.event(17)
+    event["comment"] = "changed"
+    event_status.update_event(event)
+    event_status.save_status()
+
+    # Only the changed event is written
+    assert paths.status_file.value.read_bytes() == snapshot
+    assert len(paths.status_journal_file.value.read_bytes()) * 1000 < len(snapshot)
+
+
+def _rule(rule_id, **kwargs):
+    rule = {
+        "id": rule_id,
+        "state": 1,
+        "sl": {
+            "value": 0,
+            "precedence": "message"
+        },
+    }
+    rule.update(kwargs)
+    return rule
+
+
+RULE_PACKS = [
+    dict(ec.default_rule_pack([
+        _rule("skip-backup", match="backup", drop="skip_pack"),
+        _rule("failed", match="failed", state=2),
+    ]),
+         id="pack-1"),
+    dict(ec.default_rule_pack([
+        _rule("backup-failed", match="backup (failed|aborted)"),
+        _rule("drop-debug", match="debug", drop=True),
+        _rule("link", match="link (\\S+) down", match_ok="link (\\S+) up", set_text="Link \\1"),
+        _rule("not-keepalive", match="keepalive", invert_matching=True, state=0),
+    ]),
+         id="pack-2"),
+]
+
+MESSAGES = [
+    "backup failed",
+    "disk failed",
+    "debug output",
+    "link eth0 down",
+    "link eth1 down",
+    "link eth0 up",
+    "keepalive",
+    "something else",
+]
+
+
+def _process_messages(event_server, num_messages):
+    for number in range(num_messages):
+        event_server.queue_raw_lines(
+            ("<78>Oct 17 10:00:%02d host%d app: %s\n" %
+             (number % 60, number % 3, MESSAGES[number % len(MESSAGES)])).encode("utf-8"))
+
+    thread = threading.Thread(target=event_server._process_queue)
+    thread.start()
+    try:
+        deadline = time.time() + 60
+        while (event_server._perfcounters._counters["messages"] < num_messages and
+               time.time() < deadline):
+            time.sleep(0.05)
+    finally:
+        event_server.terminate()
+        thread.join()
+
+
+@pytest.mark.parametrize("event_processes", [1, 2])
+def test_process_queued_messages(monkeypatch, event_server, event_status, perfcounters, config,
+                                 event_processes):
+    monkeypatch.setattr(cmk.ec.main.HostConfig, "_update_cache_after_core_restart",
+                        lambda self: True)
+    config["hostname_translation"] = {"case": "upper"}
+    config["event_processes"] = event_processes
+    event_server.compile_rules([], RULE_PACKS)
+
+    _process_messages(event_server, 100)
+
+    assert perfcounters._counters["messages"] == 100
+    assert perfcounters._counters["rule_tries"] == 113
+    assert perfcounters._counters["drops"] == 13
+    # 10 of the 25 link events are canceled
+    assert perfcounters._counters["events"] == 63
+    assert event_status.num_existing_events == 53
+    assert sorted({(event["rule_id"], event["host"], event["text"], event["state"])
+                   for event in event_status.events()}) == [
+                       ("backup-failed", "HOST0", "backup failed", 1),
+                       ("backup-failed", "HOST1", "backup failed", 1),
+                       ("backup-failed", "HOST2", "backup failed", 1),
+                       ("failed", "HOST0", "disk failed", 2),
+                       ("failed", "HOST1", "disk failed", 2),
+                       ("failed", "HOST2", "disk failed", 2),
+                       ("link", "HOST0", "Link eth0", 1),
+                       ("link", "HOST0", "Link eth1", 1),
+                       ("link", "HOST1", "Link eth0", 1),
+                       ("link", "HOST1", "Link eth1", 1),
+                       ("link", "HOST2", "Link eth0", 1),
+                       ("link", "HOST2", "Link eth1", 1),
+                       ("not-keepalive", "HOST0", "something else", 0),
+                       ("not-keepalive", "HOST1", "something else", 0),
+                       ("not-keepalive", "HOST2", "something else", 0),
+                   ]
+    assert dict(event_status.get_rule_stats()) == {
+        "skip-backup": 13,
+        "failed": 13,
+        "backup-failed": 13,
+        "drop-debug": 13,
+        "link": 37,
+        "not-keepalive": 12,
+    }
+
+
+def test_process_pending_batches_on_terminate(monkeypatch, event_server, perfcounters, config):
+    monkeypatch.setattr(cmk.ec.main.HostConfig, "_update_cache_after_core_restart",
+                        lambda self: True)
+    config["event_processes"] = 2
+    event_server.compile_rules([], RULE_PACKS)
+    next_batch = event_server._next_batch
+
+    def next_batch_and_terminate(block):
+        batch = next_batch(block)
+        event_server.terminate()
+        return batch
+
+    monkeypatch.setattr(event_server, "_next_batch", next_batch_and_terminate)
+    for _number in range(3):
+        event_server.queue_raw_lines(b"<78>Oct 17 10:00:00 host0 app: disk failed\n")
+
+    event_server._process_queue()
+
+    assert perfcounters._counters["messages"] == 3
+
+
+def test_process_remaining_messages(monkeypatch, event_server, perfcounters, config):
+    monkeypatch.setattr(cmk.ec.main.HostConfig, "_update_cache_after_core_restart",
+                        lambda self: True)
+    event_server.compile_rules([], RULE_PACKS)
+    for _number in range(2 * cmk.ec.main.MAX_BATCH_SIZE + 1):
+        event_server.queue_raw_lines(b"<78>Oct 17 10:00:00 host0 app: disk failed\n")
+    event_server.terminate()
+
+    event_server._process_remaining_messages()
+
+    assert perfcounters._counters["messages"] == 2 * cmk.ec.main.MAX_BATCH_SIZE + 1
+    assert event_server._message_queue.empty()
+
+
+def test_queue_overflow(monkeypatch, event_server, perfcounters):
+    monkeypatch.setattr(event_server, "_message_queue", cmk.ec.main.queue.Queue(2))
+    for _number in range(3):
+        event_server.queue_raw_lines(b"line 1\nline 2\n")
+    event_server.queue_raw_lines(b"line 3")
+
+    assert perfcounters._counters["queue_overflows"] == 3
+    assert event_server._next_batch(block=False) == [("lines", b"line 1\nline 2\n", None)] * 2
+    assert perfcounters._counters["queued_messages"] == 0
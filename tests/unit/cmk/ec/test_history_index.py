@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=protected-access
+
+import logging
+
+import pytest  # type: ignore[import]
+
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+import cmk.ec.query
+from cmk.ec.history_index import BLOCK_LINES, HistoryFileIndex
+
+logger = logging.getLogger("cmk.mkeventd")
+
+
+class FakeStatusServer:
+    def __init__(self, history):
+        self._table = cmk.ec.main.StatusTableHistory(logger, history)
+
+    def table(self, name):
+        assert name == "history"
+        return self._table
+
+
+@pytest.fixture(name="history")
+def fixture_history(tmp_path):
+    settings = ec.settings('1.2.3i45', tmp_path, tmp_path / "etc", ['mkeventd'])
+    return cmk.ec.history.History(settings, ec.default_config(), logger,
+                                  cmk.ec.main.StatusTableEvents.columns,
+                                  cmk.ec.main.StatusTableHistory.columns)
+
+
+def _event(number):
+    return {
+        "id": number,
+        "host": "host%d" % (number % 10),
+        "rule_id": "rule%d" % (number % 3),
+        "text": "Something happened %d" % number,
+        "first": 1000.0 + number,
+        "last": 1000.0 + number,
+    }
+
+
+def _history_line(number):
+    event = _event(number)
+    columns = [b"%f" % (1000.0 + number), b"NEW", b"", b""] + [
+        cmk.ec.history.quote_tab(event.get(name[6:], default))
+        for name, default in cmk.ec.main.StatusTableEvents.columns
+    ]
+    return b"\t".join(columns) + b"\n"
+
+
+def _write_log(path, numbers):
+    with path.open("ab") as f:
+        for number in numbers:
+            f.write(_history_line(number))
+
+
+def _query(history, *filters, limit=None):
+    raw_query = ["GET history"] + ["Filter: %s" % f for f in filters]
+    if limit is not None:
+        raw_query.append("Limit: %d" % limit)
+    return list(history.get(cmk.ec.query.QueryGET(FakeStatusServer(history), raw_query, logger)))
+
+
+def test_index_is_persisted(tmp_path):
+    log_path = tmp_path / "1000.log"
+    _write_log(log_path, range(2 * BLOCK_LINES + 10))
+
+    index = HistoryFileIndex(log_path, logger)
+    index.update()
+    assert len(index._blocks) == 2
+    assert index._pending.num_lines == 10
+
+    index = HistoryFileIndex(log_path, logger)
+    assert len(index._blocks) == 2
+    assert index._blocks[0].offset == 0
+    assert index._blocks[1].offset == index._blocks[0].length
+
+    index.update(complete=True)
+    assert len(HistoryFileIndex(log_path, logger)._blocks) == 3
+
+
+def test_index_truncates_torn_writes(tmp_path):
+    log_path = tmp_path / "1000.log"
+    _write_log(log_path, range(BLOCK_LINES))
+    HistoryFileIndex(log_path, logger).update()
+
+    index_path = tmp_path / "1000.idx"
+    size = index_path.stat().st_size
+    with index_path.open("ab") as f:
+        f.write(b"\x00\x00\x10\x00garbage")
+
+    assert len(HistoryFileIndex(log_path, logger)._blocks) == 1
+    assert index_path.stat().st_size == size
+
+
+def test_index_is_rebuilt_for_replaced_log(tmp_path):
+    log_path = tmp_path / "1000.log"
+    _write_log(log_path, range(BLOCK_LINES))
+    index = HistoryFileIndex(log_path, logger)
+    index.update()
+
+    log_path.unlink()
+    _write_log(log_path, range(10))
+    index.update()
+    assert not index._blocks
+    assert index._pending.num_lines == 10
+
+
+def test_candidate_ranges(tmp_path):
+    log_path = tmp_path / "1000.log"
+    _write_log(log_path, range(BLOCK_LINES))
+    _write_log(log_path, [BLOCK_LINES + n * 10 + 1 for n in range(BLOCK_LINES)])
+    _write_log(log_path, [5])
+    index = HistoryFileIndex(log_path, logger)
+    index.update()
+
+    assert [r.lines_after for r in index.candidate_ranges([], [])] == [0, 1, BLOCK_LINES + 1]
+    assert len(index.candidate_ranges([], [("event_host", ["HOST1"])])) == 2
+    assert len(index.candidate_ranges([], [("event_host", ["host2"])])) == 1
+    assert len(index.candidate_ranges([], [("event_host", ["host5"])])) == 2
+    assert len(index.candidate_ranges([], [("event_host", ["host5", "host1"])])) == 3
+    assert len(index.candidate_ranges([], [("event_host", ["host2"]),
+                                           ("event_rule_id", ["rule1"])])) == 1
+    assert not index.candidate_ranges([], [("event_id", [2000])])
+    assert len(index.candidate_ranges([(">", lambda t: t > 2000.0)], [])) == 1
+
+
+def test_add_files_maintains_index(history):
+    for number in range(BLOCK_LINES + 5):
+        history.add(_event(number), "NEW")
+
+    (log_path,) = history._settings.paths.history_dir.value.glob("*.log")
+    index = history._history_file_indexes[log_path]
+    assert len(index._blocks) == 1
+    assert index._pending.num_lines == 5
+
+    fresh_index = HistoryFileIndex(log_path, logger)
+    fresh_index.update()
+    assert fresh_index._blocks == index._blocks
+    assert fresh_index._pending.block() == index._pending.block()
+
+
+def test_add_files_while_index_is_locked(history):
+    history.add(_event(0), "NEW")
+    (log_path,) = history._settings.paths.history_dir.value.glob("*.log")
+    index = history._history_file_indexes[log_path]
+
+    # E.g. a query building the index
+    with index.lock:
+        for number in range(1, BLOCK_LINES + 5):
+            history.add(_event(number), "NEW")
+    assert index._pending.num_lines == 1
+
+    history.add(_event(BLOCK_LINES + 5), "NEW")
+    assert len(index._blocks) == 1
+    assert index._pending.num_lines == 6
+
+
+@pytest.mark.parametrize("filters", [
+    ("event_host = host3",),
+    ("event_host in host3 HOST4",),
+    ("event_host =~ HOST3", "event_rule_id = rule1"),
+    ("event_id = 1234",),
+    ("event_host ~~ host3",),
+    ("event_text ~~ happened 12",),
+    ("history_line = 7",),
+])
+def test_get_files_with_index(history, filters):
+    history_dir = history._settings.paths.history_dir.value
+    history_dir.mkdir(parents=True)
+    _write_log(history_dir / "1000.log", range(2 * BLOCK_LINES + 123))
+    _write_log(history_dir / "2000.log", range(2 * BLOCK_LINES + 123, 3 * BLOCK_LINES))
+
+    def reference(paths):
+        query = cmk.ec.query.QueryGET(FakeStatusServer(history),
+                                      ["GET history"] + ["Filter: %s" % f for f in filters], logger)
+        entries = []
+        for path in paths:
+            entries += cmk.ec.history._parse_history_file(history, path, query, [], None, logger)
+        return entries
+
+    expected = reference([history_dir / "2000.log", history_dir / "1000.log"])
+    assert expected
+    # Without the index, the lines found by grep are numbered by grep
+    assert [row[1:] for row in _query(history, *filters)] == [row[1:] for row in expected]
+
+
+def test_get_files_with_index_line_numbers(history):
+    history_dir = history._settings.paths.history_dir.value
+    history_dir.mkdir(parents=True)
+    _write_log(history_dir / "1000.log", range(3 * BLOCK_LINES + 5))
+
+    rows = _query(history, "history_time > 3500", "event_rule_id = rule1", "event_host = host1")
+    assert [row[0] for row in rows[:3]] == [4, 34, 64]
+    assert [row[5] for row in rows[:3]] == [3001, 2971, 2941]
+
+
+def test_get_files_with_index_of_several_files(history):
+    history_dir = history._settings.paths.history_dir.value
+    history_dir.mkdir(parents=True)
+    for day in range(5):
+        _write_log(history_dir / ("%d.log" % (1000 + day)),
+                   range(day * 20 * BLOCK_LINES, (day + 1) * 20 * BLOCK_LINES))
+
+    # The host does not occur in any block of the files
+    assert not _query(history, "event_host = new_host")
+    assert len(_query(history, "event_host ~~ host3")) == 10 * BLOCK_LINES
@@ -20,6 +20,24 @@ def test_perfcounters_count():
 
     assert not [(k, v) for k, v in c._counters.items() if k != "messages" and v > 0]
 
+    c.count("messages", 3)
+    assert c._counters["messages"] == 4
+
+
+def test_perfcounters_gauge(monkeypatch):
+    c = Perfcounters(logger)
+    c.set_gauge("queued_messages", 5)
+    c.set_gauge("queued_messages", 3)
+
+    monkeypatch.setattr("time.time", lambda: 1.0)
+    c.do_statistics()
+    monkeypatch.setattr("time.time", lambda: 2.0)
+    c.do_statistics()
+    assert "queued_messages" not in c._rates
+
+    status = dict(zip([n for n, _d in c.status_columns()], c.get_status()))
+    assert status["status_queued_messages"] == 3
+
 
 def test_perfcounters_count_time():
     c = Perfcounters(logger)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=protected-access
+
+import itertools
+import logging
+
+import pytest  # type: ignore[import]
+
+from cmk.ec.main import EventServer, RuleMatcher
+from cmk.ec.rule_prefilter import RulePrefilter, _LiteralScanner, required_literals
+
+
+def _compile(key, pattern):
+    return EventServer._compile_matching_value(key, pattern)
+
+
+@pytest.mark.parametrize("pattern,result", [
+    ("Failed Password", [{"failed password"}]),
+    ("sshd.*failed", [{"sshd"}, {"failed"}]),
+    ("^foo$", [{"foo"}]),
+    ("foo\\bbar", [{"foobar"}]),
+    ("a+bcd", [{"a"}, {"bcd"}]),
+    ("x*abc", [{"abc"}]),
+    ("(ab)?cd", [{"cd"}]),
+    ("(abc|de)x", [{"abcx", "dex"}]),
+    ("(abc|.*)x", [{"x"}]),
+    ("(abc|.*)", []),
+    ("(abc|d+e)", [{"abc", "d"}]),
+    ("disk (sda|sdb) full", [{"disk sda full", "disk sdb full"}]),
+    ("(?:fooo)+", [{"fooo"}]),
+    ("[abc]", [{"a", "b", "c"}]),
+    ("[a-c]x", [{"x"}]),
+    ("ſtart.*", [{"tart"}]),
+    ("a" * 100, [{"a" * 32}]),
+])
+def test_required_literals(pattern, result):
+    assert required_literals(_compile("match", pattern)) == [frozenset(r) for r in result]
+
+
+def test_literal_scanner():
+    scanner = _LiteralScanner(["abc", "ab", "bc", "b", "xyz", "a.c"])
+    assert scanner.find("xabcx") == {"abc", "ab", "bc", "b"}
+    assert scanner.find("xyxy") == set()
+    assert scanner.find("a.c abc") == {"a.c", "abc", "ab", "bc", "b"}
+    assert _LiteralScanner([]).find("abc") == set()
+
+
+def _rule(number, **patterns):
+    rule = {"id": "rule%d" % number, "pack": "pack%d" % (number % 3), "state": 1}
+    for key, pattern in patterns.items():
+        rule[key] = _compile(key, pattern)
+    return rule
+
+
+def _event(host, application, text):
+    return {
+        "host": host,
+        "application": application,
+        "text": text,
+        "priority": 3,
+        "facility": 1,
+        "ipaddress": "",
+    }
+
+
+PATTERNS = {
+    "match": ["", "failed", "Failed (password|key) for", "^disk .* full$", "(x|.*)y", "e+rror"],
+    "match_ok": [None, "succeeded", "ok$"],
+    "match_host": [None, "server1", "server[0-9]+", "^SERVER2$"],
+    "match_application": [None, "sshd", "cron(d)?"],
+    "cancel_application": [None, "login"],
+}
+
+EVENTS = [
+    _event(host, application, text) for host, application, text in itertools.product(
+        ["server1", "SERVER2", "router", "ſerver3", ""],
+        ["sshd", "crond", "login", "kernel", ""],
+        [
+            "Failed password for root",
+            "Login succeeded",
+            "disk sda is full",
+            "disk sda full",
+            "Error while writing",
+            "eeerror",
+            "xy",
+            "ſucceeded",
+            "",
+        ],
+    )
+]
+
+
+def test_prefilter_keeps_matching_rules():
+    matcher = RuleMatcher(logging.getLogger("cmk.mkeventd"), {"debug_rules": False})
+    rules = []
+    for number, combination in enumerate(itertools.product(*PATTERNS.values(), [False, True])):
+        *values, invert = combination
+        patterns = {key: pattern for key, pattern in zip(PATTERNS, values) if pattern is not None}
+        rule = _rule(number, **patterns)
+        if rule.get("match") is None:
+            del rule["match"]
+        if invert:
+            rule["invert_matching"] = True
+        rules.append(rule)
+
+    prefilter = RulePrefilter(rules)
+    assert 0 < len(prefilter) < len(rules)
+
+    num_skipped = 0
+    for event in EVENTS:
+        for rule, may_match in prefilter.filter(rules, event):
+            if may_match:
+                continue
+            num_skipped += 1
+            assert matcher.event_rule_matches_non_inverted(rule, event) is False, (rule, event)
+    assert num_skipped > len(EVENTS) * len(rules) / 4
+
+
+def test_prefilter_keeps_rule_order():
+    rules = [_rule(number, match="message %d" % number) for number in range(10)]
+    prefilter = RulePrefilter(rules[::2])
+    result = list(prefilter.filter(rules, _event("", "", "message 3 and message 4")))
+    assert [rule for rule, _may_match in result] == rules
+    may_match_flags = [may_match for _rule, may_match in result]
+    assert may_match_flags == [False, True, False, True, True, True, False, True, False, True]
+
+
+def test_prefilter_many_rules():
+    """Compare to the evaluation of all rules"""
+    matcher = RuleMatcher(logging.getLogger("cmk.mkeventd"), {"debug_rules": False})
+    rules = [
+        _rule(number, match="(service|daemon)%d: .* failed" % number, match_host="host[0-9]+")
+        for number in range(3000)
+    ]
+    prefilter = RulePrefilter(rules)
+    events = [
+        _event("host%d" % number, "app", "daemon%d: restart failed" % (number * 37))
+        for number in range(50)
+    ]
+
+    def evaluate(event, candidates):
+        matching = (rule for rule, may_match in candidates
+                    if may_match and matcher.event_rule_matches_non_inverted(rule, event))
+        return [rule["id"] for rule in matching]
+
+    expected = [evaluate(event, ((rule, True) for rule in rules)) for event in events]
+    assert [evaluate(event, prefilter.filter(rules, event)) for event in events] == expected
+    # Only the rules with a matching literal are evaluated
+    for event in events:
+        assert sum(may_match for _rule, may_match in prefilter.filter(rules, event)) <= 2
@@ -12,3 +12,74 @@ def test_needed_elements_of_expression():
         rf.needed_elements_of_expression(('transformation', ('q90percentile', 95.0), [
             ('rrd', u'heute', u'CPU utilization', 'util', 'max')
         ]))) == {('heute', 'CPU utilization', 'util', 'max')}
+
+
+def test_livestatus_lql_of_services():
+    services = [("s1", "h1", "CPU load"), ("s2", "h2", "Disk IO")]
+    columns = ["rrddata:load1:load1.max:1:2:60"]
+    assert rf.livestatus_lql_of_services(services, columns, False) == "".join([
+        "GET services\n",
+        "Columns: host_name service_description rrddata:load1:load1.max:1:2:60\n",
+        "Filter: host_name = h1\n",
+        "Filter: service_description = CPU load\n",
+        "And: 2\n",
+        "Filter: host_name = h2\n",
+        "Filter: service_description = Disk IO\n",
+        "And: 2\n",
+        "Or: 2\n",
+    ])
+
+
+def test_livestatus_lql_of_hosts():
+    assert rf.livestatus_lql_of_services([
+        ("s1", "h1", "_HOST_"),
+    ], ["rrddata:rta:rta.max:1:2:60"], True) == ("GET hosts\n"
+                                                 "Columns: host_name rrddata:rta:rta.max:1:2:60\n"
+                                                 "Filter: host_name = h1\n")
+
+
+class FakeLive:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.only_sites = None
+        self.prepend_site = False
+
+    def set_only_sites(self, sites):
+        if sites is not None:
+            self.only_sites = sites
+
+    def set_prepend_site(self, prepend_site):
+        if prepend_site:
+            self.prepend_site = prepend_site
+
+    def query(self, query):
+        self.queries.append(query)
+        return self.rows
+
+
+def test_fetch_rrd_data_of_services(monkeypatch):
+    live = FakeLive([
+        ["s1", "h1", "CPU load", [1, 2, 60, 1.0]],
+        ["s2", "h2", "CPU load", [1, 2, 60, 2.0]],
+    ])
+    monkeypatch.setattr(rf.sites, "live", lambda: live)
+
+    assert rf.fetch_rrd_data_of_services(
+        {
+            ("s1", "h1", "CPU load"): {("load1", None, 1.0)},
+            ("s2", "h2", "CPU load"): {("load1", None, 1.0)},
+            ("s2", "h3", "CPU load"): {("load1", None, 1.0)},
+        },
+        {"consolidation_function": "max"},
+        {
+            "time_range": (1, 2),
+            "step": 60
+        },
+    ) == {
+        ("s1", "h1", "CPU load"): [(("load1", None, 1.0), [1, 2, 60, 1.0])],
+        ("s2", "h2", "CPU load"): [(("load1", None, 1.0), [1, 2, 60, 2.0])],
+    }
+    assert len(live.queries) == 1
+    assert live.only_sites == ["s1", "s2"]
+    assert live.prepend_site
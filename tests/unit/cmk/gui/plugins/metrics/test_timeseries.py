@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+from cmk.utils.prediction import TimeSeries
+import cmk.gui.plugins.metrics.timeseries as ts
+
+
+@pytest.fixture(name="numpy_available", params=[True, False], ids=["numpy", "lists"])
+def fixture_numpy_available(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(ts, "get_numpy", lambda: None)
+    return request.param
+
+
+@pytest.mark.parametrize("operator_id, operands, result", [
+    ("+", [[1, None, None], [2, 3, None]], [3.0, 3.0, None]),
+    ("*", [[1.5, None, 3], [2, 3, 4]], [3.0, None, 12.0]),
+    ("-", [[5, None, 1], [2, 3, 4]], [3.0, None, -3.0]),
+    ("/", [[5, 1, None], [2, 0, 4]], [2.5, None, None]),
+    ("MAX", [[5, None, None], [2, 3, None], [7, 1, None]], [7.0, 3.0, None]),
+    ("MIN", [[5, None, None], [2, 3, None], [7, 1, None]], [2.0, 1.0, None]),
+    ("AVERAGE", [[5, None, None], [2, 3, None]], [3.5, 3.0, None]),
+    ("MERGE", [[None, None, 1], [2, None, 3], [4, 5, 6]], [2.0, 5.0, 1.0]),
+    ("+", [[1, 2, 3], [1, 2]], [2.0, 4.0]),
+])
+def test_time_series_math(numpy_available, operator_id, operands, result):
+    assert ts.time_series_math(
+        operator_id,
+        [TimeSeries(values, (0, 180, 60)) for values in operands],
+    ) == TimeSeries(result, (0, 180, 60))
+
+
+def test_time_series_math_of_results(numpy_available):
+    twindow = (0, 120, 60)
+    summed = ts.time_series_math("+", [TimeSeries([1, 2], twindow), TimeSeries([3, None], twindow)])
+    assert ts.time_series_math("*", [summed, TimeSeries([2, 2], twindow)]).values == [8.0, 4.0]
@@ -1240,6 +1240,7 @@ def test_grouped_rulespecs():
             'bulkwalk_hosts',
             'management_bulkwalk_hosts',
             'snmp_bulk_size',
+            'snmp_fetch_concurrency',
             'snmp_without_sys_descr',
             'snmpv2c_hosts',
             'snmpv3_contexts',
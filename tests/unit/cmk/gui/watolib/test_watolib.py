@@ -100,6 +100,7 @@ def test_registered_configvars():
         'enable_sounds',
         'escape_plugin_output',
         'event_limit',
+        'event_processes',
         'eventsocket_queue_len',
         'failed_notification_horizon',
         'hard_query_limit',
@@ -163,6 +164,7 @@ def test_registered_configvars():
         'staleness_threshold',
         'start_url',
         'statistics_interval',
+        'status_journal',
         'table_row_limit',
         'tcp_connect_timeout',
         'translate_snmptraps',
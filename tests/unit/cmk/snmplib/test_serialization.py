@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import ast
+import json
+import os
+import timeit
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.type_defs import SectionName
+
+import cmk.snmplib.serialization as serialization
+import cmk.snmplib.snmp_table as snmp_table
+from cmk.snmplib.type_defs import BackendOIDSpec, BackendSNMPTree
+
+
+def _if_table(num_interfaces):
+    # 20 columns, strings and a binary MAC address, like the "interfaces" section
+    return [[
+        str(index),
+        "GigabitEthernet0/%d" % index,
+        "6",
+        "1500",
+        "1000000000",
+        [0, 11, 22, 33, 44, index % 256],
+        "1",
+        "1",
+        "12345678",
+        str(index * 123456789),
+        str(index * 1234),
+        "0",
+        "0",
+        "0",
+        "0",
+        str(index * 987654321),
+        str(index * 4321),
+        "0",
+        "0",
+        "Uplink to switch %d" % index,
+    ] for index in range(1, num_interfaces + 1)]
+
+
+def _if_rowinfo(num_interfaces):
+    return [(".1.3.6.1.2.1.31.1.1.1.6.%d" % index, b"%d" % (index * 123456789))
+            for index in range(1, num_interfaces + 1)]
+
+
+def test_raw_data_round_trip():
+    raw_data = {
+        SectionName("interfaces"): [_if_table(3), []],
+        SectionName("empty"): [[]],
+    }
+    assert serialization.deserialize_raw_data(
+        serialization.serialize_raw_data(raw_data)) == raw_data
+
+
+def test_rowinfo_round_trip():
+    rowinfo = _if_rowinfo(3) + [(".1.2.3", b"\x00\xff")]
+    assert serialization.deserialize_rowinfo(serialization.serialize_rowinfo(rowinfo)) == rowinfo
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"CSNM",
+    b"[('.1.2.3', b'x')]\n",
+    serialization.serialize_rowinfo([])[:-1] + b"\xff",
+    serialization.MAGIC + b"\x00\x02\x00\x04" + b"[]",
+])
+def test_deserialize_invalid(data):
+    with pytest.raises(ValueError):
+        serialization.deserialize_rowinfo(data)
+
+
+def test_walk_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+    tree = BackendSNMPTree(base=".1.2", oids=[BackendOIDSpec("3", "string", True)])
+    rowinfo = [(".1.2.3.1", b"one"), (".1.2.3.2", b"two")]
+
+    walk_cache = snmp_table.WalkCache("testhost")
+    walk_cache[".1.2.3"] = (True, rowinfo)
+    walk_cache.save()
+
+    walk_cache = snmp_table.WalkCache("testhost")
+    walk_cache.load(trees=[tree])
+    assert walk_cache[".1.2.3"] == (True, rowinfo)
+
+
+def test_walk_cache_reads_legacy_format(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+    tree = BackendSNMPTree(base=".1.2", oids=[BackendOIDSpec("3", "string", True)])
+    rowinfo = [(".1.2.3.1", b"one"), (".1.2.3.2", b"two")]
+    (tmp_path / "snmp_cache" / "testhost").mkdir(parents=True)
+    (tmp_path / "snmp_cache" / "testhost" / ".1.2.3").write_text(repr(rowinfo) + "\n")
+
+    walk_cache = snmp_table.WalkCache("testhost")
+    walk_cache.load(trees=[tree])
+    assert walk_cache[".1.2.3"] == (True, rowinfo)
+
+
+def test_raw_data_smaller_than_json():
+    """Compare to the JSON encoding used by the fetcher protocol before"""
+    raw_data = {SectionName("interfaces"): [_if_table(2000)]}
+    json_data = json.dumps({str(k): v for k, v in raw_data.items()}).encode("utf8")
+    binary_data = serialization.serialize_raw_data(raw_data)
+
+    assert len(binary_data) < len(json_data)
+    assert serialization.deserialize_raw_data(binary_data) == {
+        SectionName(k): v for k, v in json.loads(json_data.decode("utf8")).items()
+    }
+
+
+def test_rowinfo_smaller_than_repr():
+    """Compare to the repr/literal_eval encoding used by the walk cache before"""
+    rowinfo = _if_rowinfo(5000)
+    repr_data = (repr(rowinfo) + "\n").encode("utf-8")
+    binary_data = serialization.serialize_rowinfo(rowinfo)
+
+    assert len(binary_data) < len(repr_data)
+    assert serialization.deserialize_rowinfo(binary_data) == ast.literal_eval(
+        repr_data.decode("utf-8"))
+
+
+def _best_of(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+@pytest.mark.skipif(not os.environ.get("BENCHMARK"), reason="Benchmark, set BENCHMARK=1 to run it")
+def test_benchmark_serialization(capsys):
+    """Compare to the JSON and repr/literal_eval encodings used before, nothing is asserted"""
+    raw_data = {SectionName("interfaces"): [_if_table(2000)]}
+    json_data = json.dumps({str(k): v for k, v in raw_data.items()}).encode("utf8")
+    binary_data = serialization.serialize_raw_data(raw_data)
+    rowinfo = _if_rowinfo(5000)
+    repr_data = (repr(rowinfo) + "\n").encode("utf-8")
+    binary_rowinfo = serialization.serialize_rowinfo(rowinfo)
+
+    results = [
+        ("SNMP raw data (ifTable, 2000 rows)", "JSON", len(json_data),
+         _best_of(lambda: json.dumps({str(k): v for k, v in raw_data.items()}).encode("utf8")),
+         _best_of(lambda: json.loads(json_data.decode("utf8")))),
+        ("SNMP raw data (ifTable, 2000 rows)", "binary", len(binary_data),
+         _best_of(lambda: serialization.serialize_raw_data(raw_data)),
+         _best_of(lambda: serialization.deserialize_raw_data(binary_data))),
+        ("Walk cache (ifTable column, 5000 rows)", "repr", len(repr_data),
+         _best_of(lambda: (repr(rowinfo) + "\n").encode("utf-8")),
+         _best_of(lambda: ast.literal_eval(repr_data.decode("utf-8")), repeat=2)),
+        ("Walk cache (ifTable column, 5000 rows)", "binary", len(binary_rowinfo),
+         _best_of(lambda: serialization.serialize_rowinfo(rowinfo)),
+         _best_of(lambda: serialization.deserialize_rowinfo(binary_rowinfo))),
+    ]
+    with capsys.disabled():
+        print()
+        for data, encoding, size, encode_duration, decode_duration in results:
+            print("%s, %s: %d bytes, encoded in %.2fms, decoded in %.2fms" %
+                  (data, encoding, size, encode_duration * 1000, decode_duration * 1000))
@@ -86,6 +86,49 @@ def test_get_snmp_table(monkeypatch, snmp_info, expected_values):
     assert get_all_snmp_tables(snmp_info) == expected_values
 
 
+class SNMPColumnsTestBackend(SNMPTestBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def walk(self, oid, check_plugin_name=None, table_base_oid=None, context_name=None):
+        self.requests.append([oid])
+        return super().walk(oid, check_plugin_name, table_base_oid, context_name)
+
+    def walk_columns(self, oids, check_plugin_name=None, table_base_oid=None, context_name=None):
+        self.requests.append(list(oids))
+        return {
+            oid: super(SNMPColumnsTestBackend, self).walk(oid, check_plugin_name, table_base_oid,
+                                                          context_name) for oid in oids
+        }
+
+
+def test_get_snmp_table_walks_columns_at_once():
+    backend = SNMPColumnsTestBackend(SNMPConfig, logger)
+    walk_cache = {".1.2.3.4": (False, [(".1.2.3.4.1", b"cached")])}
+    table = snmp_table.get_snmp_table(
+        section_name=SectionName("unit_test"),
+        tree=BackendSNMPTree(
+            base=".1.2.3",
+            oids=[
+                BackendOIDSpec(SpecialColumn.END, "string", False),
+                BackendOIDSpec("1", "string", False),
+                BackendOIDSpec("2", "string", True),
+                BackendOIDSpec("4", "string", False),
+            ],
+        ),
+        walk_cache=walk_cache,
+        backend=backend,
+    )
+    assert backend.requests == [[".1.2.3.1", ".1.2.3.2"]]
+    assert walk_cache[".1.2.3.2"][0] is True
+    assert table == [
+        ["1", "C0FEFE", "C0FEFE", "cached"],
+        ["2", "C0FEFE", "C0FEFE", ""],
+        ["3", "C0FEFE", "C0FEFE", ""],
+    ]
+
+
 @pytest.mark.parametrize(
     "encoding,columns,expected",
     [
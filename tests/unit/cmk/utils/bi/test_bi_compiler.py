@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+
+import copy
+
+import pytest
+
+import cmk.utils.paths
+from cmk.utils.bi.bi_aggregation import BIAggregation
+from cmk.utils.bi.bi_compiler import BICompiler
+from cmk.utils.bi.bi_lib import SitesCallback
+from cmk.utils.bi.bi_rule import BIRule
+import bi_test_data.sample_config as sample_config
+
+
+def _checkmk_of_heute(bi_packs) -> BIAggregation:
+    # Only looks up the host "heute", the default aggregation searches all hosts
+    aggregation_config = bi_packs.get_aggregation("default_aggregation").serialize()
+    aggregation_config["id"] = "checkmk_of_heute"
+    aggregation_config["node"] = {
+        "search": {
+            "type": "empty"
+        },
+        "action": {
+            "type": "call_a_rule",
+            "rule_id": "checkmk",
+            "params": {
+                "arguments": ["heute"]
+            },
+        },
+    }
+    return BIAggregation(aggregation_config)
+
+
+def _change_rule_title(bi_packs, rule_id: str, title: str) -> None:
+    rule_config = bi_packs.get_rule_mandatory(rule_id).serialize()
+    rule_config["properties"]["title"] = title
+    bi_packs.get_pack("default").add_rule(BIRule(rule_config))
+
+
+@pytest.fixture
+def bi_compiler(monkeypatch, tmp_path, bi_packs_sample_config):
+    monkeypatch.setattr(cmk.utils.paths, "tmp_dir", str(tmp_path))
+    monkeypatch.setattr(BICompiler, "_generate_part_of_aggregation_lookup",
+                        lambda self, compiled_aggregations: None)
+    bi_packs_sample_config.get_pack("default").add_aggregation(
+        _checkmk_of_heute(bi_packs_sample_config))
+
+    compiler = BICompiler("", SitesCallback(lambda: None, lambda: None))
+    compiler._bi_packs = bi_packs_sample_config
+    yield compiler
+
+
+def _compile(bi_compiler, monkeypatch, structure_states, program_start):
+    compiled = []
+    compile_aggregation = bi_compiler._compile_aggregation
+
+    def _compile_aggregation(aggregation):
+        compiled.append(aggregation.id)
+        return compile_aggregation(aggregation)
+
+    monkeypatch.setattr(bi_compiler, "_compile_aggregation", _compile_aggregation)
+    bi_compiler._bi_structure_fetcher.cleanup()
+    bi_compiler._bi_structure_fetcher.add_site_data("heute", structure_states)
+    bi_compiler.bi_searcher.set_hosts(bi_compiler._bi_structure_fetcher.hosts)
+    bi_compiler._compile_outdated_aggregations({
+        "configfile_timestamp": 0.0,
+        "known_sites": {("heute", program_start)},
+        "online_sites": {("heute", program_start)},
+    })
+    return sorted(compiled)
+
+
+def _branch_titles(bi_compiler):
+    return {
+        aggr_id: sorted(branch.properties.title for branch in compiled_aggregation.branches)
+        for aggr_id, compiled_aggregation in bi_compiler.compiled_aggregations.items()
+    }
+
+
+def test_compile_only_outdated_aggregations(bi_compiler, monkeypatch):
+    all_aggregations = ["checkmk_of_heute", "default_aggregation"]
+    assert _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states,
+                    1) == all_aggregations
+    assert _branch_titles(bi_compiler) == {
+        "checkmk_of_heute": ["Check_MK"],
+        "default_aggregation": ["Host heute", "Host heute_clone"],
+    }
+
+    # Nothing changed, the results are loaded from disk
+    bi_compiler.cleanup()
+    assert _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states, 1) == []
+    assert sorted(bi_compiler.compiled_aggregations) == all_aggregations
+
+    # The site was restarted, but the structure data of its hosts did not change
+    assert _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states, 2) == []
+
+    # Only the default aggregation looks at the host heute_clone
+    structure_states = copy.deepcopy(sample_config.bi_structure_states)
+    structure_states["heute_clone"][1].remove("tcp")
+    assert _compile(bi_compiler, monkeypatch, structure_states, 3) == ["default_aggregation"]
+    assert _branch_titles(bi_compiler)["default_aggregation"] == ["Host heute"]
+
+    structure_states["heute"][4]["Check_MK"] = ({}, {})
+    assert _compile(bi_compiler, monkeypatch, structure_states, 4) == all_aggregations
+
+
+def test_compile_changed_rules(bi_compiler, monkeypatch):
+    _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states, 1)
+
+    _change_rule_title(bi_compiler._bi_packs, "checkmk", "Checkmk")
+    assert _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states,
+                    1) == ["checkmk_of_heute", "default_aggregation"]
+    assert _branch_titles(bi_compiler)["checkmk_of_heute"] == ["Checkmk"]
+
+    _change_rule_title(bi_compiler._bi_packs, "host", "Host: $HOSTNAME$")
+    assert _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states,
+                    1) == ["default_aggregation"]
+
+    bi_compiler._bi_packs.get_pack("default").delete_aggregation("checkmk_of_heute")
+    assert _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states, 1) == []
+    assert sorted(bi_compiler.compiled_aggregations) == ["default_aggregation"]
+    assert sorted(x.name for x in bi_compiler._path_compiled_aggregations.iterdir()) == [
+        "default_aggregation"
+    ]
+
+
+def test_compile_aggregations_in_workers(bi_compiler, monkeypatch):
+    monkeypatch.setattr("cmk.utils.bi.bi_compiler.MIN_AGGREGATIONS_PER_PROCESS", 1)
+    monkeypatch.setattr("os.cpu_count", lambda: 2)
+    _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states, 1)
+    compiled_in_workers = _branch_titles(bi_compiler)
+
+    bi_compiler.cleanup()
+    bi_compiler._path_compilation_state.unlink()
+    monkeypatch.setattr("cmk.utils.bi.bi_compiler.MIN_AGGREGATIONS_PER_PROCESS", 10)
+    assert _compile(bi_compiler, monkeypatch, sample_config.bi_structure_states,
+                    1) == ["checkmk_of_heute", "default_aggregation"]
+    assert _branch_titles(bi_compiler) == compiled_in_workers
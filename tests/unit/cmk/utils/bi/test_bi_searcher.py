@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+
+import re
+
+import pytest  # type: ignore[import]
+
+from cmk.utils.rulesets.ruleset_matcher import matches_labels, matches_tag_spec
+
+
+@pytest.fixture
+def bi_searcher_with_hosts(bi_searcher, bi_structure_fetcher):
+    hosts = {}
+    for index in range(30):
+        host_name = "host%02d" % index
+        tags = {"lan" if index % 2 else "wan", "prod" if index % 3 else "test"}
+        labels = {"os": "linux" if index % 5 else "windows"}
+        services = {"CPU load": ({}, {}), "Interface %d" % (index % 4): ({}, {})}
+        hosts[host_name] = ("heute", tags, labels, "", services, (), (), "alias%d" % index,
+                            host_name)
+    bi_structure_fetcher.add_site_data("heute", hosts)
+    bi_searcher.set_hosts(bi_structure_fetcher.hosts)
+    yield bi_searcher
+
+
+def _conditions(host_choice, host_tags=None, host_labels=None):
+    return {
+        "host_choice": host_choice,
+        "host_tags": host_tags or {},
+        "host_labels": host_labels or {},
+    }
+
+
+@pytest.mark.parametrize("host_choice", [
+    {
+        "type": "all_hosts"
+    },
+    {
+        "type": "host_name_regex",
+        "pattern": "host1(.)"
+    },
+    {
+        "type": "host_name_regex",
+        "pattern": "host07"
+    },
+    {
+        "type": "host_alias_regex",
+        "pattern": "alias2"
+    },
+])
+@pytest.mark.parametrize("host_tags, host_labels", [
+    ({}, {}),
+    ({
+        "network": "lan"
+    }, {}),
+    ({
+        "network": {
+            "$ne": "lan"
+        },
+        "criticality": "prod"
+    }, {}),
+    ({
+        "network": {
+            "$or": ["wan", {
+                "$ne": "prod"
+            }]
+        }
+    }, {}),
+    ({
+        "network": {
+            "$nor": ["wan", "test"]
+        }
+    }, {
+        "os": "linux"
+    }),
+    ({}, {
+        "os": {
+            "$ne": "linux"
+        }
+    }),
+    ({
+        "network": "unknown"
+    }, {}),
+])
+def test_search_hosts_with_indexes(bi_searcher_with_hosts, host_choice, host_tags, host_labels):
+    matches = bi_searcher_with_hosts.search_hosts(_conditions(host_choice, host_tags, host_labels))
+
+    expected = []
+    for host in bi_searcher_with_hosts.hosts.values():
+        if not all(matches_tag_spec(x, host.tags) for x in host_tags.values()):
+            continue
+        if not matches_labels(host.labels, host_labels):
+            continue
+        if host_choice["type"] == "host_name_regex" and "(" not in host_choice["pattern"]:
+            # Plain host names are their own match group
+            match = re.match("(%s)$" % host_choice["pattern"], host.name)
+        elif host_choice["type"] == "host_name_regex":
+            match = re.match(host_choice["pattern"] + "$", host.name)
+        elif host_choice["type"] == "host_alias_regex":
+            match = re.match(host_choice["pattern"], host.alias)
+        else:
+            match = re.match("(.*)", host.name)
+        if match:
+            expected.append((host.name, match.groups()))
+
+    assert [(x.host.name, tuple(x.match_groups)) for x in matches] == expected
+
+
+def test_search_services_memoized(bi_searcher_with_hosts):
+    conditions = _conditions({"type": "all_hosts"}, {"network": "lan"})
+    conditions["service_regex"] = "Interface (1|3)"
+    conditions["service_labels"] = {}
+    for _repetition in range(2):
+        matches = bi_searcher_with_hosts.search_services(conditions)
+        assert [(x.host.name, x.service_description, x.match_groups) for x in matches] == [
+            ("host%02d" % x, "Interface %d" % (x % 4), (str(x % 4),)) for x in range(1, 30, 2)
+        ]
+
+
+@pytest.mark.parametrize("conditions, all_hosts, host_names", [
+    (_conditions({
+        "type": "host_name_regex",
+        "pattern": "host07"
+    }, {"network": "lan"}), False, {"host07"}),
+    (_conditions({
+        "type": "host_name_regex",
+        "pattern": "host0.*"
+    }), True, set()),
+    (_conditions({"type": "all_hosts"}, {"network": "lan"}), True, set()),
+])
+def test_record_host_lookups(bi_searcher_with_hosts, conditions, all_hosts, host_names):
+    with bi_searcher_with_hosts.record_host_lookups() as host_lookups:
+        assert bi_searcher_with_hosts.search_hosts(conditions)
+    assert host_lookups.all_hosts is all_hosts
+    assert host_lookups.host_names == host_names
@@ -4,10 +4,14 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-# pylint: disable=redefined-outer-name
+# pylint: disable=redefined-outer-name,protected-access
+import random
+
 import pytest  # type: ignore[import]
 from testlib.base import Scenario
 
+import cmk.utils.rulesets.ruleset_matcher as ruleset_matcher
+from cmk.utils.labels import LabelManager
 from cmk.utils.type_defs import CheckPluginName
 from cmk.base.check_utils import Service
 from cmk.base.discovered_labels import DiscoveredServiceLabels, ServiceLabel
@@ -526,3 +530,168 @@ def test_ruleset_optimizer_clear_ruleset_caches(monkeypatch):
     ruleset_optimizer.clear_ruleset_caches()
     assert not ruleset_optimizer._host_ruleset_cache
     assert not ruleset_optimizer._service_ruleset_cache
+
+
+def _make_matcher(num_hosts):
+    rnd = random.Random(4711)
+    host_tag_lists = {}
+    host_paths = {}
+    explicit_host_labels = {}
+    for index in range(num_hosts):
+        hostname = "host%d" % index
+        path = rnd.choice(["/", "/lvl1/", "/lvl1/lvl2/", "/other/"])
+        host_tag_lists[hostname] = {
+            path,
+            rnd.choice(["prod", "test"]),
+            rnd.choice(["lan", "wan", "dmz"]),
+            rnd.choice(["cmk-agent", "no-agent"]),
+        }
+        host_paths[hostname] = path
+        explicit_host_labels[hostname] = {"os": rnd.choice(["linux", "windows"])}
+
+    return ruleset_matcher.RulesetMatcher(
+        tag_to_group_map={},
+        host_tag_lists=host_tag_lists,
+        host_paths=host_paths,
+        labels=LabelManager(explicit_host_labels, [], [], lambda h, s: {}),
+        all_configured_hosts=set(host_tag_lists),
+        clusters_of={},
+        nodes_of={},
+    )
+
+
+_CONDITIONS = [
+    {},
+    {
+        "host_name": [],
+    },
+    {
+        "host_name": ["host1", "host2", "unknown"],
+    },
+    {
+        "host_name": {
+            "$nor": ["host1", {
+                "$regex": "host1."
+            }]
+        },
+    },
+    {
+        "host_name": [{
+            "$regex": "host.*3$"
+        }],
+        "host_tags": {
+            "criticality": "prod",
+        },
+    },
+    {
+        "host_folder": "/lvl1/",
+        "host_tags": {
+            "criticality": "test",
+            "networking": {
+                "$ne": "lan"
+            },
+        },
+    },
+    {
+        "host_tags": {
+            "networking": {
+                "$or": ["lan", "wan"]
+            },
+            "agent": {
+                "$nor": ["no-agent", "unknown"]
+            },
+        },
+    },
+    {
+        "host_folder": "/lvl1/lvl2/",
+        "host_labels": {
+            "os": "linux",
+        },
+    },
+    {
+        "host_labels": {
+            "os": {
+                "$ne": "linux"
+            },
+        },
+        "host_tags": {
+            "criticality": "prod",
+        },
+    },
+    {
+        "host_name": ["host1", "host4", "host5"],
+        "host_tags": {
+            "networking": "dmz",
+        },
+    },
+]
+
+
+def _linear_matching_hosts(matcher, condition):
+    optimizer = matcher.ruleset_optimizer
+    labels = optimizer._labels
+
+    def matches(hostname):
+        return (optimizer._host_paths[hostname].startswith(condition.get("host_folder", "/")) and
+                optimizer.matches_host_tags(optimizer._host_tag_lists[hostname],
+                                            condition.get("host_tags", {})) and
+                ruleset_matcher.matches_labels(labels.labels_of_host(matcher, hostname),
+                                               condition.get("host_labels", {})) and
+                condition.get("host_name") != [] and
+                optimizer.matches_host_name(condition.get("host_name"), hostname))
+
+    return {hostname for hostname in optimizer.all_processed_hosts() if matches(hostname)}
+
+
+@pytest.mark.parametrize("condition", _CONDITIONS)
+def test_ruleset_optimizer_all_matching_hosts(condition):
+    matcher = _make_matcher(200)
+
+    assert matcher.ruleset_optimizer._all_matching_hosts(
+        condition, with_foreign_hosts=False) == _linear_matching_hosts(matcher, condition)
+
+
+def test_ruleset_optimizer_all_matching_hosts_of_processed_hosts():
+    matcher = _make_matcher(200)
+    matcher.ruleset_optimizer.get_hosts_within_folder("/", with_foreign_hosts=False)
+    matcher.ruleset_optimizer.set_all_processed_hosts({"host1", "host2", "host3"})
+
+    for condition in _CONDITIONS:
+        assert matcher.ruleset_optimizer._all_matching_hosts(
+            condition, with_foreign_hosts=False) == _linear_matching_hosts(matcher, condition)
+
+
+def test_ruleset_optimizer_service_rules_of_host():
+    matcher = _make_matcher(200)
+    optimizer = matcher.ruleset_optimizer
+    service_ruleset = [{
+        "value": index,
+        "condition": dict(condition, service_description=["CPU"]),
+    } for index, condition in enumerate(_CONDITIONS)]
+
+    preprocessed = optimizer.get_service_ruleset(service_ruleset, False, False)
+    for hostname in sorted(optimizer.all_processed_hosts()):
+        rules = optimizer.get_service_rules_of_host(service_ruleset, hostname, False, False)
+        assert rules == [rule for rule in preprocessed if hostname in rule[1]]
+
+    # Hosts with the same matching rules share them
+    assert len({
+        id(optimizer.get_service_rules_of_host(service_ruleset, hostname, False, False))
+        for hostname in optimizer.all_processed_hosts()
+    }) < len(optimizer.all_processed_hosts())
+
+
+def test_service_description_match_cache_is_bounded():
+    matcher = _make_matcher(1)
+    service_ruleset = [{"value": "CPU", "condition": {"service_description": ["CPU"]}}]
+    for index in range(100):
+        assert list(
+            matcher.get_service_ruleset_values(
+                RulesetMatchObject(host_name="host0", service_description="CPU %d" % index),
+                service_ruleset,
+                is_binary=False,
+            )) == ["CPU"]
+
+    cache_info = ruleset_matcher._matches_service_description.cache_info()
+    assert cache_info.maxsize == ruleset_matcher.SERVICE_DESCRIPTION_MATCH_CACHE_SIZE
+    assert cache_info.currsize > 0
@@ -6,7 +6,9 @@
 
 from typing import Dict, List
 
+import os
 import shutil
+import timeit
 import pytest  # type: ignore[import]
 from pathlib import Path
 import gzip
@@ -809,3 +811,86 @@ def test_delta_structured_data_tree_serialization(zipped_trees):
     new_delta_tree.create_tree_from_raw_tree(delta_tree.get_raw_tree())
 
     assert delta_tree.is_equal(new_delta_tree)
+
+
+def _software_packages(num_packages, version):
+    return [{
+        "name": "package-%d" % index,
+        "version": "%d.%d" % (index % 7, version if index % 10 == 0 else 0),
+        "arch": "x86_64",
+        "size": index * 10,
+    } for index in range(num_packages)]
+
+
+@pytest.mark.parametrize("old_numeration_data, new_numeration_data", [
+    (_software_packages(50, 1), _software_packages(50, 2)),
+    (_software_packages(50, 1), _software_packages(60, 2)),
+    (_software_packages(50, 1) * 2, _software_packages(40, 1)[::-1]),
+    ([{
+        "name": "with list",
+        "ips": ["10.0.0.1"]
+    }], [{
+        "name": "with list",
+        "ips": ["10.0.0.2"]
+    }, {
+        "name": "other"
+    }]),
+])
+def test_structured_data_Numeration_categorized_rows(old_numeration_data, new_numeration_data):
+    old_numeration = Numeration()
+    old_numeration.set_child_data(old_numeration_data)
+    new_numeration = Numeration()
+    new_numeration.set_child_data(new_numeration_data)
+    assert new_numeration._get_categorized_rows(old_numeration) ==\
+        new_numeration._get_categorized_rows_by_comparison(old_numeration)
+    assert new_numeration.is_equal(old_numeration) is False
+    assert new_numeration.is_equal(new_numeration.copy()) is True
+
+
+def test_structured_data_Numeration_compare_with_large_tables():
+    old_numeration = Numeration()
+    old_numeration.set_child_data(_software_packages(20000, 1))
+    new_numeration = Numeration()
+    new_numeration.set_child_data(_software_packages(20000, 2))
+
+    result = new_numeration.compare_with(old_numeration, keep_identical=True)
+    num_new, num_changed, num_removed, delta_node = result
+
+    assert (num_new, num_changed, num_removed) == (0, 2000, 0)
+    assert delta_node is not None
+    assert len(delta_node.get_child_data()) == 20000
+
+
+@pytest.mark.skipif(not os.environ.get("BENCHMARK"), reason="Benchmark, set BENCHMARK=1 to run it")
+def test_structured_data_Numeration_compare_with_benchmark(capsys):
+    """Compare to the categorization by comparing the rows, nothing is asserted"""
+    results = []
+    for num_rows in [1000, 5000, 20000]:
+        old_numeration = Numeration()
+        old_numeration.set_child_data(_software_packages(num_rows, 1))
+        new_numeration = Numeration()
+        new_numeration.set_child_data(_software_packages(num_rows, 2))
+
+        by_hash = min(
+            timeit.repeat(lambda: new_numeration._get_categorized_rows(old_numeration),
+                          number=1,
+                          repeat=3))
+        compare_with = min(
+            timeit.repeat(lambda: new_numeration.compare_with(old_numeration, keep_identical=True),
+                          number=1,
+                          repeat=3))
+        # The comparison is quadratic, it takes too long for the largest table
+        by_comparison = None if num_rows > 5000 else min(
+            timeit.repeat(
+                lambda: new_numeration._get_categorized_rows_by_comparison(old_numeration),
+                number=1,
+                repeat=1))
+        results.append((num_rows, by_hash, by_comparison, compare_with))
+
+    with capsys.disabled():
+        print()
+        for num_rows, by_hash, by_comparison, compare_with in results:
+            print("%d rows: categorized by hash in %.3fs, by comparison in %s, "
+                  "compare_with() in %.3fs" %
+                  (num_rows, by_hash, "-" if by_comparison is None else "%.3fs" % by_comparison,
+                   compare_with))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import socket
+import threading
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.automation_helper as automation_helper
+from cmk.utils.exceptions import MKGeneralException
+
+_REQUEST = automation_helper.AutomationRequest(
+    command="get-check-information",
+    args=["--timeout", "10"],
+    stdin="''",
+    verbosity=1,
+)
+
+
+@pytest.fixture(name="serve_once")
+def fixture_serve_once(tmp_path):
+    """Answer a single request with the given raw response"""
+    socket_path = tmp_path / "automation-helper"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen(1)
+    received = []
+
+    def serve(response):
+        def handle():
+            connection, _address = server.accept()
+            with connection:
+                received.append(automation_helper.receive_all(connection))
+                connection.sendall(response)
+
+        thread = threading.Thread(target=handle)
+        thread.start()
+        return socket_path, received, thread
+
+    yield serve
+    server.close()
+
+
+def test_request_serialization():
+    assert automation_helper.AutomationRequest.deserialize(_REQUEST.serialize()) == _REQUEST
+
+
+def test_response_serialization():
+    response = automation_helper.AutomationResponse(exit_code=0, stdout="{}\n", stderr="ä")
+    raw = automation_helper.serialize_response(response)
+    assert automation_helper.deserialize_response(raw) == response
+
+
+def test_unavailable_response():
+    raw = automation_helper.serialize_unavailable("Command restart is not supported")
+    assert automation_helper.deserialize_response(raw) is None
+
+
+def test_execute_automation_not_running(tmp_path):
+    assert automation_helper.execute_automation(_REQUEST, tmp_path / "not-existing") is None
+
+
+def test_execute_automation(serve_once):
+    response = automation_helper.AutomationResponse(exit_code=0, stdout="{'a': 1}\n", stderr="")
+    socket_path, received, thread = serve_once(automation_helper.serialize_response(response))
+
+    assert automation_helper.execute_automation(_REQUEST, socket_path) == response
+    thread.join()
+    assert [automation_helper.AutomationRequest.deserialize(r) for r in received] == [_REQUEST]
+
+
+def test_execute_automation_declined(serve_once):
+    socket_path, _received, thread = serve_once(automation_helper.serialize_unavailable("no"))
+    assert automation_helper.execute_automation(_REQUEST, socket_path) is None
+    thread.join()
+
+
+@pytest.mark.parametrize("raw_response", [b"", b"{", b"{}"])
+def test_execute_automation_broken_response(serve_once, raw_response):
+    socket_path, _received, thread = serve_once(raw_response)
+    with pytest.raises(MKGeneralException):
+        automation_helper.execute_automation(_REQUEST, socket_path)
+    thread.join()
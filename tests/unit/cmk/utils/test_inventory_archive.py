@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+
+import copy
+import os
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.store as store
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.inventory_archive import (
+    InventoryArchive,
+    apply_raw_tree_delta,
+    compute_raw_tree_delta,
+)
+
+
+def _raw_tree(version):
+    return {
+        "hardware": {
+            "cpu": {
+                "cores": 4 + version % 2,
+                "model": "Xeon",
+            },
+            "memory": {
+                "total_ram_usable": 1024 * (version + 1),
+            },
+        },
+        "software": {
+            "packages": [{
+                "name": "package-%d" % index,
+                "version": "1.%d" % (version if index % 100 == 0 else 0),
+            } for index in range(1000 + version)],
+            "os": {
+                "name": "Linux",
+                "kernel_version": "5.%d" % (version // 2),
+            },
+        },
+    }
+
+
+@pytest.mark.parametrize("base, target", [
+    ({}, {}),
+    (dict(a=1), dict(a=1, b=2)),
+    (dict(a=1, b=2), dict(b=3, a=1)),
+    (dict(a=dict(b=[1, 2, 3])), dict(a=dict(b=[3, 1, 2, 4]))),
+    (dict(a=[dict(x=1), dict(x=2)]), dict(a=dict(x=1))),
+    (dict(a=[1, 2, 3, 4, 5]), dict(a=[1, 2, 9, 4, 5, 5, 5])),
+    (dict(a=dict(b=1), c=2), dict(c=3)),
+    (_raw_tree(1), _raw_tree(2)),
+    (_raw_tree(4), _raw_tree(1)),
+])
+def test_raw_tree_delta(base, target):
+    original_base = copy.deepcopy(base)
+    result = apply_raw_tree_delta(base, compute_raw_tree_delta(base, target))
+    assert result == target
+    assert list(result) == list(target)
+    assert base == original_base
+
+
+@pytest.fixture
+def archive_dir(tmp_path):
+    yield tmp_path / "heute"
+
+
+def _archive_trees(archive_dir, versions):
+    archive = InventoryArchive(archive_dir)
+    for version in versions[:-1]:
+        archive.add(1000 + version, _raw_tree(version), _raw_tree(version + 1))
+    return versions[-1]
+
+
+def test_load_archived_trees(archive_dir):
+    current_version = _archive_trees(archive_dir, [0, 1, 2, 3, 4])
+
+    archive = InventoryArchive(archive_dir)
+    assert archive.timestamps() == ["1000", "1001", "1002", "1003"]
+    for version in [1, 3, 0, 2]:
+        assert archive.load_raw_tree(str(1000 + version),
+                                     _raw_tree(current_version)) == _raw_tree(version)
+
+    # The disk space cleanup uses the modification time to find the oldest files
+    assert int(os.stat(str(archive_dir / "1002")).st_mtime) == 1002
+    # The deltas are way smaller than the complete trees
+    assert os.stat(str(archive_dir / "1002")).st_size * 20 < len(repr(_raw_tree(2)))
+
+
+def test_load_archived_trees_with_legacy_files(archive_dir):
+    archive_dir.mkdir()
+    store.save_object_to_file(str(archive_dir / "0999"), _raw_tree(9))
+    current_version = _archive_trees(archive_dir, [0, 1, 2])
+
+    archive = InventoryArchive(archive_dir)
+    assert archive.timestamps() == ["0999", "1000", "1001"]
+    assert archive.load_raw_tree("0999", _raw_tree(current_version)) == _raw_tree(9)
+    assert archive.load_raw_tree("1000", _raw_tree(current_version)) == _raw_tree(0)
+
+
+def test_load_archived_trees_with_removed_files(archive_dir):
+    current_version = _archive_trees(archive_dir, [0, 1, 2, 3])
+
+    # Removing the oldest trees keeps the newer ones
+    (archive_dir / "1000").unlink()
+    assert InventoryArchive(archive_dir).load_raw_tree("1001",
+                                                       _raw_tree(current_version)) == _raw_tree(1)
+
+    (archive_dir / "1002").unlink()
+    with pytest.raises(MKGeneralException):
+        InventoryArchive(archive_dir).load_raw_tree("1001", _raw_tree(current_version))
+
+
+def test_load_archived_trees_with_changed_current_tree(archive_dir):
+    current_version = _archive_trees(archive_dir, [0, 1, 2])
+
+    # Only the content of the current tree matters, not e.g. the time it has been written
+    assert InventoryArchive(archive_dir).load_raw_tree("1000",
+                                                       _raw_tree(current_version)) == _raw_tree(0)
+
+    with pytest.raises(MKGeneralException):
+        InventoryArchive(archive_dir).load_raw_tree("1000", _raw_tree(current_version + 1))
+
+
+def test_materialize_newest_archived_tree(archive_dir):
+    current_version = _archive_trees(archive_dir, [0, 1, 2])
+    InventoryArchive(archive_dir).materialize_newest(_raw_tree(current_version))
+
+    # Readable without the current tree
+    archive = InventoryArchive(archive_dir)
+    assert archive.load_raw_tree("1001", {}) == _raw_tree(1)
+    assert archive.load_raw_tree("1000", {}) == _raw_tree(0)
+
+
+def test_archive_trees_replaced_within_one_second(archive_dir):
+    archive = InventoryArchive(archive_dir)
+    archive.add(1000, _raw_tree(0), _raw_tree(1))
+    # Tree 1 is replaced within the same second as tree 2
+    archive.add(1001, _raw_tree(1), _raw_tree(2))
+    archive.add(1001, _raw_tree(2), _raw_tree(3))
+
+    archive = InventoryArchive(archive_dir)
+    assert archive.timestamps() == ["1000", "1001"]
+    assert archive.load_raw_tree("1001", _raw_tree(3)) == _raw_tree(1)
+    assert archive.load_raw_tree("1000", _raw_tree(3)) == _raw_tree(0)
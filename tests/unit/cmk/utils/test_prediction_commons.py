@@ -4,8 +4,12 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import json
+
 import pytest  # type: ignore[import]
 
+import livestatus
+
 import cmk.utils.prediction as prediction
 
 
@@ -46,6 +50,13 @@ def test_rrdtimestamps(twindow, result):
     assert prediction.rrd_timestamps(twindow) == result
 
 
+@pytest.fixture(name="numpy_available", params=[True, False], ids=["numpy", "lists"])
+def fixture_numpy_available(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(prediction, "get_numpy", lambda: None)
+    return request.param
+
+
 @pytest.mark.parametrize("rrddata, twindow, shift, upsampled", [
     ([10, 20, 10, 20], (10, 20, 10), 0, [20]),
     ([10, 20, 10, 20], (10, 20, 5), 0, [20, 20]),
@@ -55,7 +66,7 @@ def test_rrdtimestamps(twindow, result):
      (300, 400, 10), 300, [25, 25, 25, 25, None, None, None, None, 105, 105]),
     ([0, 120, 40, 25, 65, 105], (330, 410, 10), 300, [25, 65, 65, 65, 65, 105, 105, 105]),
 ])
-def test_time_series_upsampling(rrddata, twindow, shift, upsampled):
+def test_time_series_upsampling(numpy_available, rrddata, twindow, shift, upsampled):
     ts = prediction.TimeSeries(rrddata)
     assert ts.bfill_upsample(twindow, shift) == upsampled
 
@@ -71,11 +82,21 @@ def test_time_series_upsampling(rrddata, twindow, shift, upsampled):
     ([10, 45, 5, 15, 20, 25, 30, 35, 40, 45], (10, 40, 10), "average", [17.5, 27.5, 37.5]),
     ([10, 45, 5, 15, 20, 25, 30, None, 40, 45], (10, 40, 10), "average", [17.5, 27.5, 40.]),
 ])
-def test_time_series_downsampling(rrddata, twindow, cf, downsampled):
+def test_time_series_downsampling(numpy_available, rrddata, twindow, cf, downsampled):
     ts = prediction.TimeSeries(rrddata)
     assert ts.downsample(twindow, cf) == downsampled
 
 
+def test_time_series_from_array():
+    np = prediction.get_numpy()
+    ts = prediction.TimeSeries.from_array(np.array([1.0, np.nan, 3.0]), (0, 180, 60))
+    assert len(ts) == 3
+    assert list(ts.to_array(np)[[0, 2]]) == [1.0, 3.0]
+    assert ts.values == [1.0, None, 3.0]
+    del ts.values[-1]
+    assert ts == prediction.TimeSeries([1.0, None], (0, 180, 60))
+
+
 @pytest.mark.parametrize("ref_value, stdev, sig, params, levels_factor, result", [
     (2, 0.5, 1, ("absolute", (3, 5)), 0.5, (3.5, 4.5)),
     (2, 0.5, -1, ("relative", (20, 50)), 0.5, (1.6, 1)),
@@ -132,3 +153,57 @@ def test_estimate_level_bounds(ref_value, stdev, sig, params, levels_factor, res
 ])
 def test_estimate_levels(reference, params, levels_factor, result):
     assert prediction.estimate_levels(reference, params, levels_factor) == result
+
+
+def test_get_rrd_data_of_time_windows(monkeypatch):
+    queries = []
+
+    def query_row(self, query):
+        queries.append(str(query))
+        return [[100, 200, 50, 1.0, None], [300, 400, 50, 2.0, 3.0]]
+
+    monkeypatch.setattr(livestatus.SingleSiteConnection, "query_row", query_row)
+    assert prediction.get_rrd_data_of_time_windows("heute", "CPU load", "load15", "MAX",
+                                                   [(110, 190), (310, 390)]) == [
+                                                       prediction.TimeSeries([1.0, None],
+                                                                             (100, 200, 50)),
+                                                       prediction.TimeSeries([2.0, 3.0],
+                                                                             (300, 400, 50)),
+                                                   ]
+    # All time windows are fetched with a single query
+    assert queries == [
+        "GET services\n"
+        "Columns: rrddata:m1:load15.max:110:190:1:400 rrddata:m1:load15.max:310:390:1:400\n"
+        "Filter: host_name = heute\n"
+        "Filter: service_description = CPU load\n"
+        "OutputFormat: python\n"
+    ]
+
+
+_PREDICTION_DATA = {
+    "columns": ["average", "min", "max", "stdev"],
+    "points": [[1.5, 1.0, 2.0, 0.5], [None, None, None, None], [3.0, 3.0, 3.0, 3.0]],
+    "num_points": 3,
+    "data_twindow": [1543402800, 1543489200],
+    "step": 60,
+}
+
+
+def test_save_and_retrieve_prediction_data(tmp_path):
+    pred_file = str(tmp_path / "monday")
+    prediction.save_prediction_data(pred_file, _PREDICTION_DATA)
+    assert prediction.retrieve_data_for_prediction(pred_file, "monday") == _PREDICTION_DATA
+    assert (tmp_path / "monday").read_bytes().startswith(prediction.PREDICTION_FILE_MAGIC)
+
+
+def test_retrieve_json_prediction_data(tmp_path):
+    pred_file = tmp_path / "monday"
+    pred_file.write_text(json.dumps(_PREDICTION_DATA))
+    assert prediction.retrieve_data_for_prediction(str(pred_file), "monday") == _PREDICTION_DATA
+
+
+def test_retrieve_broken_prediction_data(tmp_path):
+    pred_file = tmp_path / "monday"
+    pred_file.write_bytes(prediction.PREDICTION_FILE_MAGIC + b"broken")
+    assert prediction.retrieve_data_for_prediction(str(pred_file), "monday") is None
+    assert not pred_file.exists()
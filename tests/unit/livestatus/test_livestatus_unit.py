@@ -7,8 +7,11 @@
 # pylint: disable=redefined-outer-name
 
 import errno
+import json
 import socket
 import ssl
+import threading
+import time
 from contextlib import closing
 
 import pytest  # type: ignore[import]
@@ -199,3 +202,110 @@ def test_create_socket_no_cert(tmp_path):
     with pytest.raises(livestatus.MKLivestatusConfigError,
                        match="(unknown error|no certificate or crl found)"):
         live._create_socket(socket.AF_INET)
+
+
+def _serve_livestatus(sock, responses, delay=0.0):
+    """Answers the queries on one connection, the responses are built from the queries"""
+    conn, _addr = sock.accept()
+    with closing(conn):
+        for response in responses:
+            query = b""
+            while not query.endswith(b"\n\n"):
+                query += conn.recv(4096)
+            time.sleep(delay)
+            data = response(query.decode("utf-8")).encode("utf-8")
+            conn.sendall(b"%-3s %11d\n" % (b"200", len(data)) + data)
+
+
+def _rows_of_site(site_id):
+    def _response(query):
+        if "OutputFormat: json" in query:
+            return json.dumps([[site_id, "json"], [site_id, "ä"]])
+        return repr([[site_id, "python3"], [site_id, b"blob"]])
+
+    return _response
+
+
+@pytest.fixture
+def multisite_servers(tmp_path):
+    """Sites answering the queries after different delays"""
+    sites = {}
+    servers = []
+    for site_id, delay, responses in [
+        ("slow", 0.5, [_rows_of_site("slow")] * 2),
+        ("fast", 0.0, [_rows_of_site("fast")] * 2),
+        ("broken", 0.0, [lambda query: "[['not', 'terminated'"]),
+    ]:
+        sock = socket.socket(socket.AF_UNIX)
+        sock.bind(str(tmp_path / site_id))
+        sock.listen(1)
+        server = threading.Thread(target=_serve_livestatus, args=(sock, responses, delay))
+        server.daemon = True
+        server.start()
+        servers.append((sock, server))
+        sites[site_id] = {"socket": "unix:%s" % (tmp_path / site_id)}
+
+    yield sites
+
+    for sock, server in servers:
+        server.join(timeout=5)
+        sock.close()
+
+
+def test_multisite_query_rows_as_they_arrive(multisite_servers):
+    live = livestatus.MultiSiteConnection(multisite_servers)
+    live.set_prepend_site(True)
+
+    rows = live.query_rows("GET hosts\nColumns: name\n")
+    # The rows of the fast site are available before the slow site answered
+    start = time.time()
+    assert next(rows) == ["fast", "fast", "python3"]
+    assert time.time() - start < 0.4
+    assert list(rows) == [["fast", "fast", b"blob"], ["slow", "slow", "python3"],
+                          ["slow", "slow", b"blob"]]
+
+    assert live.alive_sites() == ["slow", "fast"]
+    assert isinstance(live.dead_sites()["broken"]["exception"], livestatus.MKLivestatusSocketError)
+
+    # The parallel query keeps the order of the sites
+    assert live.query(livestatus.Query("GET hosts\nColumns: name\n", output_format="json")) == [
+        ["slow", "slow", "json"],
+        ["slow", "slow", "ä"],
+        ["fast", "fast", "json"],
+        ["fast", "fast", "ä"],
+    ]
+
+
+def test_query_invalid_output_format():
+    with pytest.raises(livestatus.MKLivestatusConfigError, match="Invalid output format"):
+        livestatus.Query("GET hosts", output_format="python")
+
+
+def test_response_reader_does_not_block():
+    live = livestatus.SingleSiteConnection("unix:/tmp/none")
+    live.socket, peer = socket.socketpair()
+    live.socket.settimeout(5.0)
+    with closing(live.socket), closing(peer):
+        reader = livestatus.ResponseReader(live)
+        data = b"[[1]]\n"
+        peer.sendall(b"200 %11d\n" % len(data))
+        start = time.time()
+        assert not reader.read_available()
+        assert not reader.read_available()
+        assert time.time() - start < 1.0
+        assert live.socket.gettimeout() == 5.0
+
+        peer.sendall(data)
+        assert reader.read_available()
+        assert reader.data == data
+
+
+def test_multisite_programming_error_is_raised(monkeypatch, multisite_servers):
+    def read_available(self, sock):
+        raise TypeError("programming error")
+
+    monkeypatch.setattr(livestatus.ResponseReader, "_read_available", read_available)
+    live = livestatus.MultiSiteConnection(multisite_servers)
+
+    with pytest.raises(TypeError, match="programming error"):
+        live.query("GET hosts\nColumns: name\n")